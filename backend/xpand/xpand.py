@@ -11,7 +11,6 @@ import os
 import os.path
 import random
 import string
-import time
 from typing import Dict, List
 
 import requests
@@ -19,9 +18,10 @@ import tabulate as tb
 from dateutil.parser import parse
 
 from backend.base_backend import MultiManagedBackend, mdadm_command, mkdir_command
-from common import backoff_with_jitter, retry, round_down_to_even
+from common import backoff_with_jitter, retry, round_down_to_even, traced_sleep
 from compute import BackendTarget, Node
 from compute.exceptions import MultiNodeException
+from lib.db_stats import STATEMENT_CUTOFF, QpcAnalyzer
 from lib.mysql_client import MySqlClientException
 
 from ..abstract_backend import AbstractBackend
@@ -39,7 +39,6 @@ LICENSE_CUTOFF = 24  # License can't be <=24 hrs away from expiration
 MAX_REDO_LIMIT_PCT = 10  # MAX_REDO shouldn't be more than 10% of the memory
 DEFAULT_LONG_COMMAND_TIMEOUT = 60 * 60 * 24
 QPC_LIMIT = 6
-STATEMENT_CUTOFF = 60
 
 
 class Xpand(BaseXpandBackend, MultiManagedBackend, AbstractBackend):
@@ -236,7 +235,7 @@ class Xpand(BaseXpandBackend, MultiManagedBackend, AbstractBackend):
         # Chances are that one of the functions above made changes and we have to restart to make it effective
         self.restart()
 
-        time.sleep(XPAND_GTM_TIMEOUT)
+        traced_sleep(XPAND_GTM_TIMEOUT, "GTM")
         self.db_connect()
         self.set_zones()  # This method will determine if zones are required or not
         self.db_connect()
@@ -338,7 +337,7 @@ class Xpand(BaseXpandBackend, MultiManagedBackend, AbstractBackend):
             systemctl restart clustrix
             """
             self.run_on_all_nodes(cmd)
-            time.sleep(XPAND_GTM_TIMEOUT)
+            traced_sleep(XPAND_GTM_TIMEOUT, "GTM")
             self.logger.info(
                 "Started xpand prometheus exporter on all nodes port:"
                 f" {self.config.prometheus_port}"
@@ -754,76 +753,21 @@ class Xpand(BaseXpandBackend, MultiManagedBackend, AbstractBackend):
         """Gather longest running queries from QPC and save explain statements.
 
         Args:
-            str: Artifact directory to save qpc_queries.txt and query_explains.txt
-        Returns:
-
+            str: Artifact directory to save qpc_queries.csv and explain_queries.txt
         """
-        qpc_query = f"""
-        SELECT
-            statement,
-            left(replace(replace(replace(statement,'\n',' '), '   ', ' '), '  ', ' '), {STATEMENT_CUTOFF}) as stmnt,
-            sum(exec_count) as s_exec_count,
-            avg(avg_latency_ms) as avg_lat_ms,
-            sum(cpu_runtime_ns)/1000/1000 as s_cpu_runtime_ms,
-            sum(cpu_waittime_ns)/1000/1000 as s_cpu_waittime_ms,
-            sum(fc_waittime_ns)/1000/1000 as s_fc_waittime_ms,
-            sum(bm_waittime_ns)/1000/1000 as s_bm_waittime_ms,
-            sum(lockman_waittime_ms) as s_lockman_waittime_ms,
-            sum(trxstate_waittime_ms) as s_trxstate_waittime_ms,
-            sum(bm_perm_waittime_ms) as s_bm_perm_waittime_ms,
-            sum(wal_perm_waittime_ms) as s_wal_perm_waittime_ms,
-            sum(forwards) as s_fowards,
-            sum(broadcasts) as s_broadcasts,
-            sum(fragment_executions) as s_fragment_executions,
-            sum(barrier_forwards) as s_barrier_forwards
-        FROM
-            system.qpc_queries
-        WHERE
-            flushed = 0
-            AND database = '{self.config.db.database}'
-        GROUP BY
-            stmnt
-        ORDER BY
-            avg_lat_ms desc LIMIT {QPC_LIMIT};
-        """
-        self.db_connect()
-        rows = self.select_all_rows(qpc_query)
-        qpc_output = ""
-        explains_output = ""
-        if len(rows) > 0:
-            for k in rows[0].keys():
-                if k != "statement":  # We don't need statement field
-                    qpc_output = f"{qpc_output}{k}\t"
-            qpc_output = f"{qpc_output}\n"
-            for row in rows:
-                row["statement"] = " ".join(row["statement"].split())
-                cmd = f"EXPLAIN {row['statement']}"
-                try:
-                    rows = self.select_all_rows(cmd)
-                except MySqlClientException:
-                    self.logger.warning(f"Invalid SQL: {cmd}")
-                    rows = []
-                tb.PRESERVE_WHITESPACE = True
-                explain = tb.tabulate(
-                    rows, headers="keys", numalign="right", tablefmt="presto"
-                )
-                explains_output = (
-                    f"{explains_output}--------------\nstatement ="
-                    f" {row['statement']}\n--------------\n{explain}\n\n\n"
-                )
-                for i, v in enumerate(row.values()):
-                    if i > 0:  # We don't need to print entire statement
-                        qpc_output = f"{qpc_output}{v}\t"
-                qpc_output = f"{qpc_output}\n"
-
-        qpc_queries_file: str = os.path.join(output_dir, "qpc_queries.txt")
-        self.logger.debug(f"Saving QPC queries to {qpc_queries_file}")
-        with open(qpc_queries_file, "w") as qpc_queries:
-            qpc_queries.write(qpc_output)
-        explain_queries_file: str = os.path.join(output_dir, "explain_queries.txt")
-        self.logger.debug(f"Saving QPC queries to {explain_queries_file}")
-        with open(explain_queries_file, "w") as explain_queries:
-            explain_queries.write(explains_output)
+        analyzer = QpcAnalyzer(limit=QPC_LIMIT, **self.connect_params)
+        try:
+            statements = analyzer.statements()
+            qpc_queries_file: str = os.path.join(output_dir, "qpc_queries.csv")
+            self.logger.debug(f"Saving QPC queries to {qpc_queries_file}")
+            statements.assign(
+                statement=statements["statement"].str.slice(0, STATEMENT_CUTOFF)
+            ).round(2).to_csv(qpc_queries_file, index=False)
+            explain_queries_file: str = os.path.join(output_dir, "explain_queries.txt")
+            self.logger.debug(f"Saving QPC queries to {explain_queries_file}")
+            analyzer.save_explains(explain_queries_file, statements)
+        finally:
+            analyzer.close()
 
     def pre_workload_run(self, **kwargs):
         super().pre_workload_run()
@@ -2,5 +2,16 @@ from .exceptions import BenchmarkException
 from .sysbench import Sysbench, SysbenchRunner
 from .benchbase import Benchbase, BenchbaseRunner
 from .hammerdb import Hammerdb, HammerdbRunner
-from .locust import Locust
+from .locust import Locust, LocustRunner
+from .native import Native, NativeRunner
+from .pgbench import Pgbench, PgbenchRunner
+from .replay import ReplayRunner
+from .composite import CompositeRunner
 from .abstract_benchmark import AbstractBenchmarkRunner
+from .step_monitor import Step, StepMonitor, StepMonitors
+from .driver_monitor import DriverMonitor
+from .replication_monitor import ReplicationMonitor
+from .db_stats_monitor import DbStatsMonitor
+from .profiler import ProfileMonitor
+from .wait_monitor import WaitMonitor
+from .qpc_monitor import QpcMonitor
@@ -1,7 +1,6 @@
 import json
 import os
 import re
-import time
 from datetime import datetime
 from enum import Enum
 from glob import glob
@@ -10,11 +9,22 @@ from typing import Dict, List, Optional
 import pandas as pd
 
 from benchmark.abstract_benchmark import AbstractBenchmarkRunner
+from benchmark.checkpoint import Checkpoint
+from benchmark.driver_monitor import distribute, distribute_step, driver_capacities
 from benchmark.exceptions import BenchmarkException
+from benchmark.open_loop import (
+    get_rates,
+    save_print_latency_vs_load,
+    save_print_latency_vs_load_summary,
+)
+from benchmark.step_monitor import Step, StepMonitors
+from common import traced_sleep
 from common.common import get_class_from_klass
 from compute import MultiNode, Node
 from lib.file_template import FileTemplate, FileTemplateException
 
+from .raw_output import RAW_OUTPUT_PATTERN, RawOutputProcessor
+
 DEFAULT_COMMAND_TIMEOUT = 300
 DEFAULT_SLEEP_TIME = 60  # sleep time between threads
 
@@ -74,6 +84,11 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
             "-", "_"
         )  #  In java "-" is not allowed
         self.num_drivers = len(self.nodes)
+        self.driver_weights: List[float] = [1.0] * self.num_drivers
+        self.step_monitors = StepMonitors(nodes, **kwargs)
+        self.checkpoint = Checkpoint(
+            self.artifact_dir, self.workload_name, kwargs.get("resume", False)
+        )
 
     @staticmethod
     def escape(str_xml: str):
@@ -216,6 +231,13 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
                 if isinstance(self.kwargs.get("terminals"), int)
                 else self.kwargs.get("terminals")
             )
+        rates = get_rates(self.kwargs)
+        if rates and self.bench == "chbenchmark":
+            self.logger.warning("Open-loop mode is not supported for chbenchmark")
+            rates = []
+        if rates:  # Open-loop: fixed number of terminals, step through arrival rates
+            self.logger.info(f"Open-loop mode with rates {rates}")
+            terminals = [max(terminals)] * len(rates)
         config_file_name = f"{self.product}_{self.bench}_config.xml"
         self.save_config_data(config_file_name=config_file_name, step=BenchmarkStep.run)
         repeats = self.kwargs.get("repeats")
@@ -239,57 +261,117 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
             repeat_runs = 0
             terminal_runs = []
             all_results = pd.DataFrame()
+            all_rate_results = pd.DataFrame()
+            if self.num_drivers > 1:
+                self.driver_weights = driver_capacities(
+                    self.pssh, self.kwargs.get("driver_weight", "nproc")
+                )
+                self.logger.info(f"Driver weights {self.driver_weights}")
+            step_rates = rates or [0] * len(terminals)
+            step_paths = [
+                (self.terminal_path(t, query_t, rate), rate)
+                for t, query_t, rate in zip(
+                    terminals,
+                    terminals_chbenchmark if self.bench == "chbenchmark" else terminals,
+                    step_rates,
+                )
+            ]
             for r in range(1, repeats + 1):
                 repeat_runs = r
-                if self.kwargs.get("pre_workload_run"):
+                repeat_done = all(
+                    self.checkpoint.done(r, path, rate) for path, rate in step_paths
+                )
+                if self.kwargs.get("pre_workload_run") and not repeat_done:
                     self.backend.pre_workload_run()
                 # All the queries all the terminals for the given repeat
                 this_repeat_queries_results: Dict[int, pd.DataFrame] = {}
                 this_repeat_results = []
+                this_repeat_rate_results = []
                 for i in range(len(terminals)):
                     t = terminals[i]  # it can be zero for chbenchmark
+                    rate = rates[i] if rates else 0
                     terminal_runs.append(t)
                     query_terminals = (
                         terminals_chbenchmark[i] if self.bench == "chbenchmark" else t
                     )
-                    terminal_path = (
-                        f"{t}_{query_terminals}"
-                        if self.bench == "chbenchmark"
-                        else f"{t}"
-                    )
+                    terminal_path = self.terminal_path(t, query_terminals, rate)
+                    outdir = f"{terminal_path}_terminals_run_{r}"
 
-                    time.sleep(DEFAULT_SLEEP_TIME)
+                    completed = self.checkpoint.get(r, terminal_path, rate)
+                    if completed is not None:
+                        self.logger.info(
+                            f"Skipping repeat {r}, thread: {terminal_path} (completed)"
+                        )
+                        this_repeat_results.extend(map(tuple, completed["results"]))
+                        if rate:
+                            this_repeat_rate_results.append(
+                                tuple(completed["rate_results"])
+                            )
+                        if self.bench in ["tpch", "chbenchmark"]:
+                            # Raw files of the completed step are in the artifact dir
+                            this_repeat_queries_results[
+                                query_terminals
+                            ] = self.one_repeat_queries_results(r, outdir)
+                        continue
+
+                    traced_sleep(DEFAULT_SLEEP_TIME, "between steps")
                     if self.kwargs.get("pre_thread_run"):
                         self.backend.pre_thread_run()
-                    per_driver_t = int(t / self.num_drivers)
-                    outdir = f"{terminal_path}_terminals_run_{r}"
+                    # <rate> is per benchbase instance
+                    if self.bench == "chbenchmark":
+                        # chbenchmark runs all terminals on every driver with a share
+                        # of the rate
+                        host_rates = distribute(rate, self.driver_weights)
+                        active = [x > 0 or not rate for x in host_rates]
+                        concurrency = t * sum(active)
+                    else:
+                        host_terminals, host_rates = distribute_step(
+                            t, rate, self.driver_weights
+                        )
+                        active = [x > 0 for x in host_terminals]
+                        concurrency = t
                     remote_outdir = f"{run_outdir}/{outdir}"
 
-                    terminals_clause = (
-                        f"--terminals_tpcc {t} --terminals_chbenchmark"
-                        f" {terminals_chbenchmark[i]}"
-                        if self.bench == "chbenchmark"
-                        else f"--terminals {per_driver_t}"
-                    )
-                    cmd = f"""
-                    cd $XBENCH_HOME
-                    python3 benchbase/scripts/update_config.py --config $XBENCH_HOME/benchbase/{config_file_name} {terminals_clause} --randomseed %s
-                    cd benchbase-{self.product}
-                    java {java_opts} -jar benchbase.jar -b {bench} -c $XBENCH_HOME/benchbase/{config_file_name} --create=false --load=false --execute=true -d /tmp/{remote_outdir}_%s -jh /tmp/{remote_outdir}_%s/histogram.json {extra_params}
-                    """
-                    host_args = [
-                        {"cmd": cmd % (i, self.nodes[i].vm.name, self.nodes[i].vm.name)}
-                        for i in range(len(self.nodes))
-                    ]
+                    host_args = []
+                    for n, node in enumerate(self.nodes):
+                        if not active[n]:
+                            # Not enough terminals for all drivers, an empty directory
+                            # keeps receiving files from all drivers working
+                            host_args.append(
+                                {"cmd": f"mkdir -p /tmp/{remote_outdir}_{node.vm.name}"}
+                            )
+                            continue
+                        terminals_clause = (
+                            f"--terminals_tpcc {t} --terminals_chbenchmark"
+                            f" {terminals_chbenchmark[i]}"
+                            if self.bench == "chbenchmark"
+                            else f"--terminals {host_terminals[n]}"
+                        )
+                        rate_clause = (
+                            f"sed -i 's#<rate>[^<]*</rate>#<rate>{host_rates[n]}</rate>#'"
+                            f" $XBENCH_HOME/benchbase/{config_file_name}"
+                            if rate
+                            else ""
+                        )
+                        cmd = f"""
+                        cd $XBENCH_HOME
+                        python3 benchbase/scripts/update_config.py --config $XBENCH_HOME/benchbase/{config_file_name} {terminals_clause} --randomseed {n}
+                        {rate_clause}
+                        cd benchbase-{self.product}
+                        java {java_opts} -jar benchbase.jar -b {bench} -c $XBENCH_HOME/benchbase/{config_file_name} --create=false --load=false --execute=true -d /tmp/{remote_outdir}_{node.vm.name} -jh /tmp/{remote_outdir}_{node.vm.name}/histogram.json {extra_params}
+                        """
+                        host_args.append({"cmd": cmd})
                     timeout = (
                         self.kwargs.get("time")
                         + self.kwargs.get("warmup")
                         + EXTRA_BENCHBASE_TIMEOUT
                     )
                     self.logger.info(f"Running repeat {r}, thread: {t}")
-                    outputs = self.pssh.run(
-                        cmd="%(cmd)s", timeout=timeout, host_args=host_args
-                    )
+                    step = Step(repeat=r, concurrency=concurrency, rate=rate)
+                    with self.step_monitors.running(step):
+                        outputs = self.pssh.run(
+                            cmd="%(cmd)s", timeout=timeout, host_args=host_args
+                        )
                     # Receiving remote files
                     self.pssh.receive_files(
                         f"/tmp/{remote_outdir}_*/",
@@ -297,7 +379,11 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
                         recursive=True,
                     )
                     # Save output locally and replace IP with vm.name
-                    for driver, stdout in zip(self.nodes, outputs):
+                    for driver, stdout, driver_active in zip(
+                        self.nodes, outputs, active
+                    ):
+                        if not driver_active:
+                            continue
                         output_file: str = os.path.join(
                             self.artifact_dir, f"{outdir}_{driver.vm.name}/stdout"
                         )
@@ -306,9 +392,17 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
                         )
                         with open(output_file, "w") as output:
                             output.write(stdout["stdout"])
+                    if self.kwargs.get("raw_output"):
+                        self.process_raw_output(outdir, r, terminal_path)
                     # Collect data from each terminal this repeat
-                    thread_results = self.one_repeat_overall_results(outdir)
+                    thread_results = self.one_repeat_overall_results(
+                        outdir, concurrency
+                    )
                     this_repeat_results.extend(thread_results)
+                    if rate:
+                        this_repeat_rate_results.append(
+                            self.one_repeat_rate_results(outdir, rate)
+                        )
 
                     if self.bench in ["tpch", "chbenchmark"]:
                         this_terminal_repeat_queries_results_df = (
@@ -324,6 +418,18 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
                     ) or self.check_stdout_errors(outdir):
                         raise BenchmarkException
 
+                    self.checkpoint.save(
+                        r,
+                        terminal_path,
+                        rate,
+                        {
+                            "results": thread_results,
+                            "rate_results": (
+                                this_repeat_rate_results[-1] if rate else None
+                            ),
+                        },
+                    )
+
                 # End of all terminals loops for the given repeat. Collect data from each repeat this run
                 if self.bench in ["tpch", "chbenchmark"]:
                     self.save_print_queries_one_repeat(this_repeat_queries_results, r)
@@ -332,8 +438,20 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
                 # Overall summary data
                 df = self.save_print_one_repeat(r, this_repeat_results)
                 all_results = pd.concat([all_results, df])
+                if rates:
+                    df = save_print_latency_vs_load(
+                        this_repeat_rate_results,
+                        self.artifact_dir,
+                        self.workload_name,
+                        r,
+                    )
+                    all_rate_results = pd.concat([all_rate_results, df])
         except BenchmarkException as e:
             self.logger.error(f"Benchmark failed")
+            self.logger.error(
+                f"Completed steps are saved in {self.checkpoint.file_name}, use"
+                f" --resume {self.artifact_dir} to continue"
+            )
             success = False
         finally:
             if not success:
@@ -345,12 +463,24 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
                     summary_query_data[repeat_runs] = this_repeat_queries_results
                 df = self.save_print_one_repeat(repeat_runs, this_repeat_results)
                 all_results = pd.concat([all_results, df])
+                if this_repeat_rate_results:
+                    df = save_print_latency_vs_load(
+                        this_repeat_rate_results,
+                        self.artifact_dir,
+                        self.workload_name,
+                        repeat_runs,
+                    )
+                    all_rate_results = pd.concat([all_rate_results, df])
 
             # End of all repeats loop. Calculate summary data
             if self.bench in ["tpch", "chbenchmark"]:
                 self.save_print_queries_summary(summary_query_data)
 
             self.save_print_summary(all_results)
+            if rates:
+                save_print_latency_vs_load_summary(
+                    all_rate_results, self.artifact_dir, self.workload_name
+                )
             if self.kwargs.get("post_workload_run"):
                 self.backend.post_workload_run(output_dir=self.artifact_dir)
             if self.kwargs.get("export_query_log"):
@@ -361,6 +491,15 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
             if not success:
                 raise BenchmarkException("Benchmark has errors")
 
+    def terminal_path(self, terminals: int, query_terminals: int, rate: int) -> str:
+        """Step name in output directories and in the checkpoint"""
+        terminal_path = (
+            f"{terminals}_{query_terminals}"
+            if self.bench == "chbenchmark"
+            else f"{terminals}"
+        )
+        return f"{terminal_path}_{rate}rps" if rate else terminal_path
+
     def check_errors(self, outdir, error_threshold) -> bool:
         """Check the benchbase histogram for unexpected and aborted errors.
 
@@ -523,9 +662,7 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
         )
         grouped_multiple.reset_index(inplace=True)
         grouped_multiple.columns = BENCHBASE_RESULT_FIELDS
-        grouped_multiple["concurrency"] = self.num_drivers * grouped_multiple[
-            "concurrency"
-        ].astype(int)
+        grouped_multiple["concurrency"] = grouped_multiple["concurrency"].astype(int)
         grouped_multiple["avg_latency"] = grouped_multiple["avg_latency"].astype(float)
         # Final DF
         df_final = grouped_multiple[BENCHBASE_RESULT_FIELDS].round(RESULT_PRECISION)
@@ -540,14 +677,15 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
         self.logger.info(f"Results for repeat {repeat} saved as {file_name}")
         return df_final
 
-    def one_repeat_overall_results(self, outdir):
+    def one_repeat_overall_results(self, outdir, concurrency: int):
         """Return total throughput of the repeat. For OLTP this is all we need. For OLAP see also  one_repeat_queries_results
 
         Args:
             outdir (str): directory where output files are located
+            concurrency (int): total number of terminals for all drivers
 
         Returns:
-            list[tuple]: terminals, throughput, avg_latency, p90_latency
+            list[tuple]: concurrency, throughput, avg_latency, p90_latency
 
         """
         terminal_data = []
@@ -556,7 +694,6 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
         ):
             with open(summary_json_file) as summary_json:
                 data = json.load(summary_json)
-            terminals = data["terminals"]
             throughput = data["Throughput (requests/second)"]
             avg_latency = round(
                 float(data["Latency Distribution"]["Average Latency (microseconds)"])
@@ -573,17 +710,99 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
                 2,
             )
             # Collect data from each driver this terminal
-            terminal_data.append((terminals, throughput, avg_latency, p90_latency))
+            terminal_data.append((concurrency, throughput, avg_latency, p90_latency))
 
         return terminal_data
 
-    # TODO support more than one driver
+    def one_repeat_rate_results(self, outdir: str, rate: int) -> tuple:
+        """Open-loop row for latency vs load curve.
+
+        Benchbase does not report queueing delay, so service and queue columns are NaN.
+
+        Args:
+            outdir (str): directory where output files are located
+            rate (int): total offered rate
+
+        Returns:
+            tuple: row in LATENCY_VS_LOAD_FIELDS order
+        """
+        throughput = errors = 0.0
+        avg_latencies, p95_latencies, p99_latencies = [], [], []
+        for summary_json_file in sorted(
+            glob(f"{self.artifact_dir}/{outdir}_*/*.summary.json")
+        ):
+            with open(summary_json_file) as summary_json:
+                data = json.load(summary_json)
+            throughput += data["Throughput (requests/second)"]
+            latency = data["Latency Distribution"]
+            avg_latencies.append(float(latency["Average Latency (microseconds)"]))
+            p95_latencies.append(
+                float(latency["95th Percentile Latency (microseconds)"])
+            )
+            p99_latencies.append(
+                float(latency["99th Percentile Latency (microseconds)"])
+            )
+        for histogram_json_file in glob(
+            f"{self.artifact_dir}/{outdir}_*/histogram.json"
+        ):
+            with open(histogram_json_file) as histogram_json:
+                data = json.load(histogram_json)
+            errors += data["aborted"]["NUM_SAMPLES"]
+            errors += data["unexpected"]["NUM_SAMPLES"]
+        if not avg_latencies:
+            raise BenchmarkException(f"No benchbase summary found for {outdir}")
+        return (
+            rate,
+            throughput,
+            sum(avg_latencies) / len(avg_latencies) / 1000.0,
+            max(p95_latencies) / 1000.0,
+            max(p99_latencies) / 1000.0,
+            float("nan"),
+            float("nan"),
+            float("nan"),
+            errors,
+        )
+
+    def process_raw_output(self, outdir: str, r: int, terminal_path: str):
+        """Aggregate per transaction raw output of all drivers
+
+        Results are saved as {workload}_raw_{r}_{terminal_path}_*. Raw files are removed
+        unless keep_raw_output is set.
+        """
+        processor = RawOutputProcessor(window=self.kwargs.get("sampling_window", 10))
+        raw_files = sorted(glob(f"{self.artifact_dir}/{outdir}_*/{RAW_OUTPUT_PATTERN}"))
+        if not raw_files:
+            self.logger.warning(f"No raw output found for {outdir}")
+            return
+        try:
+            for raw_file in raw_files:
+                processor.process_file(raw_file)
+            for histogram_json_file in glob(
+                f"{self.artifact_dir}/{outdir}_*/histogram.json"
+            ):
+                processor.add_errors(histogram_json_file)
+        except (OSError, ValueError, KeyError) as e:
+            raise BenchmarkException(f"Unable to process raw output of {outdir}: {e}")
+        processor.save(
+            self.artifact_dir, f"{self.workload_name}_raw_{r}_{terminal_path}"
+        )
+        self.logger.info(
+            "======= Benchbase transactions ==========\n"
+            f"{processor.transactions_df().to_string(index=False)}"
+        )
+        if not self.kwargs.get("keep_raw_output"):
+            for raw_file in raw_files:
+                os.remove(raw_file)
+
     def one_repeat_queries_results(self, r, outdir: str) -> pd.DataFrame:
         """Return per query throughput,avg_latency,p90_latency in ms. This applicable to tpch and ch-bench
 
+        Every driver writes its own per query files. Throughput is summed between
+        drivers, average latency is weighted by throughput and p90 is the maximum.
+
         Args:
             r (int): repeat
-            t (int): current number of terminals
+            outdir (str): directory where output files are located
 
         Returns: query, throughput,avg_latency,p90_latency
 
@@ -613,13 +832,26 @@ class BenchbaseRunner(MultiNode, AbstractBenchmarkRunner):
             df = df[df[filter_col] > 0]  # not every query run every time
 
             m = re.match(r".+(Q\d+)\.csv", query_file)
-            if m:
-                df["query"] = m.group(1)  # Query name, Q1, Q2 etc...
+            if m and not df.empty:
+                # One row per driver and query
                 all_queries.append(
-                    df[["query", "tp", "avg_latency", "p90_latency"]]
-                )  # this is raw results
+                    {
+                        "query": m.group(1),  # Query name, Q1, Q2 etc...
+                        "tp": df["tp"].mean(),
+                        "avg_latency": df["avg_latency"].mean(),
+                        "p90_latency": df["p90_latency"].max(),
+                    }
+                )
 
-        return pd.concat(all_queries)  # all raw results from all queries
+        df = pd.DataFrame.from_records(
+            all_queries, columns=["query", "tp", "avg_latency", "p90_latency"]
+        )
+        df["weighted_latency"] = df["avg_latency"] * df["tp"]
+        df = df.groupby("query", as_index=False).agg(
+            {"tp": "sum", "weighted_latency": "sum", "p90_latency": "max"}
+        )
+        df["avg_latency"] = df["weighted_latency"] / df["tp"].where(df["tp"] > 0)
+        return df[["query", "tp", "avg_latency", "p90_latency"]]
 
     def cleanup(self):
         cmd = """kill -9 $(pgrep -f "jar benchbase.jar") || true"""
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Streaming processor for benchbase raw output (-r).
+
+Benchbase writes one CSV row per successful transaction: type index, type name, start
+time (epoch seconds), latency (microseconds), worker and phase. Files of multi-hour
+runs are several GB, so they are read in chunks and every chunk is bucketed with numpy
+into LatencyHistogram buckets. Memory is bounded by the number of transaction types,
+time windows and histogram buckets, not by the number of rows.
+
+Windows are aligned to the epoch, so results of different drivers merge without
+knowing when every driver has started. Aborted/unexpected transactions are not in the
+raw file and come from benchbase histogram.json.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmark.histogram import HISTOGRAM_MIN_VALUE, LOG_GROWTH, LatencyHistogram
+
+RAW_OUTPUT_PATTERN = "*.raw.csv"
+RAW_CHUNK_ROWS = 1000000
+RAW_COLUMNS = ["transaction", "start", "latency"]  # columns 1, 2, 3 of the raw file
+EPOCH_MICROSECONDS = 1e11  # start times above are in microseconds
+ERROR_GROUPS = ["aborted", "unexpected"]  # histogram.json groups counted as errors
+RESULT_PRECISION = 2
+TRANSACTION_FIELDS = [
+    "transaction",
+    "count",
+    "throughput",
+    "avg_latency",
+    "p50_latency",
+    "p95_latency",
+    "p99_latency",
+    "max_latency",
+    "errors",
+    "error_rate",
+]
+WINDOW_FIELDS = [
+    "time",
+    "transaction",
+    "count",
+    "throughput",
+    "avg_latency",
+    "p50_latency",
+    "p95_latency",
+    "p99_latency",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_indexes(values: np.ndarray) -> np.ndarray:
+    """Vectorized histogram.bucket_index"""
+    idx = np.ceil(
+        np.log(np.maximum(values, HISTOGRAM_MIN_VALUE) / HISTOGRAM_MIN_VALUE)
+        / LOG_GROWTH
+    )
+    return idx.astype(np.int64)
+
+
+def record_array(histogram: LatencyHistogram, values: np.ndarray):
+    """Record all values (ms) in the histogram"""
+    if len(values) == 0:
+        return
+    buckets, counts = np.unique(bucket_indexes(values), return_counts=True)
+    for idx, count in zip(buckets.tolist(), counts.tolist()):
+        histogram.counts[idx] = histogram.counts.get(idx, 0) + count
+    histogram.total += len(values)
+    histogram.sum += float(values.sum())
+    histogram.sum_sq += float(np.square(values).sum())
+    low, high = float(values.min()), float(values.max())
+    histogram.min = low if histogram.min is None else min(histogram.min, low)
+    histogram.max = high if histogram.max is None else max(histogram.max, high)
+
+
+def record_groups(histograms: Dict, keys: np.ndarray, values: np.ndarray):
+    """Record values in the histogram of their key"""
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    unique_keys, starts = np.unique(keys, return_index=True)
+    for key, group in zip(unique_keys.tolist(), np.split(values, starts[1:])):
+        record_array(histograms.setdefault(key, LatencyHistogram()), group)
+
+
+class RawOutputProcessor:
+    """Per transaction type and per time window latency of one or more raw files"""
+
+    def __init__(self, window: float = 10):
+        self.window = window
+        self.transactions: Dict[str, LatencyHistogram] = {}
+        # (window start, transaction) -> histogram
+        self.windows: Dict[tuple, LatencyHistogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.first_start: Optional[float] = None
+        self.last_start: Optional[float] = None
+
+    def process_file(self, file_name: str, chunk_rows: int = RAW_CHUNK_ROWS):
+        """Stream one raw CSV"""
+        rows = 0
+        for chunk in pd.read_csv(
+            file_name,
+            usecols=[1, 2, 3],
+            names=RAW_COLUMNS,
+            header=0,
+            dtype={"transaction": str, "start": np.float64, "latency": np.float64},
+            chunksize=chunk_rows,
+        ):
+            self.process_chunk(chunk)
+            rows += len(chunk)
+        logger.debug(f"{rows} transactions processed from {file_name}")
+
+    def process_chunk(self, chunk: pd.DataFrame):
+        start = chunk["start"].to_numpy()
+        if start.size and start[0] > EPOCH_MICROSECONDS:  # older benchbase versions
+            start = start / 1e6
+        latency = chunk["latency"].to_numpy() / 1000  # ms
+        types = chunk["transaction"].astype("category")
+        codes = types.cat.codes.to_numpy()
+        names = list(types.cat.categories)
+        first, last = float(start.min()), float(start.max())
+        self.first_start = (
+            first if self.first_start is None else min(self.first_start, first)
+        )
+        self.last_start = (
+            last if self.last_start is None else max(self.last_start, last)
+        )
+
+        by_code: Dict[int, LatencyHistogram] = {}
+        record_groups(by_code, codes, latency)
+        for code, histogram in by_code.items():
+            self.transactions.setdefault(names[code], LatencyHistogram()).merge(
+                histogram
+            )
+
+        window_ids = np.floor(start / self.window).astype(np.int64)
+        # window and type code in one key, type codes are less than len(names)
+        keys = window_ids * len(names) + codes
+        by_key: Dict[int, LatencyHistogram] = {}
+        record_groups(by_key, keys, latency)
+        for key, histogram in by_key.items():
+            window_id, code = divmod(key, len(names))
+            self.windows.setdefault(
+                (window_id * self.window, names[code]), LatencyHistogram()
+            ).merge(histogram)
+
+    def add_errors(self, histogram_json_file: str):
+        """Add aborted and unexpected transactions from benchbase histogram.json"""
+        with open(histogram_json_file) as f:
+            data = json.load(f)
+        for group in ERROR_GROUPS:
+            for transaction, count in data.get(group, {}).get("HISTOGRAM", {}).items():
+                self.errors[transaction] = self.errors.get(transaction, 0) + int(count)
+
+    def merge(self, other: "RawOutputProcessor") -> "RawOutputProcessor":
+        """Merge results of another driver"""
+        for name, histogram in other.transactions.items():
+            self.transactions.setdefault(name, LatencyHistogram()).merge(histogram)
+        for key, histogram in other.windows.items():
+            self.windows.setdefault(key, LatencyHistogram()).merge(histogram)
+        for name, count in other.errors.items():
+            self.errors[name] = self.errors.get(name, 0) + count
+        for value in (other.first_start, other.last_start):
+            if value is not None:
+                self.first_start = (
+                    value if self.first_start is None else min(self.first_start, value)
+                )
+                self.last_start = (
+                    value if self.last_start is None else max(self.last_start, value)
+                )
+        return self
+
+    @property
+    def duration(self) -> float:
+        if self.first_start is None or self.last_start is None:
+            return 0.0
+        return max(self.last_start - self.first_start, self.window)
+
+    def overall(self) -> LatencyHistogram:
+        histogram = LatencyHistogram()
+        for transaction_histogram in self.transactions.values():
+            histogram.merge(transaction_histogram)
+        return histogram
+
+    def transactions_df(self) -> pd.DataFrame:
+        """One row per transaction type and ALL for all of them"""
+        rows = []
+        histograms = dict(sorted(self.transactions.items()))
+        histograms["ALL"] = self.overall()
+        for name, h in histograms.items():
+            errors = (
+                sum(self.errors.values()) if name == "ALL" else self.errors.get(name, 0)
+            )
+            rows.append(
+                (
+                    name,
+                    h.total,
+                    h.total / self.duration if self.duration else 0.0,
+                    h.mean,
+                    h.percentile(50),
+                    h.percentile(95),
+                    h.percentile(99),
+                    h.max,
+                    errors,
+                    100.0 * errors / (h.total + errors) if h.total + errors else 0.0,
+                )
+            )
+        return pd.DataFrame.from_records(rows, columns=TRANSACTION_FIELDS).round(
+            RESULT_PRECISION
+        )
+
+    def windows_df(self) -> pd.DataFrame:
+        """Long format: one row per window and transaction type"""
+        rows = [
+            (
+                ts,
+                name,
+                h.total,
+                h.total / self.window,
+                h.mean,
+                h.percentile(50),
+                h.percentile(95),
+                h.percentile(99),
+            )
+            for (ts, name), h in sorted(self.windows.items())
+        ]
+        return pd.DataFrame.from_records(rows, columns=WINDOW_FIELDS).round(
+            RESULT_PRECISION
+        )
+
+    def save(self, artifact_dir: str, name: str):
+        """Save {name}_transactions.csv, {name}_windows.csv and {name}_histograms.json"""
+        base = os.path.join(artifact_dir, name)
+        self.transactions_df().to_csv(f"{base}_transactions.csv", index=False)
+        self.windows_df().to_csv(f"{base}_windows.csv", index=False)
+        with open(f"{base}_histograms.json", "w") as f:
+            json.dump({k: h.to_dict() for k, h in self.transactions.items()}, f)
+        logger.info(f"Raw output results saved as {base}_*")
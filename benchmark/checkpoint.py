@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Checkpoint of completed sweep steps.
+
+Runners save every completed (repeat, concurrency, rate) step with the data they need
+to rebuild repeat and summary results. The file is replaced atomically after each step,
+so a crash never leaves a half written checkpoint. With `xb.py workload --resume
+<artifact_dir>` runners load it and skip finished steps.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Union
+
+from .exceptions import BenchmarkException
+
+
+class Checkpoint:
+    """Completed steps of one workload in the artifact directory"""
+
+    def __init__(self, artifact_dir: str, workload_name: str, resume: bool = False):
+        self.logger = logging.getLogger(__name__)
+        self.file_name = os.path.join(
+            artifact_dir or ".", f"{workload_name}_checkpoint.json"
+        )
+        self.steps: Dict[str, Any] = {}
+        if resume:
+            self.load()
+
+    @staticmethod
+    def key(repeat: int, concurrency: Union[int, str], rate: int = 0) -> str:
+        return f"{repeat}:{concurrency}:{rate}"
+
+    def load(self):
+        if not os.path.exists(self.file_name):
+            self.logger.warning(
+                f"No checkpoint {self.file_name}, starting from scratch"
+            )
+            return
+        try:
+            with open(self.file_name) as f:
+                self.steps = json.load(f)
+        except (OSError, ValueError) as e:
+            raise BenchmarkException(f"Unable to load checkpoint {self.file_name}: {e}")
+        self.logger.info(f"Resuming, {len(self.steps)} completed steps found")
+
+    def get(
+        self, repeat: int, concurrency: Union[int, str], rate: int = 0
+    ) -> Optional[Any]:
+        """Data saved for the completed step or None"""
+        return self.steps.get(self.key(repeat, concurrency, rate))
+
+    def done(self, repeat: int, concurrency: Union[int, str], rate: int = 0) -> bool:
+        return self.key(repeat, concurrency, rate) in self.steps
+
+    def save(self, repeat: int, concurrency: Union[int, str], rate: int, data: Any):
+        """Mark step as completed and write the checkpoint (temporary file + rename)"""
+        self.steps[self.key(repeat, concurrency, rate)] = data
+        tmp_file_name = f"{self.file_name}.tmp"
+        try:
+            with open(tmp_file_name, "w") as f:
+                json.dump(self.steps, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file_name, self.file_name)
+        except (OSError, TypeError, ValueError) as e:
+            raise BenchmarkException(f"Unable to save checkpoint {self.file_name}: {e}")
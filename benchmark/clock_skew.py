@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Clock offsets of cluster members against the xbench host and their correction.
+
+Driver time series, host samples and sync start markers are stamped by the clocks of
+the members, steps, chaos events and database samples by the xbench host. ClockSkew
+reads `date +%s.%N` of every member over SSH at the start and at the end of the run:
+
+    offset = remote time - (sent + received) / 2
+
+The sample with the lowest round trip is kept, the error of the offset is at most half
+of its round trip. Offsets are interpolated between both measurements (drift) and
+subtracted from member timestamps, so series of all hosts share the xbench clock.
+Offsets are saved to clock.yaml, runs where the clock error is above the sampling
+interval are flagged there.
+"""
+
+import fnmatch
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from common import save_dict_as_yaml
+from compute import Node, NodeException
+
+CLOCK_FILE = "clock.yaml"
+DEFAULT_SAMPLES = 5
+ORIGINAL_TIME = "member_time"  # column with uncorrected timestamps
+TIMESERIES_PATTERN = "*_timeseries_*.csv"
+RESULT_PRECISION = 3
+
+
+def estimate_offset(samples: List[Tuple[float, float, float]]) -> Tuple[float, float]:
+    """Offset and round trip (ms) from (sent, remote, received) epoch samples
+
+    The sample with the lowest round trip has the lowest error (Cristian's algorithm)
+    """
+    sent, remote, received = min(samples, key=lambda s: s[2] - s[0])
+    return 1000 * (remote - (sent + received) / 2), 1000 * (received - sent)
+
+
+def interpolate_offset(measurements: List[Dict], at: float) -> Optional[float]:
+    """Offset (ms) at epoch `at`, linear between measurements, constant outside"""
+    points = sorted((m["time"], m["offset_ms"]) for m in measurements)
+    if not points:
+        return None
+    if at <= points[0][0] or len(points) == 1:
+        return points[0][1]
+    if at >= points[-1][0]:
+        return points[-1][1]
+    for (t0, o0), (t1, o1) in zip(points, points[1:]):
+        if t0 <= at <= t1:
+            return o0 + (o1 - o0) * (at - t0) / (t1 - t0) if t1 > t0 else o1
+    return points[-1][1]
+
+
+def correct_times(
+    df: pd.DataFrame, offsets: Dict[str, List[Dict]], host_column: str
+) -> pd.DataFrame:
+    """Move `time` of every row to the xbench clock, the original goes to member_time
+
+    Rows of hosts without measurements are left as they are
+    """
+    if df.empty or ORIGINAL_TIME in df.columns:  # already corrected
+        return df
+    df = df.copy()
+    df[ORIGINAL_TIME] = df["time"]
+    corrections = [
+        interpolate_offset(offsets.get(str(host), []), t)
+        for host, t in zip(df[host_column], df["time"])
+    ]
+    df["time"] = [
+        t - c / 1000 if c is not None else t for t, c in zip(df["time"], corrections)
+    ]
+    return df
+
+
+class ClockSkew:
+    """Offsets of all managed members, measured concurrently"""
+
+    def __init__(self, nodes: List[Node], samples: int = DEFAULT_SAMPLES):
+        self.logger = logging.getLogger(__name__)
+        self.nodes = [n for n in nodes if n.vm.managed]
+        self.samples = samples
+        self.measurements: Dict[str, List[Dict]] = {}  # member name -> measurements
+
+    def _measure(self, node: Node) -> Optional[Tuple[float, float]]:
+        samples = []
+        try:
+            for _ in range(self.samples):
+                sent = time.time()
+                remote = float(node.run("date +%s.%N", timeout=30).strip())
+                samples.append((sent, remote, time.time()))
+        except (NodeException, ValueError) as e:
+            self.logger.warning(f"Unable to read the clock of {node.vm.name}: {e}")
+            return None
+        return estimate_offset(samples)
+
+    def measure(self, label: str):
+        """Offset and round trip of every member, label is start or end"""
+        if not self.nodes:
+            return
+        with ThreadPoolExecutor(len(self.nodes)) as executor:
+            results = list(executor.map(self._measure, self.nodes))
+        now = time.time()
+        for node, result in zip(self.nodes, results):
+            if result is None:
+                continue
+            offset, rtt = result
+            self.measurements.setdefault(node.vm.name, []).append(
+                {
+                    "label": label,
+                    "time": round(now, RESULT_PRECISION),
+                    "offset_ms": round(offset, RESULT_PRECISION),
+                    "rtt_ms": round(rtt, RESULT_PRECISION),
+                }
+            )
+        self.logger.info(
+            f"Clock offsets at {label} (ms): "
+            + ", ".join(
+                f"{name} {m[-1]['offset_ms']:+.1f}±{m[-1]['rtt_ms'] / 2:.1f}"
+                for name, m in self.measurements.items()
+                if m[-1]["label"] == label
+            )
+        )
+
+    def offsets(self) -> Dict[str, List[Dict]]:
+        """Measurements by member name and by public address (driver host names)"""
+        offsets = dict(self.measurements)
+        for node in self.nodes:
+            if node.vm.name in self.measurements:
+                offsets[str(node.vm.network.get_public_iface())] = self.measurements[
+                    node.vm.name
+                ]
+        return offsets
+
+    def max_error_ms(self) -> float:
+        """Worst clock error of any member: offset plus its uncertainty, or drift"""
+        errors = [0.0]
+        for measurements in self.measurements.values():
+            offsets = [m["offset_ms"] for m in measurements]
+            errors += [abs(m["offset_ms"]) + m["rtt_ms"] / 2 for m in measurements]
+            errors.append(max(offsets) - min(offsets))
+        return max(errors)
+
+    def save(self, artifact_dir: str, sampling_interval: float) -> bool:
+        """Save clock.yaml
+
+        Returns:
+            bool: clock error is above the sampling interval (seconds)
+        """
+        exceeded = self.max_error_ms() > sampling_interval * 1000
+        if exceeded:
+            self.logger.warning(
+                f"Clock error of {self.max_error_ms():.1f} ms is above the sampling"
+                f" interval {sampling_interval} sec, see {CLOCK_FILE}"
+            )
+        save_dict_as_yaml(
+            os.path.join(artifact_dir, CLOCK_FILE),
+            {
+                "reference": "xbench host",
+                "sampling_interval": sampling_interval,
+                "max_error_ms": round(self.max_error_ms(), RESULT_PRECISION),
+                "exceeds_sampling_interval": exceeded,
+                "members": {
+                    name: {
+                        "measurements": measurements,
+                        "drift_ms": round(
+                            measurements[-1]["offset_ms"]
+                            - measurements[0]["offset_ms"],
+                            RESULT_PRECISION,
+                        ),
+                    }
+                    for name, measurements in self.measurements.items()
+                },
+            },
+        )
+        return exceeded
+
+    def correct_timeseries(self, artifact_dir: str):
+        """Driver time series files moved to the xbench clock in place"""
+        offsets = self.offsets()
+        if not offsets:
+            return
+        for file_name in sorted(
+            fnmatch.filter(os.listdir(artifact_dir), TIMESERIES_PATTERN)
+        ):
+            path = os.path.join(artifact_dir, file_name)
+            df = pd.read_csv(path)
+            if "driver" in df.columns and ORIGINAL_TIME not in df.columns:
+                correct_times(df, offsets, "driver").to_csv(path, index=False)
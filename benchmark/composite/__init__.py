@@ -0,0 +1 @@
+from .composite_runner import CompositeRunner
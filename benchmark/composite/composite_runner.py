@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Run several workloads at the same time on different driver groups.
+
+Every member of a composite workload is a regular workload (benchmark + workload from
+workload.yaml) with its own runner, driver group(s) and artifact sub directory. Members
+start together behind a barrier and run concurrently. With baseline: True every member
+runs alone first, so the interference report can compare throughput and latency of the
+same steps with and without the other members. Only steps that ran while all other
+members were in a step too (windows of {workload}_steps.csv) are marked as overlapping.
+"""
+
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from benchmark.abstract_benchmark import AbstractBenchmarkRunner
+from benchmark.exceptions import BenchmarkException
+from benchmark.scalability import LATENCY_COLUMNS, save_print_scalability
+from common import get_class_from_klass, save_dict_as_yaml
+from common.common import mkdir
+from compute import Cluster, MultiNode, Node
+from lib import XbenchConfig, XbenchConfigException
+from lib.yaml_config import YamlConfigException
+
+DEFAULT_BARRIER_TIMEOUT = 600  # seconds to wait for all members to be ready
+DEFAULT_MIN_OVERLAP_PCT = 90  # share of a step all other members must run a step too
+BASELINE_DIR = "baseline"
+COMPOSITE_FILE = "composite.yaml"
+INTERFERENCE_FILE = "interference.csv"
+RESULT_PRECISION = 2
+INTERFERENCE_FIELDS = [
+    "member",
+    "concurrency",
+    "baseline_throughput",
+    "throughput",
+    "throughput_change_pct",
+    "latency_metric",
+    "baseline_latency",
+    "latency",
+    "latency_change_pct",
+    "overlap_pct",
+    "overlapping",
+]
+# Composite keys which are not passed to members
+COMPOSITE_KEYS = ["klass", "members", "baseline", "barrier_timeout", "min_overlap_pct"]
+
+
+def load_workload_conf(benchmark_name: str, workload_name: str) -> Dict:
+    """Workload config with benchmark defaults, the same way WorkloadRunning loads it"""
+    try:
+        workload_yaml = XbenchConfig().load_yaml("workload.yaml")
+        workload_yaml.defaults = workload_yaml.get_key(
+            root=benchmark_name, leaf="defaults"
+        )
+        workload_yaml.yaml_config_dict = workload_yaml.get_key(
+            root=benchmark_name, leaf="workloads", use_defaults=True
+        )
+        return workload_yaml.get_key(root=workload_name, use_defaults=True)
+    except (XbenchConfigException, YamlConfigException) as e:
+        raise BenchmarkException(
+            f"Unable to load workload {benchmark_name}.{workload_name}: {e}"
+        )
+
+
+def group_nodes(nodes: List[Node], groups: List[str]) -> List[Node]:
+    """Drivers of the named topology groups (driver1 -> driver1_0, driver1_1, ...)"""
+    return [n for n in nodes if Cluster.group_name(n.vm.name) in groups]
+
+
+def merge_windows(windows: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Sorted, non overlapping union of (start, end) windows"""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def intersect_windows(
+    a: List[Tuple[float, float]], b: List[Tuple[float, float]]
+) -> List[Tuple[float, float]]:
+    """Parts of merged windows `a` that are covered by merged windows `b`"""
+    return [
+        (max(a_start, b_start), min(a_end, b_end))
+        for a_start, a_end in a
+        for b_start, b_end in b
+        if max(a_start, b_start) < min(a_end, b_end)
+    ]
+
+
+def step_windows(steps: pd.DataFrame) -> List[Tuple[float, float]]:
+    steps = steps.dropna(subset=["start", "end"])
+    return merge_windows(list(zip(steps["start"], steps["end"])))
+
+
+def step_overlap(steps: pd.DataFrame, others: List[pd.DataFrame]) -> pd.DataFrame:
+    """Share of the steps of every concurrency during which all others ran a step
+
+    Args:
+        steps (pd.DataFrame): steps file of the member
+        others (List[pd.DataFrame]): steps files of the other members
+
+    Returns:
+        pd.DataFrame: concurrency, overlap_pct
+    """
+    other_windows = [step_windows(df) for df in others]
+    rows = []
+    for step in steps.dropna(subset=["start", "end"]).itertuples(index=False):
+        covered = [(step.start, step.end)]
+        for windows in other_windows:
+            covered = intersect_windows(covered, windows)
+        rows.append(
+            {
+                "concurrency": step.concurrency,
+                "seconds": step.end - step.start,
+                "overlap": sum(end - start for start, end in covered),
+            }
+        )
+    if not rows:
+        return pd.DataFrame(columns=["concurrency", "overlap_pct"])
+    df = pd.DataFrame(rows).groupby("concurrency", as_index=False).sum()
+    df["overlap_pct"] = 100 * df["overlap"] / df["seconds"].where(lambda x: x > 0)
+    return df[["concurrency", "overlap_pct"]]
+
+
+def interference(
+    member: str,
+    baseline: pd.DataFrame,
+    concurrent: pd.DataFrame,
+    overlap: Optional[pd.DataFrame] = None,
+    min_overlap_pct: float = DEFAULT_MIN_OVERLAP_PCT,
+):
+    """Compare summaries of the member running alone and together with others
+
+    Steps that did not overlap with all other members (by min_overlap_pct of their
+    time, see step_overlap) are not interference and have overlapping False
+
+    Returns:
+        pd.DataFrame: rows in INTERFERENCE_FIELDS order, one per common concurrency
+    """
+    latency = next(
+        (c for c in LATENCY_COLUMNS if c in baseline and c in concurrent), None
+    )
+    columns = ["concurrency", "throughput"] + ([latency] if latency else [])
+    df = pd.merge(
+        baseline[columns],
+        concurrent[columns],
+        on="concurrency",
+        suffixes=("_baseline", ""),
+    )
+    report = pd.DataFrame(
+        {
+            "member": member,
+            "concurrency": df["concurrency"],
+            "baseline_throughput": df["throughput_baseline"],
+            "throughput": df["throughput"],
+            "latency_metric": latency,
+            "baseline_latency": df[f"{latency}_baseline"] if latency else float("nan"),
+            "latency": df[latency] if latency else float("nan"),
+        }
+    )
+    report["throughput_change_pct"] = 100 * (
+        report["throughput"] / report["baseline_throughput"] - 1
+    )
+    report["latency_change_pct"] = 100 * (
+        report["latency"] / report["baseline_latency"] - 1
+    )
+    if overlap is None:
+        overlap = pd.DataFrame(columns=["concurrency", "overlap_pct"])
+    report = pd.merge(report, overlap, on="concurrency", how="left")
+    report["overlapping"] = report["overlap_pct"] >= min_overlap_pct
+    return report[INTERFERENCE_FIELDS].round(RESULT_PRECISION)
+
+
+class CompositeMember:
+    """One workload of the composite"""
+
+    def __init__(self, name: str, conf: Dict, nodes: List[Node], params: Dict):
+        """
+        Args:
+            name (str): member name
+            conf (Dict): member definition: benchmark, workload, drivers and params
+            nodes (List[Node]): all drivers
+            params (Dict): composite params (bt, backend, ...)
+        """
+        self.name = name
+        self.benchmark_name = conf.get("benchmark")
+        self.workload_name = conf.get("workload")
+        groups = conf.get("drivers")
+        groups = [groups] if isinstance(groups, str) else groups or []
+        self.nodes = group_nodes(nodes, groups)
+        if not self.nodes:
+            raise BenchmarkException(
+                f"Composite member {name} has no drivers in groups {groups}"
+            )
+        self.workload_conf = load_workload_conf(
+            self.benchmark_name, self.workload_name
+        ) | conf.get("params", {})
+        self.params = params
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+
+    def runner(self, artifact_dir: str, **kwargs) -> AbstractBenchmarkRunner:
+        mkdir(artifact_dir)
+        save_dict_as_yaml(
+            os.path.join(artifact_dir, "workload.yaml"), self.workload_conf
+        )
+        klass = get_class_from_klass(self.workload_conf.get("klass"))
+        return klass(
+            self.nodes,
+            **self.workload_conf
+            | self.params
+            | {"artifact_dir": artifact_dir, "workload_name": self.workload_name}
+            | kwargs,
+        )
+
+    def summary(self, artifact_dir: str) -> Optional[pd.DataFrame]:
+        file_name = os.path.join(artifact_dir, f"{self.workload_name}_summary.csv")
+        if not os.path.exists(file_name):
+            return None
+        return pd.read_csv(file_name)
+
+    def steps(self, artifact_dir: str) -> pd.DataFrame:
+        file_name = os.path.join(artifact_dir, f"{self.workload_name}_steps.csv")
+        if not os.path.exists(file_name):
+            return pd.DataFrame(columns=["repeat", "concurrency", "start", "end"])
+        return pd.read_csv(file_name)
+
+
+class CompositeRunner(MultiNode, AbstractBenchmarkRunner):
+    """Run composite workload members concurrently on their driver groups"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        """
+        Args:
+            nodes (List[Node]): all drivers
+            kwargs: bt + composite workload conf. Check WorkloadRunning run method
+        """
+        MultiNode.__init__(self, nodes)
+        self.logger = logging.getLogger(__name__)
+        self.kwargs = kwargs
+        self.artifact_dir = kwargs.get("artifact_dir")
+        self.workload_name = kwargs.get("workload_name")
+        self.backend = kwargs.get("backend")
+        params = {k: v for k, v in kwargs.items() if k not in COMPOSITE_KEYS}
+        self.members = [
+            CompositeMember(name, conf, nodes, params)
+            for name, conf in (kwargs.get("members") or {}).items()
+        ]
+        if not self.members:
+            raise BenchmarkException(f"Composite {self.workload_name} has no members")
+
+    def member_dir(self, member: CompositeMember, baseline: bool = False) -> str:
+        if baseline:
+            return os.path.join(self.artifact_dir, BASELINE_DIR, member.name)
+        return os.path.join(self.artifact_dir, member.name)
+
+    def prepare(self):
+        """Prepare members one by one, every member has its own schema"""
+        for member in self.members:
+            self.logger.info(f"Preparing {member.name}")
+            runner = member.runner(self.member_dir(member))
+            runner.prepare()
+            runner.data_check()
+
+    def data_check(self):
+        for member in self.members:
+            member.runner(self.member_dir(member)).data_check()
+
+    def setup(self):
+        for member in self.members:
+            member.runner(self.member_dir(member)).setup()
+
+    def cleanup(self):
+        for member in self.members:
+            member.runner(self.member_dir(member)).cleanup()
+
+    def get_scale_string(self):
+        return "_".join(
+            str(member.runner(self.member_dir(member)).get_scale_string())
+            for member in self.members
+        )
+
+    def run(self):
+        if self.kwargs.get("baseline"):
+            for member in self.members:
+                self.logger.info(f"Running baseline of {member.name} alone")
+                member.runner(self.member_dir(member, baseline=True)).run()
+        if self.kwargs.get("pre_workload_run"):
+            # Members don't call it themselves, it could disturb other members
+            self.backend.pre_workload_run()
+        self.run_concurrently()
+        self.save_composite()
+        for member in self.members:
+            save_print_scalability(self.member_dir(member))
+        if self.kwargs.get("baseline"):
+            self.save_print_interference()
+
+    def run_concurrently(self):
+        """Start all members behind one barrier and wait until all of them finish"""
+        barrier = threading.Barrier(len(self.members))
+        timeout = self.kwargs.get("barrier_timeout", DEFAULT_BARRIER_TIMEOUT)
+        # Runners are created before the barrier, so setup time doesn't skew the start
+        runners = [
+            member.runner(
+                self.member_dir(member), pre_workload_run=False, pre_thread_run=False
+            )
+            for member in self.members
+        ]
+
+        def run_member(member: CompositeMember, runner: AbstractBenchmarkRunner):
+            barrier.wait(timeout)
+            member.start = time.time()
+            self.logger.info(f"{member.name} started on {len(member.nodes)} driver(s)")
+            try:
+                runner.run()
+            finally:
+                member.end = time.time()
+                self.logger.info(f"{member.name} finished")
+
+        failed = []
+        with concurrent.futures.ThreadPoolExecutor(len(self.members)) as executor:
+            futures = {
+                executor.submit(run_member, member, runner): member
+                for member, runner in zip(self.members, runners)
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except (BenchmarkException, threading.BrokenBarrierError) as e:
+                    self.logger.error(f"{futures[future].name} failed with: {e}")
+                    failed.append(futures[future].name)
+        if failed:
+            raise BenchmarkException(f"Composite members failed: {failed}")
+
+    def save_composite(self):
+        """Save member definitions and run windows"""
+        starts = [m.start for m in self.members if m.start]
+        ends = [m.end for m in self.members if m.end]
+        overlap = (
+            max(0.0, min(ends) - max(starts))
+            if len(starts) == len(ends) == len(self.members)
+            else 0.0
+        )
+        composite = {
+            "members": {
+                m.name: {
+                    "benchmark": m.benchmark_name,
+                    "workload": m.workload_name,
+                    "drivers": [n.vm.name for n in m.nodes],
+                    "start": m.start,
+                    "end": m.end,
+                }
+                for m in self.members
+            },
+            "overlap_seconds": round(overlap, RESULT_PRECISION),
+        }
+        save_dict_as_yaml(os.path.join(self.artifact_dir, COMPOSITE_FILE), composite)
+        self.logger.info(f"All members ran together for {overlap:.0f} sec")
+
+    def save_print_interference(self) -> pd.DataFrame:
+        """Throughput and latency change of every member caused by the others"""
+        min_overlap_pct = self.kwargs.get("min_overlap_pct", DEFAULT_MIN_OVERLAP_PCT)
+        steps = {m.name: m.steps(self.member_dir(m)) for m in self.members}
+        reports = []
+        for member in self.members:
+            baseline = member.summary(self.member_dir(member, baseline=True))
+            concurrent_summary = member.summary(self.member_dir(member))
+            if baseline is None or concurrent_summary is None:
+                self.logger.warning(f"No summary to compare for {member.name}")
+                continue
+            overlap = step_overlap(
+                steps[member.name],
+                [df for name, df in steps.items() if name != member.name],
+            )
+            reports.append(
+                interference(
+                    member.name,
+                    baseline,
+                    concurrent_summary,
+                    overlap,
+                    min_overlap_pct,
+                )
+            )
+        if not reports:
+            return pd.DataFrame(columns=INTERFERENCE_FIELDS)
+        df = pd.concat(reports)
+        if not df["overlapping"].all():
+            self.logger.warning(
+                f"Steps that ran less than {min_overlap_pct}% of their time together"
+                f" with all other members are not interference:\n"
+                f"{df[~df['overlapping']][['member', 'concurrency', 'overlap_pct']].to_string(index=False)}"
+            )
+        self.logger.info(
+            f"======= Interference ==========\n{df.to_string(index=False)}"
+        )
+        file_name = os.path.join(self.artifact_dir, INTERFERENCE_FILE)
+        df.to_csv(file_name, index=False)
+        self.logger.info(f"Interference report saved as {file_name}")
+        return df
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Database side statistics during every step, without Prometheus.
+
+One connection per backend host samples the server counters every db_stats_interval
+seconds from a side thread:
+
+- MariaDB/MySQL: SHOW GLOBAL STATUS (QPS, commits, InnoDB buffer pool hit ratio, redo
+  written, pages flushed, checkpoint age)
+- PostgreSQL: pg_stat_database, pg_stat_bgwriter (checkpoints) and pg_stat_activity
+- Xpand: system.global_stats and system.proc_cpu, cluster wide from the first node
+
+Counters are turned into per second rates, counter resets are handled. Samples go to
+{workload}_dbstats_samples.csv, step averages per host to {workload}_dbstats.csv.
+
+DbSamplerMonitor (host resolution, one sampler per host, side thread) is shared with
+WaitMonitor, QpcMonitor uses the same hosts and connection settings.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List
+
+import pandas as pd
+
+from compute import Node
+from compute.backend_dialect import BackendDialect
+from compute.backend_product import BackendProduct
+from lib.db_stats import DbStats, MysqlStats, PgStats, XpandStats
+from lib.mysql_client import MySqlClientException
+from lib.pgsql_client import PgSqlClientException
+
+from .exceptions import BenchmarkException
+from .step_monitor import Step, StepMonitor
+
+DEFAULT_SAMPLE_INTERVAL = 5  # seconds
+RESULT_PRECISION = 2
+STEP_FIELDS = ["repeat", "concurrency", "rate", "host"]
+SAMPLER_EXCEPTIONS = (MySqlClientException, PgSqlClientException)
+
+
+def stats_klass(dialect: str, product: str):
+    if product == BackendProduct.xpand:
+        return XpandStats
+    if dialect == BackendDialect.pgsql:
+        return PgStats
+    return MysqlStats
+
+
+def node_hosts(backend) -> List[str]:
+    """Client addresses of all backend nodes"""
+    nodes = getattr(backend, "nodes", None) or [getattr(backend, "node", None)]
+    return [
+        n.vm.network.get_client_iface()
+        for n in nodes
+        if n is not None and n.vm.network.get_client_iface()
+    ]
+
+
+def backend_hosts(backend, product: str) -> List[str]:
+    """Client addresses of backend nodes, Xpand statistics are cluster wide"""
+    hosts = node_hosts(backend)
+    return hosts[:1] if product == BackendProduct.xpand else hosts
+
+
+def monitored_hosts(kwargs: Dict, all_nodes: bool = False) -> List[str]:
+    """db_stats_hosts, backend nodes or the bt host(s)
+
+    Args:
+        all_nodes (bool): every Xpand node, not only the first one (cluster wide)
+    """
+    backend, product = kwargs.get("backend"), str(kwargs.get("product"))
+    hosts = kwargs.get("db_stats_hosts") or (
+        node_hosts(backend) if all_nodes else backend_hosts(backend, product)
+    )
+    if not hosts:
+        hosts = kwargs.get("host", "").split(",")
+        hosts = hosts if all_nodes else hosts[:1]
+    return hosts
+
+
+def connection_kwargs(kwargs: Dict) -> Dict:
+    """Connection settings of database samplers"""
+    return {
+        "port": kwargs.get("db_stats_port", kwargs.get("port")),
+        "user": kwargs.get("user"),
+        "password": kwargs.get("password"),
+        "database": kwargs.get("database"),
+        "connect_timeout": kwargs.get("connect_timeout", 5),
+    }
+
+
+def dbstats_summary(samples: pd.DataFrame) -> pd.DataFrame:
+    """Average of every metric per step and host"""
+    metrics = [c for c in samples.columns if c not in STEP_FIELDS + ["time"]]
+    groups = samples.groupby(STEP_FIELDS, sort=False)
+    df = groups[metrics].mean()
+    df.insert(0, "samples", groups.size())
+    df = df.reset_index().round(RESULT_PRECISION)
+    return df
+
+
+class DbSamplerMonitor(StepMonitor):
+    """Samplers of every backend host, sample() runs every interval in a side thread
+
+    Subclasses implement sampler_klass() and sample(), and call start_sampling() and
+    stop_sampling() from start() and stop()
+    """
+
+    thread_name = "dbsampler"
+
+    def __init__(self, nodes: List[Node], sample_interval: float, **kwargs):
+        StepMonitor.__init__(self, nodes, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.artifact_dir = kwargs.get("artifact_dir")
+        self.workload_name = kwargs.get("workload_name")
+        self.interval = sample_interval
+        klass = self.sampler_klass(
+            str(kwargs.get("dialect")), str(kwargs.get("product"))
+        )
+        self.samplers = []
+        for host in monitored_hosts(kwargs):
+            try:
+                self.samplers.append(
+                    klass(host, host=host, **connection_kwargs(kwargs))
+                )
+            except SAMPLER_EXCEPTIONS as e:
+                raise BenchmarkException(f"Unable to connect to {host}: {e}")
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def sampler_klass(dialect: str, product: str):
+        raise NotImplementedError
+
+    def sample(self, step: Step):
+        raise NotImplementedError
+
+    def _run(self, step: Step):
+        while not self.stopped.wait(self.interval):
+            self.sample(step)
+
+    def start_sampling(self, step: Step):
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self._run, args=(step,), name=self.thread_name, daemon=True
+        )
+        self.thread.start()
+
+    def stop_sampling(self) -> bool:
+        """Stop the side thread
+
+        Returns:
+            bool: sampling was running
+        """
+        if self.thread is None:
+            return False
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        return True
+
+
+class DbStatsMonitor(DbSamplerMonitor):
+    """Sample database statistics of every backend host during each step"""
+
+    thread_name = "dbstats"
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        DbSamplerMonitor.__init__(
+            self,
+            nodes,
+            kwargs.get("db_stats_interval", DEFAULT_SAMPLE_INTERVAL),
+            **kwargs,
+        )
+        self.samplers: List[DbStats]
+        self.samples: List[dict] = []
+
+    @staticmethod
+    def sampler_klass(dialect: str, product: str):
+        return stats_klass(dialect, product)
+
+    def sample(self, step: Step):
+        for sampler in self.samplers:
+            try:
+                metrics = sampler.sample()
+            except SAMPLER_EXCEPTIONS as e:
+                self.logger.warning(f"Unable to sample {sampler.name}: {e}")
+                continue
+            if metrics:
+                self.samples.append(
+                    {
+                        "repeat": step.repeat,
+                        "concurrency": step.concurrency,
+                        "rate": step.rate,
+                        "host": sampler.name,
+                    }
+                    | metrics
+                )
+
+    def start(self, step: Step):
+        self.samples = []
+        # Counters of the first sample would span the pause between steps
+        for sampler in self.samplers:
+            try:
+                sampler.previous = None
+                sampler.sample()
+            except SAMPLER_EXCEPTIONS as e:
+                raise BenchmarkException(f"Unable to sample {sampler.name}: {e}")
+        self.start_sampling(step)
+
+    def stop(self, step: Step):
+        if not self.stop_sampling():
+            return
+        self.sample(step)
+        if not self.samples:
+            self.logger.warning("No database statistics in the step")
+            return
+        samples = pd.DataFrame(self.samples)
+        df = dbstats_summary(samples)
+        self.logger.info(
+            f"======= Database stats ==========\n{df.to_string(index=False)}"
+        )
+        if self.artifact_dir:
+            for data, suffix in ((samples, "dbstats_samples"), (df, "dbstats")):
+                file_name = os.path.join(
+                    self.artifact_dir, f"{self.workload_name}_{suffix}.csv"
+                )
+                data.round(RESULT_PRECISION).to_csv(
+                    file_name,
+                    mode="a",
+                    header=not os.path.exists(file_name),
+                    index=False,
+                )
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Driver saturation detection and capacity based load distribution."""
+
+import logging
+import math
+import os
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from compute import MultiNode, Node, PsshClient, PsshClientException
+from compute.exceptions import MultiNodeException
+
+from .exceptions import BenchmarkException
+from .step_monitor import Step, StepMonitor
+
+RESULT_PRECISION = 2
+SAMPLER_FILE = "/tmp/xbench_driver_sampler.sh"
+# Bracket keeps pkill -f from matching the remote shell running it
+SAMPLER_PATTERN = "/tmp/[x]bench_driver_sampler.sh"
+SAMPLER_OUTPUT = "/tmp/xbench_driver_sampler.out"
+# Prints: epoch procs_running rx_bytes tx_bytes <cpu line from /proc/stat>
+SAMPLER_SCRIPT = """#!/bin/bash
+echo "NPROC $(nproc)"
+while true; do
+  running=$(awk '/^procs_running/ {print $2}' /proc/stat)
+  net=$(awk -F'[: ]+' 'NR>2 && $2 != "lo" {rx+=$3; tx+=$11} END {print rx+0, tx+0}' /proc/net/dev)
+  cpu=$(head -1 /proc/stat | awk '{$1=""; print}')
+  echo "$(date +%s.%N) $running $net $cpu"
+  sleep 1
+done
+"""
+DRIVER_RESULT_FIELDS = [
+    "repeat",
+    "concurrency",
+    "rate",
+    "driver",
+    "cpu_avg_pct",
+    "cpu_max_pct",
+    "run_queue_per_core_avg",
+    "run_queue_per_core_max",
+    "net_rx_mbps",
+    "net_tx_mbps",
+    "samples",
+]
+DEFAULT_CPU_THRESHOLD = 85  # %
+DEFAULT_RUN_QUEUE_THRESHOLD = 2.0  # runnable processes per core
+DEFAULT_THREADS_PER_CORE = 64  # used by auto drivers advisory only
+
+
+def distribute(total: int, weights: List[float]) -> List[int]:
+    """Split total between drivers in proportion to weights (largest remainder)
+
+    Args:
+        total (int): total number of threads, terminals or rate
+        weights (List[float]): capacity of every driver
+
+    Returns:
+        List[int]: share of every driver, sum is equal to total
+    """
+    if not weights:
+        return []
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        weights = [1] * len(weights)
+        weight_sum = len(weights)
+    quotas = [total * w / weight_sum for w in weights]
+    shares = [int(q) for q in quotas]
+    remainders = sorted(
+        range(len(weights)), key=lambda i: quotas[i] - shares[i], reverse=True
+    )
+    for i in remainders[: total - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+def distribute_step(
+    total: int, rate: int, weights: List[float]
+) -> Tuple[List[int], List[int]]:
+    """Split threads and open-loop rate of a step between drivers
+
+    A driver gets a share of both or of none: a driver with threads and no rate would
+    run unthrottled (or not start at all), so it is left idle instead.
+
+    Args:
+        total (int): total number of threads, terminals or clients
+        rate (int): total target rate, 0 is closed-loop
+        weights (List[float]): capacity of every driver
+
+    Returns:
+        Tuple[List[int], List[int]]: threads and rate of every driver, sums are equal
+            to total and rate
+    """
+    shares = distribute(total, weights)
+    rates = [0] * len(shares)
+    while rate:
+        rates = distribute(rate, [w if s else 0 for w, s in zip(weights, shares)])
+        if all(r or not s for s, r in zip(shares, rates)):
+            break
+        # fewer drivers than needed for the rate, every pass drops at least one
+        shares = distribute(total, [w if r else 0 for w, r in zip(weights, rates)])
+    return shares, rates
+
+
+def driver_capacities(pssh: PsshClient, method: str = "nproc") -> List[float]:
+    """Capacity of every driver in the pssh hostnames order
+
+    Args:
+        pssh (PsshClient): client for all drivers
+        method (str): nproc, memory or equal
+    """
+    if method == "equal":
+        return [1.0] * len(pssh.hostnames)
+    if method == "memory":
+        cmd = "awk '/^MemTotal/ {print $2}' /proc/meminfo"
+    else:
+        cmd = "nproc"
+    try:
+        return [float(o.get("stdout").strip()) for o in pssh.run(cmd, timeout=30)]
+    except (PsshClientException, ValueError) as e:
+        raise BenchmarkException(f"Unable to get drivers capacity: {e}")
+
+
+def drivers_needed(
+    concurrency: int, nproc: int, threads_per_core: int = DEFAULT_THREADS_PER_CORE
+) -> int:
+    """How many drivers with nproc cores are required to run concurrency threads"""
+    return max(1, math.ceil(concurrency / (nproc * threads_per_core)))
+
+
+def parse_sampler_output(output: str) -> Dict:
+    """Aggregate sampler output of one driver
+
+    Returns:
+        Dict: keys are DRIVER_RESULT_FIELDS metrics
+    """
+    nproc = 1
+    samples = []
+    for line in output.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == "NPROC":
+            nproc = max(1, int(parts[1]))
+            continue
+        try:
+            values = [float(p) for p in parts]
+        except ValueError:
+            continue
+        if len(values) < 8:
+            continue
+        ts, running, rx, tx = values[:4]
+        cpu = values[4:]
+        idle = cpu[3] + (cpu[4] if len(cpu) > 4 else 0)  # idle + iowait
+        total = sum(cpu[:8])  # guest time is already in user time
+        samples.append((ts, running, rx, tx, idle, total))
+
+    cpu_pct = []
+    run_queue = []
+    for prev, cur in zip(samples, samples[1:]):
+        total = cur[5] - prev[5]
+        if total > 0:
+            cpu_pct.append(100 * (1 - (cur[4] - prev[4]) / total))
+        # procs_running includes the sampler itself
+        run_queue.append(max(cur[1] - 1, 0) / nproc)
+
+    duration = samples[-1][0] - samples[0][0] if len(samples) > 1 else 0
+    return {
+        "cpu_avg_pct": sum(cpu_pct) / len(cpu_pct) if cpu_pct else 0.0,
+        "cpu_max_pct": max(cpu_pct) if cpu_pct else 0.0,
+        "run_queue_per_core_avg": sum(run_queue) / len(run_queue) if run_queue else 0,
+        "run_queue_per_core_max": max(run_queue) if run_queue else 0.0,
+        "net_rx_mbps": (
+            (samples[-1][2] - samples[0][2]) / duration / 2**20 if duration else 0.0
+        ),
+        "net_tx_mbps": (
+            (samples[-1][3] - samples[0][3]) / duration / 2**20 if duration else 0.0
+        ),
+        "samples": len(samples),
+    }
+
+
+class DriverMonitor(MultiNode, StepMonitor):
+    """Sample CPU, run queue and network on every driver during each step"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        MultiNode.__init__(self, nodes)
+        StepMonitor.__init__(self, nodes, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.artifact_dir = kwargs.get("artifact_dir")
+        self.workload_name = kwargs.get("workload_name")
+        self.cpu_threshold = kwargs.get("driver_cpu_threshold", DEFAULT_CPU_THRESHOLD)
+        self.run_queue_threshold = kwargs.get(
+            "driver_run_queue_threshold", DEFAULT_RUN_QUEUE_THRESHOLD
+        )
+        self.action = kwargs.get("driver_saturation_action", "warn")  # warn|fail
+        self.sampler_installed = False
+
+    def install_sampler(self):
+        local_file = f"/tmp/xbench_driver_sampler_{os.getpid()}.sh"
+        with open(local_file, "w") as f:
+            f.write(SAMPLER_SCRIPT)
+        self.scp_to_all_nodes(local_file, SAMPLER_FILE)
+        self.sampler_installed = True
+
+    def start(self, step: Step):
+        try:
+            if not self.sampler_installed:
+                self.install_sampler()
+            cmd = f"""
+            pkill -f '{SAMPLER_PATTERN}' || true
+            setsid nohup bash {SAMPLER_FILE} > {SAMPLER_OUTPUT} 2>&1 < /dev/null &
+            """
+            self.run_on_all_nodes(cmd, sudo=False)
+        except MultiNodeException as e:
+            raise BenchmarkException(e)
+
+    def stop(self, step: Step):
+        cmd = f"""
+        pkill -f '{SAMPLER_PATTERN}' || true
+        cat {SAMPLER_OUTPUT}
+        """
+        try:
+            outputs = self.run_on_all_nodes(cmd, sudo=False)
+        except MultiNodeException as e:
+            raise BenchmarkException(e)
+
+        rows = []
+        saturated = []
+        for output in outputs:
+            driver = output.get("hostname")
+            metrics = parse_sampler_output(output.get("stdout", ""))
+            rows.append(
+                {"repeat": step.repeat, "concurrency": step.concurrency}
+                | {"rate": step.rate, "driver": driver}
+                | metrics
+            )
+            if (
+                metrics["cpu_avg_pct"] > self.cpu_threshold
+                or metrics["run_queue_per_core_avg"] > self.run_queue_threshold
+            ):
+                saturated.append(
+                    f"{driver} cpu {metrics['cpu_avg_pct']:.1f}% run queue per core"
+                    f" {metrics['run_queue_per_core_avg']:.2f}"
+                )
+
+        df = pd.DataFrame.from_records(rows, columns=DRIVER_RESULT_FIELDS)
+        df = df.round(RESULT_PRECISION)
+        self.logger.info(f"======= Drivers ==========\n{df.to_string(index=False)}")
+        if self.artifact_dir:
+            file_name = os.path.join(
+                self.artifact_dir, f"{self.workload_name}_drivers.csv"
+            )
+            df.to_csv(
+                file_name, mode="a", header=not os.path.exists(file_name), index=False
+            )
+
+        if saturated:
+            msg = (
+                f"Driver(s) saturated, results are not reliable: {', '.join(saturated)}"
+            )
+            if self.action == "fail":
+                raise BenchmarkException(msg)
+            self.logger.warning(msg)
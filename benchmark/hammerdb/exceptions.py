@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+from ..exceptions import BenchmarkException
+
+
+class HammerdbException(BenchmarkException):
+    """HammerDB exceptions"""
+
+
+class HammerdbOutputParseException(HammerdbException):
+    """an Exception during parsing has happened"""
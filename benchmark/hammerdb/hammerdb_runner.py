@@ -1,18 +1,42 @@
+import calendar
+import json
+import logging
 import os
 import re
-import time
 from datetime import datetime
-from glob import glob
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
 
 from benchmark.abstract_benchmark import AbstractBenchmarkRunner
+from benchmark.checkpoint import Checkpoint
+from benchmark.driver_monitor import distribute, driver_capacities
 from benchmark.exceptions import BenchmarkException
-from common.common import get_class_from_klass
-from compute import MultiNode, Node
+from benchmark.histogram import LatencyHistogram
+from benchmark.step_monitor import Step, StepMonitors
+from benchmark.sync_start import parse_window, save_timeseries, synchronized_command
+from benchmark.sysbench.sysbench_runner import RESULT_PRECISION, SYSBENCH_RESULT_FIELDS
+from common import traced_sleep
+from common.common import clean_cmd
+from common.retry_decorator import backoff_with_jitter, retry
+from compute import (
+    MultiNode,
+    Node,
+    NodeException,
+    PsshClientException,
+    SshClientException,
+)
 from lib.file_template import FileTemplate, FileTemplateException
 
+from .exceptions import HammerdbException, HammerdbOutputParseException
+
 DEFAULT_COMMAND_TIMEOUT = 300
 DEFAULT_SLEEP_TIME = 60  # sleep time between threads
+EXTRA_TIMEOUT = 600
+LOAD_SCRIPT = "/tmp/xbench_hammerdb_load.tcl"
+RUN_SCRIPT = "/tmp/xbench_hammerdb_run.tcl"
+ERROR_MARKER = "XBENCH_ERROR"
+NEW_ORDER_PROC = "NEWORD"  # NOPM is new order calls per minute
 
 PRODUCT_PREFIX = {
     "oracle": "ora",
@@ -25,6 +49,145 @@ PRODUCT_PREFIX = {
     "xpand": "maria",
 }
 
+HAMMERDB_RESULT_FIELDS = SYSBENCH_RESULT_FIELDS + ["nopm", "tpm"]
+
+TCOUNT_RE = re.compile(r"^(\d+) \S+ tpm(?: @ (.+))?$")
+TCOUNT_TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
+SUMMARY_RE = re.compile(r"SUMMARY OF \d+ ACTIVE VIRTUAL USERS.*?ELAPSED TIME : (\d+)ms")
+PROC_RE = re.compile(r"^\S+ PROC: (\S+)")
+CALLS_RE = re.compile(
+    r"^CALLS: (\d+)\s+MIN: ([\d.]+)ms\s+AVG: ([\d.]+)ms\s+MAX: ([\d.]+)ms"
+    r"\s+TOTAL: ([\d.]+)ms"
+)
+PERCENTILES_RE = re.compile(r"^P99: ([\d.]+)ms\s+P95: ([\d.]+)ms\s+P50: ([\d.]+)ms")
+TEST_RESULT_RE = re.compile(r"TEST RESULT : System achieved (\d+) NOPM from (\d+)")
+# Share of calls between min-P50, P50-P95, P95-P99 and P99-max
+PROFILE_SEGMENTS = [50, 45, 4, 1]
+PROFILE_POINTS = 8  # points per segment
+
+
+def parse_tcount(lines: Iterable[str]) -> List[Tuple[Optional[float], int]]:
+    """Parse hdbtcount.log line by line
+
+    Lines look like "12345 MariaDB tpm @ Fri Jan 05 09:15:11 UTC 2024". Timestamps are
+    UTC/GMT or local time of the xbench host.
+
+    Returns:
+        List[Tuple[Optional[float], int]]: epoch (None without timestamps), tpm
+    """
+    samples = []
+    for line in lines:
+        m = TCOUNT_RE.match(line.strip())
+        if not m:
+            continue
+        ts = None
+        if m.group(2):
+            parts = m.group(2).split()
+            zone = parts.pop(4) if len(parts) == 6 else "UTC"
+            try:
+                dt = datetime.strptime(" ".join(parts), TCOUNT_TIME_FORMAT)
+            except ValueError:
+                dt = None
+            if dt:
+                ts = (
+                    float(calendar.timegm(dt.timetuple()))
+                    if zone in ("UTC", "GMT")
+                    else dt.timestamp()
+                )
+        samples.append((ts, int(m.group(1))))
+    return samples
+
+
+def profile_histogram(
+    calls: int,
+    min_ms: float,
+    total_ms: float,
+    max_ms: float,
+    p50: float,
+    p95: float,
+    p99: float,
+) -> LatencyHistogram:
+    """Mergeable histogram from xtprofile percentiles
+
+    xtprofile reports percentiles only, so calls are spread over the ranges between
+    them. Merged percentiles are exact at P50/P95/P99 of every procedure, the mean is
+    exact.
+    """
+    histogram = LatencyHistogram()
+    bounds = [min_ms, p50, p95, p99, max_ms]
+    for i, segment_calls in enumerate(distribute(calls, PROFILE_SEGMENTS)):
+        low, high = bounds[i], max(bounds[i], bounds[i + 1])
+        for j, count in enumerate(distribute(segment_calls, [1] * PROFILE_POINTS)):
+            if count:
+                histogram.record(low + (high - low) * (j + 1) / PROFILE_POINTS, count)
+    histogram.sum = total_ms
+    histogram.min = min_ms
+    return histogram
+
+
+def parse_xtprofile(lines: Iterable[str]) -> Tuple[float, Dict[str, LatencyHistogram]]:
+    """Parse SUMMARY section of hdbxtprofile.log line by line
+
+    Returns:
+        Tuple[float, Dict[str, LatencyHistogram]]: median elapsed time (sec) and
+            histogram per stored procedure
+    """
+    elapsed = 0.0
+    histograms: Dict[str, LatencyHistogram] = {}
+    summary = False
+    proc = None
+    calls: tuple = ()
+    for line in lines:
+        line = line.strip()
+        if not summary:
+            m = SUMMARY_RE.search(line)
+            if m:
+                summary = True
+                elapsed = int(m.group(1)) / 1000
+            continue
+        m = PROC_RE.match(line)
+        if m:
+            proc, calls = m.group(1), ()
+            continue
+        m = CALLS_RE.match(line)
+        if m and proc:
+            calls = (int(m.group(1)), *map(float, m.group(2, 3, 4, 5)))
+            continue
+        m = PERCENTILES_RE.match(line)
+        if m and proc and calls:
+            n, min_ms, _, max_ms, total_ms = calls
+            p99, p95, p50 = map(float, m.groups())
+            histograms[proc] = profile_histogram(
+                n, min_ms, total_ms, max_ms, p50, p95, p99
+            )
+            proc = None
+    return elapsed, histograms
+
+
+def warehouse_ranges(warehouses: int, host_vus: List[int]) -> List[Tuple[int, int]]:
+    """Split warehouses between drivers in proportion to their virtual users
+
+    Every driver with virtual users gets at least one home warehouse
+
+    Returns:
+        List[Tuple[int, int]]: first and last home warehouse of every driver, (0, 0)
+            for drivers without virtual users
+    """
+    drivers = sum(1 for v in host_vus if v > 0)
+    if warehouses < drivers:
+        raise HammerdbException(
+            f"{warehouses} warehouses can't be split between {drivers} drivers"
+        )
+    ranges = []
+    first = 1
+    for v, extra in zip(host_vus, distribute(warehouses - drivers, host_vus)):
+        if v == 0:
+            ranges.append((0, 0))
+            continue
+        ranges.append((first, first + extra))
+        first += extra + 1
+    return ranges
+
 
 class HammerdbRunner(MultiNode, AbstractBenchmarkRunner):
     """Run HammerDB on driver(s)"""
@@ -38,7 +201,7 @@ class HammerdbRunner(MultiNode, AbstractBenchmarkRunner):
         """
 
         MultiNode.__init__(self, nodes)
-
+        self.logger = logging.getLogger(__name__)
         self.kwargs = kwargs
         self.artifact_dir = kwargs.get(
             "artifact_dir", None
@@ -56,79 +219,71 @@ class HammerdbRunner(MultiNode, AbstractBenchmarkRunner):
         self.time_m = int(self.kwargs.get("time") / 60)
         self.time_m = 1 if self.time_m < 1 else self.time_m
         self.totaltime = 60 * (self.warmup_m + self.time_m)
+        self.timeseries_rows: List[tuple] = []
+        self.driver_weights: List[float] = [1.0] * len(nodes)
+        self.step_monitors = StepMonitors(nodes, **kwargs)
+        self.checkpoint = Checkpoint(
+            self.artifact_dir, self.workload_name, kwargs.get("resume", False)
+        )
+
+    def get_script(self, virtusers: int, n: int = 0, **kwargs) -> str:
+        """Render tcl script for driver n
 
-    def get_script(self, virtusers) -> str:
+        Args:
+            virtusers (int): virtual users on this driver
+            n (int): driver number. Drivers connect to hosts round robin
+            kwargs: extra template variables
+        """
         try:
-            ft = FileTemplate(filename=f"hammerdb.tcl")
-            hosts = (",").join([host for host in self.kwargs.get("host").split(",")])
-            prefix = PRODUCT_PREFIX[self.product]
+            ft = FileTemplate(filename="hammerdb.tcl")
+            hosts = self.kwargs.get("host").split(",")
             render = ft.render(
                 **self.kwargs
                 | {
-                    "hosts": hosts,
+                    "host": hosts[n % len(hosts)],
                     "password": self.kwargs.get("password"),
-                    "prefix": prefix,
+                    "prefix": PRODUCT_PREFIX[self.product],
                     "virtusers": virtusers,
                     "phase": self.phase,
                     "warmup_m": self.warmup_m,
                     "time_m": self.time_m,
                     "totaltime": self.totaltime,
                 }
+                | kwargs
             )
         except FileTemplateException as e:
-            raise BenchmarkException(e)
+            raise HammerdbException(e)
 
         return render
 
-    def parse_timeprofile(self, log_file):
-        throughput, avg_lat, p95_lat = 0, 0, 0
-        calls, total, p95 = {}, {}, {}
-        with open(log_file, "r") as lines:
-            summary = False
-            proc = ""
-            for line in lines:
-                if re.search("SUMMARY", line):
-                    summary = True
-                elif summary:
-                    m = re.match("\S+ PROC: (?P<proc>\S+)", line)
-                    if m:
-                        proc = m.groupdict()["proc"]
-                        #print(proc)
-                    m = re.match(
-                        "CALLS: (?P<calls>\d+)\s*MIN: (?P<min>\d+[\.\d]*)ms\s*AVG:"
-                        " (?P<avg>\d+[\.\d]*)ms\s*MAX: (?P<max>\d+[\.\d]*)ms\s*TOTAL:"
-                        " (?P<total>\d+[\.\d]*)ms",
-                        line,
-                    )
-                    if m:
-                        calls[proc] = int(m.groupdict()["calls"])
-                        total[proc] = float(m.groupdict()["total"])
-                    m = re.match(
-                        "P99: (?P<p99>\d+[\.\d]*)ms\s*P95: (?P<p95>\d+[\.\d]*)ms\s*P50:"
-                        " (?P<p50>\d+[\.\d]*)ms\s*SD: (?P<sd>\d+[\.\d]*)\s*RATIO:"
-                        " (?P<ratio>\d+[\.\d]*)",
-                        line,
-                    )
-                    if m:
-                        p95[proc] = calls[proc] * float(m.groupdict()["p95"])
-        throughput = sum(calls[p] for p in calls) / self.totaltime
-        avg_lat = sum(total[p] for p in total) / sum(calls[p] for p in calls)
-        p95_lat = sum(p95[p] for p in p95) / sum(calls[p] for p in calls)
-        print(f"throughput: {throughput}, avg lat: {avg_lat}, p95 lat: {p95_lat}")
-        return throughput, avg_lat, p95_lat
+    def upload_script(self, node: Node, script: str, remote_file: str):
+        """Save script to the artifact directory and copy it to the driver"""
+        local_file = os.path.join(
+            self.artifact_dir, f"{node.vm.name}_{os.path.basename(remote_file)}"
+        )
+        with open(local_file, "w") as f:
+            f.write(script)
+        try:
+            node.scp_file(local_file, remote_file)
+        except SshClientException as e:
+            raise HammerdbException(e)
 
     def prepare(self):
         self.phase = "load"
         warehouses = self.kwargs.get("warehouses")
         num_vu_load = self.kwargs.get("num_vu_load")
-        self.logger.info(f"Loading {warehouses} warehouses with {num_vu_load} virtual users")
-        load_script = self.get_script(0)
+        self.logger.info(
+            f"Loading {warehouses} warehouses with {num_vu_load} virtual users"
+        )
+        self.upload_script(self.head_node, self.get_script(0), LOAD_SCRIPT)
         prepare_cmd = f"""
         cd $XBENCH_HOME/HammerDB
-        echo \"{load_script}\" > load.tcl
-        ./hammerdbcli auto load.tcl
+        ./hammerdbcli auto {LOAD_SCRIPT}
         """
-        output = self.head_node._unsafe_run(prepare_cmd)
+        try:
+            output = self.head_node.run(prepare_cmd, timeout=24 * 3600)
+        except NodeException as e:
+            raise HammerdbException(e)
         self.logger.debug(output)
         if self.kwargs.get("post_data_load"):
             self.backend.post_data_load(
@@ -138,124 +293,290 @@ class HammerdbRunner(MultiNode, AbstractBenchmarkRunner):
 
     def run(self):
         self.phase = "run"
+        success = True
         num_vu = (
             [self.kwargs.get("num_vu")]
             if isinstance(self.kwargs.get("num_vu"), int)
             else self.kwargs.get("num_vu")
         )
         repeats = self.kwargs.get("repeats")
-        num_drivers = len(self.nodes)
-        now = datetime.now().strftime("%Y%m%d_%H%M%S")
-        run_outdir = f"/tmp/{now}_hammerdb_{self.bench}"
-        self.logger.info(f"Using {num_drivers} drivers to generate load")
-        summary_data = {}
-        for r in range(1, repeats + 1):
-            if self.kwargs.get("pre_workload_run"):
-                self.backend.pre_workload_run()
-            repeat_data = {}
-            for v in num_vu:
-                time.sleep(DEFAULT_SLEEP_TIME)
-                if self.kwargs.get("pre_thread_run"):
-                    self.backend.pre_thread_run()
-                per_driver_v = int(v / num_drivers)
-                outdir = f"{run_outdir}/{v}_vu_run_{r}"
-                run_script = self.get_script(per_driver_v)
-                run_cmd = f"""
-                cd $XBENCH_HOME/HammerDB
-                echo \"{run_script}\" > run.tcl
-                mkdir -p {run_outdir}
-                ./hammerdbcli auto run.tcl > {outdir}_%s.out
-                if test -f /tmp/hdbtcount.log; then
-                    mv /tmp/hdbtcount.log {outdir}_hdbtcount_%s.log
-                fi
-                if test -f /tmp/hdbxtprofile.log; then
-                    mv /tmp/hdbxtprofile.log {outdir}_hdbxtprofile_%s.log
-                fi
-                """
-                host_args = [
-                    {
-                        "cmd": run_cmd
-                        % (
-                            self.nodes[i].vm.name,
-                            self.nodes[i].vm.name,
-                            self.nodes[i].vm.name,
-                        )
-                    }
-                    for i in range(len(self.nodes))
-                ]
-                timeout = self.kwargs.get("time") + self.kwargs.get("warmup") + 600
-                self.logger.info(f"Running repeat {r}, thread: {v}")
-                self.pssh.run(cmd="%(cmd)s", timeout=timeout, host_args=host_args)
-                self.pssh.receive_files(
-                    f"{run_outdir}/*", f"{self.artifact_dir}/", recursive=True
+        if self.kwargs.get("use_all_warehouses") and self.num_nodes > 1:
+            drivers = min(self.num_nodes, max(num_vu))
+            if self.kwargs.get("warehouses") < drivers:
+                raise HammerdbException(
+                    f"{self.kwargs.get('warehouses')} warehouses can't be split between"
+                    f" {drivers} drivers with use_all_warehouses, use fewer drivers"
                 )
-                vu_data = []
-                for timeprofile_log in sorted(
-                    glob(f"{self.artifact_dir}/{v}_vu_run_{r}_hdbxtprofile_*.log")
-                ):
-                    (
-                        throughput,
-                        avg_latency,
-                        p95_latency,
-                    ) = self.parse_timeprofile(timeprofile_log)
-
-                    # Collect data from each driver this terminal
-                    vu_data.append(
+        self.logger.info(f"Using {self.num_nodes} drivers to generate load")
+        all_results = pd.DataFrame()  # Contains all repeats
+        this_repeat_results: List[tuple] = []
+        r = 0
+        try:
+            if self.num_nodes > 1:
+                self.driver_weights = driver_capacities(
+                    self.pssh, self.kwargs.get("driver_weight", "nproc")
+                )
+                self.logger.info(f"Driver weights {self.driver_weights}")
+            for r in range(1, repeats + 1):
+                repeat_done = all(self.checkpoint.done(r, v) for v in num_vu)
+                if self.kwargs.get("pre_workload_run") and not repeat_done:
+                    self.backend.pre_workload_run()
+                this_repeat_results = []
+                self.timeseries_rows = []
+                for v in num_vu:
+                    completed = self.checkpoint.get(r, v)
+                    if completed is not None:
+                        self.logger.info(f"Skipping repeat {r}, vu: {v} (completed)")
+                        this_repeat_results.append(tuple(completed["results"]))
+                        self.timeseries_rows.extend(map(tuple, completed["timeseries"]))
+                        continue
+                    traced_sleep(DEFAULT_SLEEP_TIME, "between steps")
+                    if self.kwargs.get("pre_thread_run"):
+                        self.backend.pre_thread_run()
+                    self.logger.info(f"Running repeat {r}, vu: {v}")
+                    step = Step(repeat=r, concurrency=v)
+                    timeseries_start = len(self.timeseries_rows)
+                    with self.step_monitors.running(step):
+                        step_results = self.run_vu(v, r)
+                    this_repeat_results.append(step_results)
+                    self.checkpoint.save(
+                        r,
+                        v,
+                        0,
                         {
-                            "throughput": throughput,
-                            "avg_latency": avg_latency,
-                            "p95_latency": p95_latency,
-                        }
+                            "results": step_results,
+                            "timeseries": self.timeseries_rows[timeseries_start:],
+                        },
                     )
-
-                vu_throughput = sum([data["throughput"] for data in vu_data])
-                print(f"vu_data length = {vu_data}")
-                vu_avg_latency = sum([data["avg_latency"] for data in vu_data]) / len(
-                    vu_data
+                save_timeseries(
+                    self.timeseries_rows, self.artifact_dir, self.workload_name, r
                 )
-                vu_p95_latency = max(data["p95_latency"] for data in vu_data)
-                # Collect data from each terminal this repeat
-                repeat_data[v] = {
-                    "throughput": vu_throughput,
-                    "avg_latency": vu_avg_latency,
-                    "p95_latency": vu_p95_latency,
-                }
-            # Collect data from each repeat this run
-            summary_data[r] = repeat_data
-            self.logger.info("======= HammerDB results ==========")
-            output_string = f"concurrency,throughput,avg_latency,p95_latency\n"
-            for t, data in repeat_data.items():
-                output_string = f'{output_string}{v},{data["throughput"]},{data["avg_latency"]},{data["p95_latency"]}\n'
-            self.logger.info(output_string)
-            file_name = os.path.join(
-                self.artifact_dir, f"{self.workload_name}_run_{r}.csv"
+                df = self.save_print_one_repeat(r, this_repeat_results)
+                all_results = pd.concat([all_results, df])
+        except BenchmarkException as e:
+            self.logger.error(f"Benchmark failed with: {e}")
+            success = False
+            # Keep results of the steps completed in the failed repeat
+            if this_repeat_results:
+                save_timeseries(
+                    self.timeseries_rows, self.artifact_dir, self.workload_name, r
+                )
+                df = self.save_print_one_repeat(r, this_repeat_results)
+                all_results = pd.concat([all_results, df])
+        else:
+            self.logger.info("Benchmark completed successfully")
+        finally:
+            if not all_results.empty:
+                self.save_print_summary(df=all_results)
+                self.logger.info(f"Raw output has saved to the {self.artifact_dir}")
+            if not success:
+                self.logger.error(
+                    f"Completed steps are saved in {self.checkpoint.file_name}, use"
+                    f" --resume {self.artifact_dir} to continue"
+                )
+                raise BenchmarkException("Benchmark failed")
+
+    @retry(
+        (NodeException, PsshClientException, HammerdbOutputParseException),
+        BenchmarkException,
+        max_delay=1200,
+        delays=backoff_with_jitter(delay=3, attempts=3, cap=30),
+    )
+    def run_vu(self, v: int, r: int) -> tuple:
+        """Run v virtual users (total for all drivers)
+
+        Virtual users are split between drivers in proportion to driver weights. Every
+        driver gets its own script. Transaction counter runs on the head driver only
+        because it reports database wide TPM.
+
+        Returns:
+            tuple: row in HAMMERDB_RESULT_FIELDS order
+        """
+        # I need to clean driver(s) in case of re-try
+        self.pssh.run("pkill -9 -f [h]ammerdbcli || true", timeout=30)
+
+        host_vus = distribute(v, self.driver_weights)
+        ranges: List[Tuple[int, int]] = [(0, 0)] * self.num_nodes
+        if self.kwargs.get("use_all_warehouses") and self.num_nodes > 1:
+            ranges = warehouse_ranges(self.kwargs.get("warehouses"), host_vus)
+            self.logger.info(f"Home warehouses per driver: {ranges}")
+        run_outdir = f"/tmp/xbench_hammerdb_{self.workload_name}"
+        prefix = f"{v}_vu_run_{r}"
+        host_args = []
+        for n, (node, host_v) in enumerate(zip(self.nodes, host_vus)):
+            if host_v == 0:  # Not enough virtual users for all drivers
+                host_args.append({"cmd": "true"})
+                continue
+            self.upload_script(
+                node,
+                self.get_script(
+                    host_v,
+                    n,
+                    tcount=n == 0,
+                    warehouse_first=ranges[n][0],
+                    warehouse_last=ranges[n][1],
+                ),
+                RUN_SCRIPT,
             )
-            with open(file_name, "w") as csv_file:
-                csv_file.write(output_string)
-            self.logger.info(f"Results for repeat {r} saved as {file_name}")
-        # Calculate summary data
-        self.logger.info("======= Overall results ==========")
-        summary_string = f"concurrency,throughput,avg_latency,p95_latency\n"
-        for v in num_vu:
-            summary_throughput = (
-                sum(summary_data[r][v]["throughput"] for r in range(1, repeats + 1))
-                / repeats
+            name = node.vm.name
+            cmd = synchronized_command(
+                f"./hammerdbcli auto {RUN_SCRIPT} > {run_outdir}/{prefix}_{name}.out",
+                0,
             )
-            summary_avg_latency = (
-                sum(summary_data[r][v]["avg_latency"] for r in range(1, repeats + 1))
-                / repeats
+            cmd = f"""
+            rm -rf {run_outdir} /tmp/hdbtcount.log /tmp/hdbxtprofile.log
+            mkdir -p {run_outdir}
+            cd $XBENCH_HOME/HammerDB
+            {cmd}
+            if test -f /tmp/hdbtcount.log; then
+                mv /tmp/hdbtcount.log {run_outdir}/{prefix}_hdbtcount_{name}.log
+            fi
+            if test -f /tmp/hdbxtprofile.log; then
+                mv /tmp/hdbxtprofile.log {run_outdir}/{prefix}_hdbxtprofile_{name}.log
+            fi
+            """
+            host_args.append({"cmd": clean_cmd(cmd)})
+        timeout = self.kwargs.get("time") + self.kwargs.get("warmup") + EXTRA_TIMEOUT
+        outputs = self.pssh.run("%(cmd)s", timeout=timeout, host_args=host_args)
+        self.pssh.receive_files(f"{run_outdir}/*", f"{self.artifact_dir}/", True)
+
+        histograms: Dict[str, LatencyHistogram] = {}
+        throughput = nopm = 0.0
+        tpm = float("nan")
+        for n, (node, host_v, output) in enumerate(zip(self.nodes, host_vus, outputs)):
+            if host_v == 0:
+                continue
+            name = node.vm.name
+            with open(os.path.join(self.artifact_dir, f"{prefix}_{name}.out")) as f:
+                for line in f:
+                    if ERROR_MARKER in line:
+                        raise HammerdbException(f"{name}: {line.strip()}")
+                    m = TEST_RESULT_RE.search(line)
+                    if m and n == 0:
+                        tpm = float(m.group(2))
+            profile_file = os.path.join(
+                self.artifact_dir, f"{prefix}_hdbxtprofile_{name}.log"
             )
-            summary_p95_latency = max(
-                summary_data[r][v]["p95_latency"] for r in range(1, repeats + 1)
+            if not os.path.exists(profile_file):
+                raise HammerdbOutputParseException(f"No time profile from {name}")
+            with open(profile_file) as f:
+                elapsed, procs = parse_xtprofile(f)
+            if not procs or elapsed <= 0:
+                raise HammerdbOutputParseException(
+                    f"No time profile summary in {profile_file}"
+                )
+            for proc, histogram in procs.items():
+                histograms.setdefault(proc, LatencyHistogram()).merge(histogram)
+            throughput += sum(h.total for h in procs.values()) / elapsed
+            if NEW_ORDER_PROC in procs:
+                nopm += procs[NEW_ORDER_PROC].total * 60 / elapsed
+            if n == 0:
+                self.add_tcount_timeseries(
+                    os.path.join(self.artifact_dir, f"{prefix}_hdbtcount_{name}.log"),
+                    parse_window(output.get("stdout", "")),
+                    v,
+                )
+
+        histogram = LatencyHistogram()
+        for proc_histogram in histograms.values():
+            histogram.merge(proc_histogram)
+        with open(
+            os.path.join(
+                self.artifact_dir, f"{self.workload_name}_histogram_{r}_{v}.json"
+            ),
+            "w",
+        ) as f:
+            json.dump({p: h.to_dict() for p, h in histograms.items()}, f)
+        self.logger.info(f"NOPM {nopm:.0f}, TPM {tpm}")
+        return (
+            v,
+            throughput,
+            histogram.mean,
+            histogram.stddev,
+            histogram.percentile(95),
+            0,  # HammerDB stops virtual users on errors (raise_error)
+            nopm,
+            tpm,
+        )
+
+    def add_tcount_timeseries(
+        self, file_name: str, window: Tuple[Optional[float], Optional[float]], v: int
+    ):
+        """Add head driver transaction counter (database wide TPM) to the time series"""
+        if not os.path.exists(file_name):
+            self.logger.warning(f"No transaction counter log {file_name}")
+            return
+        with open(file_name) as f:
+            samples = parse_tcount(f)
+        start, end = window
+        refresh_rate = self.kwargs.get("refreshrate", 10)
+        for i, (ts, tpm) in enumerate(samples):
+            if ts is None:  # tcset timestamps 0
+                ts = (start or 0) + i * refresh_rate
+            in_window = (
+                start is not None
+                and end is not None
+                and start + 60 * self.warmup_m <= ts <= end
+            )
+            self.timeseries_rows.append(
+                (
+                    ts,
+                    self.head_node.vm.name,
+                    v,
+                    tpm / 60,
+                    float("nan"),
+                    float("nan"),
+                    float("nan"),
+                    in_window,
+                )
             )
-            summary_string = f"{summary_string}{v},{summary_throughput},{summary_avg_latency},{summary_p95_latency}\n"
-        self.logger.info(summary_string)
-        summary_file_name = os.path.join(
-            self.artifact_dir, f"{self.workload_name}_summary.csv"
+
+    def save_print_one_repeat(self, repeat: int, results: List[tuple]) -> pd.DataFrame:
+        """Display and save results of one repeat
+
+        Args:
+            repeat (int): repeat number
+            results (List[tuple]): rows in HAMMERDB_RESULT_FIELDS order
+        """
+        df_final = pd.DataFrame.from_records(results, columns=HAMMERDB_RESULT_FIELDS)
+        df_final = df_final.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= HammerDB results ==========\n{df_final.to_string(index=False)}"
+        )
+        file_name = os.path.join(
+            self.artifact_dir, f"{self.workload_name}_{repeat}.csv"
         )
-        with open(summary_file_name, "w") as csv_file:
-            csv_file.write(summary_string)
-        self.logger.info(f"Results for repeat {r} saved as {summary_file_name}")
+        self.logger.info(f"Results for repeat {repeat} saved as {file_name}")
+        df_final.to_csv(file_name, index=False)
+        df_final["repeat"] = repeat
+        return df_final
+
+    def save_print_summary(self, df: pd.DataFrame):
+        """Print overall summary for all repeats
+
+        Args:
+            df (pd.DataFrame): raw results
+        """
+        df_summary = df.groupby(["concurrency"]).agg(
+            {
+                "throughput": ["mean"],
+                "avg_latency": ["mean"],
+                "stddev": ["max"],
+                "p95_latency": ["max"],
+                "errors": ["sum"],
+                "nopm": ["mean"],
+                "tpm": ["mean"],
+            }
+        )
+        df_summary.reset_index(inplace=True)
+        df_summary.columns = HAMMERDB_RESULT_FIELDS
+        df_summary = df_summary.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= Overall results ==========\n{df_summary.to_string(index=False)}"
+        )
+        file_name = os.path.join(self.artifact_dir, f"{self.workload_name}_summary.csv")
+        self.logger.info(f"Summary results saved as {file_name}")
+        df_summary.to_csv(file_name, index=False)
 
     def get_scale_string(self):
         return self.kwargs.get("warehouses")
@@ -265,7 +586,5 @@ class HammerdbRunner(MultiNode, AbstractBenchmarkRunner):
         pass
 
     def cleanup(self):
-        cmd = """kill -9 $(pgrep -f "hammerdbcli") || true"""
+        cmd = "pkill -9 -f [h]ammerdbcli || true"
         self.run_on_all_nodes(cmd, sudo=True)
-            
-
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Mergeable latency histogram.
+
+This module has no dependencies outside of the standard library because it is shipped
+to the drivers together with the native load engine.
+"""
+
+import math
+from typing import Dict, Optional
+
+HISTOGRAM_GROWTH = 1.02  # Every bucket is 2% wider than the previous one
+HISTOGRAM_MIN_VALUE = 0.001  # 1 microsecond (values are in ms)
+LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+
+def bucket_index(value: float) -> int:
+    """Return bucket index for the value (ms)"""
+    if value <= HISTOGRAM_MIN_VALUE:
+        return 0
+    return int(math.ceil(math.log(value / HISTOGRAM_MIN_VALUE) / LOG_GROWTH))
+
+
+def bucket_upper_bound(index: int) -> float:
+    """Return upper bound (ms) of the bucket"""
+    return HISTOGRAM_MIN_VALUE * HISTOGRAM_GROWTH**index
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram (ms) with ~2% relative error.
+
+    Histograms from different processes and drivers can be merged without losing
+    precision, which is not the case for percentiles.
+    """
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float, count: int = 1):
+        idx = bucket_index(value)
+        self.counts[idx] = self.counts.get(idx, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.sum_sq += value * value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        for idx, count in other.counts.items():
+            self.counts[idx] = self.counts.get(idx, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, pct: float) -> float:
+        """Return the latency (ms) below which pct percent of samples fall"""
+        if self.total == 0:
+            return 0.0
+        rank = max(1, int(math.ceil(self.total * pct / 100.0)))
+        seen = 0
+        for idx in sorted(self.counts):
+            seen += self.counts[idx]
+            if seen >= rank:
+                return min(bucket_upper_bound(idx), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+    @property
+    def stddev(self) -> float:
+        if self.total < 2:
+            return 0.0
+        variance = self.sum_sq / self.total - self.mean**2
+        return math.sqrt(variance) if variance > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "counts": {str(k): v for k, v in sorted(self.counts.items())},
+            "total": self.total,
+            "sum": self.sum,
+            "sum_sq": self.sum_sq,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LatencyHistogram":
+        h = cls()
+        h.counts = {int(k): v for k, v in d.get("counts", {}).items()}
+        h.total = d.get("total", 0)
+        h.sum = d.get("sum", 0.0)
+        h.sum_sq = d.get("sum_sq", 0.0)
+        h.min = d.get("min")
+        h.max = d.get("max")
+        return h
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""CPU, disk, network, memory and pressure of every cluster member, without Prometheus.
+
+HostSampler copies host_sampler.py to every managed member and runs it in the
+background for the duration of the workload run. Ring files are collected to host/ in
+the artifact directory when the run ends, turned into per second rates
+({workload}_host_samples.csv.gz) and averaged per step window of {workload}_steps.csv
+({workload}_host.csv).
+"""
+
+import glob
+import logging
+import os
+from typing import Dict, List
+
+import pandas as pd
+
+from compute import MultiNode, Node
+from compute.exceptions import MultiNodeException, PsshClientException
+
+from . import host_sampler
+from .host_sampler import CPU_FIELDS, DEFAULT_CAPACITY, DEFAULT_INTERVAL, read_ring
+
+HOST_DIR = "host"
+REMOTE_DIR = "/tmp/xbench_host"
+REMOTE_SCRIPT = f"{REMOTE_DIR}/host_sampler.py"
+RESULT_PRECISION = 2
+STEP_FIELDS = ["repeat", "concurrency", "rate"]
+
+
+def host_rates(records: List[Dict]) -> pd.DataFrame:
+    """Utilization between consecutive records of one host
+
+    Counters going down (reboot) and gaps are dropped
+    """
+    df = pd.DataFrame(records)
+    if len(df) < 2:
+        return pd.DataFrame()
+    delta = df.diff().iloc[1:]
+    current = df.iloc[1:]
+    valid = (delta.drop(columns=["mem_total_kb", "mem_available_kb"]) >= 0).all(
+        axis=1
+    ) & (delta["seq"] == 1)
+    delta, current = delta[valid], current[valid]
+    seconds = delta["time"]
+    cpu_total = delta[CPU_FIELDS].sum(axis=1).where(lambda x: x > 0)
+    rates = pd.DataFrame(
+        {
+            "time": current["time"],
+            "cpu_busy_pct": 100
+            * (cpu_total - delta["cpu_idle"] - delta["cpu_iowait"])
+            / cpu_total,
+            "cpu_iowait_pct": 100 * delta["cpu_iowait"] / cpu_total,
+            "cpu_steal_pct": 100 * delta["cpu_steal"] / cpu_total,
+            "disk_read_mb_s": delta["disk_read_sectors"] * 512 / 1e6 / seconds,
+            "disk_write_mb_s": delta["disk_write_sectors"] * 512 / 1e6 / seconds,
+            "disk_iops": (delta["disk_read_ios"] + delta["disk_write_ios"]) / seconds,
+            "disk_busy_pct": 100
+            * delta["disk_io_ms"]
+            / (seconds * 1000 * current["disks"].where(lambda x: x > 0)),
+            "net_rx_mb_s": delta["net_rx_bytes"] / 1e6 / seconds,
+            "net_tx_mb_s": delta["net_tx_bytes"] / 1e6 / seconds,
+            "net_packets_s": (delta["net_rx_packets"] + delta["net_tx_packets"])
+            / seconds,
+            "mem_used_pct": 100
+            * (current["mem_total_kb"] - current["mem_available_kb"])
+            / current["mem_total_kb"].where(lambda x: x > 0),
+        }
+    )
+    for resource in ("cpu_some", "io_some", "io_full", "memory_some", "memory_full"):
+        rates[f"psi_{resource}_pct"] = (
+            100 * delta[f"psi_{resource}_us"] / (seconds * 1e6)
+        )
+    return rates.reset_index(drop=True)
+
+
+def step_resources(samples: pd.DataFrame, steps: pd.DataFrame) -> pd.DataFrame:
+    """Average utilization of every node during every step window"""
+    frames = []
+    for step in steps.dropna(subset=["start", "end"]).itertuples(index=False):
+        in_step = samples[
+            (samples["time"] > step.start) & (samples["time"] <= step.end)
+        ]
+        if in_step.empty:
+            continue
+        df = in_step.drop(columns="time").groupby("node", sort=False).mean()
+        df.insert(0, "samples", in_step.groupby("node", sort=False).size())
+        for i, field in enumerate(STEP_FIELDS):
+            df.insert(i, field, getattr(step, field))
+        frames.append(df.reset_index())
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    return df[
+        STEP_FIELDS + ["node"] + [c for c in df if c not in STEP_FIELDS + ["node"]]
+    ]
+
+
+class HostSampler:
+    """Runs host_sampler.py on every managed member during the workload run"""
+
+    def __init__(
+        self,
+        nodes: List[Node],
+        interval: float = DEFAULT_INTERVAL,
+        capacity: int = DEFAULT_CAPACITY,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.nodes = [n for n in nodes if n.vm.managed]
+        self.interval = interval
+        self.capacity = capacity
+        self.multi_node = MultiNode(self.nodes) if self.nodes else None
+        self.started = False
+
+    @staticmethod
+    def kill_command() -> str:
+        """SIGTERM lets the sampler finish the record being written"""
+        return f"[ -f {REMOTE_DIR}/sampler.pid ] && kill $(cat {REMOTE_DIR}/sampler.pid) || true"
+
+    def start(self):
+        if self.multi_node is None:
+            return
+        try:
+            self.multi_node.run_on_all_nodes(
+                f"""
+                {self.kill_command()}
+                mkdir -p {REMOTE_DIR} && chmod a+rwx {REMOTE_DIR}
+                command -v python3 > /dev/null || yum install -y python3 || apt-get install -y python3
+                """,
+                sudo=True,
+            )
+            self.multi_node.pssh.send_files(host_sampler.__file__, REMOTE_SCRIPT)
+            self.multi_node.run_on_all_nodes(
+                f"setsid nohup python3 {REMOTE_SCRIPT}"
+                f" {REMOTE_DIR}/%(name)s.ring {self.interval} {self.capacity}"
+                f" > {REMOTE_DIR}/sampler.log 2>&1 < /dev/null &"
+                f" echo $! > {REMOTE_DIR}/sampler.pid",
+                host_args=[{"name": n.vm.name} for n in self.nodes],
+            )
+            self.started = True
+            self.logger.info(f"Host sampler started on {len(self.nodes)} member(s)")
+        except (MultiNodeException, PsshClientException) as e:
+            self.logger.warning(f"Unable to start host sampler: {e}")
+
+    def stop(self, local_dir: str) -> pd.DataFrame:
+        """Stop sampling and collect ring files to local_dir
+
+        Returns:
+            pd.DataFrame: per second utilization of every node
+        """
+        if not self.started:
+            return pd.DataFrame()
+        self.started = False
+        os.makedirs(local_dir, exist_ok=True)
+        try:
+            self.multi_node.run_on_all_nodes(
+                f"{self.kill_command()}; sleep {self.interval}", sudo=True
+            )
+            self.multi_node.pssh.receive_files(
+                f"{REMOTE_DIR}/*.ring", f"{local_dir}/", False
+            )
+            self.multi_node.run_on_all_nodes(f"rm -rf {REMOTE_DIR}", sudo=True)
+        except (MultiNodeException, PsshClientException) as e:
+            self.logger.warning(f"Unable to collect host samples: {e}")
+        frames = []
+        for file_name in sorted(glob.glob(os.path.join(local_dir, "*.ring"))):
+            try:
+                rates = host_rates(read_ring(file_name))
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Unable to read {file_name}: {e}")
+                continue
+            node = os.path.basename(file_name)[: -len(".ring")]
+            frames.append(rates.assign(node=node))
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        return df[["node"] + [c for c in df if c != "node"]]
+
+
+def save_host_resources(
+    samples: pd.DataFrame, artifact_dir: str, workload_name: str
+) -> pd.DataFrame:
+    """Save per second samples and per step averages joined with the steps file"""
+    if samples.empty:
+        return pd.DataFrame()
+    samples.round(RESULT_PRECISION).to_csv(
+        os.path.join(artifact_dir, f"{workload_name}_host_samples.csv.gz"), index=False
+    )
+    steps_file = os.path.join(artifact_dir, f"{workload_name}_steps.csv")
+    if not os.path.exists(steps_file):
+        return pd.DataFrame()
+    df = step_resources(samples, pd.read_csv(steps_file)).round(RESULT_PRECISION)
+    if df.empty:
+        return df
+    df.to_csv(os.path.join(artifact_dir, f"{workload_name}_host.csv"), index=False)
+    logging.getLogger(__name__).info(
+        f"======= Host resources per step ==========\n"
+        f"{df[STEP_FIELDS + ['node', 'cpu_busy_pct', 'disk_busy_pct', 'net_rx_mb_s', 'net_tx_mb_s']].to_string(index=False)}"
+    )
+    return df
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Low overhead host sampler, runs on every cluster member during a workload run.
+
+Standard library only: the file is copied to the member and started with python3.
+Once per interval it reads /proc/stat, /proc/diskstats, /proc/net/dev, /proc/meminfo
+and /proc/pressure/* and writes one fixed size record of cumulative counters into a
+ring file:
+
+    header: MAGIC, version, record size, capacity, interval
+    slot i: record with seq % capacity == i
+
+The file is not preallocated, it grows with the run up to capacity records, then the
+oldest records are overwritten. A short run leaves a short file to collect. read_ring()
+returns the records ordered by seq, rates are computed by the reader
+(host_resources.py).
+
+    python3 host_sampler.py <ring file> [interval sec] [capacity]
+"""
+
+import os
+import signal
+import struct
+import sys
+import time
+from typing import Dict, List
+
+MAGIC = b"XBHS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHId")  # magic, version, record size, capacity, interval
+FIELDS = [
+    "seq",
+    "time",
+    "cpu_user",
+    "cpu_nice",
+    "cpu_system",
+    "cpu_idle",
+    "cpu_iowait",
+    "cpu_irq",
+    "cpu_softirq",
+    "cpu_steal",
+    "disks",
+    "disk_read_ios",
+    "disk_read_sectors",
+    "disk_write_ios",
+    "disk_write_sectors",
+    "disk_io_ms",
+    "net_rx_bytes",
+    "net_rx_packets",
+    "net_tx_bytes",
+    "net_tx_packets",
+    "mem_total_kb",
+    "mem_available_kb",
+    "psi_cpu_some_us",
+    "psi_io_some_us",
+    "psi_io_full_us",
+    "psi_memory_some_us",
+    "psi_memory_full_us",
+]
+RECORD = struct.Struct("<Qd" + "Q" * (len(FIELDS) - 2))
+DEFAULT_INTERVAL = 1.0
+DEFAULT_CAPACITY = 86400  # a day of one second samples, at most ~18 MB
+# Partitions are skipped as their whole disk is counted, so are virtual devices
+SKIP_DEVICES = ("loop", "ram", "dm-", "md", "sr", "zram", "nbd")
+CPU_FIELDS = FIELDS[2:10]
+
+
+def read_cpu() -> List[int]:
+    with open("/proc/stat") as f:
+        values = f.readline().split()[1:9]  # aggregate cpu line
+    return [int(v) for v in values] + [0] * (8 - len(values))
+
+
+def read_disks() -> List[int]:
+    disks = set(os.listdir("/sys/block")) if os.path.isdir("/sys/block") else set()
+    totals = [0] * 6  # disks, read ios, read sectors, write ios, write sectors, io ms
+    with open("/proc/diskstats") as f:
+        for line in f:
+            parts = line.split()
+            name = parts[2]
+            if name not in disks or name.startswith(SKIP_DEVICES):
+                continue
+            totals[0] += 1
+            totals[1] += int(parts[3])
+            totals[2] += int(parts[5])
+            totals[3] += int(parts[7])
+            totals[4] += int(parts[9])
+            totals[5] += int(parts[12])
+    return totals
+
+
+def read_net() -> List[int]:
+    totals = [0] * 4  # rx bytes, rx packets, tx bytes, tx packets
+    with open("/proc/net/dev") as f:
+        for line in f.readlines()[2:]:
+            name, _, counters = line.partition(":")
+            if name.strip() == "lo":
+                continue
+            values = counters.split()
+            totals[0] += int(values[0])
+            totals[1] += int(values[1])
+            totals[2] += int(values[8])
+            totals[3] += int(values[9])
+    return totals
+
+
+def read_memory() -> List[int]:
+    memory = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("MemTotal", "MemAvailable"):
+                memory[name] = int(value.split()[0])
+    return [memory.get("MemTotal", 0), memory.get("MemAvailable", 0)]
+
+
+def read_pressure(resource: str) -> Dict[str, int]:
+    """Total stall time (us) of some/full tasks, empty without PSI (kernel < 4.20)"""
+    totals = {}
+    try:
+        with open(f"/proc/pressure/{resource}") as f:
+            for line in f:
+                kind, *values = line.split()
+                totals[kind] = int(values[-1].split("=")[1])
+    except (OSError, IndexError, ValueError):
+        pass
+    return totals
+
+
+def sample(seq: int) -> bytes:
+    cpu = read_pressure("cpu")
+    io = read_pressure("io")
+    memory = read_pressure("memory")
+    return RECORD.pack(
+        seq,
+        time.time(),
+        *read_cpu(),
+        *read_disks(),
+        *read_net(),
+        *read_memory(),
+        cpu.get("some", 0),
+        io.get("some", 0),
+        io.get("full", 0),
+        memory.get("some", 0),
+        memory.get("full", 0),
+    )
+
+
+def run(file_name: str, interval: float, capacity: int):
+    stopped = []
+    signal.signal(signal.SIGTERM, lambda *_: stopped.append(True))
+    with open(file_name, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, capacity, interval))
+        seq = 0
+        next_time = time.time()
+        while not stopped:
+            seq += 1
+            f.seek(HEADER.size + RECORD.size * (seq % capacity))
+            f.write(sample(seq))
+            f.flush()
+            next_time += interval
+            delay = next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:  # fell behind, e.g. suspended, do not catch up
+                next_time = time.time()
+
+
+def read_ring(file_name: str) -> List[Dict]:
+    """Records of the ring file ordered by seq"""
+    with open(file_name, "rb") as f:
+        data = f.read()
+    magic, version, record_size, capacity, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"{file_name} is not a host sampler ring file")
+    records = []
+    for slot in range(capacity):
+        offset = HEADER.size + RECORD.size * slot
+        if offset + RECORD.size > len(data):
+            break
+        values = RECORD.unpack_from(data, offset)
+        if values[0]:  # empty slots have seq 0
+            records.append(dict(zip(FIELDS, values)))
+    return sorted(records, key=lambda r: r["seq"])
+
+
+if __name__ == "__main__":
+    run(
+        sys.argv[1],
+        float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_INTERVAL,
+        int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_CAPACITY,
+    )
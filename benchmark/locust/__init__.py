@@ -1 +1,2 @@
-from .locust import Locust
\ No newline at end of file
+from .locust import Locust
+from .locust_runner import LocustRunner
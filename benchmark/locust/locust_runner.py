@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+import os
+from io import StringIO
+from typing import Dict, List, Optional
+
+import jinja2
+import pandas as pd
+
+from benchmark.abstract_benchmark import AbstractBenchmarkRunner
+from benchmark.checkpoint import Checkpoint
+from benchmark.driver_monitor import driver_capacities
+from benchmark.exceptions import BenchmarkException
+from benchmark.step_monitor import Step, StepMonitors
+from benchmark.sysbench.sysbench_runner import RESULT_PRECISION, SYSBENCH_RESULT_FIELDS
+from common import save_dict_as_yaml, traced_sleep
+from common.retry_decorator import backoff_with_jitter, retry
+from compute import MultiNode, Node, NodeException, PsshClientException
+from compute.exceptions import MultiNodeException
+
+DEFAULT_SLEEP_TIME = 30  # sleep time between user steps
+EXTRA_TIMEOUT = 120  # workers connect and master stop timeout
+LOCUST_HOME = "$XBENCH_HOME/xpand-locust"
+LOCUST_PYTHON = "python3.9"
+LOCUST_OUTPUT_DIR = "/tmp/xbench_locust"
+LOCUST_MASTER_PORT = 5557
+AGGREGATED = "Aggregated"
+PERCENTILE_COLUMNS = ["50%", "75%", "90%", "95%", "99%", "99.9%", "100%"]
+REQUEST_RESULT_FIELDS = [
+    "concurrency",
+    "type",
+    "name",
+    "count",
+    "failures",
+    "throughput",
+    "avg_latency",
+] + [f"p{c[:-1]}_latency" for c in PERCENTILE_COLUMNS]
+
+
+def parse_stats(stats_csv: str, concurrency: int, percentile: int = 95) -> tuple:
+    """Parse locust --csv stats file
+
+    Args:
+        stats_csv (str): content of <prefix>_stats.csv
+        concurrency (int): number of users
+        percentile (int): latency percentile to report
+
+    Returns:
+        tuple: result row in SYSBENCH_RESULT_FIELDS order and per request DataFrame
+    """
+    try:
+        df = pd.read_csv(StringIO(stats_csv))
+        total = df[df["Name"] == AGGREGATED].iloc[0]
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, KeyError, IndexError):
+        raise BenchmarkException(f"Unable to parse locust stats:\n{stats_csv}")
+    if not total["Requests/s"] > 0:
+        raise BenchmarkException("Locust throughput is zero. Did workers start?")
+
+    row = (
+        concurrency,
+        float(total["Requests/s"]),
+        float(total["Average Response Time"]),
+        float("nan"),  # locust does not report stddev
+        float(total[f"{percentile}%"]),
+        float(total["Failure Count"]),
+    )
+    requests = df[df["Name"] != AGGREGATED]
+    df_requests = pd.DataFrame(
+        {
+            "concurrency": concurrency,
+            "type": requests["Type"],
+            "name": requests["Name"],
+            "count": requests["Request Count"],
+            "failures": requests["Failure Count"],
+            "throughput": requests["Requests/s"],
+            "avg_latency": requests["Average Response Time"],
+        }
+        | {f"p{c[:-1]}_latency": requests[c] for c in PERCENTILE_COLUMNS}
+    )
+    return row, df_requests[REQUEST_RESULT_FIELDS]
+
+
+def num_workers(
+    workers_per_driver: int,
+    num_drivers: int,
+    capacities: Optional[List[float]] = None,
+) -> int:
+    """Total number of locust workers
+
+    Args:
+        workers_per_driver (int): workers on every driver, 0 is one worker per core
+        num_drivers (int): number of drivers
+        capacities (List[float]): number of cores of every driver, see driver_capacities
+
+    Returns:
+        int: workers the master waits for
+    """
+    if workers_per_driver:
+        return workers_per_driver * num_drivers
+    return int(sum(capacities or []))
+
+
+def spawn_rate(users: int, warmup: int, rate: float = 0) -> float:
+    """Users spawned per second, by default all users are spawned during warmup
+
+    Args:
+        users (int): total number of users
+        warmup (int): warmup time in seconds
+        rate (float): configured spawn rate, 0 is derived from users and warmup
+
+    Returns:
+        float: locust -r value, at least one user per second
+    """
+    return rate or max(1, users / max(warmup, 1))
+
+
+class LocustRunner(MultiNode, AbstractBenchmarkRunner):
+    """Run xpand-locust in distributed mode: master on the head driver, workers on all"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        """Locust runner
+
+        Args:
+            nodes (List[Node]): list of drivers
+            kwargs: bt + workload conf. Check WorkloadRunning run method
+        """
+        MultiNode.__init__(self, nodes)
+
+        self.kwargs = kwargs
+        self.artifact_dir = kwargs.get(
+            "artifact_dir", None
+        )  # Artifact dir has been adjusted to include cluster_name and datetime
+        self.workload_name = kwargs.get("workload_name", None)
+        self.backend = kwargs.get("backend")
+        self.locustfile = kwargs.get("locustfile")
+        self.percentile = kwargs.get("percentile", 95)
+        self.params_file_name = f"{self.workload_name}_locust_params.yaml"
+        self.step_monitors = StepMonitors(nodes, **kwargs)
+        self.checkpoint = Checkpoint(
+            self.artifact_dir, self.workload_name, kwargs.get("resume", False)
+        )
+        self.num_workers = 0
+
+    def render(self, value):
+        """Render jinja2 templates in workload definition using all workload params"""
+        if isinstance(value, str):
+            return jinja2.Template(value, undefined=jinja2.StrictUndefined).render(
+                **self.kwargs
+            )
+        if isinstance(value, list):
+            return [self.render(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.render(v) for k, v in value.items()}
+        return value
+
+    def locust_options(self) -> str:
+        """Options shared by master and workers"""
+        options = f"-f {LOCUST_HOME}/{self.locustfile}"
+        if self.kwargs.get("params"):
+            options = f"{options} --params {LOCUST_HOME}/{self.params_file_name}"
+        try:
+            extra_options = self.render(self.kwargs.get("extra_options", ""))
+        except jinja2.exceptions.UndefinedError as e:
+            raise BenchmarkException(
+                f"There is a problem with locust workload {self.workload_name}: {e}"
+            )
+        return f"{options} {extra_options}".strip()
+
+    def setup(self):
+        """Ship rendered params to all drivers and count workers"""
+        if self.kwargs.get("params"):
+            local_file = f"/tmp/{self.params_file_name}"
+            try:
+                save_dict_as_yaml(local_file, self.render(self.kwargs.get("params")))
+            except jinja2.exceptions.UndefinedError as e:
+                raise BenchmarkException(
+                    f"There is a problem with locust workload {self.workload_name}: {e}"
+                )
+            try:
+                self.scp_to_all_nodes(
+                    local_file, f"{LOCUST_HOME}/{self.params_file_name}"
+                )
+            except MultiNodeException as e:
+                raise BenchmarkException(e)
+
+        workers_per_driver = self.kwargs.get("workers_per_driver", 0)
+        capacities = None
+        if not workers_per_driver:  # One worker per core
+            capacities = driver_capacities(self.pssh, "nproc")
+        self.num_workers = num_workers(workers_per_driver, self.num_nodes, capacities)
+        self.logger.info(
+            f"Using {self.num_workers} locust workers on {self.num_nodes} drivers"
+        )
+
+    def prepare(self):
+        """Locust flows create their own data if required"""
+
+    def data_check(self):
+        """Locust flows create their own data if required"""
+
+    def cleanup(self):
+        cmd = "pkill -9 -f '[l]ocust -f' || true"
+        self.run_on_all_nodes(cmd, sudo=False)
+
+    def run(self):
+        success = True
+        users = self.kwargs.get("users")
+        users = [users] if isinstance(users, int) else users
+        repeats = self.kwargs.get("repeats")
+
+        all_results = pd.DataFrame()  # Contains all repeats
+        this_repeat_results: List[tuple] = []
+        r = 0
+        self.setup()
+        try:
+            for r in range(1, repeats + 1):
+                repeat_done = all(self.checkpoint.done(r, u) for u in users)
+                if self.kwargs.get("pre_workload_run") and not repeat_done:
+                    self.backend.pre_workload_run()
+                this_repeat_results = []
+                for u in users:
+                    completed = self.checkpoint.get(r, u)
+                    if completed is not None:
+                        self.logger.info(f"Skipping repeat {r}, users: {u} (completed)")
+                        this_repeat_results.append((u, completed))
+                        continue
+                    traced_sleep(DEFAULT_SLEEP_TIME, "between steps")
+                    if self.kwargs.get("pre_thread_run"):
+                        self.backend.pre_thread_run()
+
+                    self.logger.info(f"Running repeat {r}, users: {u}")
+                    step = Step(repeat=r, concurrency=u)
+                    with self.step_monitors.running(step):
+                        outputs = self.run_users(u, r)
+                    this_repeat_results.append((u, outputs))
+                    self.checkpoint.save(r, u, 0, outputs)
+
+                df = self.save_print_one_repeat(r, this_repeat_results)
+                all_results = pd.concat([all_results, df])
+        except BenchmarkException as e:
+            self.logger.error(f"Benchmark failed with: {e}")
+            success = False
+            # Keep results of the steps completed in the failed repeat
+            if this_repeat_results:
+                df = self.save_print_one_repeat(r, this_repeat_results)
+                all_results = pd.concat([all_results, df])
+        else:
+            self.logger.info("Benchmark completed successfully")
+        finally:
+            try:
+                self.cleanup()
+            except (NodeException, PsshClientException, MultiNodeException) as e:
+                # Results of the completed steps are still saved
+                self.logger.error(f"Unable to stop locust on drivers: {e}")
+            if not all_results.empty:
+                self.save_print_summary(df=all_results)
+                self.logger.info(f"Raw output has saved to the {self.artifact_dir}")
+            if not success:
+                self.logger.error(
+                    f"Completed steps are saved in {self.checkpoint.file_name}, use"
+                    f" --resume {self.artifact_dir} to continue"
+                )
+                raise BenchmarkException("Benchmark failed")
+
+    @retry(
+        (NodeException, PsshClientException, MultiNodeException),
+        BenchmarkException,
+        max_delay=600,
+        delays=backoff_with_jitter(delay=3, attempts=3, cap=30),
+    )
+    def run_users(self, u: int, r: int) -> Dict[str, str]:
+        """Run one users step: workers in background, master on the head driver
+
+        Args:
+            u (int): total number of users
+            r (int): repeat attempt
+
+        Returns:
+            Dict[str, str]: locust csv suffix (stats, stats_history, failures) -> content
+        """
+        self.cleanup()  # in case of re-try
+        options = self.locust_options()
+        master_host = self.head_node.vm.network.get_private_iface()
+        workers_per_driver = self.kwargs.get("workers_per_driver", 0) or "$(nproc)"
+        cmd = f"""
+        export PYTHONPATH={LOCUST_HOME}
+        mkdir -p {LOCUST_OUTPUT_DIR}
+        for i in $(seq 1 {workers_per_driver}); do
+        setsid nohup {LOCUST_PYTHON} -m locust {options} --worker --master-host {master_host} --master-port {LOCUST_MASTER_PORT} > {LOCUST_OUTPUT_DIR}/worker_$i.log 2>&1 < /dev/null &
+        done
+        """
+        self.run_on_all_nodes(cmd, sudo=False)
+
+        run_time = self.kwargs.get("time", 0)
+        warmup = self.kwargs.get("warmup_time", 0)
+        # Stats are reset once all users are spawned, so spawning is the warmup
+        rate = spawn_rate(u, warmup, self.kwargs.get("spawn_rate", 0))
+        csv_prefix = f"{LOCUST_OUTPUT_DIR}/{self.workload_name}_{r}_{u}"
+        cmd = f"""
+        export PYTHONPATH={LOCUST_HOME}
+        cd {LOCUST_HOME}
+        {LOCUST_PYTHON} -m locust {options} --master --master-bind-port {LOCUST_MASTER_PORT} --headless --expect-workers {self.num_workers} --expect-workers-max-wait 120 -u {u} -r {rate} -t {run_time}s --reset-stats --stop-timeout 10 --only-summary --exit-code-on-error 0 --csv {csv_prefix} --csv-full-history
+        """
+        timeout = run_time + warmup + EXTRA_TIMEOUT
+        self.logger.debug(f"Running {cmd} with timeout {timeout}")
+        stdout = self.head_node.run(cmd, timeout=timeout, sudo=False)
+        self.logger.debug(stdout)
+
+        outputs = {}
+        for suffix in ("stats", "stats_history", "failures"):
+            content = self.head_node.run(
+                f"cat {csv_prefix}_{suffix}.csv", timeout=60, sudo=False
+            )
+            file_name = os.path.join(
+                self.artifact_dir,
+                f"{self.head_node.vm.name}_{self.workload_name}_{r}_{u}_{suffix}.csv",
+            )
+            with open(file_name, "w") as f:
+                f.write(content)
+            outputs[suffix] = content
+        return outputs
+
+    def save_print_one_repeat(self, repeat: int, results: List[tuple]) -> pd.DataFrame:
+        """Summarize, display and save results of one repeat
+
+        Args:
+            repeat (int): repeat number
+            results (List[tuple]): (users, locust csv outputs)
+        """
+        rows = []
+        dfs_requests = []
+        for u, outputs in results:
+            row, df_requests = parse_stats(outputs.get("stats"), u, self.percentile)
+            if row[-1]:
+                self.logger.warning(f"{int(row[-1])} failures for {u} users")
+            rows.append(row)
+            dfs_requests.append(df_requests)
+
+        df_final = pd.DataFrame.from_records(rows, columns=SYSBENCH_RESULT_FIELDS)
+        df_final = df_final.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= Locust results ==========\n{df_final.to_string(index=False)}"
+        )
+        file_name = os.path.join(
+            self.artifact_dir, f"{self.workload_name}_{repeat}.csv"
+        )
+        self.logger.info(f"Results for repeat {repeat} saved as {file_name}")
+        df_final.to_csv(file_name, index=False)
+
+        # Latency percentiles per request name
+        pd.concat(dfs_requests).round(RESULT_PRECISION).to_csv(
+            os.path.join(
+                self.artifact_dir, f"{self.workload_name}_requests_{repeat}.csv"
+            ),
+            index=False,
+        )
+        df_final["repeat"] = repeat
+        return df_final
+
+    def save_print_summary(self, df: pd.DataFrame):
+        """Print overall summary for all repeats
+
+        Args:
+            df (pd.DataFrame): raw results
+        """
+        if df.empty:
+            return
+        df_summary = df.groupby(["concurrency"]).agg(
+            {
+                "throughput": ["mean"],
+                "avg_latency": ["mean"],
+                "stddev": ["max"],
+                "p95_latency": ["max"],
+                "errors": ["sum"],
+            }
+        )
+        df_summary.reset_index(inplace=True)
+        df_summary.columns = SYSBENCH_RESULT_FIELDS
+        df_summary = df_summary.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= Overall results ==========\n{df_summary.to_string(index=False)}"
+        )
+        file_name = os.path.join(self.artifact_dir, f"{self.workload_name}_summary.csv")
+        self.logger.info(f"Summary results saved as {file_name}")
+        df_summary.to_csv(file_name, index=False)
+
+    def get_scale_string(self):
+        return self.kwargs.get("scale_string", "locust")
@@ -0,0 +1,2 @@
+from .native import Native
+from .native_runner import NativeRunner
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+import logging
+
+from compute import Node, NodeException
+from compute.yum import Yum
+
+from ..exceptions import BenchmarkException
+
+DEFAULT_COMMAND_TIMEOUT = 300
+NATIVE_REQUIREMENTS = "aiomysql asyncpg"
+
+
+class Native:
+    """Install requirements for the native asyncio load engine.
+
+    The engine itself is copied to drivers by NativeRunner before every run.
+    """
+
+    def __init__(self, node: Node, **kwargs):
+        self.node = node
+        self.logger = logging.getLogger(__name__)
+        self.yum = Yum(os_type=self.node.vm.os_type)
+
+    def configure(self):
+        # python3 is 3.6 so I have to install python39
+        pm_i = self.yum.install_pkg_cmd()
+        cmd = f"""
+        {pm_i} python39
+        """
+        stdout = self.node.run(cmd, timeout=DEFAULT_COMMAND_TIMEOUT, sudo=True)
+        self.logger.debug(stdout)
+
+    def install(self):
+        try:
+            self.logger.debug("Installing native engine requirements...")
+            cmd = f"""
+            mkdir -p $XBENCH_HOME/native
+            pip3.9 install --user {NATIVE_REQUIREMENTS}
+            """
+            stdout = self.node.run(cmd, timeout=DEFAULT_COMMAND_TIMEOUT)
+            self.logger.debug(stdout)
+            self.logger.debug("Native engine successfully installed")
+        except NodeException as e:
+            raise BenchmarkException(e)
+
+    def clean(self):
+        output = self.node.run(
+            "pkill -9 -f [n]ative_engine.py || true", timeout=DEFAULT_COMMAND_TIMEOUT
+        )
+        self.logger.debug(output)
+        cmd = """
+        cd $XBENCH_HOME
+        rm -rf native
+        """
+        stdout = self.node.run(cmd, timeout=DEFAULT_COMMAND_TIMEOUT)
+        self.logger.debug(stdout)
+        self.logger.debug("Native engine successfully uninstalled")
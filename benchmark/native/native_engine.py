@@ -0,0 +1,945 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Native asyncio SQL load engine.
+
+The engine is shipped to every driver together with histogram.py and executed there by
+NativeRunner. It runs one process per core and many coroutines (one connection each) per
+process. Results are printed to stdout as a single JSON document.
+
+With connect_mode: per_transaction every transaction opens its own connection and
+closes it afterwards (connect-query-disconnect), so the run measures connection setup
+(TCP, TLS, authentication, proxy routing) under churn. With rate it becomes a
+new-connection storm at the target rate. Connection latency is recorded separately,
+transaction latency does not include connect and disconnect.
+
+Usage:
+    python3.9 native_engine.py --config workload.json --step run --threads 64 --time 300
+    python3.9 native_engine.py --config workload.json --step replay --replay-file
+        replay.json --speed 2
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import ssl
+import string
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from benchmark.histogram import LatencyHistogram
+except ImportError:  # On the driver histogram.py is copied next to this file
+    from histogram import LatencyHistogram  # type: ignore[no-redef]
+
+DEFAULT_REPORT_INTERVAL = 10  # seconds
+DEFAULT_CONNECT_TIMEOUT = 30  # seconds
+RECONNECT_DELAY = 1  # seconds to wait before reconnecting after connection loss
+CONNECT_MODES = ["persistent", "per_transaction"]
+PARAM_RE = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+GENERATOR_RE = re.compile(r"^\s*(\w+)\s*\((.*)\)\s*$")
+
+
+class NativeEngineException(Exception):
+    """Native engine exception has happened"""
+
+
+# ----------------------------------------------------------------------------
+# Workload definition
+# ----------------------------------------------------------------------------
+
+
+def convert_placeholders(sql: str, dialect: str) -> Tuple[str, List[str]]:
+    """Convert :name placeholders into the driver specific format
+
+    Args:
+        sql (str): statement with :name placeholders
+        dialect (str): mysql or pgsql
+
+    Returns:
+        Tuple[str, List[str]]: converted statement and ordered list of parameter names
+    """
+    names: List[str] = []
+    if dialect == "mysql":
+        if not PARAM_RE.search(sql):  # No arguments means no pyformat either
+            return sql, names
+        sql = sql.replace("%", "%%")
+
+        def mysql_repl(m):
+            names.append(m.group(1))
+            return f"%({m.group(1)})s"
+
+        return PARAM_RE.sub(mysql_repl, sql), names
+
+    if dialect == "pgsql":
+
+        def pg_repl(m):
+            if m.group(1) not in names:
+                names.append(m.group(1))
+            return f"${names.index(m.group(1)) + 1}"
+
+        return PARAM_RE.sub(pg_repl, sql), names
+
+    raise NativeEngineException(f"Dialect {dialect} is not supported")
+
+
+def _literal(value: str):
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def make_generator(spec) -> Callable[[random.Random], object]:
+    """Build parameter generator from spec
+
+    Supported specs: uniform(a, b), choice(x, y, ...), string(n) and constants.
+    """
+    if not isinstance(spec, str):
+        return lambda rnd: spec
+
+    m = GENERATOR_RE.match(spec)
+    if m is None:
+        return lambda rnd: spec
+
+    func = m.group(1)
+    args = [_literal(a) for a in m.group(2).split(",")] if m.group(2).strip() else []
+    if func == "uniform":
+        if len(args) != 2:
+            raise NativeEngineException(f"uniform requires 2 arguments: {spec}")
+        low, high = args
+        if isinstance(low, int) and isinstance(high, int):
+            return lambda rnd: rnd.randint(low, high)
+        return lambda rnd: rnd.uniform(low, high)
+    if func == "choice":
+        if not args:
+            raise NativeEngineException(f"choice requires arguments: {spec}")
+        return lambda rnd: rnd.choice(args)
+    if func == "string":
+        if len(args) != 1 or not isinstance(args[0], int):
+            raise NativeEngineException(f"string requires length: {spec}")
+        length = args[0]
+        chars = string.ascii_letters + string.digits
+        return lambda rnd: "".join(rnd.choices(chars, k=length))
+
+    raise NativeEngineException(f"Unknown parameter generator {spec}")
+
+
+def steps_for_dialect(steps, dialect: str) -> list:
+    """prepare/cleanup could be a list or a dict keyed by dialect.
+
+    Every step is either a statement or {sql: statement, repeat: n}
+    """
+    if not steps:
+        return []
+    if isinstance(steps, dict):
+        steps = steps.get(dialect, [])
+    if isinstance(steps, str):
+        steps = [steps]
+    return list(steps)
+
+
+class Statement:
+    def __init__(self, key: str, sql: str, dialect: str):
+        self.key = key
+        self.sql, self.names = convert_placeholders(sql, dialect)
+        self.dialect = dialect
+
+    def args(self, params: dict):
+        if self.dialect == "mysql":
+            return {n: params[n] for n in self.names} if self.names else None
+        return [params[n] for n in self.names]
+
+
+class Transaction:
+    def __init__(self, name: str, definition: dict, dialect: str):
+        self.name = name
+        self.weight = definition.get("weight", 1)
+        self.trx = definition.get("trx", False)
+        self.generators = {
+            k: make_generator(v) for k, v in (definition.get("params") or {}).items()
+        }
+        statements = definition.get("statements")
+        if not statements:
+            raise NativeEngineException(f"Transaction {name} has no statements")
+        self.statements = []
+        for i, stmt in enumerate(statements):
+            if isinstance(stmt, dict):
+                stmt_name, sql = stmt.get("name", f"s{i + 1}"), stmt.get("sql")
+            else:
+                stmt_name, sql = f"s{i + 1}", stmt
+            self.statements.append(Statement(f"{name}.{stmt_name}", sql, dialect))
+            missing = set(self.statements[-1].names) - set(self.generators)
+            if missing:
+                raise NativeEngineException(
+                    f"Transaction {name} has no generator for {', '.join(missing)}"
+                )
+
+    def params(self, rnd: random.Random) -> dict:
+        return {k: g(rnd) for k, g in self.generators.items()}
+
+
+class TransactionMix:
+    """Weighted transaction mix"""
+
+    def __init__(self, transactions: dict, dialect: str):
+        if not transactions:
+            raise NativeEngineException("Workload has no transactions defined")
+        self.transactions = [
+            Transaction(name, d, dialect) for name, d in transactions.items()
+        ]
+        self.weights = [t.weight for t in self.transactions]
+        if sum(self.weights) <= 0:
+            raise NativeEngineException("Sum of transaction weights must be positive")
+
+    def pick(self, rnd: random.Random) -> Transaction:
+        return rnd.choices(self.transactions, weights=self.weights)[0]
+
+
+# ----------------------------------------------------------------------------
+# Database sessions
+# ----------------------------------------------------------------------------
+
+
+def ssl_context(connection: dict):
+    if not connection.get("ssl"):
+        return None
+    ssl_ca = connection.get("ssl_ca")
+    if ssl_ca:
+        ctx = ssl.create_default_context(cafile=os.path.expandvars(ssl_ca))
+        ctx.check_hostname = False
+    else:
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+class MysqlSession:
+    def __init__(self, connection: dict, host: str):
+        self.connection = connection
+        self.host = host
+        self.conn = None
+
+    async def connect(self):
+        import aiomysql
+
+        self.conn = await aiomysql.connect(
+            host=self.host,
+            port=int(self.connection.get("port", 3306)),
+            user=self.connection.get("user"),
+            password=self.connection.get("password", ""),
+            db=self.connection.get("database"),
+            autocommit=True,
+            ssl=ssl_context(self.connection),
+            connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        )
+
+    async def execute(self, sql: str, args=None) -> int:
+        async with self.conn.cursor() as cur:
+            await cur.execute(sql, args)
+            rows = await cur.fetchall()
+            return len(rows) if rows else 0
+
+    async def begin(self):
+        await self.conn.begin()
+
+    async def commit(self):
+        await self.conn.commit()
+
+    async def rollback(self):
+        await self.conn.rollback()
+
+    @property
+    def closed(self) -> bool:
+        return self.conn is None or self.conn.closed
+
+    async def close(self):
+        if self.conn is not None and not self.conn.closed:
+            try:
+                await self.conn.ensure_closed()  # COM_QUIT, like a well behaved client
+            except Exception:
+                self.conn.close()
+
+
+class PgsqlSession:
+    def __init__(self, connection: dict, host: str):
+        self.connection = connection
+        self.host = host
+        self.conn = None
+
+    async def connect(self):
+        import asyncpg
+
+        self.conn = await asyncpg.connect(
+            host=self.host,
+            port=int(self.connection.get("port", 5432)),
+            user=self.connection.get("user"),
+            password=self.connection.get("password", ""),
+            database=self.connection.get("database"),
+            ssl=ssl_context(self.connection),
+            timeout=DEFAULT_CONNECT_TIMEOUT,
+        )
+
+    async def execute(self, sql: str, args=None) -> int:
+        rows = await self.conn.fetch(sql, *(args or []))
+        return len(rows)
+
+    async def begin(self):
+        await self.conn.execute("BEGIN")
+
+    async def commit(self):
+        await self.conn.execute("COMMIT")
+
+    async def rollback(self):
+        await self.conn.execute("ROLLBACK")
+
+    @property
+    def closed(self) -> bool:
+        return self.conn is None or self.conn.is_closed()
+
+    async def close(self):
+        if self.conn is not None:
+            await self.conn.close()
+
+
+SESSIONS = {"mysql": MysqlSession, "pgsql": PgsqlSession}
+
+
+def new_session(config: dict, n: int):
+    """Create session for n-th connection. Connections are spread across all hosts"""
+    dialect = config.get("dialect")
+    if dialect not in SESSIONS:
+        raise NativeEngineException(f"Dialect {dialect} is not supported")
+    connection = config.get("connection", {})
+    hosts = connection.get("hosts") or ["127.0.0.1"]
+    return SESSIONS[dialect](connection, hosts[n % len(hosts)])
+
+
+# ----------------------------------------------------------------------------
+# Statistics
+# ----------------------------------------------------------------------------
+
+
+class EngineStats:
+    """Statistics of a single process. Mergeable across processes and drivers"""
+
+    def __init__(self):
+        self.transactions = 0
+        self.queries = 0
+        self.errors = 0
+        self.histogram = LatencyHistogram()
+        self.transaction_histograms: Dict[str, LatencyHistogram] = {}
+        self.statement_histograms: Dict[str, LatencyHistogram] = {}
+        self.intervals: Dict[int, List[int]] = {}  # interval -> [transactions, errors]
+        self.error_messages: Dict[str, int] = {}
+        # Open-loop only: time spent waiting for a free connection and service time
+        self.queue_histogram = LatencyHistogram()
+        self.service_histogram = LatencyHistogram()
+        self.backlog = 0  # arrivals never started before the deadline
+        self.connects = 0
+        self.connect_errors = 0
+        self.connect_histogram = LatencyHistogram()
+
+    def record_transaction(self, name: str, latency: float, statements: list):
+        self.transactions += 1
+        self.queries += len(statements)
+        self.histogram.record(latency)
+        self.transaction_histograms.setdefault(name, LatencyHistogram()).record(latency)
+        for key, stmt_latency in statements:
+            self.statement_histograms.setdefault(key, LatencyHistogram()).record(
+                stmt_latency
+            )
+
+    def record_queueing(self, queue_delay: float, service_latency: float):
+        self.queue_histogram.record(queue_delay)
+        self.service_histogram.record(service_latency)
+
+    def record_connect(self, latency: float):
+        self.connects += 1
+        self.connect_histogram.record(latency)
+
+    def record_connect_error(self, err: Exception):
+        self.connect_errors += 1
+        self.record_error(err)
+
+    def record_error(self, err: Exception):
+        self.errors += 1
+        msg = f"{type(err).__name__}: {err}"[:200]
+        self.error_messages[msg] = self.error_messages.get(msg, 0) + 1
+
+    def tick(self, interval: int, ok: bool):
+        counters = self.intervals.setdefault(interval, [0, 0])
+        counters[0 if ok else 1] += 1
+
+    def merge(self, other: "EngineStats") -> "EngineStats":
+        self.transactions += other.transactions
+        self.queries += other.queries
+        self.errors += other.errors
+        self.backlog += other.backlog
+        self.connects += other.connects
+        self.connect_errors += other.connect_errors
+        self.histogram.merge(other.histogram)
+        self.connect_histogram.merge(other.connect_histogram)
+        self.queue_histogram.merge(other.queue_histogram)
+        self.service_histogram.merge(other.service_histogram)
+        for attr in ("transaction_histograms", "statement_histograms"):
+            mine = getattr(self, attr)
+            for k, h in getattr(other, attr).items():
+                mine.setdefault(k, LatencyHistogram()).merge(h)
+        for k, (c, e) in other.intervals.items():
+            counters = self.intervals.setdefault(k, [0, 0])
+            counters[0] += c
+            counters[1] += e
+        for msg, c in other.error_messages.items():
+            self.error_messages[msg] = self.error_messages.get(msg, 0) + c
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "transactions": self.transactions,
+            "queries": self.queries,
+            "errors": self.errors,
+            "backlog": self.backlog,
+            "connects": self.connects,
+            "connect_errors": self.connect_errors,
+            "histogram": self.histogram.to_dict(),
+            "connect_histogram": self.connect_histogram.to_dict(),
+            "queue_histogram": self.queue_histogram.to_dict(),
+            "service_histogram": self.service_histogram.to_dict(),
+            "transaction_histograms": {
+                k: h.to_dict() for k, h in self.transaction_histograms.items()
+            },
+            "statement_histograms": {
+                k: h.to_dict() for k, h in self.statement_histograms.items()
+            },
+            "intervals": {str(k): v for k, v in sorted(self.intervals.items())},
+            "error_messages": self.error_messages,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "EngineStats":
+        s = cls()
+        s.transactions = d.get("transactions", 0)
+        s.queries = d.get("queries", 0)
+        s.errors = d.get("errors", 0)
+        s.backlog = d.get("backlog", 0)
+        s.connects = d.get("connects", 0)
+        s.connect_errors = d.get("connect_errors", 0)
+        s.connect_histogram = LatencyHistogram.from_dict(d.get("connect_histogram", {}))
+        s.histogram = LatencyHistogram.from_dict(d.get("histogram", {}))
+        s.queue_histogram = LatencyHistogram.from_dict(d.get("queue_histogram", {}))
+        s.service_histogram = LatencyHistogram.from_dict(d.get("service_histogram", {}))
+        s.transaction_histograms = {
+            k: LatencyHistogram.from_dict(v)
+            for k, v in d.get("transaction_histograms", {}).items()
+        }
+        s.statement_histograms = {
+            k: LatencyHistogram.from_dict(v)
+            for k, v in d.get("statement_histograms", {}).items()
+        }
+        s.intervals = {int(k): list(v) for k, v in d.get("intervals", {}).items()}
+        s.error_messages = dict(d.get("error_messages", {}))
+        return s
+
+
+# ----------------------------------------------------------------------------
+# Load generation
+# ----------------------------------------------------------------------------
+
+
+async def run_transaction(session, trx: Transaction, params: dict) -> list:
+    """Run all statements of the transaction. Returns per-statement latencies (ms)"""
+    timings = []
+    if trx.trx:
+        await session.begin()
+    try:
+        for stmt in trx.statements:
+            s0 = time.perf_counter()
+            await session.execute(stmt.sql, stmt.args(params))
+            timings.append((stmt.key, (time.perf_counter() - s0) * 1000))
+        if trx.trx:
+            await session.commit()
+    except Exception:
+        if trx.trx and not session.closed:
+            try:
+                await session.rollback()
+            except Exception:
+                pass
+        raise
+    return timings
+
+
+async def timed_connect(session, stats: EngineStats, record: bool) -> float:
+    """Connect and record connection latency (ms) or connection error
+
+    Returns:
+        float: seconds spent connecting
+    """
+    c0 = time.monotonic()
+    try:
+        await session.connect()
+    except Exception as e:
+        if record:
+            stats.record_connect_error(e)
+        raise
+    connect_time = time.monotonic() - c0
+    if record:
+        stats.record_connect(connect_time * 1000)
+    return connect_time
+
+
+async def arrival_scheduler(
+    arrivals: asyncio.Queue,
+    rate: float,
+    arrival: str,
+    rnd: random.Random,
+    deadline: float,
+    workers: int,
+):
+    """Enqueue intended start times with the target rate (open-loop)
+
+    Intended start times do not depend on how fast the database responds, so latency
+    measured from them is not affected by coordinated omission.
+    """
+    next_start = time.monotonic()
+    while next_start < deadline:
+        now = time.monotonic()
+        if next_start > now:
+            await asyncio.sleep(next_start - now)
+            continue
+        while next_start <= now and next_start < deadline:  # catch up if we are late
+            arrivals.put_nowait(next_start)
+            next_start += rnd.expovariate(rate) if arrival == "poisson" else 1 / rate
+    for _ in range(workers):
+        arrivals.put_nowait(None)
+
+
+async def worker(
+    config: dict,
+    mix: TransactionMix,
+    stats: EngineStats,
+    n: int,
+    warmup_end: float,
+    deadline: float,
+    arrivals: Optional[asyncio.Queue] = None,
+):
+    rnd = random.Random(config.get("seed", 0) * 100003 + n)
+    interval = config.get("report_interval", DEFAULT_REPORT_INTERVAL)
+    per_transaction = config.get("connect_mode") == "per_transaction"
+    session = new_session(config, n)
+    if not per_transaction:
+        await timed_connect(session, stats, time.monotonic() >= warmup_end)
+    try:
+        while True:
+            if arrivals is None:  # closed-loop
+                intended = time.monotonic()
+                if intended >= deadline:
+                    break
+            else:
+                intended = await arrivals.get()
+                if intended is None:
+                    break
+                if time.monotonic() >= deadline:
+                    stats.backlog += 1
+                    continue
+            t0 = time.monotonic()
+            trx = mix.pick(rnd)
+            params = trx.params(rnd)
+            connect_time = 0.0
+            if per_transaction:
+                try:
+                    connect_time = await timed_connect(
+                        session, stats, intended >= warmup_end
+                    )
+                except Exception:
+                    if intended >= warmup_end:
+                        stats.tick(int((intended - warmup_end) // interval), ok=False)
+                    if arrivals is None:  # do not spin on a refusing server
+                        await asyncio.sleep(RECONNECT_DELAY)
+                    continue
+            try:
+                try:
+                    timings = await run_transaction(session, trx, params)
+                    end = time.monotonic()  # disconnect is not part of the latency
+                finally:
+                    if per_transaction:
+                        await session.close()
+            except Exception as e:
+                if intended >= warmup_end:
+                    stats.record_error(e)
+                    stats.tick(int((intended - warmup_end) // interval), ok=False)
+                if session.closed and not per_transaction:
+                    await asyncio.sleep(RECONNECT_DELAY)
+                    try:
+                        await timed_connect(session, stats, True)
+                    except Exception:
+                        pass  # recorded as connection error
+                continue
+            if intended >= warmup_end:
+                # Connection latency is recorded by timed_connect
+                latency = end - intended - connect_time
+                stats.record_transaction(trx.name, latency * 1000, timings)
+                if arrivals is not None:
+                    stats.record_queueing(
+                        (t0 - intended) * 1000, (end - t0 - connect_time) * 1000
+                    )
+                stats.tick(int((intended - warmup_end) // interval), ok=True)
+    finally:
+        await session.close()
+
+
+async def process_main(
+    config: dict,
+    first_worker: int,
+    workers: int,
+    warmup_end: float,
+    deadline: float,
+    rate: float = 0,
+    arrival: str = "uniform",
+) -> EngineStats:
+    mix = TransactionMix(config.get("transactions"), config.get("dialect"))
+    stats = EngineStats()
+    arrivals: Optional[asyncio.Queue] = asyncio.Queue() if rate > 0 else None
+    tasks = [
+        worker(config, mix, stats, first_worker + i, warmup_end, deadline, arrivals)
+        for i in range(workers)
+    ]
+    if arrivals is not None:
+        rnd = random.Random(config.get("seed", 0) * 100003 - first_worker)
+        tasks.append(arrival_scheduler(arrivals, rate, arrival, rnd, deadline, workers))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            stats.record_error(r)
+    return stats
+
+
+def process_entry(
+    config, first_worker, workers, warmup_end, deadline, rate, arrival, queue
+):
+    # monotonic clock is system wide on Linux so all processes share the same deadline
+    try:
+        stats = asyncio.run(
+            process_main(
+                config, first_worker, workers, warmup_end, deadline, rate, arrival
+            )
+        )
+        queue.put(stats.to_dict())
+    except Exception as e:
+        stats = EngineStats()
+        stats.record_error(e)
+        queue.put(stats.to_dict())
+
+
+def split_threads(threads: int, processes: int) -> List[int]:
+    """Split threads between processes as evenly as possible"""
+    processes = max(1, min(processes, threads))
+    base, remainder = divmod(threads, processes)
+    return [base + (1 if i < remainder else 0) for i in range(processes)]
+
+
+def run(
+    config: dict,
+    threads: int,
+    run_time: int,
+    warmup: int,
+    processes: int,
+    rate: float = 0,
+    arrival: str = "uniform",
+    start_at: float = 0,
+) -> dict:
+    """Run the workload and return merged results
+
+    Args:
+        rate (float): target arrival rate (trx/sec) for this driver. 0 means closed-loop
+        arrival (str): uniform or poisson inter-arrival times
+        start_at (float): epoch time to start at, shared by all drivers
+    """
+    split = split_threads(threads, processes or os.cpu_count() or 1)
+    if start_at > time.time():
+        time.sleep(start_at - time.time())
+    start = time.monotonic()
+    start_epoch = time.time()
+    warmup_end = start + warmup
+    deadline = start + run_time
+
+    queue = multiprocessing.Queue()
+    procs = []
+    first = 0
+    for workers in split:
+        process_rate = rate * workers / threads  # proportional to connections
+        p = multiprocessing.Process(
+            target=process_entry,
+            args=(
+                config,
+                first,
+                workers,
+                warmup_end,
+                deadline,
+                process_rate,
+                arrival,
+                queue,
+            ),
+        )
+        p.start()
+        procs.append(p)
+        first += workers
+
+    stats = EngineStats()
+    for _ in procs:
+        stats.merge(EngineStats.from_dict(queue.get()))
+    for p in procs:
+        p.join()
+
+    result = stats.to_dict()
+    result |= {
+        "threads": threads,
+        "processes": len(split),
+        "rate": rate,
+        "arrival": arrival,
+        "time": max(run_time - warmup, 0),
+        "warmup": warmup,
+        "start_time": start_epoch,
+        "end_time": time.time(),
+    }
+    return result
+
+
+# ----------------------------------------------------------------------------
+# Query log replay
+# ----------------------------------------------------------------------------
+
+
+async def replay_session(
+    config: dict,
+    session_doc: dict,
+    n: int,
+    stats: EngineStats,
+    start: float,
+    speed: float,
+    deadline: float,
+):
+    """Replay statements of one captured session on its own connection
+
+    Statements are started at their original offset divided by speed. A session is
+    sequential, so a slow statement delays the following ones; that delay is recorded
+    as queueing (lag behind the schedule).
+    """
+    interval = config.get("report_interval", DEFAULT_REPORT_INTERVAL)
+    session = new_session(config, n)
+    await session.connect()
+    try:
+        for offset, fp, sql, _ in session_doc.get("events", []):
+            scheduled = start + offset / speed
+            if scheduled >= deadline:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            t0 = time.monotonic()
+            try:
+                await session.execute(sql)
+            except Exception as e:
+                stats.record_error(e)
+                stats.tick(int((scheduled - start) // interval), ok=False)
+                if session.closed:
+                    await asyncio.sleep(RECONNECT_DELAY)
+                    try:
+                        await session.connect()
+                    except Exception as e:
+                        stats.record_error(e)
+                continue
+            latency = (time.monotonic() - t0) * 1000
+            stats.record_transaction("replay", latency, [(fp, latency)])
+            stats.record_queueing((t0 - scheduled) * 1000, latency)
+            stats.tick(int((scheduled - start) // interval), ok=True)
+    finally:
+        await session.close()
+
+
+async def replay_process_main(
+    config: dict,
+    sessions: List[Tuple[int, dict]],
+    start: float,
+    speed: float,
+    deadline: float,
+) -> EngineStats:
+    """Replay (connection number, session) pairs in one process"""
+    stats = EngineStats()
+    results = await asyncio.gather(
+        *[
+            replay_session(config, doc, n, stats, start, speed, deadline)
+            for n, doc in sessions
+        ],
+        return_exceptions=True,
+    )
+    for r in results:
+        if isinstance(r, Exception):
+            stats.record_error(r)
+    return stats
+
+
+def replay_process_entry(config, sessions, start, speed, deadline, queue):
+    try:
+        stats = asyncio.run(
+            replay_process_main(config, sessions, start, speed, deadline)
+        )
+        queue.put(stats.to_dict())
+    except Exception as e:
+        stats = EngineStats()
+        stats.record_error(e)
+        queue.put(stats.to_dict())
+
+
+def replay(
+    config: dict,
+    replay_doc: dict,
+    speed: float = 1,
+    processes: int = 0,
+    run_time: int = 0,
+    start_at: float = 0,
+) -> dict:
+    """Replay captured sessions and return merged results
+
+    Args:
+        replay_doc (dict): {start, sessions: [{id, events}]} from query_log.partition
+        speed (float): speed multiplier, 2 replays the log twice as fast
+        run_time (int): stop after run_time seconds. 0 means replay the whole log
+        start_at (float): epoch time to start at, shared by all drivers
+    """
+    if speed <= 0:
+        raise NativeEngineException(f"Replay speed has to be positive, got {speed}")
+    sessions = replay_doc.get("sessions", [])
+    log_duration = max(
+        (s["events"][-1][0] for s in sessions if s.get("events")), default=0
+    )
+    processes = max(1, min(processes or os.cpu_count() or 1, len(sessions) or 1))
+    if start_at > time.time():
+        time.sleep(start_at - time.time())
+    start = time.monotonic()
+    start_epoch = time.time()
+    deadline = start + run_time if run_time else float("inf")
+
+    numbered = list(enumerate(sessions))
+    queue = multiprocessing.Queue()
+    procs = []
+    for i in range(processes):
+        p = multiprocessing.Process(
+            target=replay_process_entry,
+            args=(config, numbered[i::processes], start, speed, deadline, queue),
+        )
+        p.start()
+        procs.append(p)
+
+    stats = EngineStats()
+    for _ in procs:
+        stats.merge(EngineStats.from_dict(queue.get()))
+    for p in procs:
+        p.join()
+
+    end_epoch = time.time()
+    result = stats.to_dict()
+    result |= {
+        "threads": len(sessions),
+        "processes": processes,
+        "speed": speed,
+        "log_duration": log_duration,
+        "time": end_epoch - start_epoch,
+        "warmup": 0,
+        "start_time": start_epoch,
+        "end_time": end_epoch,
+    }
+    return result
+
+
+async def run_steps(config: dict, steps: list):
+    """Run prepare/cleanup statements one by one on a single connection"""
+    session = new_session(config, 0)
+    await session.connect()
+    try:
+        for step in steps:
+            if isinstance(step, dict):
+                sql, repeat = step.get("sql"), step.get("repeat", 1)
+            else:
+                sql, repeat = step, 1
+            for _ in range(repeat):
+                await session.execute(sql)
+    finally:
+        await session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Native SQL load engine")
+    parser.add_argument("--config", required=True, help="Workload JSON config")
+    parser.add_argument(
+        "--step", default="run", choices=["prepare", "run", "cleanup", "replay"]
+    )
+    parser.add_argument("--threads", type=int, default=1, help="Total connections")
+    parser.add_argument("--time", type=int, default=60, help="Run time incl. warmup")
+    parser.add_argument("--warmup", type=int, default=0, help="Warmup time")
+    parser.add_argument(
+        "--processes", type=int, default=0, help="Processes. 0 means one per core"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0, help="Target trx/sec. 0 means closed-loop"
+    )
+    parser.add_argument("--arrival", default="uniform", choices=["uniform", "poisson"])
+    parser.add_argument(
+        "--start-at", type=float, default=0, help="Epoch time to start the run at"
+    )
+    parser.add_argument("--replay-file", help="Replay JSON document for this driver")
+    parser.add_argument(
+        "--speed", type=float, default=1, help="Replay speed multiplier"
+    )
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    if args.step == "run":
+        result = run(
+            config,
+            args.threads,
+            args.time,
+            args.warmup,
+            args.processes,
+            args.rate,
+            args.arrival,
+            args.start_at,
+        )
+        print(json.dumps(result))
+    elif args.step == "replay":
+        with open(args.replay_file) as f:
+            replay_doc = json.load(f)
+        result = replay(
+            config,
+            replay_doc,
+            args.speed,
+            args.processes,
+            args.time,
+            args.start_at,
+        )
+        print(json.dumps(result))
+    else:
+        steps = steps_for_dialect(config.get(args.step), config.get("dialect"))
+        asyncio.run(run_steps(config, steps))
+        print(json.dumps({"step": args.step, "statements": len(steps)}))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except NativeEngineException as e:
+        print(f"FATAL: {e}", file=sys.stderr)
+        sys.exit(1)
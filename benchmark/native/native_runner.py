@@ -0,0 +1,698 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+import json
+import os
+import time
+from typing import Dict, List
+
+import jinja2
+import pandas as pd
+
+from benchmark.abstract_benchmark import AbstractBenchmarkRunner
+from benchmark.checkpoint import Checkpoint
+from benchmark.driver_monitor import distribute_step, driver_capacities
+from benchmark.exceptions import BenchmarkException
+from benchmark.open_loop import (
+    get_rates,
+    save_print_latency_vs_load,
+    save_print_latency_vs_load_summary,
+)
+from benchmark.sysbench.sysbench_runner import RESULT_PRECISION, SYSBENCH_RESULT_FIELDS
+from benchmark.step_monitor import Step, StepMonitors
+from benchmark.sync_start import (
+    DEFAULT_MAX_CLOCK_SKEW_MS,
+    SYNC_START_DELAY,
+    check_clock_skew,
+    intervals_in_window,
+    overlap_window,
+    save_timeseries,
+)
+from common import traced_sleep
+from common.retry_decorator import backoff_with_jitter, retry
+from compute import MultiNode, Node, NodeException, PsshClientException
+from compute.exceptions import MultiNodeException
+
+from .native_engine import (
+    CONNECT_MODES,
+    EngineStats,
+    NativeEngineException,
+    TransactionMix,
+)
+
+DEFAULT_SLEEP_TIME = 30  # sleep time between threads
+EXTRA_TIMEOUT = 120  # Connect, fork and merge could take a while on a busy driver
+NATIVE_HOME = "$XBENCH_HOME/native"
+NATIVE_PYTHON = "python3.9"
+ENGINE_FILES = [
+    os.path.join(os.path.dirname(__file__), "native_engine.py"),
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "histogram.py"),
+]
+STATEMENT_RESULT_FIELDS = [
+    "concurrency",
+    "statement",
+    "count",
+    "avg_latency",
+    "p50_latency",
+    "p95_latency",
+    "p99_latency",
+    "max_latency",
+]
+CONNECTION_RESULT_FIELDS = [
+    "concurrency",
+    "rate",
+    "connects",
+    "connect_rate",
+    "avg_connect_latency",
+    "p50_connect_latency",
+    "p95_connect_latency",
+    "p99_connect_latency",
+    "max_connect_latency",
+    "connect_errors",
+    "connect_error_pct",
+]
+
+
+class NativeRunner(MultiNode, AbstractBenchmarkRunner):
+    """Run YAML defined transaction mixes with the native asyncio engine"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        """Native engine runner
+
+        Args:
+            nodes (List[Node]): list of drivers
+            kwargs: bt + workload conf. Check WorkloadRunning run method
+        """
+        MultiNode.__init__(self, nodes)
+
+        self.kwargs = kwargs
+        self.artifact_dir = kwargs.get(
+            "artifact_dir", None
+        )  # Artifact dir has been adjusted to include cluster_name and datetime
+        self.workload_name = kwargs.get("workload_name", None)
+        self.dialect = kwargs.get("dialect", "mysql")
+        self.backend = kwargs.get("backend")
+        self.percentile = kwargs.get("percentile", 95)
+        self.config_file_name = f"{self.workload_name}_native.json"
+        self.sync_start = kwargs.get("sync_start", False)
+        self.timeseries_rows: List[tuple] = []  # Only for synchronized start
+        self.driver_weights: List[float] = [1.0] * len(nodes)
+        self.step_monitors = StepMonitors(nodes, **kwargs)
+        self.connections = pd.DataFrame()  # Connection results of all repeats
+        self.checkpoint = Checkpoint(
+            self.artifact_dir, self.workload_name, kwargs.get("resume", False)
+        )
+
+    def render(self, value):
+        """Render jinja2 templates in workload definition using all workload params"""
+        if isinstance(value, str):
+            return jinja2.Template(value, undefined=jinja2.StrictUndefined).render(
+                **self.kwargs
+            )
+        if isinstance(value, list):
+            return [self.render(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.render(v) for k, v in value.items()}
+        return value
+
+    def get_connection_config(self) -> Dict:
+        ssl = self.kwargs.get("ssl", False)
+        ssl_ca = ssl.get("ssl_ca") if isinstance(ssl, dict) else None
+        # connect_hosts bypasses the proxy (or goes through another endpoint)
+        hosts = self.kwargs.get("connect_hosts") or self.kwargs.get("host", "")
+        return {
+            "hosts": hosts.split(",") if isinstance(hosts, str) else list(hosts),
+            "port": self.kwargs.get("port"),
+            "user": self.kwargs.get("user"),
+            "password": self.kwargs.get("password", ""),
+            "database": self.kwargs.get("database"),
+            "ssl": bool(ssl),
+            # cert file copied to certs directory before workload starts
+            "ssl_ca": (
+                f"$XBENCH_HOME/certs/{os.path.basename(ssl_ca)}" if ssl_ca else None
+            ),
+        }
+
+    def get_config_data(self) -> Dict:
+        connect_mode = self.kwargs.get("connect_mode", "persistent")
+        if connect_mode not in CONNECT_MODES:
+            raise BenchmarkException(
+                f"Unknown connect_mode {connect_mode}, expected one of {CONNECT_MODES}"
+            )
+        try:
+            config = {
+                "dialect": self.dialect,
+                "connect_mode": connect_mode,
+                "seed": self.kwargs.get("rand_seed", 0),
+                "report_interval": self.kwargs.get("report_interval", 10),
+                "connection": self.get_connection_config(),
+                "prepare": self.render(self.kwargs.get("prepare")),
+                "cleanup": self.render(self.kwargs.get("cleanup")),
+                "transactions": self.render(self.kwargs.get("transactions")),
+            }
+            TransactionMix(config.get("transactions"), self.dialect)  # Fail fast
+        except jinja2.exceptions.UndefinedError as e:
+            raise BenchmarkException(
+                f"There is a problem with native workload {self.workload_name}: {e}"
+            )
+        except NativeEngineException as e:
+            raise BenchmarkException(e)
+        return config
+
+    def setup(self):
+        """Ship engine and workload config to all drivers"""
+        local_file = f"/tmp/{self.config_file_name}"
+        with open(local_file, "w") as f:
+            json.dump(self.get_config_data(), f, indent=2)
+        try:
+            self.run_on_all_nodes(f"mkdir -p {NATIVE_HOME}", sudo=False)
+            for engine_file in ENGINE_FILES:
+                self.scp_to_all_nodes(
+                    engine_file, f"{NATIVE_HOME}/{os.path.basename(engine_file)}"
+                )
+            self.scp_to_all_nodes(local_file, f"{NATIVE_HOME}/{self.config_file_name}")
+        except MultiNodeException as e:
+            raise BenchmarkException(e)
+
+    def engine_command(self, step: str, **extra_args) -> str:
+        args = " ".join(f"--{k} {v}" for k, v in extra_args.items())
+        return (
+            f"{NATIVE_PYTHON} {NATIVE_HOME}/native_engine.py --config"
+            f" {NATIVE_HOME}/{self.config_file_name} --step {step} {args}"
+        )
+
+    def prepare(self):
+        """Run prepare statements on head driver"""
+        self.setup()
+        self.logger.info(f"Running prepare step for {self.workload_name}")
+        output = self.head_node._unsafe_run(self.engine_command("prepare"))
+        self.logger.debug(output)
+        if self.kwargs.get("post_data_load"):
+            self.backend.post_data_load(
+                database=self.kwargs.get("database")
+            )  # This uses the fact that workload.py pass it to runner class
+
+    def cleanup(self):
+        """Run cleanup statements on head driver"""
+        self.setup()
+        self.logger.info(f"Running cleanup step for {self.workload_name}")
+        output = self.head_node.run(self.engine_command("cleanup"))
+        self.logger.debug(output)
+
+    def data_check(self):
+        """Check row counts defined in data_check section of the workload"""
+        checks = self.kwargs.get("data_check")
+        if not checks:
+            self.logger.warn(
+                f"Data integrity check has not been defined for {self.workload_name}"
+            )
+            return
+
+        self.logger.info("Running Data integrity check")
+        self.backend.db_connect()
+        for table, desired_rows in self.render(checks).items():
+            row = self.backend.select_one_row(
+                f"select count(*) as row_num from {table}"
+            )
+            actual_rows = int(row.get("row_num"))
+            if actual_rows != int(desired_rows):
+                raise BenchmarkException(
+                    f"Integrity check failed for table {table}: Actual rows:"
+                    f" {actual_rows}, Desired rows: {desired_rows} "
+                )
+
+    def run(self):
+        success = True
+        threads = self.kwargs.get("threads")
+        repeats = self.kwargs.get("repeats")
+        rates = get_rates(self.kwargs)
+        if rates:  # Open-loop: fixed connection pool, step through arrival rates
+            steps = [(max(threads), rate) for rate in rates]
+            self.logger.info(f"Open-loop mode with rates {rates}")
+        else:
+            steps = [(t, 0) for t in threads]
+
+        all_results = pd.DataFrame()  # Contains all repeats
+        this_repeat_results: List[tuple] = []
+        r = 0
+        self.setup()
+        self.logger.info(f"Using {self.num_nodes} drivers to generate load")
+        try:
+            if self.sync_start:
+                check_clock_skew(
+                    self.pssh,
+                    self.kwargs.get("max_clock_skew_ms", DEFAULT_MAX_CLOCK_SKEW_MS),
+                )
+            if self.num_nodes > 1:
+                self.driver_weights = driver_capacities(
+                    self.pssh, self.kwargs.get("driver_weight", "nproc")
+                )
+                self.logger.info(f"Driver weights {self.driver_weights}")
+            for r in range(1, repeats + 1):
+                repeat_done = all(self.checkpoint.done(r, t, rate) for t, rate in steps)
+                if self.kwargs.get("pre_workload_run") and not repeat_done:
+                    self.backend.pre_workload_run()
+                this_repeat_results = []
+                self.timeseries_rows = []
+                for t, rate in steps:
+                    completed = self.checkpoint.get(r, t, rate)
+                    if completed is not None:
+                        self.logger.info(
+                            f"Skipping repeat {r}, thread: {t}, rate: {rate} (completed)"
+                        )
+                        this_repeat_results.append((t, completed["results"]))
+                        self.timeseries_rows.extend(map(tuple, completed["timeseries"]))
+                        continue
+                    traced_sleep(DEFAULT_SLEEP_TIME, "between steps")
+                    if self.kwargs.get("pre_thread_run"):
+                        self.backend.pre_thread_run()
+
+                    self.logger.info(f"Running repeat {r}, thread: {t}, rate: {rate}")
+                    step = Step(repeat=r, concurrency=t, rate=rate)
+                    timeseries_start = len(self.timeseries_rows)
+                    with self.step_monitors.running(step):
+                        stats = self.run_thread(t, r, rate)
+                    this_repeat_results.append((t, stats))
+                    self.checkpoint.save(
+                        r,
+                        t,
+                        rate,
+                        {
+                            "results": stats,
+                            "timeseries": self.timeseries_rows[timeseries_start:],
+                        },
+                    )
+
+                df = self.save_print_repeat(r, this_repeat_results, rates)
+                all_results = pd.concat([all_results, df])
+        except BenchmarkException as e:
+            self.logger.error(f"Benchmark failed with: {e}")
+            success = False
+            # Keep results of the steps completed in the failed repeat
+            if this_repeat_results:
+                df = self.save_print_repeat(r, this_repeat_results, rates)
+                all_results = pd.concat([all_results, df])
+        else:
+            self.logger.info("Benchmark completed successfully")
+        finally:
+            # Partial summary if benchmark failed
+            if not all_results.empty:
+                if rates:
+                    save_print_latency_vs_load_summary(
+                        all_results, self.artifact_dir, self.workload_name
+                    )
+                else:
+                    self.save_print_summary(df=all_results)
+                self.save_print_connection_summary()
+                self.logger.info(f"Raw output has saved to the {self.artifact_dir}")
+            if not success:
+                self.logger.error(
+                    f"Completed steps are saved in {self.checkpoint.file_name}, use"
+                    f" --resume {self.artifact_dir} to continue"
+                )
+                raise BenchmarkException("Benchmark failed")
+
+    def save_print_repeat(self, r: int, results: List[tuple], rates: List[int]):
+        """Save results and time series of one (possibly incomplete) repeat"""
+        if rates:
+            df = self.save_print_latency_vs_load(r, results)
+        else:
+            df = self.save_print_one_repeat(r, results)
+        self.save_print_connections(r, results)
+        save_timeseries(self.timeseries_rows, self.artifact_dir, self.workload_name, r)
+        return df
+
+    def save_print_connections(self, repeat: int, results: List[tuple]):
+        """Connection setup latency and rate of one repeat
+
+        Every transaction connects with connect_mode: per_transaction, otherwise only
+        initial connects after warmup and reconnects are here.
+
+        Args:
+            repeat (int): repeat number
+            results (List[tuple]): (concurrency, {hostname: engine results})
+        """
+        rows = []
+        for concurrency, host_results in results:
+            merged = EngineStats()
+            for result in host_results.values():
+                merged.merge(EngineStats.from_dict(result))
+            attempts = merged.connects + merged.connect_errors
+            if not attempts:
+                continue
+            h = merged.connect_histogram
+            rows.append(
+                (
+                    concurrency,
+                    sum(r.get("rate", 0) for r in host_results.values()),
+                    merged.connects,
+                    sum(
+                        r.get("connects", 0) / r.get("time")
+                        for r in host_results.values()
+                        if r.get("time")
+                    ),
+                    h.mean,
+                    h.percentile(50),
+                    h.percentile(95),
+                    h.percentile(99),
+                    h.max,
+                    merged.connect_errors,
+                    100.0 * merged.connect_errors / attempts,
+                )
+            )
+        if not rows:
+            return
+        df = pd.DataFrame.from_records(rows, columns=CONNECTION_RESULT_FIELDS)
+        df = df.round(RESULT_PRECISION)
+        self.logger.info(f"======= Connections ==========\n{df.to_string(index=False)}")
+        file_name = os.path.join(
+            self.artifact_dir, f"{self.workload_name}_connections_{repeat}.csv"
+        )
+        df.to_csv(file_name, index=False)
+        self.logger.info(f"Connection results for repeat {repeat} saved as {file_name}")
+        self.connections = pd.concat([self.connections, df])
+
+    def save_print_connection_summary(self):
+        """Connection results of all repeats and the accept-rate ceiling
+
+        The ceiling is the highest rate of established connections over the sweep.
+        Offered load above it only adds connection latency and errors.
+        """
+        if self.connections.empty:
+            return
+        df = (
+            self.connections.groupby(["concurrency", "rate"])
+            .agg(
+                {
+                    "connects": "sum",
+                    "connect_rate": "mean",
+                    "avg_connect_latency": "mean",
+                    "p50_connect_latency": "max",
+                    "p95_connect_latency": "max",
+                    "p99_connect_latency": "max",
+                    "max_connect_latency": "max",
+                    "connect_errors": "sum",
+                    "connect_error_pct": "mean",
+                }
+            )
+            .reset_index()
+            .round(RESULT_PRECISION)
+        )
+        file_name = os.path.join(
+            self.artifact_dir, f"{self.workload_name}_connections_summary.csv"
+        )
+        df.to_csv(file_name, index=False)
+        ceiling = df.loc[df["connect_rate"].idxmax()]
+        self.logger.info(
+            f"Accept-rate ceiling {ceiling['connect_rate']} connections/sec at"
+            f" concurrency {ceiling['concurrency']}, rate {ceiling['rate']}"
+            f" (p95 {ceiling['p95_connect_latency']} ms,"
+            f" {ceiling['connect_error_pct']}% errors)"
+        )
+        self.logger.info(f"Connection summary saved as {file_name}")
+
+    @retry(
+        (NodeException, PsshClientException, MultiNodeException, ValueError),
+        BenchmarkException,
+        max_delay=600,
+        delays=backoff_with_jitter(delay=3, attempts=3, cap=30),
+    )
+    def run_thread(self, t: int, r: int, rate: int = 0) -> Dict:
+        """Run engine on all drivers
+
+        Connections and rate are split between drivers in proportion to driver weights.
+
+        Args:
+            t (int): total number of connections
+            r (int): repeat attempt
+            rate (int): total target trx/sec. 0 means closed-loop
+
+        Returns:
+            Dict: hostname -> EngineStats as dict
+        """
+        # I need to clean driver(s) in case of re-try
+        self.pssh.run("pkill -9 -f [n]ative_engine.py || true", timeout=30)
+
+        run_time = self.kwargs.get("time", 0)
+        timeout = run_time + EXTRA_TIMEOUT
+        start_at = 0
+        if self.sync_start:
+            start_at = round(time.time() + SYNC_START_DELAY, 3)
+            timeout += SYNC_START_DELAY
+        # rate 0 is closed-loop in the engine, a driver runs only with a share of it
+        host_threads, host_rates = distribute_step(t, rate, self.driver_weights)
+        host_args = []
+        for host_t, host_rate in zip(host_threads, host_rates):
+            if host_t == 0:  # Not enough connections for all drivers
+                host_args.append({"cmd": "true"})
+                continue
+            cmd = self.engine_command(
+                "run",
+                threads=host_t,
+                time=run_time,
+                warmup=self.kwargs.get("warmup_time", 0),
+                processes=self.kwargs.get("processes", 0),
+                rate=host_rate,
+                arrival=self.kwargs.get("arrival", "uniform"),
+                **{"start-at": start_at},
+            )
+            self.logger.debug(f"Running {cmd} with timeout {timeout}")
+            host_args.append({"cmd": cmd})
+
+        thread_results = {}
+        all_hosts_output = self.pssh.run(
+            "%(cmd)s", timeout=timeout, host_args=host_args
+        )
+        for host_output, host_t in zip(all_hosts_output, host_threads):
+            if host_t == 0:
+                continue
+            hostname = host_output.get("hostname")
+            stdout = host_output.get("stdout", "")
+            file_name = os.path.join(
+                self.artifact_dir,
+                f"{hostname}_{self.workload_name}_{r}_{t}"
+                + (f"_{rate}rps.json" if rate else ".json"),
+            )
+            with open(file_name, "w") as f:
+                f.write(stdout)
+            thread_results[hostname] = json.loads(stdout.splitlines()[-1])
+        return thread_results
+
+    def merge_results(self, concurrency: int, host_results: Dict) -> tuple:
+        """Merge engine results from all drivers into sysbench compatible row
+
+        Returns:
+            tuple: result row and merged EngineStats
+        """
+        merged = EngineStats()
+        for result in host_results.values():
+            merged.merge(EngineStats.from_dict(result))
+        throughput = self.total_throughput(concurrency, host_results)
+        if merged.transactions == 0:
+            raise BenchmarkException(
+                f"No transactions completed for concurrency {concurrency}:"
+                f" {merged.error_messages}"
+            )
+        if merged.errors:
+            self.logger.warning(
+                f"{merged.errors} errors for concurrency {concurrency}:"
+                f" {merged.error_messages}"
+            )
+        row = (
+            concurrency,
+            throughput,
+            merged.histogram.mean,
+            merged.histogram.stddev,
+            merged.histogram.percentile(self.percentile),
+            merged.errors,
+        )
+        return row, merged
+
+    def total_throughput(self, concurrency: int, host_results: Dict) -> float:
+        """Sum of drivers throughput.
+
+        With synchronized start only intervals where all drivers were running are used
+
+        Args:
+            concurrency (int): total number of connections
+            host_results (Dict): hostname -> engine results
+        """
+        throughput = 0.0
+        for result in host_results.values():
+            if result.get("time"):
+                throughput += result.get("transactions", 0) / result.get("time")
+        if not self.sync_start:
+            return throughput
+
+        windows = [
+            (
+                result.get("start_time") + result.get("warmup", 0),
+                result.get("start_time") + result.get("warmup", 0) + result.get("time"),
+            )
+            for result in host_results.values()
+        ]
+        overlap = overlap_window(windows)
+        if overlap[0] is None:
+            self.logger.warning(
+                "Unable to find overlapping window for all drivers. Using full run"
+            )
+            return throughput
+        self.logger.info(
+            f"All drivers measured together for {overlap[1] - overlap[0]:.1f} sec"
+        )
+
+        report_interval = self.kwargs.get("report_interval", 10)
+        aligned = 0.0
+        for hostname, result in host_results.items():
+            start = result.get("start_time")
+            # (end of interval since start, transactions, errors)
+            intervals = [
+                (result.get("warmup", 0) + (int(k) + 1) * report_interval, c, e)
+                for k, (c, e) in result.get("intervals", {}).items()
+            ]
+            inside = intervals_in_window(intervals, start, report_interval, overlap)
+            for i in intervals:
+                self.timeseries_rows.append(
+                    (
+                        start + i[0],
+                        hostname,
+                        concurrency,
+                        i[1] / report_interval,
+                        float("nan"),
+                        float("nan"),
+                        i[2] / report_interval,
+                        i in inside,
+                    )
+                )
+            if inside:
+                aligned += sum(i[1] for i in inside) / (len(inside) * report_interval)
+            elif result.get("time"):
+                aligned += result.get("transactions", 0) / result.get("time")
+        return aligned
+
+    def save_print_latency_vs_load(
+        self, repeat: int, results: List[tuple]
+    ) -> pd.DataFrame:
+        """Open-loop: latency measured from intended start time vs offered load
+
+        Args:
+            repeat (int): repeat number
+            results (List[tuple]): (concurrency, {hostname: engine results})
+        """
+        rows = []
+        for concurrency, host_results in results:
+            row, merged = self.merge_results(concurrency, host_results)
+            throughput = row[1]
+            offered_rate = sum(r.get("rate", 0) for r in host_results.values())
+            if merged.backlog:
+                self.logger.warning(
+                    f"{merged.backlog} arrivals never started at rate {offered_rate}."
+                    " Offered load is above capacity"
+                )
+            rows.append(
+                (
+                    offered_rate,
+                    throughput,
+                    merged.histogram.mean,
+                    merged.histogram.percentile(95),
+                    merged.histogram.percentile(99),
+                    merged.service_histogram.percentile(95),
+                    merged.queue_histogram.mean,
+                    merged.queue_histogram.percentile(95),
+                    merged.errors,
+                )
+            )
+        return save_print_latency_vs_load(
+            rows, self.artifact_dir, self.workload_name, repeat
+        )
+
+    def save_print_one_repeat(self, repeat: int, results: List[tuple]) -> pd.DataFrame:
+        """Summarize, display and save results of one repeat
+
+        Args:
+            repeat (int): repeat number
+            results (List[tuple]): (concurrency, {hostname: engine results})
+        """
+        rows = []
+        statement_rows = []
+        histograms = {}
+        for concurrency, host_results in results:
+            row, merged = self.merge_results(concurrency, host_results)
+            rows.append(row)
+            histograms[concurrency] = {
+                "transactions": {
+                    k: h.to_dict() for k, h in merged.transaction_histograms.items()
+                },
+                "statements": {
+                    k: h.to_dict() for k, h in merged.statement_histograms.items()
+                },
+            }
+            for key, h in merged.statement_histograms.items():
+                statement_rows.append(
+                    (
+                        concurrency,
+                        key,
+                        h.total,
+                        h.mean,
+                        h.percentile(50),
+                        h.percentile(95),
+                        h.percentile(99),
+                        h.max,
+                    )
+                )
+
+        df_final = pd.DataFrame.from_records(rows, columns=SYSBENCH_RESULT_FIELDS)
+        df_final = df_final.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= Native results ==========\n{df_final.to_string(index=False)}"
+        )
+        file_name = os.path.join(
+            self.artifact_dir, f"{self.workload_name}_{repeat}.csv"
+        )
+        self.logger.info(f"Results for repeat {repeat} saved as {file_name}")
+        df_final.to_csv(file_name, index=False)
+
+        df_statements = pd.DataFrame.from_records(
+            statement_rows, columns=STATEMENT_RESULT_FIELDS
+        ).round(RESULT_PRECISION)
+        df_statements.to_csv(
+            os.path.join(
+                self.artifact_dir, f"{self.workload_name}_statements_{repeat}.csv"
+            ),
+            index=False,
+        )
+        with open(
+            os.path.join(
+                self.artifact_dir, f"{self.workload_name}_histograms_{repeat}.json"
+            ),
+            "w",
+        ) as f:
+            json.dump(histograms, f)
+
+        df_final["repeat"] = repeat
+        return df_final
+
+    def save_print_summary(self, df: pd.DataFrame):
+        """Print overall summary for all repeats
+
+        Args:
+            df (pd.DataFrame): raw results
+        """
+        df_summary = df.groupby(["concurrency"]).agg(
+            {
+                "throughput": ["mean"],
+                "avg_latency": ["mean"],
+                "stddev": ["max"],
+                "p95_latency": ["max"],
+                "errors": ["sum"],
+            }
+        )
+        df_summary.reset_index(inplace=True)
+        df_summary.columns = SYSBENCH_RESULT_FIELDS
+        df_summary = df_summary.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= Overall results ==========\n{df_summary.to_string(index=False)}"
+        )
+        file_name = os.path.join(self.artifact_dir, f"{self.workload_name}_summary.csv")
+        self.logger.info(f"Summary results saved as {file_name}")
+        df_summary.to_csv(file_name, index=False)
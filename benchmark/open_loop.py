@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Open-loop (fixed arrival rate) helpers shared by all runners.
+
+In open-loop mode workload.yaml has `rates: [...]` - total target arrival rates
+(transactions per second across all drivers). Runners keep the connection pool
+fixed and step through rates instead of threads.
+"""
+
+import logging
+import os
+from typing import List
+
+import pandas as pd
+
+RESULT_PRECISION = 2
+LATENCY_VS_LOAD_FIELDS = [
+    "offered_rate",
+    "throughput",
+    "avg_latency",
+    "p95_latency",
+    "p99_latency",
+    "service_p95_latency",
+    "avg_queue_delay",
+    "p95_queue_delay",
+    "errors",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def get_rates(kwargs: dict) -> List[int]:
+    """Return list of target rates or empty list for closed-loop mode"""
+    rates = kwargs.get("rates")
+    if not rates:
+        return []
+    return [rates] if isinstance(rates, (int, float)) else list(rates)
+
+
+def per_driver_rate(rate: float, num_drivers: int) -> int:
+    """Split total rate between drivers. Rate has to be at least 1 per driver"""
+    return max(1, int(round(rate / num_drivers)))
+
+
+def save_print_latency_vs_load(
+    rows: List[tuple], artifact_dir: str, workload_name: str, repeat: int
+) -> pd.DataFrame:
+    """Print and save latency vs offered load curve for one repeat
+
+    Args:
+        rows (List[tuple]): rows in LATENCY_VS_LOAD_FIELDS order
+        artifact_dir (str): artifact directory
+        workload_name (str): workload name
+        repeat (int): repeat number
+
+    Returns:
+        pd.DataFrame: curve with repeat column
+    """
+    df = pd.DataFrame.from_records(rows, columns=LATENCY_VS_LOAD_FIELDS)
+    df = df.astype(float).round(RESULT_PRECISION)
+    logger.info(f"======= Latency vs load ==========\n{df.to_string(index=False)}")
+    file_name = os.path.join(
+        artifact_dir, f"{workload_name}_latency_vs_load_{repeat}.csv"
+    )
+    df.to_csv(file_name, index=False)
+    logger.info(f"Latency vs load for repeat {repeat} saved as {file_name}")
+    df["repeat"] = repeat
+    return df
+
+
+def save_print_latency_vs_load_summary(
+    df: pd.DataFrame, artifact_dir: str, workload_name: str
+):
+    """Summarize latency vs load curve for all repeats
+
+    Args:
+        df (pd.DataFrame): all repeats
+        artifact_dir (str): artifact directory
+        workload_name (str): workload name
+    """
+    if df.empty:
+        return
+    df_summary = df.groupby(["offered_rate"]).agg(
+        {
+            "throughput": ["mean"],
+            "avg_latency": ["mean"],
+            "p95_latency": ["max"],
+            "p99_latency": ["max"],
+            "service_p95_latency": ["max"],
+            "avg_queue_delay": ["mean"],
+            "p95_queue_delay": ["max"],
+            "errors": ["sum"],
+        }
+    )
+    df_summary.reset_index(inplace=True)
+    df_summary.columns = LATENCY_VS_LOAD_FIELDS
+    df_summary = df_summary.round(RESULT_PRECISION)
+    logger.info(
+        f"======= Overall latency vs load ==========\n{df_summary.to_string(index=False)}"
+    )
+    file_name = os.path.join(artifact_dir, f"{workload_name}_latency_vs_load.csv")
+    df_summary.to_csv(file_name, index=False)
+    logger.info(f"Latency vs load summary saved as {file_name}")
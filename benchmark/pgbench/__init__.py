@@ -0,0 +1,2 @@
+from .pgbench import Pgbench
+from .pgbench_runner import PgbenchRunner
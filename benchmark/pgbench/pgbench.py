@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+import logging
+
+from compute import Node, NodeException
+from compute.yum import Yum
+
+from ..exceptions import BenchmarkException
+
+DEFAULT_COMMAND_TIMEOUT = 300
+# --partitions and client side data generation require pgbench 13+. Distribution
+# postgresql client is older, so PGDG packages are used
+PG_VERSION = 15
+PG_BIN_DIR = f"/usr/pgsql-{PG_VERSION}/bin"
+PGDG_REPO = (
+    "https://download.postgresql.org/pub/repos/yum/reporpms/"
+    "EL-$(rpm -E %{rhel})-x86_64/pgdg-redhat-repo-latest.noarch.rpm"
+)
+
+
+class Pgbench:
+    """Install pgbench from PGDG repository"""
+
+    def __init__(self, node: Node, **kwargs):
+        self.node = node
+        self.logger = logging.getLogger(__name__)
+        self.yum = Yum(os_type=self.node.vm.os_type)
+
+    def configure(self):
+        pass
+
+    def install(self):
+        try:
+            self.logger.debug("Installing pgbench...")
+            pm_i = self.yum.install_pkg_cmd()
+            cmd = f"""
+            {pm_i} {PGDG_REPO} || true
+            {pm_i} postgresql{PG_VERSION}
+            {PG_BIN_DIR}/pgbench --version
+            """
+            stdout = self.node.run(cmd, timeout=DEFAULT_COMMAND_TIMEOUT, sudo=True)
+            self.logger.debug(stdout)
+            self.logger.debug("pgbench successfully installed")
+        except NodeException as e:
+            raise BenchmarkException(e)
+
+    def clean(self):
+        output = self.node.run(
+            "pkill -9 -f [p]gbench || true", timeout=DEFAULT_COMMAND_TIMEOUT
+        )
+        self.logger.debug(output)
+        pm_r = self.yum.remove_pkg_cmd()
+        stdout = self.node.run(
+            f"{pm_r} postgresql{PG_VERSION}",
+            timeout=DEFAULT_COMMAND_TIMEOUT,
+            sudo=True,
+        )
+        self.logger.debug(stdout)
+        self.logger.debug("pgbench successfully uninstalled")
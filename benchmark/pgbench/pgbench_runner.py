@@ -0,0 +1,627 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from benchmark.abstract_benchmark import AbstractBenchmarkRunner
+from benchmark.checkpoint import Checkpoint
+from benchmark.driver_monitor import distribute, distribute_step, driver_capacities
+from benchmark.exceptions import BenchmarkException
+from benchmark.histogram import LatencyHistogram
+from benchmark.open_loop import (
+    get_rates,
+    save_print_latency_vs_load,
+    save_print_latency_vs_load_summary,
+)
+from benchmark.step_monitor import Step, StepMonitors
+from benchmark.sync_start import (
+    DEFAULT_MAX_CLOCK_SKEW_MS,
+    SYNC_START_DELAY,
+    check_clock_skew,
+    overlap_window,
+    parse_window,
+    save_timeseries,
+    synchronized_command,
+)
+from benchmark.sysbench.sysbench_runner import RESULT_PRECISION, SYSBENCH_RESULT_FIELDS
+from common import traced_sleep
+from common.common import clean_cmd
+from common.retry_decorator import backoff_with_jitter, retry
+from compute import MultiNode, Node, NodeException, PsshClientException
+from compute.exceptions import MultiNodeException
+
+from .exceptions import PgbenchException, PgbenchOutputParseException
+from .pgbench import PG_BIN_DIR
+
+DEFAULT_SLEEP_TIME = 30  # sleep time between clients
+DEFAULT_INIT_TIMEOUT = 24 * 3600
+EXTRA_TIMEOUT = 60
+ACCOUNTS_PER_SCALE = 100000  # pgbench_accounts rows per scale unit
+TELLERS_PER_SCALE = 10
+LOG_MARKER = "XBENCH_PGBENCH_LOG"
+LOG_PREFIX = "/tmp/xbench_pgbench"
+SCRIPT_FILE = "/tmp/xbench_pgbench.sql"
+
+PROGRESS_RE = re.compile(
+    r"^progress: (\d+\.\d+) s, (\d+\.\d+) tps, lat (\d+\.\d+) ms stddev"
+    r" (\d+\.\d+|NaN)(?:, (\d+) failed)?(?:, lag (\d+\.\d+) ms)?"
+)
+
+
+def parse_progress(stdout: str) -> List[tuple]:
+    """Parse --progress lines
+
+    Returns:
+        List[tuple]: seconds since start, tps, avg latency, stddev, failed, lag (ms)
+    """
+    intervals = []
+    for line in stdout.splitlines():
+        m = PROGRESS_RE.match(line)
+        if m:
+            intervals.append(
+                (
+                    float(m.group(1)),
+                    float(m.group(2)),
+                    float(m.group(3)),
+                    float(m.group(4)),
+                    int(m.group(5) or 0),
+                    float(m.group(6) or 0),
+                )
+            )
+    return intervals
+
+
+def parse_transaction_log(
+    lines: List[str], window: Tuple[float, float]
+) -> Tuple[LatencyHistogram, LatencyHistogram, LatencyHistogram, int, int]:
+    """Parse sampled per transaction log (--log --sampling-rate)
+
+    Line format is client_id transaction_no time script_no time_epoch time_us
+    [schedule_lag [retries]]. Time is latency in microseconds, or failed/skipped.
+    Only transactions finished inside the window are counted.
+
+    Returns:
+        tuple: latency, service time and schedule lag histograms (ms), transactions,
+            failed
+    """
+    histogram = LatencyHistogram()
+    service_histogram = LatencyHistogram()
+    lag_histogram = LatencyHistogram()
+    transactions = failed = 0
+    window_start, window_end = window
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 6 or not parts[4].isdigit():
+            continue
+        finished = int(parts[4]) + int(parts[5]) / 1e6
+        if not window_start <= finished <= window_end:
+            continue
+        if parts[2] == "failed":
+            failed += 1
+            continue
+        if parts[2] == "skipped":  # --latency-limit
+            continue
+        transactions += 1
+        # with --rate latency includes schedule lag
+        latency = int(parts[2]) / 1000
+        lag = int(parts[6]) / 1000 if len(parts) > 6 else 0
+        histogram.record(latency)
+        service_histogram.record(latency - lag)
+        lag_histogram.record(lag)
+    return histogram, service_histogram, lag_histogram, transactions, failed
+
+
+def split_output(stdout: str) -> Tuple[str, List[str]]:
+    """Split driver output into pgbench output and transaction log lines"""
+    output, _, log = stdout.partition(f"{LOG_MARKER}\n")
+    return output, log.splitlines()
+
+
+class PgbenchRunner(MultiNode, AbstractBenchmarkRunner):
+    """Run pgbench on driver(s)"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        """pgbench runner
+
+        Args:
+            nodes (List[Node]): list of drivers
+            kwargs: bt + workload conf. Check WorkloadRunning run method
+        """
+        MultiNode.__init__(self, nodes)
+        self.logger = logging.getLogger(__name__)
+        self.kwargs = kwargs
+        self.artifact_dir = kwargs.get(
+            "artifact_dir", None
+        )  # Artifact dir has been adjusted to include cluster_name and datetime
+        self.workload_name = kwargs.get("workload_name", None)
+        self.backend = kwargs.get("backend")
+        self.scale = kwargs.get("scale", 1)
+        self.sampling_rate = kwargs.get("log_sampling_rate", 0.01)
+        self.sync_start = kwargs.get("sync_start", False)
+        self.timeseries_rows: List[tuple] = []
+        self.driver_weights: List[float] = [1.0] * len(nodes)
+        self.step_monitors = StepMonitors(nodes, **kwargs)
+        self.checkpoint = Checkpoint(
+            self.artifact_dir, self.workload_name, kwargs.get("resume", False)
+        )
+
+    def pg_env(self, n: int = 0) -> str:
+        """libpq environment. Driver n connects to n-th host (round robin)"""
+        hosts = self.kwargs.get("host", "").split(",")
+        ssl = self.kwargs.get("ssl")
+        env = (
+            f"PGHOST={hosts[n % len(hosts)]} PGPORT={self.kwargs.get('port')}"
+            f" PGUSER={self.kwargs.get('user')}"
+            f" PGPASSWORD='{self.kwargs.get('password', '')}'"
+            f" PGDATABASE={self.kwargs.get('database')}"
+            f" PGSSLMODE={'require' if ssl else 'prefer'}"
+        )
+        ssl_ca = ssl.get("ssl_ca") if isinstance(ssl, dict) else None
+        if ssl_ca:
+            # cert file copied to certs directory before workload starts
+            env = f"{env} PGSSLROOTCERT=$XBENCH_HOME/certs/{os.path.basename(ssl_ca)}"
+        return env
+
+    def psql(self, sql: str, n: int = 0) -> str:
+        return f'{self.pg_env(n)} {PG_BIN_DIR}/psql -v ON_ERROR_STOP=1 -tA -c "{sql}"'
+
+    def init_command(self, steps: str) -> str:
+        """pgbench -i with initialization steps (d, t, g, G, v, p, f)"""
+        partitions = self.kwargs.get("partitions", 0)
+        partition_clause = (
+            f"--partitions={partitions} --partition-method="
+            f"{self.kwargs.get('partition_method', 'range')}"
+            if partitions
+            else ""
+        )
+        fillfactor = self.kwargs.get("fillfactor")
+        fillfactor_clause = f"--fillfactor={fillfactor}" if fillfactor else ""
+        return (
+            f"{self.pg_env()} {PG_BIN_DIR}/pgbench -i -I {steps} --scale={self.scale}"
+            f" {partition_clause} {fillfactor_clause}"
+        )
+
+    def prepare(self):
+        """Initialize pgbench tables
+
+        With init_parallel pgbench_accounts is generated on the drivers and loaded with
+        COPY by init_jobs sessions per driver. Otherwise pgbench -i generates all data
+        on the head driver (client side generation).
+        """
+        self.logger.info(f"Initializing pgbench tables with scale {self.scale}")
+        try:
+            if not self.kwargs.get("init_parallel", True):
+                self.head_node.run(
+                    self.init_command("dtgvp"), timeout=DEFAULT_INIT_TIMEOUT
+                )
+            else:
+                self.head_node.run(self.init_command("dt"), timeout=300)
+                branches = self.scale
+                tellers = self.scale * TELLERS_PER_SCALE
+                self.head_node.run(
+                    self.psql(
+                        "INSERT INTO pgbench_branches (bid, bbalance) SELECT g, 0 FROM"
+                        f" generate_series(1, {branches}) g; INSERT INTO"
+                        " pgbench_tellers (tid, bid, tbalance) SELECT g,"
+                        f" (g - 1) / {TELLERS_PER_SCALE} + 1, 0 FROM"
+                        f" generate_series(1, {tellers}) g"
+                    ),
+                    timeout=300,
+                )
+                self.load_accounts()
+                self.head_node.run(
+                    self.init_command("vp"), timeout=DEFAULT_INIT_TIMEOUT
+                )
+        except (NodeException, MultiNodeException) as e:
+            raise PgbenchException(e)
+        if self.kwargs.get("post_data_load"):
+            self.backend.post_data_load(database=self.kwargs.get("database"))
+
+    def load_accounts(self):
+        """Generate and COPY pgbench_accounts ranges from all drivers in parallel"""
+        accounts = self.scale * ACCOUNTS_PER_SCALE
+        jobs = self.kwargs.get("init_jobs", 4)
+        weights = (
+            driver_capacities(self.pssh, self.kwargs.get("driver_weight", "nproc"))
+            if self.num_nodes > 1
+            else [1.0]
+        )
+        host_rows = distribute(accounts, weights)
+        self.logger.info(
+            f"Loading {accounts} accounts with {jobs} jobs per driver: {host_rows}"
+        )
+        host_args = []
+        first = 1
+        for n, rows in enumerate(host_rows):
+            cmd = "pids=''\n"
+            for job_rows in distribute(rows, [1] * jobs):
+                if job_rows == 0:
+                    continue
+                job_first, job_last = first, first + job_rows - 1
+                first += job_rows
+                cmd += (
+                    f"awk 'BEGIN {{for (i = {job_first}; i <= {job_last}; i++)"
+                    f' printf "%d\\t%d\\t0\\t\\n", i, int((i - 1) /'
+                    f" {ACCOUNTS_PER_SCALE}) + 1}}' | {self.pg_env(n)}"
+                    f" {PG_BIN_DIR}/psql -v ON_ERROR_STOP=1 -c '\\copy"
+                    " pgbench_accounts (aid, bid, abalance, filler) from stdin' &\n"
+                    'pids="$pids $!"\n'
+                )
+            cmd += "for pid in $pids; do wait $pid || exit 1; done\n"
+            host_args.append({"cmd": cmd})
+        try:
+            self.pssh.run("%(cmd)s", timeout=DEFAULT_INIT_TIMEOUT, host_args=host_args)
+        except PsshClientException as e:
+            raise PgbenchException(e)
+
+    def data_check(self):
+        """Compare row counts with the scale"""
+        expected = {
+            "pgbench_branches": self.scale,
+            "pgbench_tellers": self.scale * TELLERS_PER_SCALE,
+            "pgbench_accounts": self.scale * ACCOUNTS_PER_SCALE,
+        }
+        for table, rows in expected.items():
+            try:
+                actual = int(
+                    self.head_node.run(self.psql(f"SELECT count(*) FROM {table}"))
+                    .strip()
+                    .splitlines()[-1]
+                )
+            except (NodeException, ValueError, IndexError) as e:
+                raise PgbenchException(f"Unable to check {table}: {e}")
+            if actual != rows:
+                raise PgbenchException(f"{table} has {actual} rows, expected {rows}")
+            self.logger.info(f"{table} has expected {rows} rows")
+
+    def cleanup(self):
+        try:
+            self.head_node.run(self.init_command("d"))
+        except NodeException as e:
+            raise PgbenchException(e)
+
+    def setup(self):
+        """Ship custom script to drivers"""
+        script = self.kwargs.get("script")
+        if not script:
+            return
+        local_file = f"/tmp/{self.workload_name}_pgbench.sql"
+        with open(local_file, "w") as f:
+            f.write(script)
+        try:
+            self.scp_to_all_nodes(local_file, SCRIPT_FILE)
+        except MultiNodeException as e:
+            raise PgbenchException(e)
+
+    def run_command(self, clients: int, n: int, rate: int = 0) -> str:
+        """pgbench command for driver n"""
+        jobs = max(1, min(clients, self.kwargs.get("jobs") or self.nodes[n].nproc))
+        script_clause = (
+            f"-f {SCRIPT_FILE}"
+            if self.kwargs.get("script")
+            else f"-b {self.kwargs.get('builtin', 'tpcb-like')}"
+        )
+        rate_clause = f"--rate={rate}" if rate else ""
+        run_time = self.kwargs.get("time", 300) + self.kwargs.get("warmup_time", 0)
+        return (
+            f"{self.pg_env(n)} {PG_BIN_DIR}/pgbench {script_clause}"
+            f" --client={clients} --jobs={jobs} --time={run_time} {rate_clause}"
+            f" --protocol={self.kwargs.get('protocol', 'prepared')}"
+            f" --progress={self.kwargs.get('report_interval', 10)}"
+            f" --scale={self.scale} --random-seed={self.kwargs.get('rand_seed', 0)}"
+            f" --log --sampling-rate={self.sampling_rate} --log-prefix={LOG_PREFIX}"
+            f" {self.kwargs.get('extra_args', '')}"
+        )
+
+    def run(self):
+        success = True
+        clients = self.kwargs.get("clients")
+        clients = [clients] if isinstance(clients, int) else clients
+        repeats = self.kwargs.get("repeats")
+        rates = get_rates(self.kwargs)
+        if rates:  # Open-loop: fixed number of clients, step through arrival rates
+            steps = [(max(clients), rate) for rate in rates]
+            self.logger.info(f"Open-loop mode with rates {rates}")
+        else:
+            steps = [(c, 0) for c in clients]
+
+        all_results = pd.DataFrame()  # Contains all repeats
+        this_repeat_results: List[tuple] = []
+        r = 0
+        self.setup()
+        self.logger.info(f"Using {self.num_nodes} drivers to generate load")
+        try:
+            if self.sync_start:
+                check_clock_skew(
+                    self.pssh,
+                    self.kwargs.get("max_clock_skew_ms", DEFAULT_MAX_CLOCK_SKEW_MS),
+                )
+            if self.num_nodes > 1:
+                self.driver_weights = driver_capacities(
+                    self.pssh, self.kwargs.get("driver_weight", "nproc")
+                )
+                self.logger.info(f"Driver weights {self.driver_weights}")
+            for r in range(1, repeats + 1):
+                repeat_done = all(self.checkpoint.done(r, c, rate) for c, rate in steps)
+                if self.kwargs.get("pre_workload_run") and not repeat_done:
+                    self.backend.pre_workload_run()
+                this_repeat_results = []
+                self.timeseries_rows = []
+                for c, rate in steps:
+                    completed = self.checkpoint.get(r, c, rate)
+                    if completed is not None:
+                        self.logger.info(
+                            f"Skipping repeat {r}, clients: {c} (completed)"
+                        )
+                        this_repeat_results.append(tuple(completed["results"]))
+                        self.timeseries_rows.extend(map(tuple, completed["timeseries"]))
+                        continue
+                    traced_sleep(DEFAULT_SLEEP_TIME, "between steps")
+                    if self.kwargs.get("pre_thread_run"):
+                        self.backend.pre_thread_run()
+
+                    self.logger.info(f"Running repeat {r}, clients: {c}, rate: {rate}")
+                    step = Step(repeat=r, concurrency=c, rate=rate)
+                    timeseries_start = len(self.timeseries_rows)
+                    with self.step_monitors.running(step):
+                        step_results = self.run_clients(c, r, rate)
+                    this_repeat_results.append(step_results)
+                    self.checkpoint.save(
+                        r,
+                        c,
+                        rate,
+                        {
+                            "results": step_results,
+                            "timeseries": self.timeseries_rows[timeseries_start:],
+                        },
+                    )
+
+                df = self.save_print_repeat(r, this_repeat_results, rates)
+                all_results = pd.concat([all_results, df])
+        except BenchmarkException as e:
+            self.logger.error(f"Benchmark failed with: {e}")
+            success = False
+            # Keep results of the steps completed in the failed repeat
+            if this_repeat_results:
+                df = self.save_print_repeat(r, this_repeat_results, rates)
+                all_results = pd.concat([all_results, df])
+        else:
+            self.logger.info("Benchmark completed successfully")
+        finally:
+            if not all_results.empty:
+                if rates:
+                    save_print_latency_vs_load_summary(
+                        all_results, self.artifact_dir, self.workload_name
+                    )
+                else:
+                    self.save_print_summary(df=all_results)
+                self.logger.info(f"Raw output has saved to the {self.artifact_dir}")
+            if not success:
+                self.logger.error(
+                    f"Completed steps are saved in {self.checkpoint.file_name}, use"
+                    f" --resume {self.artifact_dir} to continue"
+                )
+                raise BenchmarkException("Benchmark failed")
+
+    @retry(
+        (NodeException, PsshClientException, PgbenchOutputParseException),
+        BenchmarkException,
+        max_delay=600,
+        delays=backoff_with_jitter(delay=3, attempts=3, cap=30),
+    )
+    def run_clients(self, c: int, r: int, rate: int = 0) -> tuple:
+        """Run pgbench with c clients (total for all drivers)
+
+        Clients and rate are split between drivers in proportion to driver weights.
+
+        Returns:
+            tuple: closed-loop row in SYSBENCH_RESULT_FIELDS order or open-loop row in
+                LATENCY_VS_LOAD_FIELDS order
+        """
+        # I need to clean driver(s) in case of re-try
+        self.pssh.run("pkill -9 -f [p]gbench || true", timeout=30)
+
+        warmup = self.kwargs.get("warmup_time", 0)
+        timeout = self.kwargs.get("time", 300) + warmup + EXTRA_TIMEOUT
+        start_at = 0
+        if self.sync_start:
+            start_at = time.time() + SYNC_START_DELAY
+            timeout += SYNC_START_DELAY
+        # --rate=0 is not allowed, a driver runs only with a share of the rate
+        host_clients, host_rates = distribute_step(c, rate, self.driver_weights)
+        host_args = []
+        for n, (host_c, host_rate) in enumerate(zip(host_clients, host_rates)):
+            if host_c == 0:  # Not enough clients for all drivers
+                host_args.append({"cmd": "true"})
+                continue
+            cmd = synchronized_command(self.run_command(host_c, n, host_rate), start_at)
+            cmd = f"""
+            rm -f {LOG_PREFIX}.*
+            cd /tmp
+            {cmd}
+            echo {LOG_MARKER}
+            cat {LOG_PREFIX}.* 2>/dev/null
+            """
+            host_args.append({"cmd": clean_cmd(cmd)})
+        self.logger.debug(f"Running {host_args} with timeout {timeout}")
+
+        outputs = {}
+        for host_output, host_c in zip(
+            self.pssh.run("%(cmd)s", timeout=timeout, host_args=host_args),
+            host_clients,
+        ):
+            if host_c == 0:
+                continue
+            hostname = host_output.get("hostname")
+            stdout = host_output.get("stdout", "")
+            output, log_lines = split_output(stdout)
+            file_name = os.path.join(
+                self.artifact_dir,
+                f"{hostname}_{self.workload_name}_{r}_{c}"
+                + (f"_{rate}rps" if rate else ""),
+            )
+            with open(f"{file_name}.out", "w") as f:
+                f.write(output)
+            outputs[hostname] = (output, log_lines)
+
+        return self.merge_results(c, rate, r, outputs)
+
+    def merge_results(
+        self, c: int, rate: int, r: int, outputs: Dict[str, Tuple[str, List[str]]]
+    ) -> tuple:
+        """Aggregate sampled transaction logs of all drivers over measurement window
+
+        Measurement window excludes warmup. With sync_start it is the window where all
+        drivers were running.
+        """
+        warmup = self.kwargs.get("warmup_time", 0)
+        windows = {}
+        for hostname, (output, _) in outputs.items():
+            start, end = parse_window(output)
+            if start is None or end is None:
+                raise PgbenchOutputParseException(
+                    f"pgbench on {hostname} did not finish: {output[-1000:]}"
+                )
+            windows[hostname] = (start + warmup, end)
+        overlap: Tuple[Optional[float], Optional[float]] = (None, None)
+        if self.sync_start:
+            overlap = overlap_window(list(windows.values()))
+            if overlap[0] is None:
+                self.logger.warning(
+                    "Unable to find overlapping window for all drivers. Using full run"
+                )
+            else:
+                self.logger.info(
+                    f"All drivers measured together for {overlap[1] - overlap[0]:.1f}"
+                    " sec"
+                )
+
+        histogram = LatencyHistogram()
+        service_histogram = LatencyHistogram()
+        lag_histogram = LatencyHistogram()
+        throughput = errors = 0.0
+        for hostname, (output, log_lines) in outputs.items():
+            window = overlap if overlap[0] is not None else windows[hostname]
+            h, service, lag, transactions, failed = parse_transaction_log(
+                log_lines, window
+            )
+            duration = window[1] - window[0]
+            if transactions == 0 or duration <= 0:
+                raise PgbenchOutputParseException(
+                    f"No transactions logged by {hostname} in the measurement window"
+                )
+            histogram.merge(h)
+            service_histogram.merge(service)
+            lag_histogram.merge(lag)
+            throughput += transactions / self.sampling_rate / duration
+            errors += failed / self.sampling_rate
+            start = windows[hostname][0] - warmup
+            for i in parse_progress(output):
+                self.timeseries_rows.append(
+                    (
+                        start + i[0],
+                        hostname,
+                        c,
+                        i[1],
+                        float("nan"),  # pgbench has no queries per second
+                        i[2],  # progress reports average latency only
+                        i[4] / self.kwargs.get("report_interval", 10),
+                        window[0] <= start + i[0] <= window[1],
+                    )
+                )
+
+        with open(
+            os.path.join(
+                self.artifact_dir,
+                f"{self.workload_name}_histogram_{r}_{c}"
+                + (f"_{rate}rps.json" if rate else ".json"),
+            ),
+            "w",
+        ) as f:
+            json.dump(histogram.to_dict(), f)
+
+        if rate:
+            return (
+                rate,
+                throughput,
+                histogram.mean,
+                histogram.percentile(95),
+                histogram.percentile(99),
+                service_histogram.percentile(95),
+                lag_histogram.mean,
+                lag_histogram.percentile(95),
+                errors,
+            )
+        return (
+            c,
+            throughput,
+            histogram.mean,
+            histogram.stddev,
+            histogram.percentile(self.kwargs.get("percentile", 95)),
+            errors,
+        )
+
+    def save_print_repeat(self, r: int, results: List[tuple], rates: List[int]):
+        """Save results and time series of one (possibly incomplete) repeat"""
+        save_timeseries(self.timeseries_rows, self.artifact_dir, self.workload_name, r)
+        if rates:
+            return save_print_latency_vs_load(
+                results, self.artifact_dir, self.workload_name, r
+            )
+        return self.save_print_one_repeat(r, results)
+
+    def save_print_one_repeat(self, repeat: int, results: List[tuple]) -> pd.DataFrame:
+        """Display and save results of one repeat
+
+        Args:
+            repeat (int): repeat number
+            results (List[tuple]): rows in SYSBENCH_RESULT_FIELDS order
+        """
+        df_final = pd.DataFrame.from_records(results, columns=SYSBENCH_RESULT_FIELDS)
+        df_final = df_final.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= pgbench results ==========\n{df_final.to_string(index=False)}"
+        )
+        file_name = os.path.join(
+            self.artifact_dir, f"{self.workload_name}_{repeat}.csv"
+        )
+        self.logger.info(f"Results for repeat {repeat} saved as {file_name}")
+        df_final.to_csv(file_name, index=False)
+        df_final["repeat"] = repeat
+        return df_final
+
+    def save_print_summary(self, df: pd.DataFrame):
+        """Print overall summary for all repeats
+
+        Args:
+            df (pd.DataFrame): raw results
+        """
+        df_summary = df.groupby(["concurrency"]).agg(
+            {
+                "throughput": ["mean"],
+                "avg_latency": ["mean"],
+                "stddev": ["max"],
+                "p95_latency": ["max"],
+                "errors": ["sum"],
+            }
+        )
+        df_summary.reset_index(inplace=True)
+        df_summary.columns = SYSBENCH_RESULT_FIELDS
+        df_summary = df_summary.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= Overall results ==========\n{df_summary.to_string(index=False)}"
+        )
+        file_name = os.path.join(self.artifact_dir, f"{self.workload_name}_summary.csv")
+        self.logger.info(f"Summary results saved as {file_name}")
+        df_summary.to_csv(file_name, index=False)
+
+    def get_scale_string(self):
+        partitions = self.kwargs.get("partitions", 0)
+        return f"{self.scale}_p{partitions}" if partitions else str(self.scale)
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""CPU profiles and flame graphs of cluster members in the middle of chosen steps.
+
+The profile section of a workload enables ProfileMonitor:
+
+    profile:
+      steps: [256]           # concurrency (or rate) steps to profile
+      duration: 30           # seconds
+      frequency: 99          # samples per second
+      delay: 60              # seconds after the step start, default middle of the step
+      targets: [backend]     # backend and/or driver
+      members: [backend1_0]  # optional, all nodes of the targets by default
+      process: mariadbd      # backend process, default depends on the product
+      driver_process: java
+      driver_profiler: async-profiler  # perf, py-spy or async-profiler
+
+Stacks are folded on the member and rendered with FlameGraph there. Folded stacks and
+SVGs of every member are collected to profile/<member>_<repeat>_<concurrency>_<rate>.*
+in the artifact directory. save_diff_flamegraphs compares the same profiles of two runs.
+"""
+
+import logging
+import os
+import shutil
+import threading
+from collections import Counter
+from typing import List, Optional
+
+from compute import MultiNode, Node, ProcessExecutionException, RunSubprocess
+from compute.exceptions import MultiNodeException, PsshClientException
+
+from .exceptions import BenchmarkException
+from .step_monitor import Step, StepMonitor
+
+PROFILE_DIR = "profile"
+REMOTE_DIR = "/tmp/xbench_profile"
+FLAMEGRAPH_DIR = "/opt/FlameGraph"
+FLAMEGRAPH_REPO = "https://github.com/brendangregg/FlameGraph"
+ASYNC_PROFILER_DIR = "/opt/async-profiler"
+ASYNC_PROFILER_URL = "https://github.com/async-profiler/async-profiler/releases/download/v2.9/async-profiler-2.9-linux-x64.tar.gz"
+PROFILERS = ["perf", "py-spy", "async-profiler"]
+DEFAULT_DURATION = 30
+DEFAULT_FREQUENCY = 99
+PROFILE_TIMEOUT_MARGIN = 300  # seconds for installation, folding and rendering
+PRODUCT_PROCESSES = {
+    "xpand": "clxnode",
+    "mariadb": "mariadbd",
+    "mysql": "mysqld",
+    "postgres": "postgres",
+    "xgres": "postgres",
+    "tidb": "tidb-server",
+}
+
+
+def profile_command(
+    profiler: str,
+    process: str,
+    name: str,
+    title: str,
+    duration: int,
+    frequency: int,
+) -> str:
+    """Record, fold and render a profile of all processes named `process`
+
+    Leaves {REMOTE_DIR}/{name}.folded and {name}.svg
+    """
+    folded = f"{REMOTE_DIR}/{name}.folded"
+    if profiler == "perf":
+        record = f"""
+        command -v perf > /dev/null || yum install -y perf || apt-get install -y linux-tools-common linux-tools-$(uname -r)
+        perf record -F {frequency} -g -p $(pgrep -d, -x {process}) -o {REMOTE_DIR}/{name}.data -- sleep {duration}
+        perf script -i {REMOTE_DIR}/{name}.data | {FLAMEGRAPH_DIR}/stackcollapse-perf.pl > {folded}
+        rm -f {REMOTE_DIR}/{name}.data
+        """
+    elif profiler == "py-spy":
+        record = f"""
+        command -v py-spy > /dev/null || pip3 install py-spy
+        py-spy record --nonblocking -r {frequency} -d {duration} -p $(pgrep -n -f {process}) --format raw -o {folded}
+        """
+    else:
+        record = f"""
+        [ -d {ASYNC_PROFILER_DIR} ] || (mkdir -p {ASYNC_PROFILER_DIR} && curl -sL {ASYNC_PROFILER_URL} | tar xz --strip-components=1 -C {ASYNC_PROFILER_DIR})
+        {ASYNC_PROFILER_DIR}/profiler.sh -e cpu -i {10**9 // frequency} -d {duration} -o collapsed -f {folded} $(pgrep -n -x {process})
+        """
+    return f"""
+    set -e
+    mkdir -p {REMOTE_DIR}
+    [ -d {FLAMEGRAPH_DIR} ] || git clone --depth 1 {FLAMEGRAPH_REPO} {FLAMEGRAPH_DIR}
+    {record}
+    {FLAMEGRAPH_DIR}/flamegraph.pl --title "{title}" {folded} > {REMOTE_DIR}/{name}.svg
+    chmod a+r {REMOTE_DIR}/{name}.*
+    """
+
+
+def read_folded(file_name: str) -> Counter:
+    """Folded stacks: `frame;frame;frame count` per line"""
+    stacks = Counter()
+    with open(file_name) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
+
+
+def diff_folded(baseline: Counter, current: Counter) -> List[str]:
+    """Differential folded stacks `stack baseline current` for flamegraph.pl
+
+    The baseline is scaled to the same number of samples as the current profile, so
+    the colors show the change of the share of every stack (difffolded.pl -n)
+    """
+    total_baseline, total_current = sum(baseline.values()), sum(current.values())
+    scale = total_current / total_baseline if total_baseline else 1.0
+    return [
+        f"{stack} {round(baseline.get(stack, 0) * scale)} {current.get(stack, 0)}"
+        for stack in sorted(set(baseline) | set(current))
+    ]
+
+
+def save_diff_flamegraphs(baseline_dir: str, artifact_dir: str) -> List[str]:
+    """Differential flame graphs of profiles found in both runs
+
+    Saved to profile/diff/ of the artifact directory. SVGs are rendered if flamegraph.pl
+    is on the PATH, otherwise only the differential folded stacks are saved
+
+    Returns:
+        List[str]: differential folded files
+    """
+    logger = logging.getLogger(__name__)
+    baseline_profiles = os.path.join(baseline_dir, PROFILE_DIR)
+    current_profiles = os.path.join(artifact_dir, PROFILE_DIR)
+    if not os.path.isdir(baseline_profiles) or not os.path.isdir(current_profiles):
+        logger.warning("Both runs need profiles to compare")
+        return []
+    common = sorted(
+        set(f for f in os.listdir(baseline_profiles) if f.endswith(".folded"))
+        & set(f for f in os.listdir(current_profiles) if f.endswith(".folded"))
+    )
+    diff_dir = os.path.join(current_profiles, "diff")
+    os.makedirs(diff_dir, exist_ok=True)
+    flamegraph = shutil.which("flamegraph.pl")
+    saved = []
+    for name in common:
+        lines = diff_folded(
+            read_folded(os.path.join(baseline_profiles, name)),
+            read_folded(os.path.join(current_profiles, name)),
+        )
+        file_name = os.path.join(diff_dir, name)
+        with open(file_name, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        saved.append(file_name)
+        if flamegraph:
+            svg = file_name.replace(".folded", ".svg")
+            try:
+                RunSubprocess(
+                    cmd=f'{flamegraph} --title "{name} vs {baseline_dir}" {file_name} > {svg}',
+                    timeout=PROFILE_TIMEOUT_MARGIN,
+                ).run_as_shell()
+            except ProcessExecutionException as e:
+                logger.warning(f"Unable to render {svg}: {e}")
+    if saved and not flamegraph:
+        logger.info(
+            f"Render {diff_dir}/*.folded with flamegraph.pl from {FLAMEGRAPH_REPO}"
+        )
+    logger.info(f"{len(saved)} differential profile(s) saved in {diff_dir}")
+    return saved
+
+
+class ProfileMonitor(StepMonitor):
+    """Profile chosen members in the middle of the selected steps"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        StepMonitor.__init__(self, nodes, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.artifact_dir = kwargs.get("artifact_dir")
+        conf = kwargs.get("profile") or {}
+        self.steps = conf.get("steps") or []
+        self.duration = conf.get("duration", DEFAULT_DURATION)
+        self.frequency = conf.get("frequency", DEFAULT_FREQUENCY)
+        self.delay: Optional[float] = conf.get("delay")
+        if self.delay is None:  # middle of the step
+            self.delay = max(0, (kwargs.get("time", 0) - self.duration) / 2)
+
+        # Profile command of every member: (node, profiler, process)
+        self.targets = []
+        targets = conf.get("targets", ["backend"])
+        if "backend" in targets:
+            process = conf.get(
+                "process", PRODUCT_PROCESSES.get(str(kwargs.get("product")))
+            )
+            if process is None:
+                raise BenchmarkException(
+                    f"No process to profile for {kwargs.get('product')}, set process"
+                )
+            backend = kwargs.get("backend")
+            backend_nodes = getattr(backend, "nodes", None) or [
+                getattr(backend, "node", None)
+            ]
+            self.targets += [(n, "perf", process) for n in backend_nodes if n]
+        if "driver" in targets:
+            profiler = conf.get("driver_profiler", "async-profiler")
+            if profiler not in PROFILERS:
+                raise BenchmarkException(f"Unknown profiler {profiler}")
+            self.targets += [
+                (n, profiler, conf.get("driver_process", "java")) for n in nodes
+            ]
+        members = conf.get("members")
+        if members:
+            self.targets = [t for t in self.targets if t[0].vm.name in members]
+        if not self.targets:
+            raise BenchmarkException("No members to profile")
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _run(self, step: Step):
+        if self.stopped.wait(self.delay):
+            self.logger.warning("Step finished before profiling has started")
+            return
+        suffix = f"{step.repeat}_{step.concurrency}_{step.rate}"
+        host_args = [
+            {
+                "cmd": profile_command(
+                    profiler,
+                    process,
+                    f"{node.vm.name}_{suffix}",
+                    f"{node.vm.name} {process} concurrency {step.concurrency}",
+                    self.duration,
+                    self.frequency,
+                )
+            }
+            for node, profiler, process in self.targets
+        ]
+        local_dir = os.path.join(self.artifact_dir, PROFILE_DIR)
+        os.makedirs(local_dir, exist_ok=True)
+        try:
+            multi_node = MultiNode([t[0] for t in self.targets])
+            self.logger.info(
+                f"Profiling {len(self.targets)} member(s) for {self.duration} sec"
+            )
+            multi_node.run_on_all_nodes(
+                "%(cmd)s",
+                timeout=self.duration + PROFILE_TIMEOUT_MARGIN,
+                sudo=True,
+                host_args=host_args,
+            )
+            multi_node.pssh.receive_files(
+                f"{REMOTE_DIR}/*_{suffix}.*", f"{local_dir}/", False
+            )
+            multi_node.run_on_all_nodes(f"rm -rf {REMOTE_DIR}", sudo=True)
+            self.logger.info(f"Flame graphs saved in {local_dir}")
+        except (MultiNodeException, PsshClientException) as e:
+            self.logger.error(f"Profiling failed: {e}")
+
+    def start(self, step: Step):
+        if step.concurrency not in self.steps and step.rate not in self.steps:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self._run, args=(step,), name="profile", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, step: Step):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()  # profiles are collected before the next step
+        self.thread = None
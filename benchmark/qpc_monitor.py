@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Xpand query performance cache (QPC) per step.
+
+QPC is flushed on every node at the start of each step, so statements read at the end
+of the step belong to that concurrency only. Per statement latency, CPU and wait times
+of every step go to {workload}_qpc.csv, keyed by statement fingerprint (literals
+removed). Plans of all statements seen are in {workload}_qpc_explains.txt, EXPLAIN runs
+between steps, concurrently and once per fingerprint.
+"""
+
+import logging
+import os
+from typing import Dict, List
+
+import pandas as pd
+
+from compute import Node
+from compute.backend_product import BackendProduct
+from lib.db_stats import STATEMENT_CUTOFF, QpcAnalyzer
+from lib.db_stats.qpc import DEFAULT_EXPLAIN_WORKERS, DEFAULT_LIMIT
+from lib.mysql_client import MySqlClientException
+
+from .db_stats_monitor import connection_kwargs, monitored_hosts
+from .exceptions import BenchmarkException
+from .step_monitor import Step, StepMonitor
+
+RESULT_PRECISION = 2
+
+
+class QpcMonitor(StepMonitor):
+    """Top statements of the Xpand QPC attributed to every step"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        StepMonitor.__init__(self, nodes, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.artifact_dir = kwargs.get("artifact_dir")
+        self.workload_name = kwargs.get("workload_name")
+        if str(kwargs.get("product")) != BackendProduct.xpand:
+            raise BenchmarkException("QPC is available for Xpand only")
+        # QPC is per node, every node is flushed and read
+        hosts = monitored_hosts(kwargs, all_nodes=True)
+        try:
+            self.analyzer = QpcAnalyzer(
+                limit=kwargs.get("qpc_limit", DEFAULT_LIMIT),
+                explain_workers=kwargs.get(
+                    "qpc_explain_workers", DEFAULT_EXPLAIN_WORKERS
+                ),
+                host=",".join(hosts),
+                **connection_kwargs(kwargs),
+            )
+        except MySqlClientException as e:
+            raise BenchmarkException(f"Unable to connect to {hosts[0]}: {e}")
+        self.statements: Dict[str, str] = {}  # fingerprint -> statement, all steps
+
+    def start(self, step: Step):
+        try:
+            self.analyzer.flush()
+        except MySqlClientException as e:
+            raise BenchmarkException(f"Unable to flush QPC: {e}")
+
+    def stop(self, step: Step):
+        try:
+            statements = self.analyzer.statements()
+            self.analyzer.explain(statements)
+        except MySqlClientException as e:
+            self.logger.warning(f"Unable to read QPC: {e}")
+            return
+        if statements.empty:
+            self.logger.warning("No statements in QPC")
+            return
+        self.statements |= dict(zip(statements["fingerprint"], statements["statement"]))
+        df = statements.assign(
+            statement=statements["statement"].str.slice(0, STATEMENT_CUTOFF)
+        ).round(RESULT_PRECISION)
+        df.insert(0, "repeat", step.repeat)
+        df.insert(1, "concurrency", step.concurrency)
+        df.insert(2, "rate", step.rate)
+        self.logger.info(
+            f"======= QPC top statements ==========\n"
+            f"{df[['fingerprint', 'exec_count', 'avg_lat_ms', 'cpu_runtime_ms', 'lockman_waittime_ms']].to_string(index=False)}"
+        )
+        if self.artifact_dir:
+            file_name = os.path.join(self.artifact_dir, f"{self.workload_name}_qpc.csv")
+            df.to_csv(
+                file_name, mode="a", header=not os.path.exists(file_name), index=False
+            )
+            self.analyzer.save_explains(
+                os.path.join(
+                    self.artifact_dir, f"{self.workload_name}_qpc_explains.txt"
+                ),
+                pd.DataFrame(
+                    {
+                        "fingerprint": list(self.statements),
+                        "statement": list(self.statements.values()),
+                    }
+                ),
+            )
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Recovery of the throughput after an injected fault.
+
+Per driver time series ({workload}_timeseries_{repeat}.csv, absolute time) are summed
+into cluster wide throughput and error rate per report interval. For every fault:
+
+- baseline is the mean throughput over baseline_window seconds before the injection
+- time_to_detect is when the first interval after the injection is degraded: throughput
+  below (1 - dip_threshold) * baseline or errors
+- time_to_recover is when recovery_samples healthy intervals in a row start
+- dip_area is transactions lost against the baseline until recovery
+- errors is the number of errors until recovery
+
+Resolution of all times is the report interval of the workload.
+"""
+
+import fnmatch
+import logging
+import math
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+TIMESERIES_PATTERN = "*_timeseries_*.csv"
+RECOVERY_FILE = "chaos_recovery.csv"
+DEFAULT_REPORT_INTERVAL = 10
+DEFAULT_BASELINE_WINDOW = 60  # seconds before the fault
+DEFAULT_DIP_THRESHOLD = 0.2  # throughput drop considered as degradation
+DEFAULT_RECOVERY_SAMPLES = 3  # healthy intervals in a row to consider recovered
+RESULT_PRECISION = 2
+RECOVERY_FIELDS = [
+    "event",
+    "action",
+    "target",
+    "injected_at",
+    "baseline_throughput",
+    "min_throughput",
+    "time_to_detect",
+    "time_to_recover",
+    "dip_area",
+    "errors",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def load_timeseries(artifact_dir: str) -> pd.DataFrame:
+    """All time series files of the artifact directory in one data frame"""
+    frames = []
+    for file_name in sorted(
+        fnmatch.filter(os.listdir(artifact_dir), TIMESERIES_PATTERN)
+    ):
+        try:
+            frames.append(pd.read_csv(os.path.join(artifact_dir, file_name)))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read {file_name}: {e}")
+    if not frames:
+        return pd.DataFrame(columns=["time", "throughput", "errors"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def aggregate_timeseries(df: pd.DataFrame, interval: float) -> pd.DataFrame:
+    """Sum throughput and error rate of all drivers per interval
+
+    Drivers report at slightly different moments, so time is snapped to the interval
+    grid of the first sample.
+
+    Returns:
+        pd.DataFrame: time (end of the interval), throughput, errors. Sorted by time
+    """
+    if df.empty:
+        return pd.DataFrame(columns=["time", "throughput", "errors"])
+    origin = df["time"].min()
+    snapped = origin + np.round((df["time"] - origin) / interval) * interval
+    series = (
+        df.assign(time=snapped, errors=df["errors"].fillna(0))
+        .groupby("time", as_index=False)[["throughput", "errors"]]
+        .sum()
+    )
+    return series.sort_values("time").reset_index(drop=True)
+
+
+def recovery_metrics(
+    series: pd.DataFrame,
+    injected_at: float,
+    interval: float = DEFAULT_REPORT_INTERVAL,
+    baseline_window: float = DEFAULT_BASELINE_WINDOW,
+    dip_threshold: float = DEFAULT_DIP_THRESHOLD,
+    recovery_samples: int = DEFAULT_RECOVERY_SAMPLES,
+) -> Optional[Dict]:
+    """Detection, recovery and throughput dip of one fault
+
+    Args:
+        series (pd.DataFrame): output of aggregate_timeseries
+        injected_at (float): epoch of the fault injection
+
+    Returns:
+        Optional[Dict]: None if there are no samples before or after the injection.
+            Times are seconds since the injection, NaN if it never happened
+    """
+    before = series[
+        (series["time"] <= injected_at)
+        & (series["time"] > injected_at - baseline_window)
+    ]
+    after = series[series["time"] > injected_at].reset_index(drop=True)
+    if before.empty or after.empty:
+        return None
+    baseline = before["throughput"].mean()
+    degraded = (
+        (after["throughput"] < (1 - dip_threshold) * baseline) | (after["errors"] > 0)
+    ).tolist()
+
+    detected = next((i for i, d in enumerate(degraded) if d), None)
+    if detected is None:
+        return {
+            "baseline_throughput": baseline,
+            "min_throughput": after["throughput"].min(),
+            "time_to_detect": math.nan,
+            "time_to_recover": 0.0,
+            "dip_area": 0.0,
+            "errors": 0.0,
+        }
+    recovered = next(
+        (
+            i
+            for i in range(detected + 1, len(degraded) - recovery_samples + 1)
+            if not any(degraded[i : i + recovery_samples])
+        ),
+        None,
+    )
+    dip = after.iloc[: recovered if recovered is not None else len(after)]
+    return {
+        "baseline_throughput": baseline,
+        "min_throughput": dip["throughput"].min(),
+        "time_to_detect": after["time"][detected] - injected_at,
+        "time_to_recover": (
+            max(0.0, after["time"][recovered] - interval - injected_at)
+            if recovered is not None
+            else math.nan
+        ),
+        "dip_area": float((baseline - dip["throughput"]).clip(lower=0).sum())
+        * interval,
+        "errors": float(dip["errors"].sum()) * interval,
+    }
+
+
+def save_print_recovery(
+    artifact_dir: str,
+    faults: List[Dict],
+    interval: float = DEFAULT_REPORT_INTERVAL,
+    **kwargs,
+) -> pd.DataFrame:
+    """Recovery report of every injected fault saved as chaos_recovery.csv
+
+    Args:
+        artifact_dir (str): directory with time series
+        faults (List[Dict]): event, action, target and injected_at of every fault
+        kwargs: baseline_window, dip_threshold, recovery_samples
+    """
+    series = aggregate_timeseries(load_timeseries(artifact_dir), interval)
+    rows = []
+    for fault in faults:
+        metrics = recovery_metrics(series, fault["injected_at"], interval, **kwargs)
+        if metrics is None:
+            logger.warning(
+                f"No time series around {fault['event']}. Is sync_start enabled?"
+            )
+            continue
+        rows.append({k: fault[k] for k in RECOVERY_FIELDS if k in fault} | metrics)
+    df = pd.DataFrame(rows, columns=RECOVERY_FIELDS).round(RESULT_PRECISION)
+    if df.empty:
+        return df
+    logger.info(f"======= Fault recovery ==========\n{df.to_string(index=False)}")
+    file_name = os.path.join(artifact_dir, RECOVERY_FILE)
+    df.to_csv(file_name, index=False)
+    logger.info(f"Recovery report saved as {file_name}")
+    return df
@@ -0,0 +1 @@
+from .replay_runner import ReplayRunner
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+from ..exceptions import BenchmarkException
+
+
+class ReplayException(BenchmarkException):
+    """Query log replay exception has happened"""
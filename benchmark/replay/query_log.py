@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Query log parsers for replay.
+
+Supported formats:
+    general - MySQL/MariaDB general query log
+    slow    - MySQL/MariaDB slow query log (long_query_time=0 to capture everything)
+    pgsql   - PostgreSQL log with log_min_duration_statement=0 and
+              log_line_prefix='%m [%p] '
+    xpand   - Xpand query log (clx logdump query)
+
+All parsers return events sorted by start time. Statement latency from the log is kept
+when the format has it, so replay latency can be compared with the original one.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from lib.sql_fingerprint import fingerprint
+
+from .exceptions import ReplayException
+
+GENERAL_LINE_RE = re.compile(
+    r"^(?:(?P<ts>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?|\d{6}\s+\d{1,2}:\d{2}:\d{2})\s+|\t\t)"
+    r"\s*(?P<id>\d+)\s+(?P<command>\w+)\t?(?P<sql>.*)$"
+)
+SLOW_TIME_RE = re.compile(r"^# Time: (.+)$")
+SLOW_USER_RE = re.compile(r"^# (?:User@Host: .*?)?(?:Id|Thread_id):\s*(\d+)")
+SLOW_QUERY_TIME_RE = re.compile(r"^# Query_time: (\d+\.\d+)")
+SLOW_TIMESTAMP_RE = re.compile(r"^SET timestamp=(\d+);")
+PGSQL_LINE_RE = re.compile(
+    r"^(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)(?: \w+)? \[(?P<pid>\d+)\]"
+    r".*?duration: (?P<duration>\d+\.\d+) ms\s+(?:statement|execute [^:]*): (?P<sql>.*)$"
+)
+XPAND_LINE_RE = re.compile(
+    r"^(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?).*?SID:(?P<sid>\d+)"
+    r'.*?sql="(?P<sql>.*)" \[.*?\] time (?P<time>\d+(?:\.\d+)?)ms'
+)
+
+MARIADB_TS_RE = re.compile(r"^(\d{6})\s+(\d:)")
+TIMESTAMP_FORMATS = [
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%y%m%d %H:%M:%S",
+]
+
+REPLAYED_COMMANDS = {"Query", "Execute"}
+
+
+@dataclass
+class QueryEvent:
+    ts: float  # statement start, epoch seconds
+    session: str
+    sql: str
+    latency: Optional[float] = None  # ms, as recorded in the log
+
+
+def parse_timestamp(ts: str) -> float:
+    """Parse log timestamps to epoch seconds. Timestamps without zone are UTC"""
+    ts = ts.strip().rstrip("Z")
+    ts = MARIADB_TS_RE.sub(r"\1 0\2", ts)  # MariaDB pads hours with a space
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            dt = datetime.strptime(ts, fmt)
+            return dt.replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            continue
+    raise ReplayException(f"Unknown timestamp format {ts}")
+
+
+def parse_general_log(lines: Iterable[str]) -> List[QueryEvent]:
+    events: List[QueryEvent] = []
+    last_ts = None
+    current: Optional[QueryEvent] = None
+    for line in lines:
+        line = line.rstrip("\n")
+        m = GENERAL_LINE_RE.match(line)
+        if m is None:
+            if current is not None:  # multi-line statement
+                current.sql = f"{current.sql}\n{line}"
+            continue
+        if m.group("ts"):
+            last_ts = parse_timestamp(m.group("ts"))
+        current = None
+        if m.group("command") in REPLAYED_COMMANDS and last_ts is not None:
+            current = QueryEvent(last_ts, m.group("id"), m.group("sql"))
+            events.append(current)
+    return sort_events(events)
+
+
+def parse_slow_log(lines: Iterable[str]) -> List[QueryEvent]:
+    events: List[QueryEvent] = []
+    end_ts = session = query_time = None
+    sql_lines: List[str] = []
+
+    def flush():
+        if sql_lines and end_ts is not None:
+            events.append(
+                QueryEvent(
+                    end_ts - (query_time or 0),
+                    session or "0",
+                    "\n".join(sql_lines),
+                    query_time * 1000 if query_time is not None else None,
+                )
+            )
+        sql_lines.clear()
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("#"):
+            flush()
+            m = SLOW_TIME_RE.match(line)
+            if m:
+                end_ts = parse_timestamp(m.group(1))
+            m = SLOW_USER_RE.match(line)
+            if m:
+                session = m.group(1)
+            m = SLOW_QUERY_TIME_RE.match(line)
+            if m:
+                query_time = float(m.group(1))
+            continue
+        m = SLOW_TIMESTAMP_RE.match(line)
+        if m:
+            # MariaDB prints # Time only when it changes, so the statement start from
+            # SET timestamp wins unless # Time gives a start within the same second
+            start_ts = float(m.group(1))
+            if end_ts is None or not 0 <= end_ts - (query_time or 0) - start_ts < 1:
+                end_ts = start_ts + (query_time or 0)
+            continue
+        if line.lower().startswith("use ") or not line.strip():
+            continue
+        sql_lines.append(line)
+        if line.rstrip().endswith(";"):
+            flush()
+    flush()
+    return sort_events(events)
+
+
+def parse_pgsql_log(lines: Iterable[str]) -> List[QueryEvent]:
+    events: List[QueryEvent] = []
+    current: Optional[QueryEvent] = None
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("\t") and current is not None:
+            current.sql = f"{current.sql}\n{line.strip()}"
+            continue
+        current = None
+        m = PGSQL_LINE_RE.match(line)
+        if m:
+            duration = float(m.group("duration"))
+            current = QueryEvent(
+                parse_timestamp(m.group("ts")) - duration / 1000,
+                m.group("pid"),
+                m.group("sql"),
+                duration,
+            )
+            events.append(current)
+    return sort_events(events)
+
+
+def parse_xpand_log(lines: Iterable[str]) -> List[QueryEvent]:
+    events: List[QueryEvent] = []
+    for line in lines:
+        m = XPAND_LINE_RE.match(line)
+        if m:
+            duration = float(m.group("time"))
+            events.append(
+                QueryEvent(
+                    parse_timestamp(m.group("ts")) - duration / 1000,
+                    m.group("sid"),
+                    m.group("sql").replace('\\"', '"'),
+                    duration,
+                )
+            )
+    return sort_events(events)
+
+
+PARSERS = {
+    "general": parse_general_log,
+    "slow": parse_slow_log,
+    "pgsql": parse_pgsql_log,
+    "xpand": parse_xpand_log,
+}
+
+
+def parse_log(lines: Iterable[str], log_format: str) -> List[QueryEvent]:
+    if log_format not in PARSERS:
+        raise ReplayException(
+            f"Query log format {log_format} is not supported. Use one of {list(PARSERS)}"
+        )
+    events = PARSERS[log_format](lines)
+    if not events:
+        raise ReplayException(f"No statements found in the {log_format} query log")
+    return events
+
+
+def sort_events(events: List[QueryEvent]) -> List[QueryEvent]:
+    return sorted(events, key=lambda e: e.ts)
+
+
+def partition(events: List[QueryEvent], weights: List[float]) -> List[Dict]:
+    """Split sessions between drivers. A session never spans drivers
+
+    Busiest sessions are assigned first, each to the driver with the lowest load
+    relative to its weight.
+
+    Returns:
+        List[Dict]: per driver replay document {start, sessions: [{id, events}]}, where
+            every event is [offset from log start (sec), fingerprint, sql, latency]
+    """
+    start = events[0].ts
+    sessions: Dict[str, list] = {}
+    for e in events:
+        sessions.setdefault(e.session, []).append(
+            [round(e.ts - start, 6), fingerprint(e.sql), e.sql, e.latency]
+        )
+    drivers = [{"start": start, "sessions": []} for _ in weights]
+    loads = [0.0] * len(weights)
+    for sid, session_events in sorted(sessions.items(), key=lambda x: -len(x[1])):
+        i = min(
+            range(len(weights)),
+            key=lambda k: (loads[k] + len(session_events)) / max(weights[k], 1e-9),
+        )
+        drivers[i]["sessions"].append({"id": sid, "events": session_events})
+        loads[i] += len(session_events)
+    return drivers
+
+
+def original_latencies(events: List[QueryEvent]) -> Dict[str, List[float]]:
+    """fingerprint -> latencies recorded in the log (ms)"""
+    latencies: Dict[str, List[float]] = {}
+    for e in events:
+        if e.latency is not None:
+            latencies.setdefault(fingerprint(e.sql), []).append(e.latency)
+    return latencies
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+import json
+import math
+import os
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+from benchmark.driver_monitor import driver_capacities
+from benchmark.exceptions import BenchmarkException
+from benchmark.histogram import LatencyHistogram
+from benchmark.native.native_engine import EngineStats
+from benchmark.native.native_runner import EXTRA_TIMEOUT, NATIVE_HOME, NativeRunner
+from benchmark.step_monitor import Step
+from benchmark.sync_start import (
+    DEFAULT_MAX_CLOCK_SKEW_MS,
+    SYNC_START_DELAY,
+    check_clock_skew,
+)
+from benchmark.sysbench.sysbench_runner import RESULT_PRECISION
+from common import traced_sleep
+from common.retry_decorator import backoff_with_jitter, retry
+from compute import Node, NodeException, PsshClientException, SshClientException
+from compute.exceptions import MultiNodeException
+
+from .query_log import QueryEvent, original_latencies, parse_log, partition
+
+DEFAULT_SLEEP_TIME = 30  # sleep time between speeds
+DEFAULT_MAX_LAG = 60  # seconds a replay may run behind the log before it is stopped
+REPLAY_RESULT_FIELDS = [
+    "speed",
+    "statements",
+    "throughput",
+    "avg_latency",
+    "p95_latency",
+    "p99_latency",
+    "avg_lag",
+    "p95_lag",
+    "errors",
+]
+DIVERGENCE_FIELDS = [
+    "fingerprint",
+    "count",
+    "original_avg_latency",
+    "original_p95_latency",
+    "replay_avg_latency",
+    "replay_p95_latency",
+    "p95_ratio",
+]
+
+
+def divergence(
+    original: Dict[str, List[float]], replayed: Dict[str, LatencyHistogram]
+) -> pd.DataFrame:
+    """Latency divergence per statement fingerprint, worst first
+
+    Args:
+        original (Dict[str, List[float]]): fingerprint -> latencies from the log (ms)
+        replayed (Dict[str, LatencyHistogram]): fingerprint -> replay latencies
+    """
+    rows = []
+    for fp, h in replayed.items():
+        orig = LatencyHistogram()
+        for latency in original.get(fp, []):
+            orig.record(latency)
+        orig_p95 = orig.percentile(95) if orig.total else float("nan")
+        rows.append(
+            (
+                fp,
+                h.total,
+                orig.mean if orig.total else float("nan"),
+                orig_p95,
+                h.mean,
+                h.percentile(95),
+                (
+                    h.percentile(95) / orig_p95
+                    if orig.total and orig_p95
+                    else float("nan")
+                ),
+            )
+        )
+    df = pd.DataFrame.from_records(rows, columns=DIVERGENCE_FIELDS)
+    return df.sort_values("p95_ratio", ascending=False, na_position="last")
+
+
+class ReplayRunner(NativeRunner):
+    """Replay a captured query log from all drivers with original timing or faster"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        """Query log replay runner
+
+        Args:
+            nodes (List[Node]): list of drivers
+            kwargs: bt + workload conf. Check WorkloadRunning run method
+        """
+        NativeRunner.__init__(self, nodes, **kwargs)
+        self.query_log = kwargs.get("query_log")
+        self.log_format = kwargs.get("log_format", "general")
+        speeds = kwargs.get("speeds", 1)
+        self.speeds = speeds if isinstance(speeds, list) else [speeds]
+        self.replay_file_name = f"{self.workload_name}_replay.json"
+        self.original: Dict[str, List[float]] = {}
+        self.num_sessions = 0
+        self.log_duration = 0.0
+
+    def get_config_data(self) -> Dict:
+        return {
+            "dialect": self.dialect,
+            "seed": self.kwargs.get("rand_seed", 0),
+            "report_interval": self.kwargs.get("report_interval", 10),
+            "connection": self.get_connection_config(),
+        }
+
+    def load_events(self) -> List[QueryEvent]:
+        """Read the query log from a file or from the backend (query_log: backend)"""
+        if self.query_log == "backend":
+            self.logger.info("Capturing query log from the backend")
+            content = self.backend.get_logs()
+            if not content:
+                raise BenchmarkException(
+                    f"Backend {type(self.backend).__name__} does not provide query logs"
+                )
+            lines = content.splitlines()
+        else:
+            try:
+                with open(os.path.expandvars(self.query_log)) as f:
+                    lines = f.readlines()
+            except (OSError, TypeError) as e:
+                raise BenchmarkException(f"Unable to read query log: {e}")
+        events = parse_log(lines, self.log_format)
+        max_events = self.kwargs.get("max_events")
+        if max_events:
+            events = events[:max_events]
+        self.logger.info(
+            f"Loaded {len(events)} statements over"
+            f" {events[-1].ts - events[0].ts:.1f} sec from the query log"
+        )
+        return events
+
+    def setup(self):
+        """Ship engine, config and every driver's share of sessions"""
+        NativeRunner.setup(self)
+        events = self.load_events()
+        self.original = original_latencies(events)
+        self.log_duration = events[-1].ts - events[0].ts
+        weights = (
+            driver_capacities(self.pssh, self.kwargs.get("driver_weight", "nproc"))
+            if self.num_nodes > 1
+            else [1.0]
+        )
+        docs = partition(events, weights)
+        self.num_sessions = sum(len(doc["sessions"]) for doc in docs)
+        for node, doc in zip(self.nodes, docs):
+            local_file = f"/tmp/{node.vm.name}_{self.replay_file_name}"
+            with open(local_file, "w") as f:
+                json.dump(doc, f)
+            self.logger.info(
+                f"{len(doc['sessions'])} sessions will be replayed from {node.vm.name}"
+            )
+            try:
+                node.scp_file(local_file, f"{NATIVE_HOME}/{self.replay_file_name}")
+            except SshClientException as e:
+                raise BenchmarkException(e)
+
+    def prepare(self):
+        """Replay runs against the database captured with the log. Restore it first"""
+
+    def data_check(self):
+        """Replay runs against the database captured with the log. Restore it first"""
+
+    def run(self):
+        success = True
+        repeats = self.kwargs.get("repeats")
+        all_results = pd.DataFrame()  # Contains all repeats
+        this_repeat_results: List[tuple] = []
+        r = 0
+        self.setup()
+        self.logger.info(f"Using {self.num_nodes} drivers to replay the query log")
+        try:
+            if self.sync_start:
+                check_clock_skew(
+                    self.pssh,
+                    self.kwargs.get("max_clock_skew_ms", DEFAULT_MAX_CLOCK_SKEW_MS),
+                )
+            for r in range(1, repeats + 1):
+                repeat_done = all(
+                    self.checkpoint.done(r, f"{speed}x") for speed in self.speeds
+                )
+                if self.kwargs.get("pre_workload_run") and not repeat_done:
+                    self.backend.pre_workload_run()
+                this_repeat_results = []
+                for speed in self.speeds:
+                    completed = self.checkpoint.get(r, f"{speed}x")
+                    if completed is not None:
+                        self.logger.info(
+                            f"Skipping repeat {r}, speed: {speed}x (completed)"
+                        )
+                        this_repeat_results.append((speed, completed))
+                        continue
+                    traced_sleep(DEFAULT_SLEEP_TIME, "between steps")
+                    if self.kwargs.get("pre_thread_run"):
+                        self.backend.pre_thread_run()
+
+                    self.logger.info(f"Running repeat {r}, speed: {speed}x")
+                    step = Step(repeat=r, concurrency=self.num_sessions)
+                    with self.step_monitors.running(step):
+                        host_results = self.run_speed(speed, r)
+                    this_repeat_results.append((speed, host_results))
+                    self.checkpoint.save(r, f"{speed}x", 0, host_results)
+
+                df = self.save_print_one_repeat(r, this_repeat_results)
+                all_results = pd.concat([all_results, df])
+        except BenchmarkException as e:
+            self.logger.error(f"Benchmark failed with: {e}")
+            success = False
+            # Keep results of the speeds completed in the failed repeat
+            if this_repeat_results:
+                df = self.save_print_one_repeat(r, this_repeat_results)
+                all_results = pd.concat([all_results, df])
+        else:
+            self.logger.info("Benchmark completed successfully")
+        finally:
+            if not all_results.empty:
+                self.save_print_summary(df=all_results)
+                self.logger.info(f"Raw output has saved to the {self.artifact_dir}")
+            if not success:
+                self.logger.error(
+                    f"Completed speeds are saved in {self.checkpoint.file_name}, use"
+                    f" --resume {self.artifact_dir} to continue"
+                )
+                raise BenchmarkException("Benchmark failed")
+
+    @retry(
+        (NodeException, PsshClientException, MultiNodeException, ValueError),
+        BenchmarkException,
+        max_delay=600,
+        delays=backoff_with_jitter(delay=3, attempts=3, cap=30),
+    )
+    def run_speed(self, speed: float, r: int) -> Dict:
+        """Replay driver's sessions on all drivers
+
+        Args:
+            speed (float): speed multiplier
+            r (int): repeat attempt
+
+        Returns:
+            Dict: hostname -> EngineStats as dict
+        """
+        # I need to clean driver(s) in case of re-try
+        self.pssh.run("pkill -9 -f [n]ative_engine.py || true", timeout=30)
+
+        # Whole log unless time is set. Sessions lagging behind get max_lag to finish
+        run_time = self.kwargs.get("time") or math.ceil(
+            self.log_duration / speed + self.kwargs.get("max_lag", DEFAULT_MAX_LAG)
+        )
+        timeout = run_time + EXTRA_TIMEOUT
+        start_at = 0
+        if self.sync_start:
+            start_at = round(time.time() + SYNC_START_DELAY, 3)
+            timeout += SYNC_START_DELAY
+        cmd = self.engine_command(
+            "replay",
+            **{"replay-file": f"{NATIVE_HOME}/{self.replay_file_name}"},
+            speed=speed,
+            time=run_time,
+            processes=self.kwargs.get("processes", 0),
+            **{"start-at": start_at},
+        )
+        self.logger.debug(f"Running {cmd} with timeout {timeout}")
+
+        host_results = {}
+        for host_output in self.pssh.run(cmd, timeout=timeout):
+            hostname = host_output.get("hostname")
+            stdout = host_output.get("stdout", "")
+            file_name = os.path.join(
+                self.artifact_dir,
+                f"{hostname}_{self.workload_name}_{r}_{speed}x.json",
+            )
+            with open(file_name, "w") as f:
+                f.write(stdout)
+            host_results[hostname] = json.loads(stdout.splitlines()[-1])
+        return host_results
+
+    def save_print_one_repeat(self, repeat: int, results: List[tuple]) -> pd.DataFrame:
+        """Summarize, display and save results of one repeat
+
+        Args:
+            repeat (int): repeat number
+            results (List[tuple]): (speed, {hostname: engine results})
+        """
+        rows = []
+        for speed, host_results in results:
+            merged = EngineStats()
+            for result in host_results.values():
+                merged.merge(EngineStats.from_dict(result))
+            if merged.transactions == 0:
+                raise BenchmarkException(
+                    f"No statements replayed at speed {speed}x: {merged.error_messages}"
+                )
+            if merged.errors:
+                self.logger.warning(
+                    f"{merged.errors} errors at speed {speed}x: {merged.error_messages}"
+                )
+            duration = max(r.get("time", 0) for r in host_results.values())
+            rows.append(
+                (
+                    speed,
+                    merged.transactions,
+                    merged.transactions / duration if duration else 0,
+                    merged.histogram.mean,
+                    merged.histogram.percentile(95),
+                    merged.histogram.percentile(99),
+                    merged.queue_histogram.mean,
+                    merged.queue_histogram.percentile(95),
+                    merged.errors,
+                )
+            )
+
+            df_divergence = divergence(self.original, merged.statement_histograms)
+            df_divergence = df_divergence.round(RESULT_PRECISION)
+            self.logger.info(
+                f"======= Divergence at {speed}x (top 10) ==========\n"
+                f"{df_divergence.head(10).to_string(index=False)}"
+            )
+            df_divergence.to_csv(
+                os.path.join(
+                    self.artifact_dir,
+                    f"{self.workload_name}_divergence_{repeat}_{speed}x.csv",
+                ),
+                index=False,
+            )
+
+        df_final = pd.DataFrame.from_records(rows, columns=REPLAY_RESULT_FIELDS)
+        df_final = df_final.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= Replay results ==========\n{df_final.to_string(index=False)}"
+        )
+        file_name = os.path.join(
+            self.artifact_dir, f"{self.workload_name}_{repeat}.csv"
+        )
+        self.logger.info(f"Results for repeat {repeat} saved as {file_name}")
+        df_final.to_csv(file_name, index=False)
+        df_final["repeat"] = repeat
+        return df_final
+
+    def save_print_summary(self, df: pd.DataFrame):
+        """Print overall summary for all repeats
+
+        Args:
+            df (pd.DataFrame): raw results
+        """
+        if df.empty:
+            return
+        df_summary = df.groupby(["speed"]).agg(
+            {
+                "statements": ["mean"],
+                "throughput": ["mean"],
+                "avg_latency": ["mean"],
+                "p95_latency": ["max"],
+                "p99_latency": ["max"],
+                "avg_lag": ["mean"],
+                "p95_lag": ["max"],
+                "errors": ["sum"],
+            }
+        )
+        df_summary.reset_index(inplace=True)
+        df_summary.columns = REPLAY_RESULT_FIELDS
+        df_summary = df_summary.round(RESULT_PRECISION)
+        self.logger.info(
+            f"======= Overall results ==========\n{df_summary.to_string(index=False)}"
+        )
+        file_name = os.path.join(self.artifact_dir, f"{self.workload_name}_summary.csv")
+        self.logger.info(f"Summary results saved as {file_name}")
+        df_summary.to_csv(file_name, index=False)
+
+    def get_scale_string(self):
+        return self.kwargs.get("scale_string", "replay")
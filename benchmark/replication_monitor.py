@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Replica lag, apply rate and relay log growth during every step.
+
+Replicas are listed in `replicas` of the workload. Every replica is sampled from a side
+thread every replica_sample_interval seconds with XpandMonitor (type: xpand) or
+ReplicaMonitor (MariaDB/MySQL replication, ColumnStore). Per step and replica the
+monitor reports peak/average/final lag, sustained (median) apply throughput and relay
+log growth. A step fails if the peak lag is above replica_lag_slo or replication stopped.
+"""
+
+import logging
+import math
+import os
+import threading
+from typing import List
+
+import pandas as pd
+
+from compute import Node
+from lib.mysql_client import MySqlClientException
+from lib.xpand_monitor import ReplicaMonitor, XpandMonitor
+
+from .exceptions import BenchmarkException
+from .step_monitor import Step, StepMonitor
+
+DEFAULT_SAMPLE_INTERVAL = 5  # seconds
+RESULT_PRECISION = 2
+REPLICA_KLASSES = {
+    "mariadb": ReplicaMonitor,
+    "mysql": ReplicaMonitor,
+    "xpand": XpandMonitor,
+}
+SAMPLE_FIELDS = [
+    "time",
+    "repeat",
+    "concurrency",
+    "rate",
+    "replica",
+    "lag",
+    "applied_tps",
+    "relay_log_growth",
+    "last_error",
+]
+REPLICATION_RESULT_FIELDS = [
+    "repeat",
+    "concurrency",
+    "rate",
+    "replica",
+    "peak_lag",
+    "avg_lag",
+    "final_lag",
+    "apply_tps",
+    "peak_apply_tps",
+    "relay_log_growth",
+    "samples",
+    "stopped_samples",
+]
+
+
+def replication_summary(samples: pd.DataFrame) -> pd.DataFrame:
+    """One row per step and replica in REPLICATION_RESULT_FIELDS order
+
+    Args:
+        samples (pd.DataFrame): samples in SAMPLE_FIELDS order, lag is NaN when
+            replication is stopped
+    """
+    rows = []
+    keys = ["repeat", "concurrency", "rate", "replica"]
+    for key, df in samples.sort_values("time").groupby(keys, sort=False):
+        lag = df["lag"].dropna()
+        rows.append(
+            key
+            + (
+                lag.max() if not lag.empty else math.nan,
+                lag.mean() if not lag.empty else math.nan,
+                df["lag"].iloc[-1],
+                df["applied_tps"].median(),
+                df["applied_tps"].max(),
+                df["relay_log_growth"].mean(),
+                len(df),
+                int(df["lag"].isna().sum()),
+            )
+        )
+    return pd.DataFrame.from_records(rows, columns=REPLICATION_RESULT_FIELDS).round(
+        RESULT_PRECISION
+    )
+
+
+class ReplicationMonitor(StepMonitor):
+    """Sample every replica during each step and check the lag SLO"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        StepMonitor.__init__(self, nodes, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.artifact_dir = kwargs.get("artifact_dir")
+        self.workload_name = kwargs.get("workload_name")
+        self.interval = kwargs.get("replica_sample_interval", DEFAULT_SAMPLE_INTERVAL)
+        self.lag_slo = kwargs.get("replica_lag_slo")  # seconds, None - no check
+        self.action = kwargs.get("replica_lag_action", "fail")  # warn|fail
+        if not kwargs.get("replicas"):
+            raise BenchmarkException("No replicas to monitor")
+        self.replicas = []
+        for i, replica in enumerate(kwargs.get("replicas")):
+            klass = REPLICA_KLASSES.get(replica.get("type", "mariadb"))
+            if klass is None:
+                raise BenchmarkException(f"Unknown replica type {replica.get('type')}")
+            try:
+                self.replicas.append(
+                    klass(
+                        replica.get("name", f"replica{i + 1}"),
+                        host=replica.get("host"),
+                        port=replica.get("port", kwargs.get("port")),
+                        user=replica.get("user", kwargs.get("user")),
+                        password=replica.get("password", kwargs.get("password")),
+                    )
+                )
+            except MySqlClientException as e:
+                raise BenchmarkException(f"Unable to connect to replica: {e}")
+        self.samples: List[tuple] = []
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self, step: Step):
+        for replica in self.replicas:
+            try:
+                stats = replica.replication_stats()
+            except MySqlClientException as e:
+                self.logger.warning(f"Unable to sample {replica.name}: {e}")
+                continue
+            if not stats:  # first call only primes rates
+                continue
+            lag = stats.get("lag")
+            self.samples.append(
+                (
+                    stats["timestamp"],
+                    step.repeat,
+                    step.concurrency,
+                    step.rate,
+                    replica.name,
+                    float(lag) if lag is not None else math.nan,
+                    stats.get("applied_tps"),
+                    stats.get("relay_log_growth"),
+                    stats.get("last_error"),
+                )
+            )
+
+    def _run(self, step: Step):
+        while not self.stopped.wait(self.interval):
+            self.sample(step)
+
+    def start(self, step: Step):
+        self.samples = []
+        # Rates of the first sample span the pause between steps
+        for replica in self.replicas:
+            try:
+                replica.replication_stats()
+            except MySqlClientException as e:
+                raise BenchmarkException(f"Unable to sample {replica.name}: {e}")
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self._run, args=(step,), name="replication", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, step: Step):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.sample(step)  # lag right at the end of the step
+        samples = pd.DataFrame.from_records(self.samples, columns=SAMPLE_FIELDS)
+        if samples.empty:
+            self.logger.warning("No replication samples in the step")
+            return
+        df = replication_summary(samples)
+        self.logger.info(f"======= Replication ==========\n{df.to_string(index=False)}")
+        if self.artifact_dir:
+            for data, suffix in ((samples, "replication_samples"), (df, "replication")):
+                file_name = os.path.join(
+                    self.artifact_dir, f"{self.workload_name}_{suffix}.csv"
+                )
+                data.to_csv(
+                    file_name,
+                    mode="a",
+                    header=not os.path.exists(file_name),
+                    index=False,
+                )
+
+        violations = [
+            (
+                f"{row.replica} stopped replicating"
+                if row.stopped_samples
+                else f"{row.replica} peak lag {row.peak_lag} sec"
+            )
+            for row in df.itertuples()
+            if row.stopped_samples
+            or (self.lag_slo is not None and row.peak_lag > self.lag_slo)
+        ]
+        if violations:
+            msg = f"Replica lag SLO ({self.lag_slo} sec) violated: {', '.join(violations)}"
+            if self.action == "fail":
+                raise BenchmarkException(msg)
+            self.logger.warning(msg)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Universal Scalability Law fit for throughput vs concurrency summaries.
+
+X(N) = λN / (1 + σ(N - 1) + κN(N - 1)), where σ is contention (serialization) and
+κ is coherency (crosstalk) penalty. κ > 0 means throughput has a peak at
+N* = sqrt((1 - σ) / κ) and goes down after it.
+
+Every *_summary.csv with concurrency and throughput columns in the artifact directory
+gets a fit, a latency knee and recommended threads to sample next. Results are saved
+to scalability.yaml in the same directory.
+"""
+
+import fnmatch
+import logging
+import math
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from common import save_dict_as_yaml
+
+SCALABILITY_FILE = "scalability.yaml"
+SUMMARY_PATTERN = "*_summary.csv"
+# First one found in the summary is used for the latency knee
+LATENCY_COLUMNS = ["p95_latency", "p90_latency", "p99_latency", "avg_latency"]
+MIN_POINTS = 3  # three parameters to fit
+DEFAULT_RECOMMENDED_POINTS = 8
+SIGMA_GRID = np.linspace(0, 1, 101)
+KAPPA_GRID = np.concatenate(([0], np.logspace(-7, 0, 141)))
+REFINE_ITERATIONS = 4
+PRECISION = 6  # significant digits in scalability.yaml
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UslModel:
+    single_throughput: float  # λ, throughput of a single thread
+    sigma: float  # contention
+    kappa: float  # coherency
+    r2: float  # goodness of fit
+    peak_concurrency: Optional[float] = None  # None when throughput has no peak
+    peak_throughput: Optional[float] = None  # asymptote λ/σ when there is no peak
+
+    def throughput(self, n: float) -> float:
+        return (
+            self.single_throughput
+            * n
+            / (1 + self.sigma * (n - 1) + self.kappa * n * (n - 1))
+        )
+
+
+def _usl_shape(n: np.ndarray, sigma: np.ndarray, kappa: np.ndarray) -> np.ndarray:
+    """X(N) / λ"""
+    return n / (1 + sigma * (n - 1) + kappa * n * (n - 1))
+
+
+def _grid_search(n: np.ndarray, x: np.ndarray, sigmas: np.ndarray, kappas: np.ndarray):
+    """Best (sse, λ, σ, κ) on the grid. λ has closed form least squares for fixed σ, κ"""
+    f = _usl_shape(n[None, None, :], sigmas[:, None, None], kappas[None, :, None])
+    lam = (f * x).sum(axis=2) / (f * f).sum(axis=2)
+    sse = ((lam[:, :, None] * f - x) ** 2).sum(axis=2)
+    i, j = np.unravel_index(np.argmin(sse), sse.shape)
+    return sse[i, j], lam[i, j], sigmas[i], kappas[j]
+
+
+def fit_usl(concurrency: List[float], throughput: List[float]) -> Optional[UslModel]:
+    """Least squares USL fit
+
+    Coarse grid over σ in [0, 1] and log-spaced κ, then a few finer grids around the
+    best point. Deterministic and needs numpy only.
+
+    Returns:
+        Optional[UslModel]: None if there are less than MIN_POINTS measurements
+    """
+    points = sorted(
+        (float(c), float(x))
+        for c, x in zip(concurrency, throughput)
+        if c > 0 and x > 0 and math.isfinite(x)
+    )
+    if len({c for c, _ in points}) < MIN_POINTS:
+        return None
+    n = np.array([c for c, _ in points])
+    x = np.array([v for _, v in points])
+
+    sse, lam, sigma, kappa = _grid_search(n, x, SIGMA_GRID, KAPPA_GRID)
+    sigma_step = SIGMA_GRID[1] - SIGMA_GRID[0]
+    kappa_ratio = KAPPA_GRID[2] / KAPPA_GRID[1]
+    for _ in range(REFINE_ITERATIONS):
+        sigmas = np.clip(np.linspace(sigma - sigma_step, sigma + sigma_step, 21), 0, 1)
+        if kappa > 0:
+            kappas = np.geomspace(kappa / kappa_ratio, kappa * kappa_ratio, 21)
+        else:
+            kappas = np.concatenate(([0], np.linspace(0, KAPPA_GRID[1], 21)[1:]))
+        sse, lam, sigma, kappa = _grid_search(n, x, sigmas, kappas)
+        sigma_step /= 10
+        kappa_ratio = kappa_ratio**0.1
+
+    sst = ((x - x.mean()) ** 2).sum()
+    model = UslModel(
+        single_throughput=float(lam),
+        sigma=float(sigma),
+        kappa=float(kappa),
+        r2=float(1 - sse / sst) if sst > 0 else 1.0,
+    )
+    if kappa > 0:
+        model.peak_concurrency = math.sqrt((1 - sigma) / kappa)
+        model.peak_throughput = model.throughput(model.peak_concurrency)
+    elif sigma > 0:
+        model.peak_throughput = float(lam / sigma)
+    return model
+
+
+def latency_knee(concurrency: List[float], latency: List[float]) -> Optional[float]:
+    """Concurrency after which latency grows fastest (maximum distance from the chord)
+
+    Returns:
+        Optional[float]: None for less than MIN_POINTS points or a non convex curve
+    """
+    points = sorted(zip(map(float, concurrency), map(float, latency)))
+    if len(points) < MIN_POINTS:
+        return None
+    c = np.array([p[0] for p in points])
+    lat = np.array([p[1] for p in points])
+    if c[-1] == c[0] or lat.max() == lat.min():
+        return None
+    c_norm = (c - c[0]) / (c[-1] - c[0])
+    lat_norm = (lat - lat.min()) / (lat.max() - lat.min())
+    distance = c_norm - lat_norm
+    i = int(np.argmax(distance))
+    if distance[i] <= 0:
+        return None
+    return float(c[i])
+
+
+def recommend_threads(
+    model: UslModel, sampled: List[int], points: int = DEFAULT_RECOMMENDED_POINTS
+) -> List[int]:
+    """Geometric threads list that brackets predicted peak concurrency
+
+    Without a peak the range is extended to twice the maximum sampled concurrency.
+    """
+    low = max(1, min(sampled))
+    if model.peak_concurrency:
+        high = max(1.5 * model.peak_concurrency, low + 1)
+    else:
+        high = 2 * max(sampled)
+    threads = {int(round(v)) for v in np.geomspace(low, high, points)}
+    if model.peak_concurrency:
+        threads.add(max(1, int(round(model.peak_concurrency))))
+    return sorted(threads)
+
+
+def _round(value):
+    if isinstance(value, float):
+        return float(f"{value:.{PRECISION}g}")
+    return value
+
+
+def analyze_summary(df: pd.DataFrame) -> Optional[Dict]:
+    """Fit USL and find the latency knee for one summary
+
+    Returns:
+        Optional[Dict]: None when summary has no concurrency/throughput or too few points
+    """
+    if "concurrency" not in df.columns or "throughput" not in df.columns:
+        return None
+    model = fit_usl(df["concurrency"].tolist(), df["throughput"].tolist())
+    if model is None:
+        return None
+    result = asdict(model)
+    latency_column = next((c for c in LATENCY_COLUMNS if c in df.columns), None)
+    result["latency_metric"] = latency_column
+    result["latency_knee_concurrency"] = (
+        latency_knee(df["concurrency"].tolist(), df[latency_column].tolist())
+        if latency_column
+        else None
+    )
+    result["sampled_threads"] = [int(c) for c in sorted(df["concurrency"].unique())]
+    result["recommended_threads"] = recommend_threads(model, result["sampled_threads"])
+    return {k: _round(v) for k, v in result.items()}
+
+
+def save_print_scalability(artifact_dir: str) -> Dict[str, Dict]:
+    """Analyze every summary in the artifact directory and save scalability.yaml
+
+    Returns:
+        Dict[str, Dict]: summary name (without _summary.csv) -> analysis
+    """
+    results = {}
+    for file_name in sorted(fnmatch.filter(os.listdir(artifact_dir), SUMMARY_PATTERN)):
+        try:
+            df = pd.read_csv(os.path.join(artifact_dir, file_name))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read {file_name}: {e}")
+            continue
+        result = analyze_summary(df)
+        if result is None:
+            continue
+        results[file_name[: -len("_summary.csv")]] = result
+
+    if not results:
+        logger.info(f"No summary to fit scalability model in {artifact_dir}")
+        return results
+    df_results = pd.DataFrame.from_dict(results, orient="index")
+    logger.info(
+        "======= Scalability (USL) ==========\n"
+        f"{df_results.drop(columns=['sampled_threads']).to_string()}"
+    )
+    file_name = os.path.join(artifact_dir, SCALABILITY_FILE)
+    save_dict_as_yaml(file_name, results)
+    logger.info(f"Scalability analysis saved as {file_name}")
+    return results
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Hooks around every benchmark step (one repeat of one concurrency or rate).
+
+Runners wrap each step in StepMonitors.running(), which calls start()/stop() around it
+and abort() when the step raises. Every monitor listed in
+`step_monitors` in workload.yaml is instantiated as klass(drivers, **kwargs), the same
+way runners are. Step windows are appended to {workload}_steps.csv so any time series
+collected elsewhere can be joined with steps later.
+"""
+
+import csv
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
+from typing import List, Optional
+
+from common.common import get_class_from_klass
+from common.tracing import tracer
+from compute import Node
+
+from .exceptions import BenchmarkException
+
+PROFILE_MONITOR = "benchmark.ProfileMonitor"  # enabled by the profile section
+
+
+@dataclass
+class Step:
+    repeat: int
+    concurrency: int
+    rate: int = 0
+    start: Optional[float] = None  # epoch
+    end: Optional[float] = None  # epoch
+
+
+class StepMonitor:
+    """Base class for anything that has to be sampled during each step"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        self.nodes = nodes
+        self.kwargs = kwargs
+
+    def start(self, step: Step):
+        pass
+
+    def stop(self, step: Step):
+        """Raise BenchmarkException if the step has to be considered as failed"""
+        pass
+
+
+class StepMonitors:
+    """All monitors configured for the workload"""
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        self.logger = logging.getLogger(__name__)
+        self.artifact_dir = kwargs.get("artifact_dir")
+        self.workload_name = kwargs.get("workload_name")
+        self.monitors: List[StepMonitor] = []
+        self.span = None
+        klasses = list(kwargs.get("step_monitors") or [])
+        if kwargs.get("profile") and PROFILE_MONITOR not in klasses:
+            klasses.append(PROFILE_MONITOR)
+        for klass in klasses:
+            try:
+                self.monitors.append(get_class_from_klass(klass)(nodes, **kwargs))
+            except BenchmarkException as e:
+                self.logger.warning(f"Step monitor {klass} is disabled: {e}")
+
+    def start(self, step: Step):
+        # Span of the step includes the monitors, they run on the driver too
+        self.span = tracer.start_span(
+            "step", repeat=step.repeat, concurrency=step.concurrency, rate=step.rate
+        )
+        step.start = time.time()
+        for monitor in self.monitors:
+            try:
+                with tracer.span(f"{type(monitor).__name__}.start"):
+                    monitor.start(step)
+            except BenchmarkException as e:
+                self.logger.warning(f"Unable to start {type(monitor).__name__}: {e}")
+
+    def stop(self, step: Step):
+        step.end = time.time()
+        self.save_step(step)
+        failures = []
+        for monitor in self.monitors:
+            try:
+                with tracer.span(f"{type(monitor).__name__}.stop"):
+                    monitor.stop(step)
+            except BenchmarkException as e:
+                failures.append(f"{type(monitor).__name__}: {e}")
+        tracer.end_span(self.span, failed=bool(failures))
+        self.span = None
+        if failures:
+            raise BenchmarkException("; ".join(failures))
+
+    def abort(self, step: Step, error: BaseException):
+        """Stop monitors of a step that raised, their failures are only logged
+
+        Remote samplers and side threads of the monitors do not outlive the step
+        """
+        step.end = time.time()
+        for monitor in self.monitors:
+            try:
+                with tracer.span(f"{type(monitor).__name__}.stop"):
+                    monitor.stop(step)
+            except Exception as e:
+                self.logger.warning(f"Unable to stop {type(monitor).__name__}: {e}")
+        if self.span is not None:
+            self.span.attributes["error"] = f"{type(error).__name__}: {error}"
+        tracer.end_span(self.span, failed=True)
+        self.span = None
+
+    @contextmanager
+    def running(self, step: Step):
+        """Monitors around the step, stop() may still fail the step"""
+        self.start(step)
+        try:
+            yield step
+        except BaseException as e:
+            self.abort(step, e)
+            raise
+        self.stop(step)
+
+    def save_step(self, step: Step):
+        """Append step window to the steps file"""
+        if not self.artifact_dir:
+            return
+        file_name = os.path.join(self.artifact_dir, f"{self.workload_name}_steps.csv")
+        new_file = not os.path.exists(file_name)
+        with open(file_name, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[x.name for x in fields(Step)])
+            if new_file:
+                writer.writeheader()
+            writer.writerow(asdict(step))
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Synchronized start across drivers and time-aligned aggregation.
+
+PsshClient starts the command on all drivers concurrently, but every SSH session has
+its own setup latency. Instead of relying on that, every driver waits for a shared
+start timestamp in the near future and prints its absolute start and end time. Results
+are then aggregated over the window where all drivers were running.
+"""
+
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from compute import PsshClient, PsshClientException
+
+from .exceptions import BenchmarkException
+
+SYNC_START_DELAY = 15  # seconds. Has to be longer than SSH setup on all drivers
+DEFAULT_MAX_CLOCK_SKEW_MS = 50
+START_MARKER = "XBENCH_START"
+END_MARKER = "XBENCH_END"
+
+CHRONY_OFFSET_RE = re.compile(
+    r"^System time\s+:\s+(\d+\.\d+) seconds (fast|slow) of NTP time", re.MULTILINE
+)
+MARKER_RE = re.compile(rf"^({START_MARKER}|{END_MARKER}) (\d+\.\d+)", re.MULTILINE)
+SYSBENCH_INTERVAL_RE = re.compile(
+    r"^\[ (\d+)s \] thds: (\d+) tps: (\d+\.\d+) qps: (\d+\.\d+).*?"
+    r"lat \(ms,\d+%\): (\d+\.\d+) err/s: (\d+\.\d+)"
+)
+TIMESERIES_FIELDS = [
+    "time",
+    "driver",
+    "concurrency",
+    "throughput",
+    "queries",
+    "p95_latency",
+    "errors",
+    "in_window",
+]
+
+logger = logging.getLogger(__name__)
+
+
+def parse_chrony_offset(chrony_output: str) -> Optional[float]:
+    """Return offset of the system clock from NTP time in ms (positive means fast)"""
+    m = CHRONY_OFFSET_RE.search(chrony_output)
+    if m is None:
+        return None
+    offset = float(m.group(1)) * 1000
+    return offset if m.group(2) == "fast" else -offset
+
+
+def check_clock_skew(
+    pssh: PsshClient, max_skew_ms: float = DEFAULT_MAX_CLOCK_SKEW_MS
+) -> Dict[str, float]:
+    """Check that driver clocks are close enough to use a shared start timestamp
+
+    Args:
+        pssh (PsshClient): client for all drivers
+        max_skew_ms (float): maximum allowed difference between driver clocks
+
+    Raises:
+        BenchmarkException: skew is above max_skew_ms
+
+    Returns:
+        Dict[str, float]: hostname -> offset from NTP time in ms
+    """
+    try:
+        outputs = pssh.run("chronyc tracking", timeout=30, ignore_errors=True)
+    except PsshClientException as e:
+        logger.warning(f"Unable to check clock skew: {e}")
+        return {}
+
+    offsets = {}
+    for host_output in outputs:
+        offset = parse_chrony_offset(host_output.get("stdout", ""))
+        if offset is None:
+            logger.warning(
+                f"chrony is not tracking on {host_output.get('hostname')}. Unable to"
+                " check clock skew"
+            )
+            continue
+        offsets[host_output.get("hostname")] = offset
+
+    if len(offsets) > 1:
+        skew = max(offsets.values()) - min(offsets.values())
+        logger.info(f"Clock skew between drivers is {skew:.3f} ms")
+        if skew > max_skew_ms:
+            raise BenchmarkException(
+                f"Clock skew between drivers {skew:.3f} ms is above {max_skew_ms} ms:"
+                f" {offsets}"
+            )
+    return offsets
+
+
+def synchronized_command(cmd: str, start_at: float) -> str:
+    """Wrap command so it starts at start_at (epoch) and prints start/end markers"""
+    return f"""
+    sleep $(awk -v s={start_at:.3f} -v n=$(date +%s.%N) 'BEGIN{{d=s-n; print (d>0?d:0)}}')
+    echo "{START_MARKER} $(date +%s.%N)"
+    {cmd}
+    echo "{END_MARKER} $(date +%s.%N)"
+    """
+
+
+def parse_window(stdout: str) -> Tuple[Optional[float], Optional[float]]:
+    """Return absolute (start, end) of the command from markers"""
+    markers = {name: float(ts) for name, ts in MARKER_RE.findall(stdout)}
+    return markers.get(START_MARKER), markers.get(END_MARKER)
+
+
+def overlap_window(
+    windows: List[Tuple[Optional[float], Optional[float]]],
+) -> Tuple[Optional[float], Optional[float]]:
+    """Return window where all drivers were running or (None, None)"""
+    if not windows or any(s is None or e is None for s, e in windows):
+        return None, None
+    start = max(s for s, _ in windows)
+    end = min(e for _, e in windows)
+    return (start, end) if end > start else (None, None)
+
+
+def parse_sysbench_intervals(stdout: str) -> List[tuple]:
+    """Parse sysbench --report-interval lines
+
+    Returns:
+        List[tuple]: seconds since start, threads, tps, qps, percentile latency, err/s
+    """
+    intervals = []
+    for line in stdout.splitlines():
+        m = SYSBENCH_INTERVAL_RE.match(line)
+        if m:
+            intervals.append(
+                (
+                    int(m.group(1)),
+                    int(m.group(2)),
+                    float(m.group(3)),
+                    float(m.group(4)),
+                    float(m.group(5)),
+                    float(m.group(6)),
+                )
+            )
+    return intervals
+
+
+def intervals_in_window(
+    intervals: List[tuple], start: float, report_interval: int, window: tuple
+) -> List[tuple]:
+    """Keep only intervals fully inside the window
+
+    Args:
+        intervals (List[tuple]): first element is seconds since start (end of interval)
+        start (float): absolute start of the driver
+        report_interval (int): interval length in seconds
+        window (tuple): absolute (start, end)
+    """
+    window_start, window_end = window
+    return [
+        i
+        for i in intervals
+        if start + i[0] - report_interval >= window_start and start + i[0] <= window_end
+    ]
+
+
+def save_timeseries(
+    rows: List[tuple], artifact_dir: str, workload_name: str, repeat: int
+):
+    """Save per driver interval samples in absolute time
+
+    Args:
+        rows (List[tuple]): rows in TIMESERIES_FIELDS order
+    """
+    if not rows:
+        return
+    df = pd.DataFrame.from_records(rows, columns=TIMESERIES_FIELDS)
+    file_name = os.path.join(artifact_dir, f"{workload_name}_timeseries_{repeat}.csv")
+    df.to_csv(file_name, index=False)
+    logger.info(f"Time series for repeat {repeat} saved as {file_name}")
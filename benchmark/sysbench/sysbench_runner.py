@@ -4,14 +4,35 @@ import re
 import shutil
 import time
 from io import StringIO
-from typing import List
+from typing import Dict, List
 
 import jinja2
 import pandas as pd
 
 from benchmark.abstract_benchmark import AbstractBenchmarkRunner
+from benchmark.checkpoint import Checkpoint
+from benchmark.driver_monitor import distribute_step, driver_capacities
 from benchmark.exceptions import BenchmarkException
-from common.common import get_class_from_klass
+from benchmark.histogram import LatencyHistogram
+from benchmark.open_loop import (
+    get_rates,
+    save_print_latency_vs_load,
+    save_print_latency_vs_load_summary,
+)
+from benchmark.step_monitor import Step, StepMonitors
+from benchmark.sync_start import (
+    DEFAULT_MAX_CLOCK_SKEW_MS,
+    SYNC_START_DELAY,
+    check_clock_skew,
+    intervals_in_window,
+    overlap_window,
+    parse_sysbench_intervals,
+    parse_window,
+    save_timeseries,
+    synchronized_command,
+)
+from common import traced_sleep
+from common.common import clean_cmd, get_class_from_klass
 from common.retry_decorator import backoff_with_jitter, retry
 from compute import Node, NodeException, PsshClient, SshClientTimeoutException
 from lib import XbenchConfig
@@ -36,6 +57,9 @@ SYSBENCH_RESULT_FIELDS = [
     "errors",
 ]
 
+HISTOGRAM_LINE_RE = re.compile(r"^\s*(\d+\.\d+)\s+\|\**\s+(\d+)\s*$")
+QUEUE_LINE_RE = re.compile(r"^\[ \d+s \] queue length: (\d+), concurrency: (\d+)")
+
 ERROR_PCT = 5  # Maximum % difference between expected rows and actual rows
 
 tpcc_scale_factors = {
@@ -71,6 +95,13 @@ class SysbenchRunner(AbstractBenchmarkRunner):
         }
         self.pssh = PsshClient(**pssh_config)
         self.backend = kwargs.get("backend")
+        self.sync_start = kwargs.get("sync_start", False)
+        self.timeseries_rows: List[tuple] = []  # Only for synchronized start
+        self.driver_weights: List[float] = [1.0] * len(nodes)
+        self.step_monitors = StepMonitors(nodes, **kwargs)
+        self.checkpoint = Checkpoint(
+            self.artifact_dir, self.workload_name, kwargs.get("resume", False)
+        )
 
     @property
     def head_node(self):
@@ -187,8 +218,16 @@ class SysbenchRunner(AbstractBenchmarkRunner):
         success = True
         threads = self.kwargs.get("threads")
         repeats = self.kwargs.get("repeats")
+        rates = get_rates(self.kwargs)
+        if rates:  # Open-loop: fixed number of threads, step through arrival rates
+            steps = [(max(threads), rate) for rate in rates]
+            self.logger.info(f"Open-loop mode with rates {rates}")
+        else:
+            steps = [(t, 0) for t in threads]
 
         all_results = pd.DataFrame()  # Contains all repeats
+        this_repeat_results: List[tuple] = []
+        r = 0
         num_drivers = len(self.nodes)
         # For the sole logging purpose only
         run_command = self.evaluate_command("run", **{"t": "$t"})
@@ -196,47 +235,141 @@ class SysbenchRunner(AbstractBenchmarkRunner):
 
         self.logger.info(f"Using {num_drivers} drivers to generate load")
         try:
+            if self.sync_start:
+                check_clock_skew(
+                    self.pssh,
+                    self.kwargs.get("max_clock_skew_ms", DEFAULT_MAX_CLOCK_SKEW_MS),
+                )
+            if num_drivers > 1:
+                self.driver_weights = driver_capacities(
+                    self.pssh, self.kwargs.get("driver_weight", "nproc")
+                )
+                self.logger.info(f"Driver weights {self.driver_weights}")
             for r in range(1, repeats + 1):
-
-                if self.kwargs.get("pre_workload_run"):
+                repeat_done = all(self.checkpoint.done(r, t, rate) for t, rate in steps)
+                if self.kwargs.get("pre_workload_run") and not repeat_done:
                     self.backend.pre_workload_run()
                 this_repeat_results = []
-                for t in threads:
-                    time.sleep(DEFAULT_SLEEP_TIME)
+                self.timeseries_rows = []
+                for t, rate in steps:
+                    completed = self.checkpoint.get(r, t, rate)
+                    if completed is not None:
+                        self.logger.info(
+                            f"Skipping repeat {r}, thread: {t} (completed)"
+                        )
+                        this_repeat_results.extend(map(tuple, completed["results"]))
+                        self.timeseries_rows.extend(map(tuple, completed["timeseries"]))
+                        continue
+                    traced_sleep(DEFAULT_SLEEP_TIME, "between steps")
                     if self.kwargs.get("pre_thread_run"):
                         self.backend.pre_thread_run()
 
                     self.logger.info(f"Running repeat {r}, thread: {t}")
 
-                    # Not super genius decision. Don't allocate 3 drivers for 8 threads!
-                    per_driver_t = int(t / num_drivers)
-
-                    # this will also save raw data
-                    thread_results = self.run_thread(per_driver_t, r)
+                    step = Step(repeat=r, concurrency=t, rate=rate)
+                    timeseries_start = len(self.timeseries_rows)
+                    with self.step_monitors.running(step):
+                        # this will also save raw data
+                        thread_results = self.run_thread(t, r, rate)
                     self.logger.debug(thread_results)
-                    this_repeat_results.extend(thread_results)
+                    if rates:
+                        step_results = [self.latency_vs_load_row(rate, thread_results)]
+                    else:
+                        step_results = [result[:-2] for result in thread_results]
+                    this_repeat_results.extend(step_results)
+                    self.checkpoint.save(
+                        r,
+                        t,
+                        rate,
+                        {
+                            "results": step_results,
+                            "timeseries": self.timeseries_rows[timeseries_start:],
+                        },
+                    )
 
                 # At the end of full repeat print data frame
-                df = self.save_print_one_repeat(
-                    repeat=r,
-                    num_drivers=num_drivers,
-                    results=this_repeat_results,
+                save_timeseries(
+                    self.timeseries_rows, self.artifact_dir, self.workload_name, r
                 )
+                if rates:
+                    df = save_print_latency_vs_load(
+                        this_repeat_results, self.artifact_dir, self.workload_name, r
+                    )
+                else:
+                    df = self.save_print_one_repeat(
+                        repeat=r, results=this_repeat_results
+                    )
                 # Now we need collect overall run results, but before we need add repeat
                 all_results = pd.concat([all_results, df])
         except BenchmarkException as e:
             self.logger.error(f"Benchmark failed with: {e}")
             success = False
+            # Keep results of the steps completed in the failed repeat
+            if this_repeat_results:
+                save_timeseries(
+                    self.timeseries_rows, self.artifact_dir, self.workload_name, r
+                )
+                if rates:
+                    df = save_print_latency_vs_load(
+                        this_repeat_results, self.artifact_dir, self.workload_name, r
+                    )
+                else:
+                    df = self.save_print_one_repeat(
+                        repeat=r, results=this_repeat_results
+                    )
+                all_results = pd.concat([all_results, df])
         else:
             self.logger.info("Benchmark completed successfully")
         finally:
-            if success:
-                # Print and save summary
-                self.save_print_summary(df=all_results)
+            # Print and save summary, partial if benchmark failed
+            if not all_results.empty:
+                if rates:
+                    save_print_latency_vs_load_summary(
+                        all_results, self.artifact_dir, self.workload_name
+                    )
+                else:
+                    self.save_print_summary(df=all_results)
                 self.logger.info(f"Raw output has saved to the {self.artifact_dir}")
-            else:
+            if not success:
+                self.logger.error(
+                    f"Completed steps are saved in {self.checkpoint.file_name}, use"
+                    f" --resume {self.artifact_dir} to continue"
+                )
                 raise BenchmarkException("Benchmark failed")
 
+    def latency_vs_load_row(self, rate: int, thread_results: List[tuple]):
+        """Open-loop row from all drivers results.
+
+        Latency is sysbench event latency. Queue delay is not reported by sysbench, so it
+        is estimated from the reported queue length using Little's law: total queue
+        length across drivers divided by the total rate.
+        """
+        histogram = LatencyHistogram()
+        throughput = errors = 0.0
+        queue_lengths: List[int] = []
+        for result in thread_results:
+            throughput += result[1]
+            errors += result[7]
+            histogram.merge(result[8])
+            queue_lengths.extend(result[9])
+        queue_lengths.sort()
+        avg_queue = sum(queue_lengths) / len(queue_lengths) if queue_lengths else 0
+        p95_queue = (
+            queue_lengths[int(0.95 * (len(queue_lengths) - 1))] if queue_lengths else 0
+        )
+        num_drivers = len(thread_results)
+        return (
+            rate,
+            throughput,
+            histogram.mean,
+            histogram.percentile(95),
+            histogram.percentile(99),
+            float("nan"),  # not measured separately by sysbench
+            avg_queue * num_drivers / rate * 1000,
+            p95_queue * num_drivers / rate * 1000,
+            errors,
+        )
+
     def save_print_summary(self, df: pd.DataFrame):
         """Print overall summary for all repeats
 
@@ -263,13 +396,12 @@ class SysbenchRunner(AbstractBenchmarkRunner):
         self.logger.info(f"Summary results saved as {file_name}")
         df_summary.to_csv(file_name, index=False)
 
-    def save_print_one_repeat(
-        self, repeat: int, num_drivers: int, results: List[tuple]
-    ) -> pd.DataFrame:
+    def save_print_one_repeat(self, repeat: int, results: List[tuple]) -> pd.DataFrame:
         """Summarize and display sysbench results
 
         Args:
-            results (list[tuple]): _description_
+            results (list[tuple]): per driver results, concurrency is the total for
+                all drivers
         """
         columns = [
             "concurrency",
@@ -301,9 +433,7 @@ class SysbenchRunner(AbstractBenchmarkRunner):
         grouped_multiple["avg_latency"] = (
             grouped_multiple["total_response_time"] / grouped_multiple["transactions"]
         )
-        grouped_multiple["concurrency"] = num_drivers * grouped_multiple[
-            "concurrency"
-        ].astype(int)
+        grouped_multiple["concurrency"] = grouped_multiple["concurrency"].astype(int)
 
         grouped_multiple["avg_latency"] = grouped_multiple["avg_latency"].astype(float)
 
@@ -334,15 +464,18 @@ class SysbenchRunner(AbstractBenchmarkRunner):
         max_delay=600,
         delays=backoff_with_jitter(delay=3, attempts=3, cap=30),
     )
-    def run_thread(self, t: int, r: int) -> List[tuple]:
+    def run_thread(self, t: int, r: int, rate: int = 0) -> List[tuple]:
         """Run single thread of sysbench
 
+        Threads and rate are split between drivers in proportion to driver weights.
+
         Args:
-            t (int): thread number
+            t (int): total number of threads for all drivers
             r (int): repeat attempt
+            rate (int): total target events/sec. 0 means closed-loop
 
         Returns:
-            tuple: sysbench parsed results
+            tuple: sysbench parsed results, concurrency is replaced with t
         """
         # I need to clean driver(s) in case of re-try
         cmd = "pkill -9 sysbench || true"
@@ -351,29 +484,113 @@ class SysbenchRunner(AbstractBenchmarkRunner):
         timeout = (
             self.kwargs.get("time", 0) + self.kwargs.get("warmup_time", 0) + 30
         )  # Add buffer to timeout
-        run_command = self.evaluate_command("run", **{"t": t})
-        self.logger.debug(f"Running run command {run_command} with timeout {timeout}")
-
-        # TODO add workload 9010|8020 as parameter for parser down below
-        cmd = (  # This should send metrics to prometheus
-            f"{run_command} | /xbench/workload-exporter/bin/sysbench_parser.sh"
-        )
+        # --rate=0 is unlimited in sysbench, a driver runs only with a share of the rate
+        host_threads, host_rates = distribute_step(t, rate, self.driver_weights)
+        start_at = time.time() + SYNC_START_DELAY
+        host_args = []
+        for host_t, host_rate in zip(host_threads, host_rates):
+            if host_t == 0:  # Not enough threads for all drivers
+                host_args.append({"cmd": "true"})
+                continue
+            rate_option = f"--rate={host_rate}" if rate else ""
+            run_command = self.evaluate_command(
+                "run", **{"t": host_t, "rate_option": rate_option}
+            )
+            self.logger.debug(
+                f"Running run command {run_command} with timeout {timeout}"
+            )
+            # TODO add workload 9010|8020 as parameter for parser down below
+            cmd = (  # This should send metrics to prometheus
+                f"{run_command} | /xbench/workload-exporter/bin/sysbench_parser.sh"
+            )
+            if self.sync_start:
+                cmd = synchronized_command(cmd, start_at)
+            host_args.append({"cmd": clean_cmd(cmd)})
+        if self.sync_start:
+            timeout += SYNC_START_DELAY
 
         thread_results: List = []  # contains results for each driver
+        outputs: Dict[str, str] = {}
 
-        all_hosts_sysbench_output = self.pssh.run(cmd, timeout=timeout)
-        for host_output in all_hosts_sysbench_output:
+        all_hosts_sysbench_output = self.pssh.run(
+            "%(cmd)s", timeout=timeout, host_args=host_args
+        )
+        for host_output, host_t in zip(all_hosts_sysbench_output, host_threads):
+            if host_t == 0:
+                continue
             hostname = host_output.get("hostname")
             sysbench_output = host_output.get("stdout", "")
             # Let's save it first
             file_name = os.path.join(
-                self.artifact_dir, f"{hostname}_{self.workload_name}_{r}_{t}.out"
+                self.artifact_dir,
+                f"{hostname}_{self.workload_name}_{r}_{t}"
+                + (f"_{rate}rps.out" if rate else ".out"),
             )
             self.save_sysbench_output(file_name, sysbench_output)
             single_host_results = self.parse_output(sysbench_output)
-            thread_results.append(single_host_results)
+            thread_results.append((t,) + single_host_results[1:])
+            outputs[hostname] = sysbench_output
+        if self.sync_start:
+            thread_results = self.align_to_overlap(t, outputs, thread_results)
         return thread_results
 
+    def align_to_overlap(
+        self, t: int, outputs: Dict[str, str], thread_results: List[tuple]
+    ) -> List[tuple]:
+        """Replace throughput with the one measured while all drivers were running
+
+        Args:
+            t (int): total number of threads
+            outputs (Dict[str, str]): hostname -> sysbench output
+            thread_results (List[tuple]): parse_output results in the same order
+
+        Returns:
+            List[tuple]: adjusted results
+        """
+        warmup = self.kwargs.get("warmup_time", 0)
+        report_interval = self.kwargs.get("report_interval", 10)
+        starts = {}
+        windows = []
+        for hostname, output in outputs.items():
+            start, end = parse_window(output)
+            starts[hostname] = start
+            windows.append((start + warmup if start is not None else None, end))
+        overlap = overlap_window(windows)
+        if overlap[0] is None:
+            self.logger.warning(
+                "Unable to find overlapping window for all drivers. Using full run"
+            )
+            return thread_results
+        self.logger.info(
+            f"All drivers measured together for {overlap[1] - overlap[0]:.1f} sec"
+        )
+
+        aligned = []
+        for (hostname, output), result in zip(outputs.items(), thread_results):
+            intervals = parse_sysbench_intervals(output)
+            inside = intervals_in_window(
+                intervals, starts[hostname], report_interval, overlap
+            )
+            for i in intervals:
+                self.timeseries_rows.append(
+                    (
+                        starts[hostname] + i[0],
+                        hostname,
+                        t,
+                        i[2],
+                        i[3],
+                        i[4],
+                        i[5],
+                        i in inside,
+                    )
+                )
+            if inside:
+                tps = sum(i[2] for i in inside) / len(inside)
+                qps = sum(i[3] for i in inside) / len(inside)
+                result = (result[0], tps, qps) + tuple(result[3:])
+            aligned.append(result)
+        return aligned
+
     def save_sysbench_output(self, file_name: str, sysbench_output: str):
         """Save output to the benchmark directory
 
@@ -394,7 +611,8 @@ class SysbenchRunner(AbstractBenchmarkRunner):
             sysbench_output (str): sysbench plain output
 
         Returns:
-            tuple: thds, tps, qps, p95_latency, avg, stddev
+            tuple: thds, tps, qps, stddev, transactions, total_response_time,
+                p95_latency, errors, latency histogram, queue lengths
         """
 
         thds = (
@@ -407,6 +625,8 @@ class SysbenchRunner(AbstractBenchmarkRunner):
 
         seen_latency = False
         seen_sql_statistics = False
+        histogram = LatencyHistogram()  # Only if --histogram was used
+        queue_lengths = []  # Only in --rate mode
 
         try:
             sysbench_output_io = StringIO(sysbench_output)
@@ -415,6 +635,15 @@ class SysbenchRunner(AbstractBenchmarkRunner):
                 if line.startswith("FATAL:") or line.startswith("Segmentation fault"):
                     raise SysbenchFatalException(line)
 
+                m = HISTOGRAM_LINE_RE.match(line)
+                if m:
+                    histogram.record(float(m.group(1)), int(m.group(2)))
+                    continue
+                m = QUEUE_LINE_RE.match(line)
+                if m:
+                    queue_lengths.append(int(m.group(1)))
+                    continue
+
                 if line.startswith("SQL statistics:"):
                     seen_sql_statistics = True
                 elif line.startswith("Latency (ms):"):
@@ -468,6 +697,8 @@ class SysbenchRunner(AbstractBenchmarkRunner):
                 total_response_time,
                 p95_latency,
                 errors,
+                histogram,
+                queue_lengths,
             )
         except AttributeError as e:
             raise SysbenchOutputParseException(
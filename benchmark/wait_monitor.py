@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Where the database waits during every step.
+
+- MariaDB/MySQL: delta of performance_schema.events_waits_summary_global_by_event_name
+  between the start and the end of the step, plus InnoDB row lock waits per table
+  sampled every wait_sample_interval
+- PostgreSQL: pg_stat_activity.wait_event of active sessions sampled every
+  wait_sample_interval, sessions on CPU are reported as CPU/running
+- Xpand: delta of QPC wait times (lockman, bm, wal, ...) of the workload database
+
+Sampled waits are converted to session wait time: every waiting session adds the
+sample interval. Waits of every step go to {workload}_waits.csv, attribute_waits adds
+the top wait classes of every concurrency to {workload}_summary.csv.
+"""
+
+import logging
+import os
+from collections import Counter
+from typing import Dict, List
+
+import pandas as pd
+
+from compute import Node
+from compute.backend_dialect import BackendDialect
+from compute.backend_product import BackendProduct
+from lib.db_stats import MysqlWaits, PgWaits, WaitStats, XpandWaits, counter_deltas
+
+from .db_stats_monitor import SAMPLER_EXCEPTIONS, DbSamplerMonitor
+from .exceptions import BenchmarkException
+from .step_monitor import Step
+
+DEFAULT_SAMPLE_INTERVAL = 0.2  # seconds
+DEFAULT_TOP_WAITS = 3
+RESULT_PRECISION = 2
+WAIT_FIELDS = [
+    "repeat",
+    "concurrency",
+    "rate",
+    "host",
+    "wait_class",
+    "wait_event",
+    "wait_ms",
+    "pct",
+]
+
+
+def waits_klass(dialect: str, product: str):
+    if product == BackendProduct.xpand:
+        return XpandWaits
+    if dialect == BackendDialect.pgsql:
+        return PgWaits
+    return MysqlWaits
+
+
+def step_waits(
+    before: Dict, after: Dict, sampled: Counter, sample_interval: float
+) -> Dict:
+    """Wait time (ms) of the step from counter deltas and sampled sessions"""
+    # Waits seen for the first time in the step counted from zero
+    waits = Counter(
+        counter_deltas({k: before.get(k, 0) for k in after}, after, list(after))
+    )
+    for key, sessions in sampled.items():
+        waits[key] += sessions * sample_interval * 1000
+    return {k: v for k, v in waits.items() if v > 0}
+
+
+def top_waits(waits: pd.DataFrame, keys: List[str], top: int) -> pd.DataFrame:
+    """Top wait classes per keys as `class pct%; class pct%`"""
+    by_class = waits.groupby(keys + ["wait_class"], as_index=False)["wait_ms"].sum()
+    by_class["pct"] = (
+        100 * by_class["wait_ms"] / by_class.groupby(keys)["wait_ms"].transform("sum")
+    )
+    by_class = by_class.sort_values(
+        keys + ["pct"], ascending=[True] * len(keys) + [False]
+    )
+    top_classes = by_class.groupby(keys).head(top)
+    top_classes = top_classes.assign(
+        top_waits=[
+            f"{c} {p:.1f}%"
+            for c, p in zip(top_classes["wait_class"], top_classes["pct"])
+        ]
+    )
+    return top_classes.groupby(keys, as_index=False)["top_waits"].agg("; ".join)
+
+
+def attribute_waits(
+    artifact_dir: str, workload_name: str, top: int = DEFAULT_TOP_WAITS
+) -> pd.DataFrame:
+    """Add top wait classes of every concurrency (and rate) to the summary
+
+    Returns:
+        pd.DataFrame: updated summary, empty if there are no waits or summary
+    """
+    waits_file = os.path.join(artifact_dir, f"{workload_name}_waits.csv")
+    summary_file = os.path.join(artifact_dir, f"{workload_name}_summary.csv")
+    if not os.path.exists(waits_file) or not os.path.exists(summary_file):
+        return pd.DataFrame()
+    summary = pd.read_csv(summary_file).drop(columns="top_waits", errors="ignore")
+    keys = [k for k in ("concurrency", "rate") if k in summary.columns]
+    if "concurrency" not in keys:
+        return pd.DataFrame()
+    summary = summary.merge(
+        top_waits(pd.read_csv(waits_file), keys, top), on=keys, how="left"
+    )
+    summary.to_csv(summary_file, index=False)
+    logging.getLogger(__name__).info(
+        f"======= Top waits ==========\n"
+        f"{summary[keys + ['top_waits']].to_string(index=False)}"
+    )
+    return summary
+
+
+class WaitMonitor(DbSamplerMonitor):
+    """Wait events and lock contention of every backend host during each step"""
+
+    thread_name = "waits"
+
+    def __init__(self, nodes: List[Node], **kwargs):
+        DbSamplerMonitor.__init__(
+            self,
+            nodes,
+            kwargs.get("wait_sample_interval", DEFAULT_SAMPLE_INTERVAL),
+            **kwargs,
+        )
+        self.logger = logging.getLogger(__name__)
+        self.top = kwargs.get("top_waits", DEFAULT_TOP_WAITS)
+        self.samplers: List[WaitStats]
+        self.before: Dict[str, Dict] = {}
+        self.sampled: Dict[str, Counter] = {}
+
+    @staticmethod
+    def sampler_klass(dialect: str, product: str):
+        return waits_klass(dialect, product)
+
+    def sample(self, step: Step):
+        for sampler in self.samplers:
+            try:
+                self.sampled[sampler.name].update(sampler.sessions())
+            except SAMPLER_EXCEPTIONS as e:
+                self.logger.warning(f"Unable to sample {sampler.name}: {e}")
+
+    def start(self, step: Step):
+        for sampler in self.samplers:
+            try:
+                self.before[sampler.name] = sampler.counters()
+            except SAMPLER_EXCEPTIONS as e:
+                raise BenchmarkException(f"Unable to read waits of {sampler.name}: {e}")
+            self.sampled[sampler.name] = Counter()
+        self.start_sampling(step)
+
+    def stop(self, step: Step):
+        if not self.stop_sampling():
+            return
+        rows = []
+        for sampler in self.samplers:
+            try:
+                after = sampler.counters()
+            except SAMPLER_EXCEPTIONS as e:
+                self.logger.warning(f"Unable to read waits of {sampler.name}: {e}")
+                continue
+            waits = step_waits(
+                self.before.get(sampler.name, {}),
+                after,
+                self.sampled[sampler.name],
+                self.interval,
+            )
+            total = sum(waits.values())
+            rows += [
+                (
+                    step.repeat,
+                    step.concurrency,
+                    step.rate,
+                    sampler.name,
+                    wait_class,
+                    wait_event,
+                    wait_ms,
+                    100 * wait_ms / total,
+                )
+                for (wait_class, wait_event), wait_ms in sorted(
+                    waits.items(), key=lambda x: -x[1]
+                )
+            ]
+        if not rows:
+            self.logger.warning("No waits in the step")
+            return
+        df = pd.DataFrame.from_records(rows, columns=WAIT_FIELDS).round(
+            RESULT_PRECISION
+        )
+        self.logger.info(
+            f"======= Top waits ==========\n"
+            f"{df.groupby('host').head(self.top).to_string(index=False)}"
+        )
+        if self.artifact_dir:
+            file_name = os.path.join(
+                self.artifact_dir, f"{self.workload_name}_waits.csv"
+            )
+            df.to_csv(
+                file_name, mode="a", header=not os.path.exists(file_name), index=False
+            )
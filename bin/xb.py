@@ -8,10 +8,12 @@ import argparse
 import logging
 import sys
 import traceback
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
 
 from cloud.exceptions import CloudException
 from common.common import local_ip_addr, mkdir, validate_name_rfc1035
+from common.tracing import trace_report, tracer
 from xbench import (
     DeProvisioning,
     Provisioning,
@@ -28,6 +30,7 @@ BENCH_LOG_HOME = "/tmp"
 MAX_BYTES = 1024 * 1024
 BACKUP_COUNT = 3
 FILE_LOG_NAME = "xbench.log"
+TRACE_FILE_NAME = "trace-{command}-{timestamp}.json"
 
 logger = logging.getLogger(__name__)
 
@@ -166,6 +169,23 @@ ARG_WORKLOAD_TAG = defineArg(
     required=False,
 )
 
+ARG_AUTO_DRIVERS = defineArg(
+    "--auto-drivers",
+    action="store_true",
+    default=False,
+    dest="auto_drivers",
+    help="Advise how many drivers are required for the maximum workload concurrency",
+)
+
+ARG_RESUME = defineArg(
+    "--resume",
+    action="store",
+    dest="resume",
+    metavar="ARTIFACT_DIR",
+    default=None,
+    help="Resume failed workload run from its artifact directory, completed steps are skipped",
+)
+
 ARG_TARGET = defineArg(
     "-p",
     "--target",
@@ -231,6 +251,15 @@ ARG_REPORTING_NOTEBOOK_TITLE = defineArg(
     """,
 )
 
+ARG_REPORTING_BASELINE = defineArg(
+    "--baseline-dir",
+    action="store",
+    required=False,
+    dest="baseline_dir",
+    help="""Artifact directory of the run to compare with (differential flame graphs)
+    """,
+)
+
 ARG_REPORTING_YAML_CONFIG = defineArg(
     "--yaml-config",
     action="store",
@@ -344,6 +373,7 @@ def provision(args, extra_impl_params):
 
 def workload(args, extra_impl_params):
     final_artifact_dir = None
+    resume_dir = getattr(args, "resume", None)  # end-to-end run doesn't resume
     w = WorkloadRunning(
         cluster_name=args.cluster,
         benchmark_name=args.benchmark,
@@ -351,8 +381,15 @@ def workload(args, extra_impl_params):
         artifact_dir=args.artifact_dir or args.log_dir,
         extra_impl_params=extra_impl_params,
         tag=args.tag,
+        auto_drivers=args.auto_drivers,
+        resume_dir=resume_dir,
     )
-    if args.step == "all":
+    if resume_dir:
+        # Database is already prepared, only run the remaining steps
+        logger.info(f"Resuming workload from {resume_dir}")
+        w.self_test()
+        final_artifact_dir = w.run()
+    elif args.step == "all":
         logger.info("Executing all workload steps")
         w.self_test()
         w.prepare()
@@ -413,6 +450,7 @@ def reporting(args, extra_impl_params):
         notebook_name=args.notebook_name,
         notebook_title=args.notebook_title,
         yaml_config=args.yaml_config,
+        baseline_dir=getattr(args, "baseline_dir", None),
     )
     r.run()
 
@@ -513,6 +551,8 @@ def main():
             ARG_WORKLOAD_STEP,
             ARG_WORKLOAD_TAG,
             ARG_TARGET,
+            ARG_AUTO_DRIVERS,
+            ARG_RESUME,
         ],
     )
     workload_parser.set_defaults(func=workload)
@@ -566,6 +606,7 @@ def main():
             ARG_REPORTING_NOTEBOOK,
             ARG_REPORTING_NOTEBOOK_TITLE,
             ARG_REPORTING_YAML_CONFIG,
+            ARG_REPORTING_BASELINE,
         ],
     )
     reporting_parser.set_defaults(func=reporting)
@@ -591,6 +632,7 @@ def main():
             ARG_REPORTING_NOTEBOOK,
             ARG_REPORTING_NOTEBOOK_TITLE,
             ARG_REPORTING_YAML_CONFIG,
+            ARG_AUTO_DRIVERS,
         ],
     )
 
@@ -709,6 +751,14 @@ def main():
         handlers=handlers,
     )
     logger.info(f"Log directory is set as {log_file_dir}")
+    trace_file = TRACE_FILE_NAME.format(
+        command=args.command, timestamp=datetime.now().strftime("%Y%m%d-%H%M%S")
+    )
+    tracer.open(
+        f"{log_file_dir}/{trace_file}",
+        f"xb.py {args.command}",
+        cluster=args.cluster,
+    )
 
     try:
         if args.command in ("deprovision", "d"):
@@ -754,6 +804,10 @@ def main():
         log_trace(exc)
         exit(1)
 
+    finally:
+        trace_file = tracer.file_name
+        logger.info(f"{trace_report(tracer.close())}\nTrace saved in {trace_file}")
+
     return 0
 
 
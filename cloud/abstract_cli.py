@@ -8,6 +8,7 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import Dict, List, Optional
 
+from common import tracer
 from compute import ProcessExecutionException, RunSubprocess
 
 from .exceptions import CloudCliException
@@ -88,10 +89,11 @@ class AbstractCli(metaclass=ABCMeta):
         cmd = " ".join(cmd.split())
         try:
             proc = RunSubprocess(cmd=cmd, timeout=timeout)
-            if shell:
-                (stdout, stderr, exit_code) = proc.run_as_shell()
-            else:
-                (stdout, stderr, exit_code) = proc.run()
+            with tracer.span("cloud.cli", cmd=cmd):
+                if shell:
+                    (stdout, stderr, exit_code) = proc.run_as_shell()
+                else:
+                    (stdout, stderr, exit_code) = proc.run()
 
             if exit_code != 0 or (self._check_stderr and len(stderr) > 0):
                 raise CloudCliException(f"CLI command failed with {stderr}")
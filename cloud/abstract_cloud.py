@@ -217,6 +217,10 @@ class AbstractCloud(ABC, Generic[T, C]):
 
         run_parallel(instances, noop, self.stop_instance)
 
+    def reboot_instance(self, instance: Node, wait: bool = True):
+        gc = ComputeFactory().create_compute_from_vm(cli=self.cli, vm=instance.vm)
+        gc.reboot(wait)
+
     def start_instance(self, instance: Node, **kwargs) -> Node:
         gc = ComputeFactory().create_compute_from_vm(cli=self.cli, vm=instance.vm)
         vm = gc.start()
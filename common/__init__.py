@@ -15,3 +15,4 @@ from .common import (
 )
 from .exceptions import SigTermException
 from .retry_decorator import backoff, backoff_with_jitter, constant_delay, retry
+from .tracing import critical_path, trace_report, traced, traced_sleep, tracer
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Span based tracing of xbench commands.
+
+bin/xb.py opens a trace file per command, everything executed by the command becomes a
+tree of spans: provisioning and workload steps, Node.run, PsshClient.run (one span per
+host), cloud CLI calls, benchmark steps, sleeps and data checks.
+
+Spans are written as they end in the Chrome trace event format (a JSON array of
+complete events, the closing bracket is optional), open the file in
+https://ui.perfetto.dev or chrome://tracing. When the command ends trace_report()
+summarizes the critical path, time per node and the slowest spans.
+
+Spans of threads started by run_parallel are attached to the span of the caller
+(Tracer.propagate), spans of other threads to the root span.
+"""
+
+import functools
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+CRITICAL_PATH_MIN_PCT = 1.0  # shorter spans are not shown in the critical path
+TOP_SPANS = 10
+MAX_ATTRIBUTE_LENGTH = 120
+REDACTED = "***"
+# Secrets in commands (database passwords, cloud keys, tokens) never reach the trace
+SECRETS = [
+    # --mysql-password='x', PGPASSWORD=x, secret_access_key=x, --token="x", Password x
+    (
+        re.compile(
+            r"([\w-]*(?:password|passwd|pwd|secret|token|access_key)[\w-]*)"
+            r"(\s*[=:]\s*|\s+)('[^']*'|\"[^\"]*\"|[^\s&'\"]+)",
+            re.IGNORECASE,
+        ),
+        rf"\1\2{REDACTED}",
+    ),
+    # ftp://user:x@host, DATA_SOURCE_NAME="user:x@(host)"
+    (re.compile(r"([\w.-]+):[^@\s'\"/:]+@"), rf"\1:{REDACTED}@"),
+    # sshpass -p x, mysql -px
+    (re.compile(r"(sshpass\s+-p\s*|\s-p)('[^']*'|\"[^\"]*\"|\S+)"), rf"\1{REDACTED}"),
+    # host:port:database:user:x >> ~/.pgpass
+    (
+        re.compile(r"((?:[^\s:'\"]*:){4})[^\s'\"]+(?=['\"]?\s*>>\s*\S*\.pgpass)"),
+        rf"\1{REDACTED}",
+    ),
+]
+
+
+@dataclass
+class Span:
+    name: str
+    id: int
+    parent_id: Optional[int]
+    start: float  # epoch
+    end: Optional[float] = None
+    thread: str = ""
+    attributes: Dict = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def label(self) -> str:
+        attributes = ", ".join(f"{k}={v}" for k, v in self.attributes.items())
+        return f"{self.name} ({attributes})" if attributes else self.name
+
+
+def redact(value: str) -> str:
+    """Secrets of a command replaced by ***"""
+    for pattern, replacement in SECRETS:
+        value = pattern.sub(replacement, value)
+    return value
+
+
+def short(value) -> str:
+    """Single line attribute value without secrets, long commands are cut"""
+    value = redact(" ".join(str(value).split()))
+    if len(value) > MAX_ATTRIBUTE_LENGTH:
+        return value[: MAX_ATTRIBUTE_LENGTH - 3] + "..."
+    return value
+
+
+class Tracer:
+    """Records spans of the current command, does nothing until open() is called"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+        self.file = None
+        self.file_name: Optional[str] = None
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []  # finished spans
+        self.threads: Dict[str, int] = {}  # thread name -> trace tid
+
+    @property
+    def enabled(self) -> bool:
+        return self.file is not None
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def current(self) -> Optional[Span]:
+        stack = self._stack()
+        return stack[-1] if stack else self.root
+
+    def open(self, file_name: str, name: str, **attributes) -> Span:
+        """Start writing spans to file_name, the root span is ended by close()"""
+        os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+        self.file = open(file_name, "w")
+        self.file.write("[\n")
+        self.file_name = file_name
+        self.spans, self.threads = [], {}
+        self.root = None
+        self.root = self.start_span(name, **attributes)
+        self._stack().clear()  # the root is the parent of every thread
+        return self.root
+
+    def start_span(self, name: str, **attributes) -> Optional[Span]:
+        """Span of the current thread until end_span(), None if tracing is off"""
+        if not self.enabled:
+            return None
+        parent = self.current()
+        span = Span(
+            name=name,
+            id=next(self.ids),
+            parent_id=parent.id if parent else None,
+            start=time.time(),
+            thread=threading.current_thread().name,
+            attributes={k: short(v) for k, v in attributes.items()},
+        )
+        self._stack().append(span)
+        return span
+
+    def end_span(self, span: Optional[Span], **attributes):
+        if span is None:
+            return
+        span.end = time.time()
+        span.attributes |= {k: short(v) for k, v in attributes.items()}
+        stack = self._stack()
+        if span in stack:
+            stack.remove(span)
+        self._write(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Span around a block, an exception is recorded as the error attribute"""
+        span = self.start_span(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            if span is not None:
+                span.attributes["error"] = short(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            self.end_span(span)
+
+    def record(self, name: str, start: float, end: float, **attributes):
+        """Span measured elsewhere, e.g. one host of a parallel ssh command"""
+        if not self.enabled:
+            return
+        parent = self.current()
+        self._write(
+            Span(
+                name=name,
+                id=next(self.ids),
+                parent_id=parent.id if parent else None,
+                start=start,
+                end=end,
+                thread=threading.current_thread().name,
+                attributes={k: short(v) for k, v in attributes.items()},
+            )
+        )
+
+    def propagate(self, fn: Callable) -> Callable:
+        """fn running in another thread gets spans of the current thread as parents"""
+        parent = self.current()
+        if not self.enabled or parent is None:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            stack = self._stack()
+            stack.append(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stack.remove(parent)
+
+        return wrapper
+
+    def _write(self, span: Span):
+        with self.lock:
+            if self.file is None:
+                return
+            pid = os.getpid()
+            if span.thread not in self.threads:  # trace viewers want numeric ids
+                self.threads[span.thread] = len(self.threads) + 1
+                self.file.write(
+                    json.dumps(
+                        {
+                            "name": "thread_name",
+                            "ph": "M",
+                            "pid": pid,
+                            "tid": self.threads[span.thread],
+                            "args": {"name": span.thread},
+                        }
+                    )
+                    + ",\n"
+                )
+            event = {
+                "name": span.name,
+                "cat": span.name.split(".")[0],
+                "ph": "X",
+                "ts": int(span.start * 1e6),
+                "dur": int((span.end - span.start) * 1e6),
+                "pid": pid,
+                "tid": self.threads[span.thread],
+                "args": span.attributes | {"id": span.id, "parent_id": span.parent_id},
+            }
+            self.file.write(json.dumps(event) + ",\n")
+            self.file.flush()
+            self.spans.append(span)
+
+    def close(self, **attributes) -> List[Span]:
+        """End the root span and the trace file
+
+        Returns:
+            List[Span]: all spans of the command, the root is the last one
+        """
+        if not self.enabled:
+            return []
+        self.end_span(self.root, **attributes)
+        with self.lock:
+            process = {
+                "name": "process_name",
+                "ph": "M",
+                "pid": os.getpid(),
+                "args": {"name": self.root.name},
+            }
+            self.file.write(json.dumps(process) + "\n]\n")
+            self.file.close()
+            self.file = None
+        spans, self.spans, self.root = self.spans, [], None
+        return spans
+
+
+tracer = Tracer()
+
+
+def traced(name: str, **attributes):
+    """Decorator: span around every call of the function"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name, **attributes):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_sleep(seconds: float, reason: str):
+    with tracer.span("sleep", seconds=seconds, reason=reason):
+        time.sleep(seconds)
+
+
+def critical_path(spans: List[Span]) -> List[Span]:
+    """Chain of spans that determined the duration of the root span
+
+    Walking back from the end of a span, the child that ended last is on the path, then
+    the child that ended last before that one started, and so on. Concurrent children
+    (e.g. parallel ssh commands) only contribute the slowest one
+    """
+    if not spans:
+        return []
+    children = defaultdict(list)
+    for s in spans:
+        children[s.parent_id].append(s)
+    ids = {s.id for s in spans}
+    roots = [s for s in spans if s.parent_id not in ids]
+    root = max(roots, key=lambda s: s.duration)
+
+    def walk(span: Span) -> List[Span]:
+        chain, cursor = [], span.end
+        for child in sorted(children[span.id], key=lambda s: s.end, reverse=True):
+            if child.end <= cursor:
+                chain.append(child)
+                cursor = child.start
+        path = [span]
+        for child in reversed(chain):
+            path += walk(child)
+        return path
+
+    return walk(root)
+
+
+def trace_report(spans: List[Span], top: int = TOP_SPANS) -> str:
+    """Critical path, busy time per node and the slowest spans as text"""
+    path = critical_path(spans)
+    if not path:
+        return "No spans recorded"
+    total = path[0].duration or 1e-9
+    depth = {path[0].id: 0}
+    lines = [f"======= Critical path ({total:.1f} sec) =========="]
+    for s in path:
+        depth[s.id] = depth.get(s.parent_id, -1) + 1
+        pct = 100 * s.duration / total
+        if pct >= CRITICAL_PATH_MIN_PCT:
+            lines.append(
+                f"{'  ' * depth[s.id]}{s.duration:9.1f} sec {pct:5.1f}%  {s.label()}"
+            )
+    per_node = defaultdict(lambda: [0, 0.0])
+    for s in spans:
+        if "node" in s.attributes:
+            per_node[s.attributes["node"]][0] += 1
+            per_node[s.attributes["node"]][1] += s.duration
+    if per_node:
+        lines.append("======= Remote commands per node ==========")
+        for node, (count, seconds) in sorted(per_node.items(), key=lambda x: -x[1][1]):
+            lines.append(f"{seconds:9.1f} sec {count:6d} command(s)  {node}")
+    parents = {s.parent_id for s in spans}
+    slowest = sorted(
+        (s for s in spans if s.id not in parents), key=lambda s: -s.duration
+    )[:top]
+    lines.append(f"======= Slowest {len(slowest)} operations ==========")
+    lines += [f"{s.duration:9.1f} sec  {s.label()}" for s in slowest]
+    return "\n".join(lines)
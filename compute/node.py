@@ -7,7 +7,7 @@ from typing import Optional, Union
 from dacite import from_dict
 
 from cloud import VirtualMachine
-from common import backoff, retry, round_down_to_even
+from common import backoff, retry, round_down_to_even, tracer
 from lib.xbench_config import XbenchConfig
 from metrics import MetricsServer, MetricsTarget
 
@@ -129,6 +129,7 @@ class Node:
         {self._disable_selinux()}
         {self._disable_network_security(really=self.vm.network.disable_network_security)}
         service chronyd start
+        chronyc -a makestep > /dev/null 2>&1 || true
         rpm -qa | grep -i epel
         """
         _ = self.run(cmd=cmd, timeout=DEFAULT_COMMAND_TIMEOUT, sudo=True)
@@ -180,9 +181,10 @@ class Node:
         It will not retry! By default it will run for 24 hours!
         """
 
-        output = self.ssh_client.run(
-            cmd, timeout=timeout, sudo=sudo, ignore_errors=ignore_errors, user=user
-        )
+        with tracer.span("node.run", node=self.vm.name, cmd=cmd, sudo=sudo):
+            output = self.ssh_client.run(
+                cmd, timeout=timeout, sudo=sudo, ignore_errors=ignore_errors, user=user
+            )
         return output
 
     def set_ssh_passwordless_access(self, local_dir):
@@ -6,11 +6,12 @@
 """
 import asyncio
 import logging
+import time
 from typing import Dict, List, Optional, Union
 
 import asyncssh
 
-from common import clean_cmd
+from common import clean_cmd, tracer
 
 from .exceptions import PsshClientException, SshClientException
 from .ssh_client import SshClient
@@ -81,11 +82,26 @@ class PsshClient:
             )
 
         try:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            results = await asyncio.gather(
+                *(
+                    self._timed(hostname, task)
+                    for hostname, task in zip(self.hostnames, tasks)
+                ),
+                return_exceptions=True,
+            )
             return results
         except SshClientException as e:
             raise PsshClientException(e)
 
+    @staticmethod
+    async def _timed(hostname: str, task):
+        """One span per host of a parallel command"""
+        start = time.time()
+        try:
+            return await task
+        finally:
+            tracer.record("ssh.run", start, time.time(), node=hostname)
+
     async def _send_file_sftp(self, local, remote):
         tasks = [runner._sftp_send(local, remote) for runner in self.pssh_clients]
         results = await asyncio.gather(tasks, return_exceptions=True)
@@ -154,15 +170,16 @@ class PsshClient:
         self.logger.debug(f"Running {cmd} on {self.hostnames}")
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        results = loop.run_until_complete(
-            self._run_clients(
-                cmd=clean_cmd(cmd),
-                timeout=timeout,
-                sudo=sudo,
-                host_args=host_args,
-                ignore_errors=ignore_errors,
+        with tracer.span("pssh.run", hosts=len(self.hostnames), cmd=cmd, sudo=sudo):
+            results = loop.run_until_complete(
+                self._run_clients(
+                    cmd=clean_cmd(cmd),
+                    timeout=timeout,
+                    sudo=sudo,
+                    host_args=host_args,
+                    ignore_errors=ignore_errors,
+                )
             )
-        )
         for r in results:
             if isinstance(r, asyncio.TimeoutError):
                 raise PsshClientException(
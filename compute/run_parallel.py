@@ -6,6 +6,7 @@ import concurrent.futures
 from multiprocessing import cpu_count
 from typing import TypeVar
 
+from common import tracer
 from compute.node import Node
 
 SEP = "."
@@ -22,6 +23,7 @@ def run_parallel(instances: list[P], fn_result, fn, /, *args, **kwargs):
         fn_result (Function): A function reference to call on each completed Future
         fn (Function): A reference to a function that will be executed for each instance.
     """
+    fn = tracer.propagate(fn)  # spans of the threads belong to the caller
     with concurrent.futures.ThreadPoolExecutor(THREAD_POOL_MAX_WORKERS) as executor:
         futures = [
             executor.submit(fn, **instance, **kwargs)
@@ -36,16 +36,31 @@ diset {{bench}} {{prefix}}_allwarehouse {{allwarehouse}}
 diset {{bench}} {{prefix}}_timeprofile True
 diset {{bench}} {{prefix}}_keyandthink {{keyandthink}}
 print dict
+{% if tcount %}
 tcset logtotemp {{logtotemp}}
 tcset timestamps {{timestamps}}
 tcset refreshrate {{refreshrate}}
 print tcconf
+{% endif %}
 loadscript
+{% if warehouse_first %}
+# Home warehouses of this driver virtual users are limited to its own range
+if {[string first {RandomNumber 1 $w_id_input} $_ED(package)] < 0} {
+puts "XBENCH_ERROR home warehouse selection not found in the driver script"
+exit
+}
+set _ED(package) [string map [list {RandomNumber 1 $w_id_input} "RandomNumber {{warehouse_first}} {{warehouse_last}}"] $_ED(package)]
+{% endif %}
 vuset vu {{virtusers}}
 vuset delay {{delay}}
 print vuconf
 vucreate
+{% if tcount %}
 tcstart
+{% endif %}
 vurun
+{% if tcount %}
+tcstop
+{% endif %}
 vudestroy
 {% endif %}
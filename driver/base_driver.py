@@ -1,12 +1,12 @@
 import logging
 import os
-from typing import Dict
+from typing import Dict, List
 
 from backend.base_backend import mkdir_command
 from benchmark import BenchmarkException
 from common.common import get_class_from_klass
-from compute import BackendTarget, Node, Yum
-from lib import XbenchConfig
+from compute import BackendTarget, Cluster, Node, Yum
+from lib import XbenchConfig, XbenchConfigException
 from lib.yaml_config import YamlConfig, YamlConfigException
 
 from .abstract_driver import AbstractDriver
@@ -14,6 +14,7 @@ from .exceptions import DriverException
 
 DEFAULT_COMMAND_TIMEOUT = 300
 DRIVER_CONFIG_FILE = "benchmarks.yaml"
+COMPOSITE_LABEL = "composite"  # benchmarks come from members of composite workloads
 DEFAULT_DIR = "/xbench"  # Where is benchmark will be installed
 
 # ToDo: configure.drivers.sh  --cloud
@@ -53,11 +54,38 @@ class BaseDriver(AbstractDriver):
             driver_config = YamlConfig(
                 yaml_config_file=driver_config_file_name,
             )
+            if driver_config_label == COMPOSITE_LABEL:
+                benchmarks = self.composite_benchmarks(driver_config)
+                if benchmarks:
+                    return benchmarks
             return driver_config.get_key(driver_config_label, use_defaults=True)
 
         except YamlConfigException as e:
             raise DriverException(e)
 
+    def composite_benchmarks(self, driver_config: YamlConfig) -> List[str]:
+        """Benchmarks of all composite members running on the group of this driver
+
+        Members without drivers run on every group
+        """
+        group = Cluster.group_name(self.node.vm.name)
+        try:
+            workload_yaml = XbenchConfig().load_yaml("workload.yaml")
+        except XbenchConfigException as e:
+            raise DriverException(e)
+        workloads = workload_yaml.get_key(root=COMPOSITE_LABEL, leaf="workloads")
+        benchmarks = []
+        for workload in (workloads or {}).values():
+            for member in (workload.get("members") or {}).values():
+                groups = member.get("drivers")
+                groups = [groups] if isinstance(groups, str) else groups
+                if groups and group not in groups:
+                    continue
+                for klass in driver_config.get_key(member.get("benchmark")):
+                    if klass not in benchmarks:
+                        benchmarks.append(klass)
+        return benchmarks
+
     def configure(self):
         """Prepare os to run a driver workload"""
         self.logger.debug("Configuring driver's OS")
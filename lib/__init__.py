@@ -3,3 +3,4 @@ from .mysql_client import MySqlClient, MySqlClientException
 from .pgsql_client import PgSqlClient, PgSqlClientException
 from .xbench_config import XbenchConfig, XbenchConfigException
 from .grafana import Grafana
+from .prometheus import Prometheus, PrometheusException
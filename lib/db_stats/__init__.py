@@ -0,0 +1,8 @@
+from .db_stats import DbStats, MysqlStats, PgStats, XpandStats, counter_deltas
+from .wait_stats import MysqlWaits, PgWaits, WaitStats, XpandWaits, wait_class
+from .qpc import (
+    STATEMENT_CUTOFF,
+    QpcAnalyzer,
+    aggregate_statements,
+    statement_fingerprint,
+)
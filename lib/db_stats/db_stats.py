@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+import math
+import time
+from typing import Dict, List, Optional
+
+from lib.mysql_client import MySqlClient
+from lib.pgsql_client import PgSqlClient
+
+
+def counter_deltas(
+    previous: Dict[str, float], current: Dict[str, float], counters: List[str]
+) -> Dict[str, float]:
+    """Increase of cumulative counters between two samples
+
+    A counter going down was reset (server restart, FLUSH STATUS, pg_stat_reset), so
+    it counted from zero and the increase is its current value
+    """
+    deltas = {}
+    for k in counters:
+        if k not in current or k not in previous:
+            continue
+        delta = current[k] - previous[k]
+        deltas[k] = delta if delta >= 0 else current[k]
+    return deltas
+
+
+def ratio_pct(part: float, total: float) -> float:
+    return 100.0 * part / total if total else math.nan
+
+
+def to_number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class DbStats:
+    """Base class of database statistics samplers
+
+    read() returns raw values, names in `counters` are cumulative counters, everything
+    else is a gauge. derive() turns per second rates, deltas and gauges into the
+    reported metrics. The first sample only primes counters.
+    """
+
+    counters: List[str] = []
+
+    def __init__(self, name: str):
+        self.name = name
+        self.previous: Optional[Dict[str, float]] = None
+        self.previous_time: Optional[float] = None
+
+    def read(self) -> Dict[str, float]:
+        raise NotImplementedError
+
+    def derive(
+        self,
+        rates: Dict[str, float],
+        deltas: Dict[str, float],
+        gauges: Dict[str, float],
+    ) -> Dict[str, float]:
+        return rates | gauges
+
+    def sample(self) -> Dict[str, float]:
+        """Metrics since the previous sample, empty dict for the first one"""
+        now = time.time()
+        values = self.read()
+        previous, previous_time = self.previous, self.previous_time
+        self.previous, self.previous_time = values, now
+        if previous is None or now <= previous_time:
+            return {}
+        deltas = counter_deltas(previous, values, self.counters)
+        rates = {k: v / (now - previous_time) for k, v in deltas.items()}
+        gauges = {k: v for k, v in values.items() if k not in self.counters}
+        return {"time": now} | self.derive(rates, deltas, gauges)
+
+
+class MysqlStats(MySqlClient, DbStats):
+    """SHOW GLOBAL STATUS of MariaDB/MySQL: QPS, InnoDB buffer pool, redo and flushing"""
+
+    counters = [
+        "Questions",
+        "Handler_commit",
+        "Handler_rollback",
+        "Innodb_buffer_pool_read_requests",
+        "Innodb_buffer_pool_reads",
+        "Innodb_data_reads",
+        "Innodb_data_writes",
+        "Innodb_os_log_written",
+        "Innodb_buffer_pool_pages_flushed",
+        "Innodb_row_lock_waits",
+        "Created_tmp_disk_tables",
+    ]
+    gauges = [
+        "Threads_running",
+        "Threads_connected",
+        "Innodb_buffer_pool_pages_dirty",
+        "Innodb_checkpoint_age",  # MariaDB only
+    ]
+
+    def __init__(self, name, **kwargs):
+        MySqlClient.__init__(self, **kwargs | {"autocommit": True})
+        DbStats.__init__(self, name)
+        self.connect()
+
+    def read(self) -> Dict[str, float]:
+        values = {}
+        for row in self.select_all_rows("SHOW GLOBAL STATUS"):
+            if row["Variable_name"] in self.counters + self.gauges:
+                value = to_number(row["Value"])
+                if value is not None:
+                    values[row["Variable_name"]] = value
+        return values
+
+    def derive(self, rates, deltas, gauges):
+        return {
+            "qps": rates.get("Questions", math.nan),
+            "tps": rates.get("Handler_commit", math.nan),
+            "rollbacks_per_sec": rates.get("Handler_rollback", math.nan),
+            "buffer_hit_pct": 100.0
+            - ratio_pct(
+                deltas.get("Innodb_buffer_pool_reads", 0),
+                deltas.get("Innodb_buffer_pool_read_requests", 0),
+            ),
+            "disk_reads_per_sec": rates.get("Innodb_data_reads", math.nan),
+            "disk_writes_per_sec": rates.get("Innodb_data_writes", math.nan),
+            "log_bytes_per_sec": rates.get("Innodb_os_log_written", math.nan),
+            "pages_flushed_per_sec": rates.get(
+                "Innodb_buffer_pool_pages_flushed", math.nan
+            ),
+            "lock_waits_per_sec": rates.get("Innodb_row_lock_waits", math.nan),
+            "tmp_disk_tables_per_sec": rates.get("Created_tmp_disk_tables", math.nan),
+            "threads_running": gauges.get("Threads_running", math.nan),
+            "connections": gauges.get("Threads_connected", math.nan),
+            "dirty_pages": gauges.get("Innodb_buffer_pool_pages_dirty", math.nan),
+            "checkpoint_age": gauges.get("Innodb_checkpoint_age", math.nan),
+        }
+
+
+class PgStats(PgSqlClient, DbStats):
+    """pg_stat_database (all databases), pg_stat_bgwriter and pg_stat_activity"""
+
+    counters = [
+        "xact_commit",
+        "xact_rollback",
+        "blks_read",
+        "blks_hit",
+        "tup_returned",
+        "tup_fetched",
+        "tup_inserted",
+        "tup_updated",
+        "tup_deleted",
+        "deadlocks",
+        "temp_bytes",
+        "checkpoints_timed",
+        "checkpoints_req",
+        "buffers_checkpoint",
+        "buffers_clean",
+        "buffers_backend",
+    ]
+
+    def __init__(self, name, **kwargs):
+        PgSqlClient.__init__(self, **kwargs)
+        DbStats.__init__(self, name)
+        self.connect()
+
+    def read(self) -> Dict[str, float]:
+        row = self.select_one_row(
+            "select sum(xact_commit) as xact_commit, sum(xact_rollback) as xact_rollback,"
+            " sum(blks_read) as blks_read, sum(blks_hit) as blks_hit,"
+            " sum(tup_returned) as tup_returned, sum(tup_fetched) as tup_fetched,"
+            " sum(tup_inserted) as tup_inserted, sum(tup_updated) as tup_updated,"
+            " sum(tup_deleted) as tup_deleted, sum(deadlocks) as deadlocks,"
+            " sum(temp_bytes) as temp_bytes from pg_stat_database"
+        )
+        # Checkpoint columns are not there since PostgreSQL 17 (pg_stat_checkpointer)
+        row |= self.select_one_row("select * from pg_stat_bgwriter")
+        row |= self.select_one_row(
+            "select count(*) as connections,"
+            " count(*) filter (where state = 'active') as active"
+            " from pg_stat_activity where backend_type = 'client backend'"
+        )
+        values = {k: to_number(v) for k, v in row.items()}
+        return {k: v for k, v in values.items() if v is not None}
+
+    def derive(self, rates, deltas, gauges):
+        return {
+            "tps": rates.get("xact_commit", 0) + rates.get("xact_rollback", 0),
+            "rollbacks_per_sec": rates.get("xact_rollback", math.nan),
+            "buffer_hit_pct": ratio_pct(
+                deltas.get("blks_hit", 0),
+                deltas.get("blks_hit", 0) + deltas.get("blks_read", 0),
+            ),
+            "disk_reads_per_sec": rates.get("blks_read", math.nan),
+            "rows_read_per_sec": rates.get("tup_returned", 0)
+            + rates.get("tup_fetched", 0),
+            "rows_written_per_sec": rates.get("tup_inserted", 0)
+            + rates.get("tup_updated", 0)
+            + rates.get("tup_deleted", 0),
+            "deadlocks_per_sec": rates.get("deadlocks", math.nan),
+            "temp_bytes_per_sec": rates.get("temp_bytes", math.nan),
+            "checkpoints": deltas.get("checkpoints_timed", math.nan)
+            + deltas.get("checkpoints_req", math.nan),
+            "requested_checkpoints": deltas.get("checkpoints_req", math.nan),
+            "checkpoint_buffers_per_sec": rates.get("buffers_checkpoint", math.nan),
+            "bgwriter_buffers_per_sec": rates.get("buffers_clean", math.nan),
+            "backend_buffers_per_sec": rates.get("buffers_backend", math.nan),
+            "threads_running": gauges.get("active", math.nan),
+            "connections": gauges.get("connections", math.nan),
+        }
+
+
+class XpandStats(MySqlClient, DbStats):
+    """system.global_stats and system.proc_cpu, cluster wide from any node"""
+
+    counters = ["statements_total", "transactions_total", "cpu_busy", "cpu_total"]
+
+    def __init__(self, name, **kwargs):
+        MySqlClient.__init__(self, **kwargs | {"autocommit": True})
+        DbStats.__init__(self, name)
+        self.connect()
+
+    def read(self) -> Dict[str, float]:
+        values = {
+            row["name"]: float(row["value"])
+            for row in self.select_all_rows(
+                "select name, value from system.global_stats"
+                " where name in ('statements_total', 'transactions_total')"
+            )
+        }
+        cpu = self.select_one_row(
+            "select sum(user+nice+system+irq+softirq+steal_time+guest) as cpu_busy,"
+            "sum(user+nice+system+iowait+irq+softirq+steal_time+guest+idle) as cpu_total"
+            " from system.proc_cpu"
+        )
+        values |= {k: float(v) for k, v in cpu.items() if v is not None}
+        values |= self.select_one_row(
+            "select count(*) as connections from system.sessions"
+        )
+        return values
+
+    def derive(self, rates, deltas, gauges):
+        return {
+            "qps": rates.get("statements_total", math.nan),
+            "tps": rates.get("transactions_total", math.nan),
+            "cpu_busy_pct": ratio_pct(
+                deltas.get("cpu_busy", 0), deltas.get("cpu_total", 0)
+            ),
+            "connections": float(gauges.get("connections", math.nan)),
+        }
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pandas as pd
+import tabulate as tb
+
+from lib.mysql_client import MySqlClient, MySqlClientException
+from lib.sql_fingerprint import fingerprint_hash
+
+DEFAULT_LIMIT = 6
+DEFAULT_EXPLAIN_WORKERS = 4
+STATEMENT_CUTOFF = 200
+# Output column -> aggregate over system.qpc_queries rows of the same statement
+QPC_COLUMNS = {
+    "exec_count": "sum(exec_count)",
+    "total_lat_ms": "sum(exec_count * avg_latency_ms)",
+    "cpu_runtime_ms": "sum(cpu_runtime_ns) / 1000000",
+    "cpu_waittime_ms": "sum(cpu_waittime_ns) / 1000000",
+    "fc_waittime_ms": "sum(fc_waittime_ns) / 1000000",
+    "bm_waittime_ms": "sum(bm_waittime_ns) / 1000000",
+    "lockman_waittime_ms": "sum(lockman_waittime_ms)",
+    "trxstate_waittime_ms": "sum(trxstate_waittime_ms)",
+    "bm_perm_waittime_ms": "sum(bm_perm_waittime_ms)",
+    "wal_perm_waittime_ms": "sum(wal_perm_waittime_ms)",
+    "forwards": "sum(forwards)",
+    "broadcasts": "sum(broadcasts)",
+    "fragment_executions": "sum(fragment_executions)",
+    "barrier_forwards": "sum(barrier_forwards)",
+}
+
+
+def statement_fingerprint(statement: str) -> str:
+    """Same fingerprint for statements different only in literal values
+
+    Hash of lib.sql_fingerprint.fingerprint, the one replay reports use
+    """
+    return fingerprint_hash(statement)
+
+
+def aggregate_statements(rows: List[Dict], limit: int) -> pd.DataFrame:
+    """Statements with the same fingerprint merged, top `limit` by total latency
+
+    Columns: fingerprint, statement (first seen, literals kept for EXPLAIN),
+    avg_lat_ms and QPC_COLUMNS
+    """
+    if not rows:
+        return pd.DataFrame(columns=["fingerprint", "statement", "avg_lat_ms"])
+    df = pd.DataFrame(rows)
+    df[list(QPC_COLUMNS)] = df[list(QPC_COLUMNS)].astype(float)
+    df["statement"] = df["statement"].map(lambda s: " ".join(s.split()))
+    df.insert(0, "fingerprint", df["statement"].map(statement_fingerprint))
+    df = df.groupby("fingerprint", as_index=False, sort=False).agg(
+        {"statement": "first"} | {c: "sum" for c in QPC_COLUMNS}
+    )
+    df.insert(
+        2,
+        "avg_lat_ms",
+        (df["total_lat_ms"] / df["exec_count"]).where(df["exec_count"] > 0),
+    )
+    df = df.sort_values("total_lat_ms", ascending=False).head(limit)
+    return df.reset_index(drop=True)
+
+
+class QpcAnalyzer(MySqlClient):
+    """Top statements of the Xpand query performance cache (QPC) with their plans
+
+    flush() resets QPC on every host, statements() reads what was executed since then.
+    EXPLAIN runs concurrently over explain_workers connections, plans are cached by
+    statement fingerprint, so a statement seen again in the next step is not explained
+    twice
+    """
+
+    def __init__(
+        self,
+        limit: int = DEFAULT_LIMIT,
+        explain_workers: int = DEFAULT_EXPLAIN_WORKERS,
+        **kwargs,
+    ):
+        self.connect_kwargs = kwargs | {"autocommit": True}
+        MySqlClient.__init__(self, **self.connect_kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.hosts = kwargs.get("host").split(",")
+        self.database = kwargs.get("database")
+        self.limit = limit
+        self.explain_workers = explain_workers
+        self.explains: Dict[str, str] = {}  # fingerprint -> plan
+        self.clients = queue.Queue()  # idle EXPLAIN connections
+        self.connect()
+
+    def flush(self):
+        """QPC is per node, flush it on every host"""
+        for host in self.hosts:
+            client = (
+                self
+                if host == self.host
+                else MySqlClient(**self.connect_kwargs | {"host": host})
+            )
+            if client.conn is None:
+                client.connect()
+            client.execute("call system.qpc_flush()")
+            if client is not self:
+                client.conn.close()
+
+    def statements(self) -> pd.DataFrame:
+        """Top statements of the database executed since the last flush"""
+        rows = self.select_all_rows(
+            "select statement, "
+            + ", ".join(f"{expr} as {name}" for name, expr in QPC_COLUMNS.items())
+            + " from system.qpc_queries where flushed = 0 and database = %s"
+            " group by statement",
+            (self.database,),
+        )
+        return aggregate_statements(rows, self.limit)
+
+    def _explain(self, statement: str) -> str:
+        try:
+            client = self.clients.get_nowait()
+        except queue.Empty:
+            client = MySqlClient(**self.connect_kwargs)
+            client.connect()
+        try:
+            rows = client.select_all_rows(f"EXPLAIN {statement}")
+        except MySqlClientException:
+            self.logger.warning(f"Invalid SQL: EXPLAIN {statement}")
+            rows = []
+        finally:
+            self.clients.put(client)
+        tb.PRESERVE_WHITESPACE = True
+        return tb.tabulate(rows, headers="keys", numalign="right", tablefmt="presto")
+
+    def explain(self, statements: pd.DataFrame) -> Dict[str, str]:
+        """Plans of the statements by fingerprint, only new fingerprints are explained"""
+        new = {
+            fingerprint: statement
+            for fingerprint, statement in zip(
+                statements["fingerprint"], statements["statement"]
+            )
+            if fingerprint not in self.explains
+        }
+        if new:
+            with ThreadPoolExecutor(
+                max_workers=self.explain_workers, thread_name_prefix="explain"
+            ) as executor:
+                plans = executor.map(self._explain, new.values())
+                self.explains |= dict(zip(new, plans))
+        return {f: self.explains[f] for f in statements["fingerprint"]}
+
+    def save_explains(self, file_name: str, statements: pd.DataFrame):
+        """Plans in the explain_queries.txt format"""
+        plans = self.explain(statements)
+        with open(file_name, "w") as f:
+            for fingerprint, statement in zip(
+                statements["fingerprint"], statements["statement"]
+            ):
+                f.write(
+                    f"--------------\nstatement = {statement}\n"
+                    f"fingerprint = {fingerprint}\n--------------\n"
+                    f"{plans[fingerprint]}\n\n\n"
+                )
+
+    def close(self):
+        while not self.clients.empty():
+            self.clients.get_nowait().conn.close()
+        if self.conn is not None:
+            self.conn.close()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+from typing import Dict, Tuple
+
+from lib.mysql_client import MySqlClient, MySqlClientException
+from lib.pgsql_client import PgSqlClient
+
+WaitKey = Tuple[str, str]  # wait class, wait event
+
+
+def wait_class(event_name: str) -> str:
+    """performance_schema event class: wait/io/file/innodb/innodb_data_file -> io/file"""
+    parts = event_name.split("/")
+    return "/".join(parts[1:3]) if parts[0] == "wait" else parts[0]
+
+
+class WaitStats:
+    """Base class of wait samplers
+
+    counters() returns cumulative wait time (ms) per wait, deltas between the start and
+    the end of a step give the wait time of the step. sessions() returns sessions
+    waiting right now, sampled during the step: every waiting session adds the sample
+    interval to the wait time (active session history)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def counters(self) -> Dict[WaitKey, float]:
+        return {}
+
+    def sessions(self) -> Dict[WaitKey, int]:
+        return {}
+
+
+class MysqlWaits(MySqlClient, WaitStats):
+    """performance_schema wait summary and InnoDB row lock waits of MariaDB/MySQL"""
+
+    # MySQL 8 has data_lock_waits, MariaDB has information_schema.INNODB_LOCK_WAITS
+    lock_wait_queries = [
+        "select concat(l.OBJECT_SCHEMA, '.', l.OBJECT_NAME) as object, count(*) as waits"
+        " from performance_schema.data_lock_waits w join performance_schema.data_locks l"
+        " on l.ENGINE_LOCK_ID = w.BLOCKING_ENGINE_LOCK_ID group by object",
+        "select l.lock_table as object, count(*) as waits"
+        " from information_schema.INNODB_LOCK_WAITS w join information_schema.INNODB_LOCKS l"
+        " on l.lock_id = w.blocking_lock_id group by object",
+    ]
+
+    def __init__(self, name, **kwargs):
+        MySqlClient.__init__(self, **kwargs | {"autocommit": True})
+        WaitStats.__init__(self, name)
+        self.connect()
+        self.lock_wait_query = None
+        for query in self.lock_wait_queries:
+            try:
+                self.select_all_rows(query)
+                self.lock_wait_query = query
+                break
+            except MySqlClientException:  # no such table
+                continue
+
+    def counters(self) -> Dict[WaitKey, float]:
+        rows = self.select_all_rows(
+            "select EVENT_NAME as event, SUM_TIMER_WAIT / 1000000000 as wait_ms"
+            " from performance_schema.events_waits_summary_global_by_event_name"
+            " where SUM_TIMER_WAIT > 0 and EVENT_NAME <> 'idle'"
+        )
+        return {(wait_class(r["event"]), r["event"]): float(r["wait_ms"]) for r in rows}
+
+    def sessions(self) -> Dict[WaitKey, int]:
+        if self.lock_wait_query is None:
+            return {}
+        return {
+            ("lock/row", r["object"]): int(r["waits"])
+            for r in self.select_all_rows(self.lock_wait_query)
+        }
+
+
+class PgWaits(PgSqlClient, WaitStats):
+    """pg_stat_activity.wait_event of active client sessions, CPU if not waiting"""
+
+    def __init__(self, name, **kwargs):
+        PgSqlClient.__init__(self, **kwargs)
+        WaitStats.__init__(self, name)
+        self.connect()
+
+    def sessions(self) -> Dict[WaitKey, int]:
+        rows = self.select_all_rows(
+            "select coalesce(wait_event_type, 'CPU') as class,"
+            " coalesce(wait_event, 'running') as event, count(*) as sessions"
+            " from pg_stat_activity where state = 'active'"
+            " and backend_type = 'client backend' and pid <> pg_backend_pid()"
+            " group by 1, 2"
+        )
+        return {(r["class"], r["event"]): int(r["sessions"]) for r in rows}
+
+
+class XpandWaits(MySqlClient, WaitStats):
+    """Wait times of all queries of the database in the query performance cache"""
+
+    qpc_waits = {
+        "cpu_wait": "sum(cpu_waittime_ns) / 1000000",
+        "flow_control": "sum(fc_waittime_ns) / 1000000",
+        "bm": "sum(bm_waittime_ns) / 1000000",
+        "lockman": "sum(lockman_waittime_ms)",
+        "trxstate": "sum(trxstate_waittime_ms)",
+        "bm_perm": "sum(bm_perm_waittime_ms)",
+        "wal_perm": "sum(wal_perm_waittime_ms)",
+    }
+
+    def __init__(self, name, **kwargs):
+        MySqlClient.__init__(self, **kwargs | {"autocommit": True})
+        WaitStats.__init__(self, name)
+        self.database = kwargs.get("database")
+        self.connect()
+
+    def counters(self) -> Dict[WaitKey, float]:
+        row = self.select_one_row(
+            "select "
+            + ", ".join(f"{expr} as {name}" for name, expr in self.qpc_waits.items())
+            + " from system.qpc_queries where database = %s",
+            (self.database,),
+        )
+        return {
+            ("qpc", name): float(value)
+            for name, value in row.items()
+            if value is not None
+        }
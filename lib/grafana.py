@@ -1,11 +1,17 @@
+import copy
 import json
 import logging
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from typing import Dict, List, Tuple
 
 from grafana_client import GrafanaApi
 
 SNAPSHOT_EXPIRATION = 31536000  # 1yr retention
+SNAPSHOT_WORKERS = 8  # concurrent snapshot requests per Grafana server
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 # product to dashboard UID mapping
 product_dashboards = {
     "xpand": ["xpandstats", "nodeexporter"],
@@ -33,6 +39,17 @@ class Grafana:
         self.api = GrafanaApi(auth, host=host, port=port, verify=verify)
         self.api.url = self.host_url  # GrafanaAPI never sets this
         self.logger.debug(self.api.connect())
+        self.dashboards: Dict[str, dict] = {}  # uid -> dashboard definition
+        self.lock = threading.Lock()
+
+    def get_dashboard(self, uid: str) -> dict:
+        """Copy of the dashboard definition, fetched once per server"""
+        with self.lock:
+            if uid not in self.dashboards:
+                self.dashboards[uid] = self.api.dashboard.get_dashboard(uid)[
+                    "dashboard"
+                ]
+            return copy.deepcopy(self.dashboards[uid])
 
     def update_var_template(self, dashboard, var_name, var_value):
         for index, variable in enumerate(dashboard["templating"]["list"]):
@@ -48,24 +65,54 @@ class Grafana:
                 dashboard["templating"]["list"][index]["type"] = "custom"
                 dashboard["templating"]["list"][index]["query"] = var_value
 
-    def create_snapshot(self, cluster, time_from, time_to):
-        snapshot_urls = []
+    def snapshot_requests(
+        self, cluster, time_from: str, time_to: str, label: str = ""
+    ) -> List[Tuple[str, dict]]:
+        """Snapshot name and dashboard of every product dashboard and node group
+
+        Args:
+            time_from, time_to (str): UTC "%Y-%m-%d %H:%M:%S"
+            label (str): added to snapshot names, e.g. step of the run
+        """
+        if cluster.bt.product not in product_dashboards.keys():
+            self.logger.warning(f"No dashboards exist for {cluster.bt.product}")
+            return []
         # Convert to UTC in case method was called with local TZ timestamps
-        utc_from = datetime.strptime(time_from, "%Y-%m-%d %H:%M:%S").replace(
-            tzinfo=timezone.utc
-        )
-        utc_to = datetime.strptime(time_to, "%Y-%m-%d %H:%M:%S").replace(
+        utc_from = datetime.strptime(time_from, TIME_FORMAT).replace(
             tzinfo=timezone.utc
         )
+        utc_to = datetime.strptime(time_to, TIME_FORMAT).replace(tzinfo=timezone.utc)
         iso_from = utc_from.isoformat()
         iso_to = utc_to.isoformat()
-        from_string = utc_from.strftime("%y%m%d.%H%M%S")
-        to_string = utc_to.strftime("%y%m%d.%H%M%S")
-        if cluster.bt.product in product_dashboards.keys():
-            for dashboard_name in product_dashboards[cluster.bt.product]:
-                dashboard = self.api.dashboard.get_dashboard(dashboard_name)[
-                    "dashboard"
+        window = (
+            f"{utc_from.strftime('%y%m%d.%H%M%S')}-{utc_to.strftime('%y%m%d.%H%M%S')}"
+        )
+        if label:
+            window = f"{label}_{window}"
+        requests = []
+        for dashboard_name in product_dashboards[cluster.bt.product]:
+            if dashboard_name == "nodeexporter":
+                node_names = [
+                    group[0].name.split(",")[0]  # Get first node in each group
+                    for group in cluster.level_order_group_cluster_members()
+                ]
+                node_names = [
+                    n for n in node_names if cluster.members.get(n).vm.managed
                 ]
+                snapshot_names = [
+                    f"{cluster.cluster_name}_{dashboard_name}_{n}_{window}"
+                    for n in node_names
+                ]
+            else:
+                # Assuming other backend dashboards if not nodeexporter
+                node = cluster.get_backend_nodes()[0].vm
+                node_names = [node.name] if node.managed else []
+                snapshot_names = [
+                    f"{cluster.cluster_name}_{dashboard_name}_{window}"
+                    for _ in node_names
+                ]
+            for node_name, snapshot_name in zip(node_names, snapshot_names):
+                dashboard = self.get_dashboard(dashboard_name)
                 dashboard["time"] = {
                     "from": iso_from,
                     "raw": {"from": iso_from, "to": iso_to},
@@ -73,45 +120,57 @@ class Grafana:
                 }
                 dashboard["refresh"] = ""
                 self.update_var_template(dashboard, "cluster", cluster.cluster_name)
-                if dashboard_name == "nodeexporter":
-                    node_names = [
-                        group[0].name.split(",")[0]  # Get first node in each group
-                        for group in cluster.level_order_group_cluster_members()
-                    ]
-                    for node_name in node_names:
-                        if cluster.members.get(node_name).vm.managed:
-                            self.update_var_template(dashboard, "node", node_name)
-                            snapshot_name = f"{cluster.cluster_name}_{dashboard_name}_{node_name}_{from_string}-{to_string}"
-                            snapshot = self.api.snapshots.create_new_snapshot(
-                                dashboard,
-                                name=snapshot_name,
-                                expires=SNAPSHOT_EXPIRATION,
-                                key=snapshot_name,
-                                delete_key=snapshot_name,
-                            )
-                            snapshot_url = snapshot["url"]
-                            snapshot_url = snapshot_url.replace(
-                                "localhost:3000", self.host_url
-                            )
-                            snapshot_urls.append(snapshot_url)
-                else:
-                    # Assuming other backend dashboards if not nodeexporter
-                    node = cluster.get_backend_nodes()[0].vm
-                    if node.managed:
-                        self.update_var_template(dashboard, "node", node.name)
-                        snapshot_name = f"{cluster.cluster_name}_{dashboard_name}_{from_string}-{to_string}"
-                        snapshot = self.api.snapshots.create_new_snapshot(
-                            dashboard,
-                            name=snapshot_name,
-                            expires=SNAPSHOT_EXPIRATION,
-                            key=snapshot_name,
-                            delete_key=snapshot_name,
-                        )
-                        snapshot_url = snapshot["url"]
-                        snapshot_url = snapshot_url.replace(
-                            "localhost:3000", self.host_url
-                        )
-                        snapshot_urls.append(snapshot_url)
-        else:
-            self.logger.warning(f"No dashboards exist for {cluster.bt.product}")
-        return snapshot_urls
+                self.update_var_template(dashboard, "node", node_name)
+                requests.append((snapshot_name, dashboard))
+        return requests
+
+    def _create_snapshot(self, request: Tuple[str, dict]) -> str:
+        snapshot_name, dashboard = request
+        snapshot = self.api.snapshots.create_new_snapshot(
+            dashboard,
+            name=snapshot_name,
+            expires=SNAPSHOT_EXPIRATION,
+            key=snapshot_name,
+            delete_key=snapshot_name,
+        )
+        return snapshot["url"].replace("localhost:3000", self.host_url)
+
+    def create_snapshots(
+        self, requests: List[Tuple[str, dict]], workers: int = SNAPSHOT_WORKERS
+    ) -> List[str]:
+        """Snapshot URLs in the order of requests, created concurrently"""
+        if not requests:
+            return []
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="snapshot"
+        ) as executor:
+            return list(executor.map(self._create_snapshot, requests))
+
+    def create_snapshot(
+        self, cluster, time_from, time_to, workers: int = SNAPSHOT_WORKERS
+    ):
+        return self.create_snapshots(
+            self.snapshot_requests(cluster, time_from, time_to), workers
+        )
+
+    def create_step_snapshots(
+        self, cluster, steps: List[dict], workers: int = SNAPSHOT_WORKERS
+    ) -> List[Tuple[dict, str]]:
+        """Snapshots of every step window (repeat, concurrency, rate, start, end epoch)
+
+        Returns:
+            List[Tuple[dict, str]]: step and snapshot URL
+        """
+        requests, request_steps = [], []
+        for step in steps:
+            label = f"r{step['repeat']}_c{step['concurrency']}"
+            if step.get("rate"):
+                label = f"{label}_rate{step['rate']}"
+            time_from, time_to = (
+                datetime.fromtimestamp(step[k], tz=timezone.utc).strftime(TIME_FORMAT)
+                for k in ("start", "end")
+            )
+            step_requests = self.snapshot_requests(cluster, time_from, time_to, label)
+            requests += step_requests
+            request_steps += [step] * len(step_requests)
+        return list(zip(request_steps, self.create_snapshots(requests, workers)))
@@ -0,0 +1,175 @@
+import csv
+import gzip
+import json
+import logging
+import math
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import requests
+
+DEFAULT_PORT = 9090
+DEFAULT_STEP = 10  # seconds between points
+MAX_POINTS = 11000  # Prometheus refuses range queries with more points per series
+REQUEST_TIMEOUT = 300
+EXPORT_FIELDS = ["time", "member", "metric", "labels", "value"]
+# Labels every registered target has, they are columns of the export already
+MEMBER_LABELS = ["__name__", "cluster_name", "name"]
+
+
+class PrometheusException(Exception):
+    pass
+
+
+def to_epoch(timestamp: str) -> float:
+    """UTC timestamp saved by WorkloadRunning.save_timestamp to epoch"""
+    return (
+        datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+        .replace(tzinfo=timezone.utc)
+        .timestamp()
+    )
+
+
+def range_step(start: float, end: float, step: float) -> float:
+    """Step close to the requested one, but without too many points per series"""
+    return max(step, math.ceil((end - start) / MAX_POINTS))
+
+
+class Prometheus:
+    """Pull time series of cluster members from Prometheus using range queries"""
+
+    def __init__(self, url: str):
+        self.logger = logging.getLogger(__name__)
+        self.url = url.rstrip("/")
+
+    @classmethod
+    def from_metric_server(cls, metric_server: Dict) -> "Prometheus":
+        """Prometheus of the metric server from cloud.yaml
+
+        prometheus_url is used if set, otherwise the metric server hostname on port 9090
+        """
+        url = metric_server.get("prometheus_url")
+        if url is None:
+            url = f"http://{metric_server['hostname']}:{DEFAULT_PORT}"
+        return cls(url)
+
+    def query_range(
+        self, query: str, start: float, end: float, step: float = DEFAULT_STEP
+    ) -> List[Dict]:
+        """Run a range query
+
+        Returns:
+            List[Dict]: series as returned by Prometheus, every series has metric
+                (labels) and values ([epoch, "value"] pairs)
+        """
+        try:
+            response = requests.get(
+                f"{self.url}/api/v1/query_range",
+                params={
+                    "query": query,
+                    "start": start,
+                    "end": end,
+                    "step": range_step(start, end, step),
+                },
+                timeout=REQUEST_TIMEOUT,
+            )
+            body = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise PrometheusException(f"Range query {query} failed: {e}")
+        if body.get("status") != "success":
+            raise PrometheusException(
+                f"Range query {query} failed: {body.get('error', response.status_code)}"
+            )
+        return body["data"]["result"]
+
+    @staticmethod
+    def member_query(
+        cluster_name: str, member: str, metrics: Optional[List[str]] = None
+    ) -> str:
+        """All series of the member, or only metrics matching any of the regexps"""
+        selector = f'cluster_name="{cluster_name}",name="{member}"'
+        if metrics:
+            selector = f'__name__=~"{"|".join(metrics)}",{selector}'
+        return f"{{{selector}}}"
+
+    def export_range(
+        self,
+        file_name: str,
+        cluster_name: str,
+        members: List[str],
+        start: float,
+        end: float,
+        step: float = DEFAULT_STEP,
+        metrics: Optional[List[str]] = None,
+    ) -> int:
+        """Save all series of the members as gzip compressed csv
+
+        Every row is one point: time, member, metric, labels (json) and value. Series of
+        all exporters registered for the member (node, database, xpand, workload) are
+        saved unless metrics limits them.
+
+        Returns:
+            int: number of points saved
+        """
+        points = 0
+        with gzip.open(file_name, "wt", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_FIELDS)
+            for member in members:
+                query = self.member_query(cluster_name, member, metrics)
+                for series in self.query_range(query, start, end, step):
+                    metric = series["metric"].get("__name__", "")
+                    labels = json.dumps(
+                        {
+                            k: v
+                            for k, v in series["metric"].items()
+                            if k not in MEMBER_LABELS
+                        },
+                        sort_keys=True,
+                    )
+                    writer.writerows(
+                        (timestamp, member, metric, labels, value)
+                        for timestamp, value in series["values"]
+                    )
+                    points += len(series["values"])
+        self.logger.info(
+            f"{points} points of {len(members)} member(s) saved as {file_name}"
+        )
+        return points
+
+    def export_steps(
+        self,
+        directory: str,
+        steps: List[Dict],
+        cluster_name: str,
+        members: List[str],
+        step: float = DEFAULT_STEP,
+        metrics: Optional[List[str]] = None,
+    ) -> List[str]:
+        """One export per benchmark step
+
+        Args:
+            steps (List[Dict]): rows of {workload}_steps.csv (repeat, concurrency,
+                rate, start, end)
+
+        Returns:
+            List[str]: saved files
+        """
+        files = []
+        for s in steps:
+            file_name = os.path.join(
+                directory,
+                f"step_{s['repeat']}_{s['concurrency']}_{s['rate']}.csv.gz",
+            )
+            self.export_range(
+                file_name,
+                cluster_name,
+                members,
+                s["start"],
+                s["end"],
+                step,
+                metrics,
+            )
+            files.append(file_name)
+        return files
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Statement fingerprints shared by replay (query logs) and QPC reports.
+
+Statements that differ only in literal values get the same fingerprint:
+
+    SELECT c FROM t WHERE id IN (1, 2, 3) AND k = 'a''b'  -> select c from t where id in (?+) and k = ?
+    INSERT INTO t VALUES (1, 'x'), (2, 'y')                -> insert into t values (?+)+
+"""
+
+import hashlib
+import re
+
+STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+VALUES_LIST_RE = re.compile(r"(\(\?\+?\))(?:\s*,\s*\(\?\+?\))+")
+COMMENT_RE = re.compile(r"/\*.*?\*/|--[^\n]*", re.DOTALL)
+SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Normalize statement: literals become ?, lists collapse, whitespace is single"""
+    fp = COMMENT_RE.sub(" ", sql)
+    fp = STRING_RE.sub("?", fp)
+    fp = NUMBER_RE.sub("?", fp)
+    fp = IN_LIST_RE.sub("(?+)", fp)
+    fp = VALUES_LIST_RE.sub(r"\1+", fp)
+    fp = SPACE_RE.sub(" ", fp).strip().rstrip(";").strip()
+    return fp.lower()
+
+
+def fingerprint_hash(sql: str) -> str:
+    """Short stable id of the fingerprint, e.g. for file names and joins"""
+    return hashlib.md5(fingerprint(sql).encode()).hexdigest()[:16]
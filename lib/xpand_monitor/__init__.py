@@ -1,2 +1,3 @@
 from .xpand_monitor import XpandMonitor
+from .replica_monitor import ReplicaMonitor
 from .memoize import Memoized
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+
+from lib.mysql_client import MySqlClient
+from .memoize import Memoized
+
+
+class ReplicaMonitor(MySqlClient):
+    """MariaDB/MySQL replica (ColumnStore, MariaDB replication) counterpart of XpandMonitor"""
+
+    def __init__(self, name, **kwargs):
+        super(ReplicaMonitor, self).__init__(**kwargs)
+        self.name = name
+        self.connect()
+
+    @Memoized(rate_metrics=["applied_tps", "relay_log_growth"])
+    def replication_stats(self):
+        """Lag (sec), applied transactions and relay log bytes of the replica
+
+        Applied transactions are Handler_commit, the replica is expected to be written
+        by replication only. Lag is None if the SQL thread is not running
+        """
+        status = self.select_one_row("SHOW SLAVE STATUS")
+        commits = self.select_one_row("SHOW GLOBAL STATUS LIKE 'Handler_commit'")
+        return (
+            self.name,
+            {
+                "lag": status.get("Seconds_Behind_Master"),
+                "applied_tps": int(commits.get("Value", 0)),
+                "relay_log_growth": int(status.get("Relay_Log_Space", 0)),
+                "last_error": status.get("Last_SQL_Error")
+                or status.get("Last_Error", ""),
+            },
+        )
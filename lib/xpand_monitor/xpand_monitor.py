@@ -2,8 +2,7 @@
 # Copyright (C) 2021 dvolkov
 
 
-from mariadb_client import MariaDbClient, MariaDbClientException, NoDataFoundException
-from mysql_client.mysql_client import MySqlClient
+from lib.mysql_client import MySqlClient
 from .memoize import Memoized
 
 
@@ -22,11 +21,9 @@ class XpandMonitor(MySqlClient):
 
     @Memoized()
     def seconds_slave_behind(self):
-        try:
-            query = "select Seconds_Behind_Master as slv_sec_behind, Last_Error as last_error from system.mysql_slave_status"
-            return (self.name, self.select_one_row(query))
-        except NoDataFoundException as e:
-            return (self.name, {"slv_sec_behind": 0, "last_error": "NA"})
+        query = "select Seconds_Behind_Master as slv_sec_behind, Last_Error as last_error from system.mysql_slave_status"
+        row = self.select_one_row(query)
+        return (self.name, row or {"slv_sec_behind": 0, "last_error": "NA"})
 
     @Memoized(rate_metrics=["qps", "tps"])
     def system_stats(self):
@@ -46,3 +43,24 @@ class XpandMonitor(MySqlClient):
         )
 
         return (self.name, self.select_one_row(query))
+
+    @Memoized(rate_metrics=["applied_tps", "relay_log_growth"])
+    def replication_stats(self):
+        """Lag (sec), applied transactions and relay log bytes of the replica
+
+        Transactions are cluster wide transactions_total, the replica is expected to be
+        written by replication only. Relay log is NaN if the build doesn't report it
+        """
+        status = self.select_one_row("select * from system.mysql_slave_status")
+        tps = self.select_one_row(
+            "select value from system.global_stats where name = 'transactions_total'"
+        )
+        return (
+            self.name,
+            {
+                "lag": status.get("Seconds_Behind_Master"),
+                "applied_tps": int(tps.get("value", 0)),
+                "relay_log_growth": status.get("Relay_Log_Bytes_Read", float("nan")),
+                "last_error": status.get("Last_Error", ""),
+            },
+        )
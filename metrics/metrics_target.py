@@ -1,6 +1,11 @@
 from common import json_pretty_please
 
 
+def target_key(group: dict) -> str:
+    """Member name and address identify a target group in a file_sd file"""
+    return f"{group['labels'].get('name')}@{','.join(group['targets'])}"
+
+
 class MetricsTarget:
     """
     Defines the prometheus consumable metrics scraping target file and filenames
@@ -12,17 +17,20 @@ class MetricsTarget:
         self.hostname = hostname
         self.port = port
 
+    def group(self) -> dict:
+        """file_sd target group of the exporter"""
+        return {
+            "labels": self.labels,
+            "targets": [
+                f"{self.hostname}:{self.port}",
+            ],
+        }
+
+    def key(self) -> str:
+        return target_key(self.group())
+
     def target(self) -> str:
-        t = [
-            {
-                "labels": self.labels,
-                "targets": [
-                    f"{self.hostname}:{self.port}",
-                ],
-            }
-        ]
-
-        return json_pretty_please(t)
+        return json_pretty_please([self.group()])
 
     def target_name(self) -> str:
         return f"{self.labels.get('cluster_name')}-{self.labels.get('name')}-{self.service_name}-exporter.json"
@@ -1,25 +1,62 @@
+import json
 import logging
 import os
 import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
 
+from common import json_pretty_please
 from compute.ssh_client import SshClient
 
-from .metrics_target import MetricsTarget
+from .metrics_target import MetricsTarget, target_key
+
+TARGET_GROUPINGS = ["cluster", "role"]
+
+
+def merge_targets(
+    current: List[dict], changes: Dict[str, Optional[dict]]
+) -> List[dict]:
+    """Apply added (group) and removed (None) targets to the content of a file_sd file
+
+    Args:
+        current (List[dict]): target groups already in the file
+        changes (Dict[str, Optional[dict]]): target groups by target_key
+    """
+    groups = {target_key(g): g for g in current}
+    for key, group in changes.items():
+        if group is None:
+            groups.pop(key, None)
+        else:
+            groups[key] = group
+    return sorted(groups.values(), key=target_key)
 
 
 class MetricsServer:
     """
     singleton class that provides dynamic registration of metric scraping targets
+
+    All targets of a cluster (or of a role in the cluster with target_grouping: role)
+    live in one file_sd file. Inside batch() registrations are only collected and
+    every file is updated once, with one upload and an atomic rename, when the batch
+    is over.
     """
 
     __instance = None
 
     def initialize(self, **kwargs):
+        if getattr(self, "_pending", None):
+            self.flush()  # pending targets belong to the previous server
 
         self.remote_target_path = kwargs.get("remote_target_path")
+        self.target_grouping = kwargs.get("target_grouping", "cluster")
         self.logger = logging.getLogger(__name__)
         self._prometheus_user: str = "nobody"
         self._prometheus_group: str = self._prometheus_user
+        self._lock = threading.RLock()
+        self._pending: Dict[str, Dict[str, Optional[dict]]] = {}
+        self._legacy: Dict[str, List[str]] = {}
+        self._batch_depth = 0
 
         hostname = kwargs.get("hostname", None)
         if hostname:  # Some cloud may not have MetricsServer
@@ -38,45 +75,105 @@ class MetricsServer:
             MetricsServer.__instance = object.__new__(cls)
         return MetricsServer.__instance
 
+    def target_file_name(self, exporter: MetricsTarget) -> str:
+        """file_sd file of the exporter"""
+        cluster_name = exporter.labels.get("cluster_name")
+        if self.target_grouping == "role":
+            return f"{cluster_name}-{exporter.labels.get('role')}-targets.json"
+        return f"{cluster_name}-targets.json"
+
+    @contextmanager
+    def batch(self):
+        """Collect registrations and update target files once at the end"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                done = self._batch_depth == 0
+            if done:
+                self.flush()
+
     def register_metric_target(self, exporter: MetricsTarget):
-        """Send metric file to the prometheus server
+        """Add the exporter to the target file of its cluster
 
         Args:
             exporter (MetricsTarget): prometheus consumable metrics
         """
-        if self.ssh_client is None:
-            self.logger.warning('Metric server is missing in the config')
-
-        else:
-            t: str = exporter.target()
-            fname: str = os.path.basename(exporter.target_name())
-            self.logger.debug(f"Prometheus metric target: {t}")
-
-            temp_file = tempfile.NamedTemporaryFile(delete=False)
-            temp_file.write(str.encode(t))
-            temp_file.close()
-
-            self.ssh_client.send_files(temp_file.name, f"/tmp/{fname}")
-
-            # we have to use `mv` after `scp` because we are scp'ing a file to
-            # a docker volume that will be owned by root
-            finalize_file: str = f"""
-            mv /tmp/{fname} {self.remote_target_path}/{fname}
-            chown {self._prometheus_user}:{self._prometheus_group} {self.remote_target_path}/{fname}
-            chmod +r {self.remote_target_path}/{fname}
-            """
-
-            self.ssh_client.run(finalize_file, sudo=True)
-            os.unlink(temp_file.name)
+        self._queue(exporter, exporter.group())
 
     def deregister_metric_target(self, exporter: MetricsTarget):
+        self._queue(exporter, None)
+
+    def _queue(self, exporter: MetricsTarget, group: Optional[dict]):
         if self.ssh_client is None:
-            self.logger.warning('Metric server is missing in the config')
-        else:
-            fname = exporter.target_name()
-            self.ssh_client.run(
-                f"rm {self.remote_target_path}/{fname}", sudo=True, ignore_errors=True
-            )
+            self.logger.warning("Metric server is missing in the config")
+            return
+        self.logger.debug(f"Prometheus metric target: {exporter.target()}")
+        with self._lock:
+            file_name = self.target_file_name(exporter)
+            self._pending.setdefault(file_name, {})[exporter.key()] = group
+            # Targets registered before were saved one file per exporter
+            self._legacy.setdefault(file_name, []).append(exporter.target_name())
+            batching = self._batch_depth > 0
+        if not batching:
+            self.flush()
+
+    def flush(self):
+        """Write all pending changes, one upload per target file"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            legacy, self._legacy = self._legacy, {}
+            for file_name, changes in pending.items():
+                targets = merge_targets(self._read_targets(file_name), changes)
+                self._write_targets(file_name, targets, legacy.get(file_name, []))
+                self.logger.debug(
+                    f"{file_name} updated with {len(changes)} change(s),"
+                    f" {len(targets)} target(s)"
+                )
+
+    def _read_targets(self, file_name: str) -> List[dict]:
+        content = self.ssh_client.run(
+            f"cat {self.remote_target_path}/{file_name} 2>/dev/null || true", sudo=True
+        )
+        if not content or not content.strip():
+            return []
+        try:
+            return json.loads(content)
+        except ValueError:
+            self.logger.warning(f"{file_name} is not valid json, rewriting it")
+            return []
+
+    def _write_targets(self, file_name: str, targets: List[dict], legacy: List[str]):
+        path = f"{self.remote_target_path}/{file_name}"
+        remove_legacy = "\n".join(
+            f"rm -f {self.remote_target_path}/{name}" for name in sorted(set(legacy))
+        )
+        if not targets:
+            self.ssh_client.run(f"rm -f {path}\n{remove_legacy}", sudo=True)
+            return
+
+        temp_file = tempfile.NamedTemporaryFile(delete=False)
+        temp_file.write(str.encode(json_pretty_please(targets)))
+        temp_file.close()
+
+        self.ssh_client.send_files(temp_file.name, f"/tmp/{file_name}")
+
+        # we have to use `mv` after `scp` because we are scp'ing a file to
+        # a docker volume that will be owned by root. The last `mv` is in the same
+        # directory, so Prometheus never reads a partially written file
+        finalize_file: str = f"""
+        mv /tmp/{file_name} {self.remote_target_path}/.{file_name}.tmp
+        chown {self._prometheus_user}:{self._prometheus_group} {self.remote_target_path}/.{file_name}.tmp
+        chmod +r {self.remote_target_path}/.{file_name}.tmp
+        mv -f {self.remote_target_path}/.{file_name}.tmp {path}
+        {remove_legacy}
+        """
+
+        self.ssh_client.run(finalize_file, sudo=True)
+        os.unlink(temp_file.name)
 
     def deregister_cluster(self, cluster_name: str):
         if self.ssh_client:
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark.benchbase.raw_output import (
+    RawOutputProcessor,
+    bucket_indexes,
+    record_array,
+)
+from benchmark.histogram import LatencyHistogram, bucket_index
+
+HEADER = (
+    "Transaction Type Index,Transaction Name,Start Time (microseconds),"
+    "Latency (microseconds),Worker Id (start number),Phase Id (index in config file)"
+)
+
+
+def write_raw(path, start, rows, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "index": 1,
+            "name": rng.choice(["NewOrder", "Payment"], rows),
+            "start": start + np.sort(rng.uniform(0, 60, rows)),
+            "latency": rng.integers(500, 50000, rows),
+            "worker": 0,
+            "phase": 0,
+        }
+    )
+    with open(path, "w") as f:
+        f.write(HEADER + "\n")
+        df.to_csv(f, header=False, index=False)
+    return df
+
+
+def test_bucket_indexes_match_histogram():
+    values = np.array([0.0005, 0.001, 0.0011, 1.0, 2.5, 1000.0])
+    pytest.assume(bucket_indexes(values).tolist() == [bucket_index(v) for v in values])
+    h1, h2 = LatencyHistogram(), LatencyHistogram()
+    record_array(h1, values)
+    for v in values:
+        h2.record(v)
+    pytest.assume(h1.to_dict() == h2.to_dict())
+
+
+def test_process_and_merge_drivers(tmp_path):
+    df1 = write_raw(tmp_path / "a.raw.csv", 1700000000.0, 5000, 1)
+    df2 = write_raw(tmp_path / "b.raw.csv", 1700000005.0, 3000, 2)
+    with open(tmp_path / "histogram.json", "w") as f:
+        json.dump({"aborted": {"HISTOGRAM": {"NewOrder": 80}, "NUM_SAMPLES": 80}}, f)
+
+    driver1 = RawOutputProcessor(window=10)
+    driver1.process_file(str(tmp_path / "a.raw.csv"), chunk_rows=700)
+    driver1.add_errors(str(tmp_path / "histogram.json"))
+    driver2 = RawOutputProcessor(window=10)
+    driver2.process_file(str(tmp_path / "b.raw.csv"), chunk_rows=1000)
+    merged = driver1.merge(driver2)
+
+    both = pd.concat([df1, df2])
+    transactions = merged.transactions_df().set_index("transaction")
+    pytest.assume(transactions.loc["ALL", "count"] == 8000)
+    pytest.assume(
+        transactions.loc["NewOrder", "count"] == (both["name"] == "NewOrder").sum()
+    )
+    expected_p95 = np.percentile(both["latency"] / 1000, 95)
+    pytest.assume(abs(transactions.loc["ALL", "p95_latency"] - expected_p95) < 1)
+    pytest.assume(transactions.loc["NewOrder", "errors"] == 80)
+    pytest.assume(transactions.loc["Payment", "error_rate"] == 0)
+    pytest.assume(abs(merged.duration - 65) < 1)
+
+    windows = merged.windows_df()
+    pytest.assume(windows["count"].sum() == 8000)
+    pytest.assume(windows["time"].min() == 1700000000.0)
+    pytest.assume(set(windows["transaction"]) == {"NewOrder", "Payment"})
+
+    merged.save(str(tmp_path), "tpcc_raw_1_8")
+    saved = pd.read_csv(tmp_path / "tpcc_raw_1_8_windows.csv")
+    pytest.assume(len(saved) == len(windows))
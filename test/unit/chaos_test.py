@@ -0,0 +1,93 @@
+import math
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from benchmark.recovery import aggregate_timeseries, recovery_metrics
+from xbench.chaos import chaos_steps, target_nodes
+
+
+def fake_node(name, role, zone):
+    return SimpleNamespace(vm=SimpleNamespace(name=name, role=role, zone=zone))
+
+
+MEMBERS = {
+    "driver1_0": fake_node("driver1_0", "driver", "a"),
+    "backend1_0": fake_node("backend1_0", "backend", "a"),
+    "backend1_1": fake_node("backend1_1", "backend", "b"),
+    "proxy1_0": fake_node("proxy1_0", "proxy", "b"),
+}
+
+
+def names(nodes):
+    return [n.vm.name for n in nodes]
+
+
+def test_target_nodes():
+    pytest.assume(names(target_nodes(MEMBERS, "backend1_1")) == ["backend1_1"])
+    pytest.assume(
+        names(target_nodes(MEMBERS, "backend1")) == ["backend1_0", "backend1_1"]
+    )
+    pytest.assume(names(target_nodes(MEMBERS, "proxy")) == ["proxy1_0"])
+    # Drivers are not part of the zone outage
+    pytest.assume(names(target_nodes(MEMBERS, "zone:a")) == ["backend1_0"])
+
+
+def test_chaos_steps():
+    steps = chaos_steps(
+        [
+            {"at": 600, "action": "reboot", "target": "zone:b"},
+            {
+                "name": "kill",
+                "at": 300,
+                "action": "stop",
+                "target": "backend1_1",
+                "duration": 60,
+                "check_quorum": True,
+            },
+        ]
+    )
+    pytest.assume(
+        [(s.event, s.action, s.at) for s in steps]
+        == [
+            ("kill", "stop", 300),
+            ("kill", "start", 360),
+            ("event1", "reboot", 600),
+        ]
+    )
+    pytest.assume([s.fault for s in steps] == [True, False, True])
+    # Quorum is checked after the recovery step only
+    pytest.assume([s.check_quorum for s in steps] == [False, True, False])
+
+
+def timeseries():
+    # Two drivers, 10 sec interval, fault at 1060: throughput drops for 30 seconds
+    rows = []
+    for t in range(1010, 1200, 10):
+        per_driver = 50.0 if 1060 < t <= 1090 else 500.0
+        errors = 2.0 if t == 1070 else 0.0
+        for driver, skew in (("d1", 0.0), ("d2", 0.3)):
+            rows.append((t + skew, driver, per_driver, errors))
+    return pd.DataFrame(rows, columns=["time", "driver", "throughput", "errors"])
+
+
+def test_recovery_metrics():
+    series = aggregate_timeseries(timeseries(), 10)
+    pytest.assume(len(series) == 19)
+    pytest.assume(series["throughput"].iloc[0] == 1000)
+    m = recovery_metrics(series, 1060, interval=10, recovery_samples=3)
+    pytest.assume(m["baseline_throughput"] == 1000)
+    pytest.assume(m["min_throughput"] == 100)
+    pytest.assume(m["time_to_detect"] == 10)
+    pytest.assume(m["time_to_recover"] == 30)
+    pytest.assume(m["dip_area"] == 3 * 900 * 10)
+    pytest.assume(m["errors"] == 4 * 10)
+
+
+def test_recovery_metrics_no_impact():
+    series = aggregate_timeseries(timeseries(), 10)
+    m = recovery_metrics(series, 1150, interval=10)
+    pytest.assume(math.isnan(m["time_to_detect"]))
+    pytest.assume(m["dip_area"] == 0)
+    pytest.assume(recovery_metrics(series, 2000, interval=10) is None)
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from benchmark.checkpoint import Checkpoint
+from benchmark.exceptions import BenchmarkException
+
+
+def test_checkpoint_resume(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path), "oltp")
+    checkpoint.save(1, 8, 0, {"results": [[8, 100.5, 2000.0]], "timeseries": []})
+    checkpoint.save(1, "4_8", 1000, {"results": [[8, 990.0]], "rate_results": None})
+    pytest.assume(os.path.exists(tmp_path / "oltp_checkpoint.json"))
+    pytest.assume(not os.path.exists(tmp_path / "oltp_checkpoint.json.tmp"))
+
+    resumed = Checkpoint(str(tmp_path), "oltp", resume=True)
+    pytest.assume(resumed.done(1, 8))
+    pytest.assume(not resumed.done(1, 16))
+    pytest.assume(resumed.get(1, 8)["results"] == [[8, 100.5, 2000.0]])
+    pytest.assume(resumed.get(1, "4_8", 1000)["results"] == [[8, 990.0]])
+    pytest.assume(resumed.get(2, 8) is None)
+
+    # New run in the same directory ignores previous steps
+    pytest.assume(not Checkpoint(str(tmp_path), "oltp").done(1, 8))
+    # Nothing to resume
+    pytest.assume(Checkpoint(str(tmp_path), "tpcc", resume=True).steps == {})
+
+
+def test_checkpoint_corrupted(tmp_path):
+    with open(tmp_path / "oltp_checkpoint.json", "w") as f:
+        f.write('{"1:8:0": ')
+    with pytest.raises(BenchmarkException):
+        Checkpoint(str(tmp_path), "oltp", resume=True)
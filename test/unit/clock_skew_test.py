@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from benchmark.clock_skew import (
+    ORIGINAL_TIME,
+    correct_times,
+    estimate_offset,
+    interpolate_offset,
+)
+
+
+def test_estimate_offset():
+    # remote clock 0.5 sec ahead, the second sample has the lowest round trip
+    samples = [(100.0, 100.65, 100.2), (101.0, 101.52, 101.04), (102.0, 102.6, 102.1)]
+    offset, rtt = estimate_offset(samples)
+    pytest.assume(offset == pytest.approx(500))
+    pytest.assume(rtt == pytest.approx(40))
+
+
+def test_interpolate_offset():
+    measurements = [
+        {"label": "start", "time": 100.0, "offset_ms": 10.0, "rtt_ms": 1.0},
+        {"label": "end", "time": 200.0, "offset_ms": 30.0, "rtt_ms": 1.0},
+    ]
+    pytest.assume(interpolate_offset([], 150) is None)
+    pytest.assume(interpolate_offset(measurements, 50) == 10.0)
+    pytest.assume(interpolate_offset(measurements, 150) == pytest.approx(20.0))
+    pytest.assume(interpolate_offset(measurements, 250) == 30.0)
+    pytest.assume(interpolate_offset(measurements[:1], 250) == 10.0)
+
+
+def test_correct_times():
+    offsets = {"10.0.0.1": [{"label": "start", "time": 0.0, "offset_ms": 500.0}]}
+    df = pd.DataFrame({"driver": ["10.0.0.1", "10.0.0.2"], "time": [1000.5, 1000.0]})
+    corrected = correct_times(df, offsets, "driver")
+    pytest.assume(list(corrected["time"]) == [1000.0, 1000.0])
+    pytest.assume(list(corrected[ORIGINAL_TIME]) == [1000.5, 1000.0])
+    pytest.assume(list(df["time"]) == [1000.5, 1000.0])
+    # corrected frames are left as they are
+    again = correct_times(corrected, offsets, "driver")
+    pytest.assume(list(again["time"]) == [1000.0, 1000.0])
+    pytest.assume(correct_times(pd.DataFrame(), offsets, "driver").empty)
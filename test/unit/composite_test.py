@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from benchmark.composite.composite_runner import (
+    INTERFERENCE_FIELDS,
+    group_nodes,
+    interference,
+    step_overlap,
+)
+
+
+def fake_node(name):
+    return SimpleNamespace(vm=SimpleNamespace(name=name))
+
+
+def test_group_nodes():
+    nodes = [fake_node(n) for n in ["driver1_0", "driver1_1", "driver2_0"]]
+    pytest.assume(
+        [n.vm.name for n in group_nodes(nodes, ["driver1"])]
+        == ["driver1_0", "driver1_1"]
+    )
+    pytest.assume([n.vm.name for n in group_nodes(nodes, ["driver2"])] == ["driver2_0"])
+    pytest.assume(group_nodes(nodes, ["driver3"]) == [])
+
+
+def test_interference():
+    baseline = pd.DataFrame(
+        {
+            "concurrency": [8, 16, 32],
+            "throughput": [1000.0, 1800.0, 2000.0],
+            "p95_latency": [10.0, 12.0, 20.0],
+        }
+    )
+    concurrent = pd.DataFrame(
+        {
+            "concurrency": [8, 16],
+            "throughput": [800.0, 1800.0],
+            "p95_latency": [15.0, 12.0],
+        }
+    )
+    df = interference("oltp", baseline, concurrent)
+    pytest.assume(list(df.columns) == INTERFERENCE_FIELDS)
+    pytest.assume(len(df) == 2)
+    pytest.assume(df["throughput_change_pct"].tolist() == [-20.0, 0.0])
+    pytest.assume(df["latency_change_pct"].tolist() == [50.0, 0.0])
+    pytest.assume(set(df["latency_metric"]) == {"p95_latency"})
+    # without step windows nothing is known to overlap
+    pytest.assume(not df["overlapping"].any())
+    overlap = pd.DataFrame({"concurrency": [8, 16], "overlap_pct": [100.0, 40.0]})
+    df = interference("oltp", baseline, concurrent, overlap, 90)
+    pytest.assume(df["overlapping"].tolist() == [True, False])
+
+
+def test_step_overlap():
+    steps = pd.DataFrame(
+        {
+            "repeat": [1, 1, 2],
+            "concurrency": [8, 16, 8],
+            "start": [0.0, 100.0, 200.0],
+            "end": [100.0, 200.0, 300.0],
+        }
+    )
+    # the other members ran steps until 250, the second one had a gap
+    other1 = pd.DataFrame(
+        {"concurrency": [4, 4], "start": [0.0, 90.0], "end": [100.0, 250.0]}
+    )
+    other2 = pd.DataFrame(
+        {"concurrency": [2, 2], "start": [0.0, 150.0], "end": [50.0, 400.0]}
+    )
+    df = step_overlap(steps, [other1, other2]).set_index("concurrency")
+    pytest.assume(df.loc[8, "overlap_pct"] == pytest.approx(50.0))  # 50 + 50 of 200
+    pytest.assume(df.loc[16, "overlap_pct"] == pytest.approx(50.0))
+    pytest.assume(
+        step_overlap(steps, []).set_index("concurrency").loc[8, "overlap_pct"] == 100.0
+    )
@@ -0,0 +1,89 @@
+import math
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from benchmark.db_stats_monitor import dbstats_summary, monitored_hosts
+from lib.db_stats import DbStats, MysqlStats, counter_deltas
+
+
+class ScriptedStats(DbStats):
+    counters = ["Questions"]
+
+    def __init__(self, values):
+        DbStats.__init__(self, "db1")
+        self.values = iter(values)
+
+    def read(self):
+        return next(self.values)
+
+
+def test_counter_deltas():
+    deltas = counter_deltas(
+        {"a": 100, "b": 500, "c": 1}, {"a": 150, "b": 20, "d": 3}, ["a", "b", "c"]
+    )
+    pytest.assume(deltas == {"a": 50, "b": 20})
+
+
+def test_sample_rates():
+    stats = ScriptedStats(
+        [
+            {"Questions": 1000, "Threads_running": 4},
+            {"Questions": 3000, "Threads_running": 8},
+        ]
+    )
+    pytest.assume(stats.sample() == {})
+    stats.previous_time -= 2  # two seconds between samples
+    metrics = stats.sample()
+    pytest.assume(abs(metrics["Questions"] - 1000) < 10)
+    pytest.assume(metrics["Threads_running"] == 8)
+    pytest.assume("time" in metrics)
+
+
+def test_mysql_derive():
+    metrics = MysqlStats.derive(
+        None,
+        {"Questions": 500.0, "Handler_commit": 100.0},
+        {"Innodb_buffer_pool_read_requests": 1000, "Innodb_buffer_pool_reads": 10},
+        {"Threads_running": 5},
+    )
+    pytest.assume(metrics["qps"] == 500)
+    pytest.assume(metrics["tps"] == 100)
+    pytest.assume(metrics["buffer_hit_pct"] == 99)
+    pytest.assume(metrics["threads_running"] == 5)
+    pytest.assume(math.isnan(metrics["checkpoint_age"]))
+    idle = MysqlStats.derive(None, {}, {}, {})
+    pytest.assume(math.isnan(idle["buffer_hit_pct"]))
+
+
+def test_dbstats_summary():
+    samples = pd.DataFrame.from_records(
+        [
+            (1, 8, 0, "h2", 1.0, 50.0),
+            (1, 8, 0, "h1", 1.0, 100.0),
+            (1, 8, 0, "h1", 2.0, 300.0),
+        ],
+        columns=["repeat", "concurrency", "rate", "host", "time", "qps"],
+    )
+    df = dbstats_summary(samples).set_index("host")
+    pytest.assume(df.loc["h1", "qps"] == 200)
+    pytest.assume(df.loc["h1", "samples"] == 2)
+    pytest.assume(df.loc["h2", "samples"] == 1)
+    pytest.assume("time" not in df.columns)
+
+
+def test_monitored_hosts():
+    def node(ip):
+        return SimpleNamespace(
+            vm=SimpleNamespace(network=SimpleNamespace(get_client_iface=lambda: ip))
+        )
+
+    backend = SimpleNamespace(nodes=[node("10.0.0.1"), node("10.0.0.2")])
+    xpand = {"backend": backend, "product": "xpand"}
+    pytest.assume(monitored_hosts(xpand) == ["10.0.0.1"])  # cluster wide stats
+    pytest.assume(monitored_hosts(xpand, all_nodes=True) == ["10.0.0.1", "10.0.0.2"])
+    pytest.assume(
+        monitored_hosts(xpand | {"db_stats_hosts": ["10.0.0.9"]}) == ["10.0.0.9"]
+    )
+    pytest.assume(monitored_hosts({"host": "10.0.1.1,10.0.1.2"}) == ["10.0.1.1"])
@@ -0,0 +1,59 @@
+import pytest
+
+from benchmark.driver_monitor import (
+    distribute,
+    distribute_step,
+    drivers_needed,
+    parse_sampler_output,
+)
+
+SAMPLER_OUTPUT = """NPROC 4
+1700000000.0 5 1000 2000 100 0 100 700 0 0 0 0 0 0
+1700000001.0 9 1048576 2097152 250 0 150 800 0 0 0 0 0 0
+garbage line
+1700000002.0 3 2098152 4196304 400 0 200 900 0 0 0 0 0 0
+"""
+
+
+def test_distribute():
+    pytest.assume(distribute(10, [1, 1, 1]) == [4, 3, 3])
+    pytest.assume(
+        distribute(10, [8, 4, 4]) == [5, 3, 2] or distribute(10, [8, 4, 4]) == [5, 2, 3]
+    )
+    pytest.assume(sum(distribute(1001, [16, 8, 2])) == 1001)
+    pytest.assume(distribute(2, [1, 1, 1, 1]).count(0) == 2)
+    pytest.assume(distribute(6, [0, 0]) == [3, 3])
+    pytest.assume(distribute(5, []) == [])
+
+
+def test_distribute_step():
+    # closed-loop
+    pytest.assume(distribute_step(4, 0, [1] * 8) == ([1, 1, 1, 1, 0, 0, 0, 0], [0] * 8))
+    # the rate goes to drivers with threads only
+    threads, rates = distribute_step(4, 1000, [1] * 8)
+    pytest.assume(sum(threads) == 4 and sum(rates) == 1000)
+    pytest.assume(all(bool(t) == bool(r) for t, r in zip(threads, rates)))
+    # a rate lower than drivers with threads leaves the other drivers idle
+    threads, rates = distribute_step(8, 3, [1] * 8)
+    pytest.assume(sum(threads) == 8 and sum(rates) == 3)
+    pytest.assume(all(bool(t) == bool(r) for t, r in zip(threads, rates)))
+    pytest.assume(sorted(rates, reverse=True)[:3] == [1, 1, 1])
+
+
+def test_drivers_needed():
+    pytest.assume(drivers_needed(1024, 8, 64) == 2)
+    pytest.assume(drivers_needed(512, 8, 64) == 1)
+    pytest.assume(drivers_needed(0, 8, 64) == 1)
+
+
+def test_parse_sampler_output():
+    metrics = parse_sampler_output(SAMPLER_OUTPUT)
+    pytest.assume(metrics["samples"] == 3)
+    # 200 of 300 jiffies busy in both intervals
+    pytest.assume(abs(metrics["cpu_avg_pct"] - 200 / 3) < 0.01)
+    # (9 - 1) / 4 and (3 - 1) / 4
+    pytest.assume(metrics["run_queue_per_core_max"] == 2.0)
+    pytest.assume(metrics["run_queue_per_core_avg"] == 1.25)
+    pytest.assume(abs(metrics["net_rx_mbps"] - 1.0) < 0.01)
+    pytest.assume(abs(metrics["net_tx_mbps"] - 2.0) < 0.01)
+    pytest.assume(parse_sampler_output("")["samples"] == 0)
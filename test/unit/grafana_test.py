@@ -0,0 +1,96 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from lib.grafana import Grafana
+
+
+class FakeApi:
+    def __init__(self):
+        self.fetched = []
+        self.snapshots = self
+        self.dashboard = self
+
+    def get_dashboard(self, uid):
+        self.fetched.append(uid)
+        return {"dashboard": {"uid": uid, "templating": {"list": [{"name": "node"}]}}}
+
+    def create_new_snapshot(self, dashboard, name, **kwargs):
+        return {"url": f"http://localhost:3000/dashboard/snapshot/{name}"}
+
+
+class FakeGrafana(Grafana):
+    def __init__(self):
+        self.logger = None
+        self.host_url = "grafana:3000"
+        self.api = FakeApi()
+        self.dashboards = {}
+        self.lock = threading.Lock()
+
+
+def member(name, managed=True):
+    return SimpleNamespace(name=name, vm=SimpleNamespace(name=name, managed=managed))
+
+
+def cluster():
+    members = {m.name: m for m in (member("backend1_0"), member("driver1_0"))}
+    return SimpleNamespace(
+        cluster_name="c1",
+        bt=SimpleNamespace(product="xpand"),
+        members=members,
+        level_order_group_cluster_members=lambda: [
+            [members["backend1_0"]],
+            [members["driver1_0"]],
+        ],
+        get_backend_nodes=lambda: [members["backend1_0"]],
+    )
+
+
+def test_create_snapshot():
+    grafana = FakeGrafana()
+    urls = grafana.create_snapshot(
+        cluster(), "2023-05-01 10:00:00", "2023-05-01 11:00:00"
+    )
+    pytest.assume(
+        urls
+        == [
+            "http://grafana:3000/dashboard/snapshot/c1_xpandstats_230501.100000-230501.110000",
+            "http://grafana:3000/dashboard/snapshot/c1_nodeexporter_backend1_0_230501.100000-230501.110000",
+            "http://grafana:3000/dashboard/snapshot/c1_nodeexporter_driver1_0_230501.100000-230501.110000",
+        ]
+    )
+    pytest.assume(grafana.api.fetched == ["xpandstats", "nodeexporter"])
+
+
+def test_step_snapshots():
+    grafana = FakeGrafana()
+    requests = grafana.snapshot_requests(
+        cluster(), "2023-05-01 10:00:00", "2023-05-01 10:10:00", "r1_c8"
+    )
+    nodes = [d["templating"]["list"][0]["current"]["text"] for _, d in requests]
+    pytest.assume(nodes == ["backend1_0", "backend1_0", "driver1_0"])
+    pytest.assume(requests[0][1]["time"]["from"] == "2023-05-01T10:00:00+00:00")
+    steps = [
+        {
+            "repeat": 1,
+            "concurrency": 8,
+            "rate": 0,
+            "start": 1682935200.0,
+            "end": 1682935800.0,
+        },
+        {
+            "repeat": 1,
+            "concurrency": 16,
+            "rate": 500,
+            "start": 1682935800.0,
+            "end": 1682936400.0,
+        },
+    ]
+    snapshots = grafana.create_step_snapshots(cluster(), steps)
+    pytest.assume(len(snapshots) == 6)
+    pytest.assume(snapshots[3][0]["concurrency"] == 16)
+    pytest.assume(
+        "c1_xpandstats_r1_c16_rate500_230501.101000-230501.102000" in snapshots[3][1]
+    )
+    pytest.assume(grafana.api.fetched == ["xpandstats", "nodeexporter"])
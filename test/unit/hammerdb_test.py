@@ -0,0 +1,75 @@
+import pytest
+
+from benchmark.hammerdb.exceptions import HammerdbException
+from benchmark.hammerdb.hammerdb_runner import (
+    TEST_RESULT_RE,
+    parse_tcount,
+    parse_xtprofile,
+    profile_histogram,
+    warehouse_ranges,
+)
+
+TCOUNT_LOG = """Hammerdb Transaction Counter Log @ Fri Jan 05 09:15:01 UTC 2024
++-----------------+
+0 MariaDB tpm @ Fri Jan 05 09:15:11 UTC 2024
+120000 MariaDB tpm @ Fri Jan 05 09:15:21 UTC 2024
+125000 MariaDB tpm
+"""
+
+XTPROFILE_LOG = """>>>>> VIRTUAL USER 2 : ELAPSED TIME : 60192ms
+>>>>> PROC: NEWORD
+CALLS: 1000\tMIN: 0.707ms\tAVG: 2.000ms\tMAX: 197.640ms\tTOTAL: 2000.000ms
+P99: 6.097ms\tP95: 3.948ms\tP50: 1.913ms\tSD: 1391.698\tRATIO: 48.462%
+>>>>> SUMMARY OF 8 ACTIVE VIRTUAL USERS : MEDIAN ELAPSED TIME : 60000ms
+>>>>> PROC: NEWORD
+CALLS: 60000\tMIN: 0.707ms\tAVG: 2.139ms\tMAX: 197.640ms\tTOTAL: 128340.000ms
+P99: 6.097ms\tP95: 3.948ms\tP50: 1.913ms\tSD: 1391.698\tRATIO: 48.462%
+>>>>> PROC: PAYMENT
+CALLS: 60000\tMIN: 0.500ms\tAVG: 1.000ms\tMAX: 50.000ms\tTOTAL: 60000.000ms
+P99: 4.000ms\tP95: 2.000ms\tP50: 0.900ms\tSD: 700.000\tRATIO: 30.000%
+"""
+
+
+def test_parse_tcount():
+    samples = parse_tcount(TCOUNT_LOG.splitlines())
+    pytest.assume(len(samples) == 3)
+    pytest.assume(samples[0] == (1704446111.0, 0))
+    pytest.assume(samples[1][0] - samples[0][0] == 10)
+    pytest.assume(samples[2] == (None, 125000))
+
+
+def test_parse_xtprofile():
+    elapsed, procs = parse_xtprofile(XTPROFILE_LOG.splitlines())
+    pytest.assume(elapsed == 60)
+    # Per virtual user sections before the summary are ignored
+    pytest.assume(sorted(procs) == ["NEWORD", "PAYMENT"])
+    neword = procs["NEWORD"]
+    pytest.assume(neword.total == 60000)
+    pytest.assume(abs(neword.mean - 2.139) < 1e-9)
+    pytest.assume(abs(neword.percentile(95) - 3.948) / 3.948 < 0.03)
+    pytest.assume(abs(neword.percentile(50) - 1.913) / 1.913 < 0.03)
+    pytest.assume(neword.max == 197.64)
+
+
+def test_profile_histogram_merge():
+    a = profile_histogram(100, 1, 200, 10, 2, 5, 8)
+    b = profile_histogram(100, 1, 200, 10, 2, 5, 8)
+    pytest.assume(a.merge(b).total == 200)
+    pytest.assume(abs(a.percentile(95) - 5) / 5 < 0.03)
+    pytest.assume(a.mean == 2)
+
+
+def test_test_result():
+    m = TEST_RESULT_RE.search(
+        "Vuser 1:TEST RESULT : System achieved 12345 NOPM from 28765 MariaDB TPM"
+    )
+    pytest.assume(m.groups() == ("12345", "28765"))
+
+
+def test_warehouse_ranges():
+    pytest.assume(warehouse_ranges(10, [4, 4]) == [(1, 5), (6, 10)])
+    # skewed virtual users still leave a home warehouse to every driver
+    pytest.assume(warehouse_ranges(3, [10, 1, 1]) == [(1, 1), (2, 2), (3, 3)])
+    pytest.assume(warehouse_ranges(4, [2, 0]) == [(1, 4), (0, 0)])
+    with pytest.raises(HammerdbException):
+        warehouse_ranges(2, [1, 1, 1])
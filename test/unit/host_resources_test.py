@@ -0,0 +1,113 @@
+import signal
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+from benchmark import host_sampler
+from benchmark.host_resources import host_rates, step_resources
+from benchmark.host_sampler import FIELDS, read_ring
+
+
+def record(seq, **values):
+    return (
+        {f: 0 for f in FIELDS}
+        | {
+            "seq": seq,
+            "time": 100.0 + seq,
+            "mem_total_kb": 1000,
+            "mem_available_kb": 250,
+        }
+        | values
+    )
+
+
+def test_ring_file(tmp_path):
+    file_name = str(tmp_path / "backend1_0.ring")
+    proc = subprocess.Popen(
+        [sys.executable, host_sampler.__file__, file_name, "0.2", "4"]
+    )
+    time.sleep(1.5)
+    proc.send_signal(signal.SIGTERM)
+    proc.wait(timeout=5)
+    records = read_ring(file_name)
+    seqs = [r["seq"] for r in records]
+    pytest.assume(len(records) == 4)  # ring capacity
+    pytest.assume(seqs == list(range(seqs[0], seqs[0] + 4)))
+    pytest.assume(seqs[0] > 1)  # oldest records overwritten
+    pytest.assume(records[-1]["mem_total_kb"] > 0)
+    rates = host_rates(records)
+    pytest.assume(len(rates) == 3)
+    pytest.assume(rates["cpu_busy_pct"].between(0, 100).all())
+
+
+def test_ring_file_size(tmp_path):
+    file_name = tmp_path / "backend1_0.ring"
+    proc = subprocess.Popen(
+        [sys.executable, host_sampler.__file__, str(file_name), "0.2", "86400"]
+    )
+    time.sleep(1)
+    proc.send_signal(signal.SIGTERM)
+    proc.wait(timeout=5)
+    records = read_ring(str(file_name))
+    # Only written slots are in the file, not the whole capacity
+    pytest.assume(
+        file_name.stat().st_size
+        == host_sampler.HEADER.size + host_sampler.RECORD.size * (len(records) + 1)
+    )
+
+
+def test_host_rates():
+    rates = host_rates(
+        [
+            record(1),
+            record(
+                2,
+                cpu_user=30,
+                cpu_idle=60,
+                cpu_iowait=10,
+                disks=2,
+                disk_io_ms=500,
+                disk_write_sectors=2000000,
+                net_rx_bytes=5000000,
+                psi_io_some_us=250000,
+            ),
+            record(4),  # gap, counters reset
+        ]
+    )
+    pytest.assume(len(rates) == 1)
+    row = rates.iloc[0]
+    pytest.assume(row["cpu_busy_pct"] == 30)
+    pytest.assume(row["cpu_iowait_pct"] == 10)
+    pytest.assume(row["disk_busy_pct"] == 25)
+    pytest.assume(row["disk_write_mb_s"] == 1024)
+    pytest.assume(row["net_rx_mb_s"] == 5)
+    pytest.assume(row["psi_io_some_pct"] == 25)
+    pytest.assume(row["mem_used_pct"] == 75)
+
+
+def test_step_resources():
+    samples = pd.DataFrame(
+        {
+            "node": ["b1", "b1", "b1", "d1"],
+            "time": [101.0, 102.0, 111.0, 102.0],
+            "cpu_busy_pct": [10.0, 30.0, 90.0, 50.0],
+        }
+    )
+    steps = pd.DataFrame(
+        {
+            "repeat": [1, 1, 1],
+            "concurrency": [8, 16, 32],
+            "rate": [0, 0, 0],
+            "start": [100.0, 110.0, 120.0],
+            "end": [105.0, 115.0, None],
+        }
+    )
+    df = step_resources(samples, steps)
+    pytest.assume(
+        list(df.columns[:5]) == ["repeat", "concurrency", "rate", "node", "samples"]
+    )
+    pytest.assume(df["cpu_busy_pct"].tolist() == [20.0, 50.0, 90.0])
+    pytest.assume(df["concurrency"].tolist() == [8, 8, 16])
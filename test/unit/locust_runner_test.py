@@ -0,0 +1,83 @@
+import logging
+import os
+
+import pandas as pd
+import pytest
+
+from benchmark.exceptions import BenchmarkException
+from benchmark.locust.locust_runner import (
+    REQUEST_RESULT_FIELDS,
+    LocustRunner,
+    num_workers,
+    parse_stats,
+    spawn_rate,
+)
+from benchmark.sysbench.sysbench_runner import SYSBENCH_RESULT_FIELDS
+
+STATS_CSV = """Type,Name,Request Count,Failure Count,Median Response Time,Average Response Time,Min Response Time,Max Response Time,Average Content Size,Requests/s,Failures/s,50%,66%,75%,80%,90%,95%,98%,99%,99.9%,99.99%,100%
+sql,select,900,0,2,2.5,1,40,0,90.0,0.0,2,3,3,3,4,5,8,10,30,40,40
+sql,update,100,2,5,6.0,2,80,0,10.0,0.2,5,6,7,7,9,12,20,30,80,80,80
+,Aggregated,1000,2,2,2.85,1,80,0,100.0,0.2,2,3,3,4,5,6,10,12,40,80,80
+"""
+
+
+def test_parse_stats():
+    row, df_requests = parse_stats(STATS_CSV, 16)
+    pytest.assume(row == (16, 100.0, 2.85, row[3], 6.0, 2.0))
+    pytest.assume(list(df_requests.columns) == REQUEST_RESULT_FIELDS)
+    pytest.assume(df_requests["name"].tolist() == ["select", "update"])
+    pytest.assume(df_requests["p99_latency"].tolist() == [10, 30])
+
+    with pytest.raises(BenchmarkException):
+        parse_stats("", 16)
+
+
+def test_num_workers():
+    pytest.assume(num_workers(2, 3) == 6)
+    # one worker per core
+    pytest.assume(num_workers(0, 3, [4.0, 4.0, 8.0]) == 16)
+    pytest.assume(num_workers(2, 3, [4.0, 4.0, 8.0]) == 6)
+
+
+def test_spawn_rate():
+    # all users spawned during warmup
+    pytest.assume(spawn_rate(100, 10) == 10)
+    pytest.assume(spawn_rate(5, 10) == 1)
+    pytest.assume(spawn_rate(100, 0) == 100)
+    pytest.assume(spawn_rate(100, 10, 50) == 50)
+
+
+def locust_runner(artifact_dir: str) -> LocustRunner:
+    runner = LocustRunner.__new__(LocustRunner)
+    runner.logger = logging.getLogger(__name__)
+    runner.artifact_dir = artifact_dir
+    runner.workload_name = "flow"
+    runner.percentile = 95
+    return runner
+
+
+def test_save_print_one_repeat(tmp_path):
+    runner = locust_runner(str(tmp_path))
+    df = runner.save_print_one_repeat(
+        1, [(16, {"stats": STATS_CSV}), (32, {"stats": STATS_CSV})]
+    )
+    pytest.assume(df["concurrency"].tolist() == [16, 32])
+    pytest.assume(df["repeat"].tolist() == [1, 1])
+    saved = pd.read_csv(os.path.join(tmp_path, "flow_1.csv"))
+    pytest.assume(list(saved.columns) == SYSBENCH_RESULT_FIELDS)
+    pytest.assume(saved["throughput"].tolist() == [100.0, 100.0])
+    requests = pd.read_csv(os.path.join(tmp_path, "flow_requests_1.csv"))
+    pytest.assume(list(requests.columns) == REQUEST_RESULT_FIELDS)
+    pytest.assume(len(requests) == 4)
+
+
+def test_save_print_summary(tmp_path):
+    runner = locust_runner(str(tmp_path))
+    df = pd.concat(
+        [runner.save_print_one_repeat(r, [(16, {"stats": STATS_CSV})]) for r in (1, 2)]
+    )
+    runner.save_print_summary(df)
+    summary = pd.read_csv(os.path.join(tmp_path, "flow_summary.csv"))
+    pytest.assume(list(summary.columns) == SYSBENCH_RESULT_FIELDS)
+    pytest.assume(summary["concurrency"].tolist() == [16])
+    pytest.assume(summary["errors"].tolist() == [4.0])
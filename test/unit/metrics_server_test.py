@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from metrics import MetricsServer, MetricsTarget
+from metrics.metrics_target import target_key
+from metrics.server import merge_targets
+
+
+class FakeSsh:
+    """Metric server keeping the target file in memory"""
+
+    def __init__(self):
+        self.content = ""
+        self.commands = []
+        self.uploads = 0
+
+    def run(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        if cmd.startswith("cat "):
+            return self.content
+        if cmd.startswith("rm -f /targets/cl1-targets.json"):
+            self.content = ""
+        return ""
+
+    def send_files(self, local, remote, **kwargs):
+        self.uploads += 1
+        with open(local) as f:
+            self.content = f.read()
+
+
+def target(name, service="node", port=9100, role="backend"):
+    return MetricsTarget(
+        service_name=service,
+        labels={"cluster_name": "cl1", "name": name, "role": role},
+        hostname=f"10.0.0.{name[-1]}",
+        port=port,
+    )
+
+
+@pytest.fixture
+def server():
+    ms = MetricsServer()
+    ms.initialize(remote_target_path="/targets")
+    ms.ssh_client = FakeSsh()
+    return ms
+
+
+def test_merge_targets():
+    a, b = target("backend1_1").group(), target("backend1_2").group()
+    merged = merge_targets([a], {target_key(b): b})
+    pytest.assume(merged == [a, b])
+    pytest.assume(merge_targets(merged, {target_key(a): None}) == [b])
+    pytest.assume(merge_targets([a], {target_key(a): a}) == [a])
+
+
+def test_batch_single_upload(server):
+    with server.batch():
+        for i in range(1, 4):
+            server.register_metric_target(target(f"backend1_{i}"))
+            server.register_metric_target(target(f"backend1_{i}", "mariadb", 9104))
+        pytest.assume(server.ssh_client.uploads == 0)
+    pytest.assume(server.ssh_client.uploads == 1)
+    targets = json.loads(server.ssh_client.content)
+    pytest.assume(len(targets) == 6)
+    pytest.assume(server.target_file_name(target("backend1_1")) == "cl1-targets.json")
+
+
+def test_incremental(server):
+    server.register_metric_target(target("backend1_1"))
+    with server.batch():
+        server.register_metric_target(target("driver1_2", "workload_exporter", 9300))
+        server.deregister_metric_target(target("backend1_1"))
+    targets = json.loads(server.ssh_client.content)
+    pytest.assume([t["targets"] for t in targets] == [["10.0.0.2:9300"]])
+    pytest.assume(server.ssh_client.uploads == 2)
+    server.deregister_metric_target(target("driver1_2", "workload_exporter", 9300))
+    pytest.assume(server.ssh_client.content == "")
+    pytest.assume(server.ssh_client.uploads == 2)
@@ -0,0 +1,218 @@
+import asyncio
+import random
+
+import pandas as pd
+import pytest
+
+from benchmark.histogram import LatencyHistogram
+from benchmark.native import native_engine
+from benchmark.native.native_engine import (
+    EngineStats,
+    TransactionMix,
+    convert_placeholders,
+    make_generator,
+    split_threads,
+)
+from benchmark.open_loop import (
+    LATENCY_VS_LOAD_FIELDS,
+    get_rates,
+    per_driver_rate,
+    save_print_latency_vs_load,
+    save_print_latency_vs_load_summary,
+)
+
+
+def test_histogram_percentiles():
+    h = LatencyHistogram()
+    for v in range(1, 1001):
+        h.record(float(v))
+    pytest.assume(h.total == 1000)
+    pytest.assume(abs(h.mean - 500.5) < 1e-6)
+    pytest.assume(abs(h.percentile(95) - 950) / 950 < 0.02)
+    pytest.assume(h.percentile(100) == 1000)
+
+
+def test_histogram_merge_roundtrip():
+    a, b = LatencyHistogram(), LatencyHistogram()
+    for v in range(1, 501):
+        a.record(float(v))
+    for v in range(501, 1001):
+        b.record(float(v))
+    merged = LatencyHistogram.from_dict(a.to_dict()).merge(b)
+    pytest.assume(merged.total == 1000)
+    pytest.assume(merged.min == 1 and merged.max == 1000)
+    pytest.assume(abs(merged.percentile(50) - 500) / 500 < 0.02)
+
+
+def test_convert_placeholders():
+    sql, names = convert_placeholders(
+        "SELECT c FROM t WHERE id = :id AND c LIKE 'a%' AND k = :id", "mysql"
+    )
+    pytest.assume(
+        sql == "SELECT c FROM t WHERE id = %(id)s AND c LIKE 'a%%' AND k = %(id)s"
+    )
+    pytest.assume(names == ["id", "id"])
+
+    sql, names = convert_placeholders(
+        "SELECT c::text FROM t WHERE id = :id AND k = :k AND j = :id", "pgsql"
+    )
+    pytest.assume(sql == "SELECT c::text FROM t WHERE id = $1 AND k = $2 AND j = $1")
+    pytest.assume(names == ["id", "k"])
+
+
+def test_generators_and_mix():
+    rnd = random.Random(1)
+    pytest.assume(1 <= make_generator("uniform(1, 10)")(rnd) <= 10)
+    pytest.assume(make_generator("choice('a', 'b')")(rnd) in ("a", "b"))
+    pytest.assume(len(make_generator("string(16)")(rnd)) == 16)
+    pytest.assume(make_generator(42)(rnd) == 42)
+
+    mix = TransactionMix(
+        {
+            "read": {"weight": 9, "statements": ["SELECT :id"], "params": {"id": 1}},
+            "write": {"weight": 1, "statements": ["UPDATE t SET c = 1"]},
+        },
+        "mysql",
+    )
+    picks = [mix.pick(rnd).name for _ in range(1000)]
+    pytest.assume(700 < picks.count("read") < 990)
+
+
+def test_split_threads_and_stats_merge():
+    pytest.assume(split_threads(10, 4) == [3, 3, 2, 2])
+    pytest.assume(split_threads(2, 8) == [1, 1])
+
+    a, b = EngineStats(), EngineStats()
+    a.record_transaction("read", 1.0, [("read.s1", 0.9)])
+    a.tick(0, ok=True)
+    b.record_transaction("read", 3.0, [("read.s1", 2.9)])
+    b.record_error(ValueError("boom"))
+    b.tick(0, ok=False)
+    merged = EngineStats.from_dict(a.to_dict()).merge(
+        EngineStats.from_dict(b.to_dict())
+    )
+    pytest.assume(merged.transactions == 2 and merged.errors == 1)
+    pytest.assume(merged.statement_histograms["read.s1"].total == 2)
+    pytest.assume(merged.intervals[0] == [1, 1])
+
+
+class FakeSession:
+    """Session with fixed 5ms service time"""
+
+    closed = False
+
+    def __init__(self, connection, host):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def execute(self, sql, args=None):
+        await asyncio.sleep(0.005)
+
+    async def close(self):
+        pass
+
+
+def test_open_loop_run(monkeypatch):
+    monkeypatch.setitem(native_engine.SESSIONS, "mysql", FakeSession)
+    config = {
+        "dialect": "mysql",
+        "report_interval": 1,
+        "transactions": {"read": {"statements": ["SELECT 1"]}},
+    }
+    # 2 connections can serve ~400 trx/sec so 100 trx/sec must not queue
+    result = native_engine.run(config, 2, 2, 0, 1, rate=100)
+    stats = EngineStats.from_dict(result)
+    pytest.assume(150 <= stats.transactions <= 210)
+    pytest.assume(stats.queue_histogram.percentile(95) < 5)
+    # 1000 trx/sec overloads them: latency from intended start has to include queueing
+    result = native_engine.run(config, 2, 2, 0, 1, rate=1000)
+    stats = EngineStats.from_dict(result)
+    pytest.assume(stats.histogram.percentile(95) > 100)
+    pytest.assume(stats.service_histogram.percentile(95) < 50)
+    pytest.assume(stats.backlog > 0)
+
+
+def test_latency_vs_load_summary(tmp_path):
+    pytest.assume(get_rates({"rates": 100}) == [100])
+    pytest.assume(get_rates({}) == [])
+    pytest.assume(per_driver_rate(1000, 3) == 333)
+    row = (100, 99.0, 5.0, 6.0, 7.0, 5.0, 0.1, 0.2, 0)
+    df = pd.concat(
+        [
+            save_print_latency_vs_load([row], str(tmp_path), "w", 1),
+            save_print_latency_vs_load([row], str(tmp_path), "w", 2),
+        ]
+    )
+    save_print_latency_vs_load_summary(df, str(tmp_path), "w")
+    summary = pd.read_csv(tmp_path / "w_latency_vs_load.csv")
+    pytest.assume(list(summary.columns) == LATENCY_VS_LOAD_FIELDS)
+    pytest.assume(summary["offered_rate"].tolist() == [100])
+
+
+class ChurnSession(FakeSession):
+    """Session with 2ms connect, every third connect is refused"""
+
+    attempts = 0
+
+    def __init__(self, connection, host):
+        self.closed = True
+
+    async def connect(self):
+        await asyncio.sleep(0.002)
+        ChurnSession.attempts += 1
+        if ChurnSession.attempts % 3 == 0:
+            raise ConnectionRefusedError("Too many connections")
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_per_transaction_connect(monkeypatch):
+    monkeypatch.setitem(native_engine.SESSIONS, "mysql", ChurnSession)
+    config = {
+        "dialect": "mysql",
+        "connect_mode": "per_transaction",
+        "report_interval": 1,
+        "transactions": {"read": {"statements": ["SELECT 1"]}},
+    }
+    now = native_engine.time.monotonic()
+    stats = asyncio.run(native_engine.process_main(config, 0, 2, now, now + 1, 200))
+    stats = EngineStats.from_dict(stats.to_dict())
+    attempts = stats.connects + stats.connect_errors
+    pytest.assume(stats.connects == stats.transactions)
+    pytest.assume(abs(stats.connect_errors - attempts / 3) <= 1)
+    pytest.assume(stats.errors == stats.connect_errors)
+    pytest.assume(stats.connect_histogram.percentile(50) >= 2)
+    # Failed connects are failed transactions in the time series
+    pytest.assume(sum(e for _, e in stats.intervals.values()) == stats.connect_errors)
+
+
+class SlowConnectSession(ChurnSession):
+    """Session with 20ms connect and 20ms disconnect"""
+
+    async def connect(self):
+        await asyncio.sleep(0.02)
+        self.closed = False
+
+    async def close(self):
+        await asyncio.sleep(0.02)
+        self.closed = True
+
+
+def test_per_transaction_latency(monkeypatch):
+    monkeypatch.setitem(native_engine.SESSIONS, "mysql", SlowConnectSession)
+    config = {
+        "dialect": "mysql",
+        "connect_mode": "per_transaction",
+        "report_interval": 1,
+        "transactions": {"read": {"statements": ["SELECT 1"]}},
+    }
+    now = native_engine.time.monotonic()
+    stats = asyncio.run(native_engine.process_main(config, 0, 2, now, now + 1, 0))
+    pytest.assume(stats.transactions > 0)
+    # Connect and disconnect are not part of the transaction latency
+    pytest.assume(stats.histogram.percentile(95) < 15)
+    pytest.assume(stats.connect_histogram.percentile(50) >= 20)
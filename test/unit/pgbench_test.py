@@ -0,0 +1,51 @@
+import pytest
+
+from benchmark.pgbench.pgbench_runner import (
+    LOG_MARKER,
+    parse_progress,
+    parse_transaction_log,
+    split_output,
+)
+
+OUTPUT = f"""pgbench (15.5)
+starting vacuum...end.
+progress: 10.0 s, 1015.6 tps, lat 7.870 ms stddev 2.410, 0 failed
+progress: 20.0 s, 998.1 tps, lat 8.010 ms stddev NaN, 3 failed
+progress: 30.0 s, 500.0 tps, lat 2.000 ms stddev 0.500, 0 failed, lag 0.250 ms
+transaction type: <builtin: TPC-B (sort of)>
+number of failed transactions: 3 (0.010%)
+{LOG_MARKER}
+0 199 5432 0 1700000010 500000
+1 200 8000 0 1700000011 0
+0 201 failed 0 1700000012 0
+1 202 skipped 0 1700000013 0 100
+0 203 3000 0 1700000014 0 1000
+2 204 9000 0 1700000100 0
+"""
+
+
+def test_parse_progress():
+    output, _ = split_output(OUTPUT)
+    intervals = parse_progress(output)
+    pytest.assume(len(intervals) == 3)
+    pytest.assume(intervals[0] == (10.0, 1015.6, 7.87, 2.41, 0, 0))
+    pytest.assume(intervals[1][4] == 3)
+    pytest.assume(intervals[2][5] == 0.25)
+
+
+def test_parse_transaction_log():
+    output, lines = split_output(OUTPUT)
+    pytest.assume(LOG_MARKER not in output)
+    pytest.assume(len(lines) == 6)
+    histogram, service, lag, transactions, failed = parse_transaction_log(
+        lines, (1700000010.0, 1700000020.0)
+    )
+    # last line is outside of the window
+    pytest.assume(transactions == 3)
+    pytest.assume(failed == 1)
+    pytest.assume(histogram.total == 3)
+    pytest.assume(abs(histogram.percentile(100) - 8) / 8 < 0.05)
+    pytest.assume(abs(service.percentile(0) - 2) / 2 < 0.05)
+    pytest.assume(lag.total == 3)
+    _, _, _, transactions, failed = parse_transaction_log(lines, (1700000011.5, 1e10))
+    pytest.assume(transactions == 2 and failed == 1)
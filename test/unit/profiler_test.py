@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from benchmark.profiler import (
+    PROFILE_DIR,
+    diff_folded,
+    profile_command,
+    read_folded,
+    save_diff_flamegraphs,
+)
+
+
+def write_profile(run_dir, name, lines):
+    os.makedirs(os.path.join(run_dir, PROFILE_DIR), exist_ok=True)
+    file_name = os.path.join(run_dir, PROFILE_DIR, name)
+    with open(file_name, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return file_name
+
+
+def test_read_folded(tmp_path):
+    file_name = write_profile(
+        str(tmp_path),
+        "a.folded",
+        ["main;run;exec 10", "main;run;exec 5", "main;idle 3", "junk"],
+    )
+    stacks = read_folded(file_name)
+    pytest.assume(stacks == {"main;run;exec": 15, "main;idle": 3})
+
+
+def test_diff_folded():
+    lines = diff_folded({"a;b": 50, "a;c": 50}, {"a;b": 150, "a;d": 50})
+    # baseline scaled to 200 samples
+    pytest.assume(lines == ["a;b 100 150", "a;c 100 0", "a;d 0 50"])
+
+
+def test_save_diff_flamegraphs(tmp_path):
+    baseline, current = str(tmp_path / "baseline"), str(tmp_path / "current")
+    write_profile(baseline, "backend1_0_1_256_0.folded", ["a;b 10"])
+    write_profile(current, "backend1_0_1_256_0.folded", ["a;b 20"])
+    write_profile(current, "backend1_0_1_512_0.folded", ["a;b 20"])
+    saved = save_diff_flamegraphs(baseline, current)
+    pytest.assume([os.path.basename(f) for f in saved] == ["backend1_0_1_256_0.folded"])
+    with open(saved[0]) as f:
+        pytest.assume(f.read() == "a;b 20 20\n")
+
+
+def test_profile_command():
+    cmd = profile_command("perf", "mariadbd", "backend1_0_1_256_0", "title", 30, 99)
+    pytest.assume("perf record -F 99 -g -p $(pgrep -d, -x mariadbd)" in cmd)
+    pytest.assume("backend1_0_1_256_0.svg" in cmd)
+    cmd = profile_command(
+        "async-profiler", "java", "driver1_0_1_256_0", "title", 30, 100
+    )
+    pytest.assume("-i 10000000 -d 30 -o collapsed" in cmd)
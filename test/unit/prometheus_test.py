@@ -0,0 +1,120 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from lib.prometheus import (
+    EXPORT_FIELDS,
+    MAX_POINTS,
+    Prometheus,
+    PrometheusException,
+    range_step,
+)
+
+SERIES = {
+    "backend1_0": [
+        {
+            "metric": {
+                "__name__": "node_load1",
+                "cluster_name": "test",
+                "name": "backend1_0",
+                "instance": "10.0.0.1:9100",
+            },
+            "values": [[100, "1.5"], [110, "2.5"]],
+        }
+    ],
+    "driver1_0": [
+        {
+            "metric": {
+                "__name__": "workload_tps",
+                "cluster_name": "test",
+                "name": "driver1_0",
+            },
+            "values": [[100, "1000"]],
+        }
+    ],
+}
+
+
+class FakePrometheus(BaseHTTPRequestHandler):
+    queries = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        FakePrometheus.queries.append(params)
+        if "bad" in params["query"]:
+            body = {"status": "error", "error": "parse error"}
+        else:
+            member = params["query"].split('name="')[-1].split('"')[0]
+            body = {
+                "status": "success",
+                "data": {"resultType": "matrix", "result": SERIES.get(member, [])},
+            }
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def prometheus():
+    server = HTTPServer(("127.0.0.1", 0), FakePrometheus)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    FakePrometheus.queries = []
+    yield Prometheus(f"http://127.0.0.1:{server.server_port}/")
+    server.shutdown()
+
+
+def test_range_step():
+    pytest.assume(range_step(0, 3600, 10) == 10)
+    pytest.assume(range_step(0, 100 * MAX_POINTS, 10) == 100)
+
+
+def test_export_range(prometheus, tmp_path):
+    file_name = str(tmp_path / "run.csv.gz")
+    points = prometheus.export_range(
+        file_name, "test", ["backend1_0", "driver1_0", "proxy1_0"], 100, 200, 10
+    )
+    pytest.assume(points == 3)
+    pytest.assume(len(FakePrometheus.queries) == 3)
+    pytest.assume(FakePrometheus.queries[0]["step"] == "10")
+    pytest.assume(
+        FakePrometheus.queries[0]["query"] == '{cluster_name="test",name="backend1_0"}'
+    )
+    with gzip.open(file_name, "rt") as f:
+        df = pd.read_csv(f)
+    pytest.assume(list(df.columns) == EXPORT_FIELDS)
+    pytest.assume(df["member"].tolist() == ["backend1_0", "backend1_0", "driver1_0"])
+    pytest.assume(df["value"].tolist() == [1.5, 2.5, 1000.0])
+    pytest.assume(json.loads(df["labels"][0]) == {"instance": "10.0.0.1:9100"})
+
+
+def test_export_steps(prometheus, tmp_path):
+    steps = [
+        {"repeat": 1, "concurrency": 8, "rate": 0, "start": 100, "end": 150},
+        {"repeat": 1, "concurrency": 16, "rate": 0, "start": 160, "end": 210},
+    ]
+    files = prometheus.export_steps(
+        str(tmp_path), steps, "test", ["backend1_0"], metrics=["node_.*"]
+    )
+    pytest.assume(
+        [f.split("/")[-1] for f in files] == ["step_1_8_0.csv.gz", "step_1_16_0.csv.gz"]
+    )
+    pytest.assume(FakePrometheus.queries[1]["start"] == "160")
+    pytest.assume(FakePrometheus.queries[0]["query"].startswith('{__name__=~"node_.*"'))
+
+
+def test_query_error(prometheus):
+    with pytest.raises(PrometheusException):
+        prometheus.query_range("bad", 0, 10)
+    with pytest.raises(PrometheusException):
+        Prometheus("http://127.0.0.1:1").query_range("up", 0, 10)
@@ -0,0 +1,81 @@
+import pytest
+
+from lib.db_stats import QpcAnalyzer, aggregate_statements, statement_fingerprint
+from lib.db_stats.qpc import QPC_COLUMNS
+from lib.sql_fingerprint import fingerprint, fingerprint_hash
+
+
+class ScriptedAnalyzer(QpcAnalyzer):
+    def __init__(self):
+        self.explains = {}
+        self.explain_workers = 2
+        self.explained = []
+
+    def _explain(self, statement):
+        self.explained.append(statement)
+        return f"plan of {statement}"
+
+
+def qpc_row(statement, exec_count, avg_latency_ms):
+    return (
+        {"statement": statement}
+        | {c: 0 for c in QPC_COLUMNS}
+        | {
+            "exec_count": exec_count,
+            "total_lat_ms": exec_count * avg_latency_ms,
+        }
+    )
+
+
+def test_fingerprint():
+    statement = "SELECT c FROM sbtest1\n WHERE id IN (1, 2,3) AND k='a''b' AND x=1e3"
+    pytest.assume(
+        fingerprint(statement)
+        == "select c from sbtest1 where id in (?+) and k=? and x=?"
+    )
+    # replay reports use the same fingerprint
+    pytest.assume(statement_fingerprint(statement) == fingerprint_hash(statement))
+    pytest.assume(
+        statement_fingerprint("select c from t where id = 10")
+        == statement_fingerprint("SELECT c  FROM t WHERE id = 2")
+    )
+    pytest.assume(
+        statement_fingerprint("select c from t where id = 10")
+        != statement_fingerprint("select k from t where id = 10")
+    )
+
+
+def test_aggregate_statements():
+    df = aggregate_statements(
+        [
+            qpc_row("select c from t where id = 1", 100, 2.0),
+            qpc_row("select c from t where id = 2", 300, 1.0),
+            qpc_row("update t set k = k + 1 where id = 5", 10, 100.0),
+            qpc_row("commit", 1000, 0.1),
+        ],
+        limit=2,
+    )
+    pytest.assume(len(df) == 2)
+    pytest.assume(df["statement"][0] == "update t set k = k + 1 where id = 5")
+    pytest.assume(df["exec_count"][1] == 400)
+    pytest.assume(df["avg_lat_ms"][1] == 1.25)
+    pytest.assume(aggregate_statements([], limit=2).empty)
+
+
+def test_explain_cache():
+    analyzer = ScriptedAnalyzer()
+    step1 = aggregate_statements(
+        [qpc_row("select 1", 1, 1.0), qpc_row("select c from t where id = 1", 1, 1.0)],
+        limit=10,
+    )
+    step2 = aggregate_statements(
+        [qpc_row("select c from t where id = 7", 1, 1.0), qpc_row("commit", 1, 1.0)],
+        limit=10,
+    )
+    analyzer.explain(step1)
+    plans = analyzer.explain(step2)
+    pytest.assume(len(analyzer.explained) == 3)
+    pytest.assume(
+        plans[statement_fingerprint("select c from t where id = 7")]
+        == "plan of select c from t where id = 1"
+    )
@@ -0,0 +1,172 @@
+import asyncio
+
+import pytest
+
+from benchmark.histogram import LatencyHistogram
+from benchmark.native import native_engine
+from benchmark.native.native_engine import EngineStats
+from benchmark.replay.exceptions import ReplayException
+from benchmark.replay.query_log import (
+    fingerprint,
+    original_latencies,
+    parse_log,
+    partition,
+)
+from benchmark.replay.replay_runner import divergence
+
+GENERAL_LOG = """/usr/sbin/mariadbd, Version: 10.11.6-MariaDB-log. started with:
+Tcp port: 3306  Unix socket: /run/mysqld/mysqld.sock
+Time\t\t    Id Command\tArgument
+240105  9:15:01\t    11 Connect\tapp@localhost on shop using TCP/IP
+\t\t    11 Query\tSELECT * FROM orders WHERE id = 42
+240105  9:15:02\t    12 Query\tSELECT * FROM orders
+WHERE id IN (1, 2, 3)
+\t\t    11 Quit\t
+"""
+
+SLOW_LOG = """# Time: 240105  9:15:03
+# User@Host: app[app] @ localhost []
+# Thread_id: 7  Schema: shop  QC_hit: No
+# Query_time: 0.250000  Lock_time: 0.000010  Rows_sent: 1  Rows_examined: 1
+SET timestamp=1704446102;
+UPDATE orders SET status = 'paid' WHERE id = 42;
+# User@Host: app[app] @ localhost []
+# Thread_id: 8  Schema: shop  QC_hit: No
+# Query_time: 0.001000  Lock_time: 0.000010  Rows_sent: 1  Rows_examined: 1
+SET timestamp=1704446103;
+SELECT 1;
+"""
+
+PGSQL_LOG = """2024-01-05 09:15:01.100 UTC [311] LOG:  duration: 1.500 ms  statement: SELECT * FROM orders
+\tWHERE id = 7
+2024-01-05 09:15:02.000 UTC [312] LOG:  duration: 0.500 ms  execute <unnamed>: SELECT 1
+2024-01-05 09:15:02.500 UTC [312] LOG:  connection authorized: user=app
+"""
+
+
+def test_fingerprint():
+    pytest.assume(
+        fingerprint("SELECT * FROM t WHERE id = 42 AND c = 'x'  ")
+        == "select * from t where id = ? and c = ?"
+    )
+    pytest.assume(
+        fingerprint("SELECT a FROM t WHERE id IN (1, 2, 3);")
+        == "select a from t where id in (?+)"
+    )
+    pytest.assume(
+        fingerprint("INSERT INTO t VALUES (1), (2), (3)")
+        == fingerprint("INSERT INTO t VALUES (4), (5)")
+    )
+    pytest.assume(fingerprint("SELECT t1.c2 FROM t1") == "select t1.c2 from t1")
+
+
+def test_parse_general_log():
+    events = parse_log(GENERAL_LOG.splitlines(keepends=True), "general")
+    pytest.assume(len(events) == 2)
+    pytest.assume(events[0].session == "11")
+    pytest.assume(events[1].ts - events[0].ts == 1)
+    pytest.assume(events[1].sql.endswith("WHERE id IN (1, 2, 3)"))
+    pytest.assume(events[0].latency is None)
+
+
+def test_parse_slow_log():
+    events = parse_log(SLOW_LOG.splitlines(keepends=True), "slow")
+    pytest.assume(len(events) == 2)
+    pytest.assume(events[0].session == "7")
+    # Start from # Time minus Query_time, SET timestamp when # Time is stale
+    pytest.assume(events[0].ts == 1704446102.75)
+    pytest.assume(events[1].ts == 1704446103)
+    pytest.assume(events[0].latency == 250)
+    pytest.assume(events[1].sql == "SELECT 1;")
+
+
+def test_parse_pgsql_log():
+    events = parse_log(PGSQL_LOG.splitlines(keepends=True), "pgsql")
+    pytest.assume(len(events) == 2)
+    pytest.assume(events[0].session == "311")
+    pytest.assume(events[0].sql == "SELECT * FROM orders\nWHERE id = 7")
+    pytest.assume(abs(events[1].ts - events[0].ts - 0.9010) < 1e-6)
+    pytest.assume(events[1].latency == 0.5)
+
+
+def test_parse_log_errors():
+    with pytest.raises(ReplayException):
+        parse_log([], "binlog")
+    with pytest.raises(ReplayException):
+        parse_log(["nothing to see\n"], "general")
+
+
+def test_partition_keeps_sessions_together():
+    events = parse_log(SLOW_LOG.splitlines(keepends=True), "slow") + parse_log(
+        PGSQL_LOG.splitlines(keepends=True), "pgsql"
+    )
+    events.sort(key=lambda e: e.ts)
+    docs = partition(events, [2.0, 1.0])
+    pytest.assume(len(docs) == 2)
+    ids = [s["id"] for d in docs for s in d["sessions"]]
+    pytest.assume(sorted(ids) == ["311", "312", "7", "8"])
+    pytest.assume(all(d["start"] == events[0].ts for d in docs))
+    first = docs[0]["sessions"][0]["events"][0]
+    pytest.assume(first[0] >= 0 and first[1] == fingerprint(first[2]))
+
+    original = original_latencies(events)
+    pytest.assume(original["select ?"] == [0.5, 1.0])
+
+
+def test_divergence_sorted_worst_first():
+    fast, slow, new = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for _ in range(10):
+        fast.record(1.0)
+        slow.record(10.0)
+        new.record(3.0)
+    df = divergence(
+        {"select ?": [1.0] * 10, "update t set c = ?": [1.0] * 10},
+        {"select ?": fast, "update t set c = ?": slow, "delete from t": new},
+    )
+    pytest.assume(
+        list(df["fingerprint"]) == ["update t set c = ?", "select ?", "delete from t"]
+    )
+    pytest.assume(abs(df.iloc[0]["p95_ratio"] - 10) < 0.5)
+
+
+class FakeSession:
+    """Session with fixed 5ms service time"""
+
+    closed = False
+
+    def __init__(self, connection, host):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def execute(self, sql, args=None):
+        await asyncio.sleep(0.005)
+
+    async def close(self):
+        pass
+
+
+def test_replay_speed(monkeypatch):
+    monkeypatch.setitem(native_engine.SESSIONS, "mysql", FakeSession)
+    config = {"dialect": "mysql", "report_interval": 1}
+    doc = {
+        "start": 0,
+        "sessions": [
+            {
+                "id": str(s),
+                "events": [[i * 0.1, "select ?", "SELECT 1", 1.0] for i in range(11)],
+            }
+            for s in range(4)
+        ],
+    }
+    result = native_engine.replay(config, doc, speed=2, processes=2)
+    stats = EngineStats.from_dict(result)
+    pytest.assume(stats.transactions == 44)
+    pytest.assume(result["log_duration"] == 1.0)
+    # 1 sec of log at 2x
+    pytest.assume(0.45 <= result["time"] < 1.0)
+    pytest.assume(stats.statement_histograms["select ?"].total == 44)
+    # run_time cuts the replay
+    result = native_engine.replay(config, doc, speed=1, processes=1, run_time=0.5)
+    pytest.assume(EngineStats.from_dict(result).transactions < 44)
@@ -0,0 +1,29 @@
+import math
+
+import pandas as pd
+import pytest
+
+from benchmark.replication_monitor import SAMPLE_FIELDS, replication_summary
+
+
+def test_replication_summary():
+    samples = pd.DataFrame.from_records(
+        [
+            (100.0, 1, 8, 0, "r1", 0.0, 900.0, 1000.0, ""),
+            (105.0, 1, 8, 0, "r1", 4.0, 1000.0, 2000.0, ""),
+            (110.0, 1, 8, 0, "r1", 2.0, 1100.0, 3000.0, ""),
+            (100.0, 1, 8, 0, "r2", 1.0, 500.0, 0.0, ""),
+            (105.0, 1, 8, 0, "r2", math.nan, 0.0, 0.0, "Duplicate entry"),
+        ],
+        columns=SAMPLE_FIELDS,
+    )
+    df = replication_summary(samples).set_index("replica")
+    pytest.assume(df.loc["r1", "peak_lag"] == 4)
+    pytest.assume(df.loc["r1", "avg_lag"] == 2)
+    pytest.assume(df.loc["r1", "final_lag"] == 2)
+    pytest.assume(df.loc["r1", "apply_tps"] == 1000)
+    pytest.assume(df.loc["r1", "peak_apply_tps"] == 1100)
+    pytest.assume(df.loc["r1", "relay_log_growth"] == 2000)
+    pytest.assume(df.loc["r1", "samples"] == 3)
+    pytest.assume(df.loc["r2", "stopped_samples"] == 1)
+    pytest.assume(math.isnan(df.loc["r2", "final_lag"]))
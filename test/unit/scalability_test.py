@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+import yaml
+
+from benchmark.scalability import (
+    SCALABILITY_FILE,
+    UslModel,
+    analyze_summary,
+    fit_usl,
+    latency_knee,
+    recommend_threads,
+    save_print_scalability,
+)
+
+THREADS = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+def test_fit_usl_recovers_parameters():
+    truth = UslModel(single_throughput=1000, sigma=0.05, kappa=0.0005, r2=1)
+    # +-1% noise
+    throughput = [
+        truth.throughput(n) * (1 + 0.01 * (-1) ** i) for i, n in enumerate(THREADS)
+    ]
+    model = fit_usl(THREADS, throughput)
+    pytest.assume(abs(model.sigma - 0.05) < 0.005)
+    pytest.assume(abs(model.kappa - 0.0005) / 0.0005 < 0.1)
+    pytest.assume(model.r2 > 0.99)
+    # N* = sqrt((1 - 0.05) / 0.0005) = 43.6
+    pytest.assume(abs(model.peak_concurrency - 43.6) < 3)
+    pytest.assume(abs(model.peak_throughput - truth.throughput(43.6)) / 10000 < 0.02)
+
+
+def test_fit_usl_without_peak():
+    truth = UslModel(single_throughput=500, sigma=0.1, kappa=0, r2=1)
+    model = fit_usl(THREADS, [truth.throughput(n) for n in THREADS])
+    pytest.assume(model.kappa == 0)
+    pytest.assume(model.peak_concurrency is None)
+    pytest.assume(abs(model.peak_throughput - 5000) < 1)
+    pytest.assume(fit_usl([1, 2], [100, 200]) is None)
+    pytest.assume(fit_usl([1, 1, 2], [100, 100, 200]) is None)
+
+
+def test_latency_knee_and_recommendation():
+    latency = [1, 1, 1.1, 1.2, 1.5, 3, 8, 20]
+    pytest.assume(latency_knee(THREADS, latency) == 32)
+    pytest.assume(latency_knee(THREADS, [5] * len(THREADS)) is None)
+    model = UslModel(1000, 0.05, 0.0005, 1, peak_concurrency=43.6)
+    threads = recommend_threads(model, [8, 16, 32])
+    pytest.assume(threads[0] == 8 and 44 in threads and threads[-1] == 65)
+    model = UslModel(500, 0.1, 0, 1)
+    pytest.assume(recommend_threads(model, [8, 16, 32])[-1] == 64)
+
+
+def test_save_print_scalability(tmp_path):
+    truth = UslModel(single_throughput=1000, sigma=0.02, kappa=0.0002, r2=1)
+    df = pd.DataFrame(
+        {
+            "concurrency": THREADS,
+            "throughput": [truth.throughput(n) for n in THREADS],
+            "avg_latency": [n / truth.throughput(n) * 1000 for n in THREADS],
+            "p95_latency": [2 * n / truth.throughput(n) * 1000 for n in THREADS],
+        }
+    )
+    df.to_csv(tmp_path / "oltp_summary.csv", index=False)
+    df.rename(columns={"concurrency": "offered_rate"}).to_csv(
+        tmp_path / "oltp_latency_vs_load_summary.csv", index=False
+    )
+    results = save_print_scalability(str(tmp_path))
+    pytest.assume(list(results) == ["oltp"])
+    with open(tmp_path / SCALABILITY_FILE) as f:
+        saved = yaml.safe_load(f)
+    pytest.assume(saved["oltp"]["latency_metric"] == "p95_latency")
+    pytest.assume(saved["oltp"]["sampled_threads"] == THREADS)
+    pytest.assume(abs(saved["oltp"]["sigma"] - 0.02) < 0.002)
+    pytest.assume(analyze_summary(df.drop(columns=["throughput"])) is None)
@@ -0,0 +1,46 @@
+import pytest
+
+from benchmark.exceptions import BenchmarkException
+from benchmark.step_monitor import Step, StepMonitor, StepMonitors
+
+
+class RecordingMonitor(StepMonitor):
+    def __init__(self, fail_stop: bool = False):
+        super().__init__([])
+        self.fail_stop = fail_stop
+        self.calls = []
+
+    def start(self, step: Step):
+        self.calls.append("start")
+
+    def stop(self, step: Step):
+        self.calls.append("stop")
+        if self.fail_stop:
+            raise BenchmarkException("too many errors")
+
+
+def test_running(tmp_path):
+    monitors = StepMonitors([], artifact_dir=str(tmp_path), workload_name="wl")
+    monitor = RecordingMonitor()
+    monitors.monitors.append(monitor)
+    with monitors.running(Step(repeat=1, concurrency=8)) as step:
+        pass
+    pytest.assume(monitor.calls == ["start", "stop"])
+    pytest.assume(step.end >= step.start)
+    pytest.assume((tmp_path / "wl_steps.csv").exists())
+
+
+def test_running_failed_step(tmp_path):
+    monitors = StepMonitors([], artifact_dir=str(tmp_path), workload_name="wl")
+    monitor = RecordingMonitor(fail_stop=True)
+    monitors.monitors.append(monitor)
+    # monitors are stopped and the error of the step is raised, not theirs
+    with pytest.raises(RuntimeError):
+        with monitors.running(Step(repeat=1, concurrency=8)):
+            raise RuntimeError("driver lost")
+    pytest.assume(monitor.calls == ["start", "stop"])
+    pytest.assume(monitors.span is None)
+    # failure of a monitor fails a step that completed
+    with pytest.raises(BenchmarkException):
+        with monitors.running(Step(repeat=1, concurrency=16)):
+            pass
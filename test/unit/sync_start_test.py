@@ -0,0 +1,43 @@
+import pytest
+
+from benchmark.sync_start import (
+    intervals_in_window,
+    overlap_window,
+    parse_chrony_offset,
+    parse_sysbench_intervals,
+    parse_window,
+)
+
+SYSBENCH_OUTPUT = """XBENCH_START 1000.5
+Running the test with following options:
+Number of threads: 8
+[ 10s ] thds: 8 tps: 100.00 qps: 2000.00 (r/w/o: 1400.00/400.00/200.00) lat (ms,95%): 12.30 err/s: 0.00 reconn/s: 0.00
+[ 20s ] thds: 8 tps: 200.00 qps: 4000.00 (r/w/o: 2800.00/800.00/400.00) lat (ms,95%): 10.10 err/s: 1.00 reconn/s: 0.00
+[ 30s ] thds: 8 tps: 300.00 qps: 6000.00 (r/w/o: 4200.00/1200.00/600.00) lat (ms,95%): 9.50 err/s: 0.00 reconn/s: 0.00
+XBENCH_END 1031.0
+"""
+
+
+def test_parse_chrony_offset():
+    fast = "System time     : 0.000012345 seconds fast of NTP time\n"
+    slow = "System time     : 0.001000000 seconds slow of NTP time\n"
+    pytest.assume(abs(parse_chrony_offset(fast) - 0.012345) < 1e-9)
+    pytest.assume(abs(parse_chrony_offset(slow) + 1.0) < 1e-9)
+    pytest.assume(parse_chrony_offset("506 Cannot talk to daemon") is None)
+
+
+def test_overlap_and_intervals():
+    start, end = parse_window(SYSBENCH_OUTPUT)
+    pytest.assume((start, end) == (1000.5, 1031.0))
+    pytest.assume(overlap_window([(0, 10), (2, 12)]) == (2, 10))
+    pytest.assume(overlap_window([(0, 10), (11, 12)]) == (None, None))
+    pytest.assume(overlap_window([(0, 10), (None, 12)]) == (None, None))
+
+    intervals = parse_sysbench_intervals(SYSBENCH_OUTPUT)
+    pytest.assume(len(intervals) == 3)
+    pytest.assume(intervals[1] == (20, 8, 200.0, 4000.0, 10.1, 1.0))
+    # Second driver started 5 seconds later: only second interval is fully inside
+    inside = intervals_in_window(intervals, start, 10, (1005.5, 1031.0))
+    pytest.assume([i[0] for i in inside] == [20, 30])
+    inside = intervals_in_window(intervals, start, 10, (1005.5, 1025.0))
+    pytest.assume([i[0] for i in inside] == [20])
@@ -0,0 +1,101 @@
+import json
+import threading
+
+import pytest
+
+from common.tracing import Span, Tracer, critical_path, short, trace_report
+
+
+def span(id, parent_id, start, end, name="op", **attributes):
+    return Span(name, id, parent_id, start, end, attributes=attributes)
+
+
+def test_trace_file(tmp_path):
+    tracer = Tracer()
+    pytest.assume(tracer.start_span("off") is None)
+    file_name = tmp_path / "trace.json"
+    tracer.open(str(file_name), "xb.py provision", cluster="c1")
+    with tracer.span("provision.make"):
+        with tracer.span("node.run", node="backend1_0", cmd="echo\n  hello"):
+            pass
+        tracer.record("ssh.run", 1.0, 2.0, node="driver1_0")
+    try:
+        with tracer.span("workload.run"):
+            raise ValueError("no drivers")
+    except ValueError:
+        pass
+    spans = tracer.close()
+    events = json.loads(file_name.read_text())
+    complete = {e["args"]["id"]: e for e in events if e["ph"] == "X"}
+    by_name = {s.name: s for s in spans}
+    pytest.assume(len(spans) == len(complete) == 5)
+    pytest.assume(by_name["node.run"].parent_id == by_name["provision.make"].id)
+    pytest.assume(by_name["provision.make"].parent_id == by_name["xb.py provision"].id)
+    pytest.assume(by_name["node.run"].attributes["cmd"] == "echo hello")
+    pytest.assume(
+        by_name["workload.run"].attributes["error"] == "ValueError: no drivers"
+    )
+    pytest.assume(spans[-1].name == "xb.py provision")
+    pytest.assume(not tracer.enabled)
+
+
+def test_propagate(tmp_path):
+    tracer = Tracer()
+    tracer.open(str(tmp_path / "trace.json"), "xb.py provision")
+    parents = {}
+    with tracer.span("provision.install") as parent:
+
+        def install(name):
+            with tracer.span("install", node=name) as child:
+                parents[name] = child.parent_id
+
+        threads = [
+            threading.Thread(target=tracer.propagate(install), args=(n,))
+            for n in ("a", "b")
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    tracer.close()
+    pytest.assume(parents == {"a": parent.id, "b": parent.id})
+
+
+def test_critical_path():
+    spans = [
+        span(1, None, 0, 100, "xb.py run"),
+        span(2, 1, 0, 30, "provision.make"),
+        span(3, 2, 0, 10, "install", node="n1"),
+        span(4, 2, 0, 29, "install", node="n2"),  # slowest parallel install
+        span(5, 1, 30, 95, "workload.run"),
+        span(6, 5, 31, 40, "step"),
+        span(7, 5, 40, 94, "step"),
+    ]
+    path = [s.id for s in critical_path(spans)]
+    pytest.assume(path == [1, 2, 4, 5, 6, 7])
+    report = trace_report(spans)
+    pytest.assume("29.0 sec" in report)
+    pytest.assume(report.index("n2") < report.index("n1"))  # busiest node first
+
+
+def test_short_redacts_secrets():
+    pytest.assume(
+        short("PGHOST=10.0.0.1 PGUSER=xbench PGPASSWORD='S3cretPass' pgbench -c 4")
+        == "PGHOST=10.0.0.1 PGUSER=xbench PGPASSWORD=*** pgbench -c 4"
+    )
+    pytest.assume(
+        short("sysbench --mysql-user=cbench --mysql-password='Ma49#+Pa1' --threads=4")
+        == "sysbench --mysql-user=cbench --mysql-password=*** --threads=4"
+    )
+    pytest.assume(
+        short('export DATA_SOURCE_NAME="exporter:pw@(localhost:3306)/"')
+        == 'export DATA_SOURCE_NAME="exporter:***@(localhost:3306)/"'
+    )
+    pytest.assume(
+        short("echo 'h:5432:*:xbench:pw' >> ~/.pgpass")
+        == "echo 'h:5432:*:xbench:***' >> ~/.pgpass"
+    )
+    pytest.assume(short("mysql -u root -proot -e x") == "mysql -u root -p*** -e x")
+    pytest.assume(short("ssh -p 22 host") == "ssh -p 22 host")
+    # secrets are removed before long commands are cut
+    pytest.assume("S3cret" not in short("x" * 110 + " PGPASSWORD=S3cretPass"))
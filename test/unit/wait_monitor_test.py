@@ -0,0 +1,56 @@
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from benchmark.wait_monitor import WAIT_FIELDS, attribute_waits, step_waits, top_waits
+from lib.db_stats import wait_class
+
+
+def test_wait_class():
+    pytest.assume(wait_class("wait/io/file/innodb/innodb_data_file") == "io/file")
+    pytest.assume(wait_class("wait/synch/mutex/innodb/trx_sys_mutex") == "synch/mutex")
+    pytest.assume(wait_class("idle") == "idle")
+
+
+def test_step_waits():
+    io, lock, new = ("io/file", "data"), ("lock/row", "sbtest1"), ("io/table", "t")
+    waits = step_waits(
+        {io: 1000.0, ("synch/mutex", "m"): 5.0},
+        {io: 1500.0, ("synch/mutex", "m"): 5.0, new: 20.0},
+        Counter({lock: 10}),
+        0.2,
+    )
+    pytest.assume(waits == {io: 500.0, lock: 2000.0, new: 20.0})
+
+
+def waits_frame():
+    return pd.DataFrame.from_records(
+        [
+            (1, 8, 0, "h1", "io/file", "data", 100.0, 0),
+            (1, 8, 0, "h1", "lock/row", "sbtest1", 300.0, 0),
+            (1, 8, 0, "h2", "io/file", "data", 100.0, 0),
+            (1, 16, 0, "h1", "lock/row", "sbtest1", 900.0, 0),
+            (1, 16, 0, "h1", "synch/mutex", "m", 100.0, 0),
+        ],
+        columns=WAIT_FIELDS,
+    )
+
+
+def test_top_waits():
+    df = top_waits(waits_frame(), ["concurrency"], 1).set_index("concurrency")
+    pytest.assume(df.loc[8, "top_waits"] == "lock/row 60.0%")
+    df = top_waits(waits_frame(), ["concurrency"], 3).set_index("concurrency")
+    pytest.assume(df.loc[16, "top_waits"] == "lock/row 90.0%; synch/mutex 10.0%")
+
+
+def test_attribute_waits(tmp_path):
+    waits_frame().to_csv(tmp_path / "oltp_waits.csv", index=False)
+    pd.DataFrame({"concurrency": [8, 16, 32], "throughput": [1.0, 2.0, 3.0]}).to_csv(
+        tmp_path / "oltp_summary.csv", index=False
+    )
+    attribute_waits(str(tmp_path), "oltp", top=1)
+    summary = attribute_waits(str(tmp_path), "oltp", top=2)  # idempotent
+    pytest.assume(list(summary.columns) == ["concurrency", "throughput", "top_waits"])
+    pytest.assume(summary["top_waits"][0] == "lock/row 60.0%; io/file 40.0%")
+    pytest.assume(pd.isna(summary["top_waits"][2]))
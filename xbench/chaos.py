@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2023 dvolkov
+
+"""Fault injection while the workload is running.
+
+The chaos section of a workload lists events executed by a side thread during run:
+
+    chaos:
+      events:
+        - name: kill_backend
+          at: 300               # seconds after the workload has started
+          action: command       # stop, start, restart, command, stop_instance, start_instance, reboot
+          target: backend_1     # member, group (backend1), role (backend) or zone:<zone>
+          command: systemctl kill -s KILL clustrix
+          recover_command: systemctl start clustrix
+          duration: 120         # run the recovery step after 120 seconds
+          check_quorum: True    # wait for quorum after the recovery step
+
+stop/start/restart call the component (backend, proxy) class of the target nodes,
+stop_instance/start_instance/reboot go through the cloud of the nodes. Events with
+duration get a recovery step (stop -> start, stop_instance -> start_instance,
+command -> recover_command). Recovery steps which are not executed before the workload
+ends are executed right after it, so the cluster is not left broken.
+"""
+
+import csv
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Callable, Dict, List, Optional
+
+from backend.exceptions import BackendException
+from cloud.abstract_cloud import AbstractCloud
+from cloud.exceptions import CloudException
+from common import get_class_from_klass, traced_sleep
+from compute import Cluster, MultiNode, Node
+from compute.exceptions import NodeException, PsshClientException, SshClientException
+from proxy.exceptions import ProxyException
+
+from .exceptions import XbenchException
+
+EVENTS_FILE = "chaos_events.csv"
+ZONE_PREFIX = "zone:"
+DRIVER_ROLE = "driver"
+SERVICE_ACTIONS = ["stop", "start", "restart"]
+INSTANCE_ACTIONS = ["stop_instance", "start_instance", "reboot"]
+COMMAND_ACTION = "command"
+RECOVERY_ACTIONS = {
+    "stop": "start",
+    "stop_instance": "start_instance",
+    "command": "command",
+}
+DEFAULT_QUORUM_TIMEOUT = 600
+QUORUM_CHECK_INTERVAL = 5
+COMMAND_TIMEOUT = 600
+CHAOS_EXCEPTIONS = (
+    BackendException,
+    ProxyException,
+    CloudException,
+    NodeException,
+    SshClientException,
+    PsshClientException,
+    XbenchException,
+)
+
+
+@dataclass
+class ChaosStep:
+    event: str
+    action: str
+    target: str
+    at: float  # seconds since the schedule start
+    command: Optional[str] = None
+    fault: bool = True  # False for the recovery step of the event
+    check_quorum: bool = False
+    nodes: List[str] = field(default_factory=list)
+    start: Optional[float] = None  # epoch
+    end: Optional[float] = None  # epoch
+    status: str = "pending"
+
+
+def target_nodes(members: Dict[str, Node], target: str) -> List[Node]:
+    """Nodes matching the target
+
+    Args:
+        members (Dict[str, Node]): cluster members by name (backend1_0, proxy1_0, ...)
+        target (str): member name, group name (backend1), role (backend) or
+            zone:<zone>. Drivers are never part of a zone
+    """
+    if target.startswith(ZONE_PREFIX):
+        zone = target[len(ZONE_PREFIX) :]
+        return [
+            n
+            for n in members.values()
+            if n.vm.zone == zone and n.vm.role != DRIVER_ROLE
+        ]
+    return [
+        n
+        for name, n in members.items()
+        if target in (name, Cluster.group_name(name), n.vm.role)
+    ]
+
+
+def chaos_steps(events: List[Dict]) -> List[ChaosStep]:
+    """Fault and recovery steps of all events ordered by time"""
+    steps = []
+    for i, event in enumerate(events):
+        name = event.get("name", f"event{i + 1}")
+        action = event.get("action")
+        if action not in SERVICE_ACTIONS + INSTANCE_ACTIONS + [COMMAND_ACTION]:
+            raise XbenchException(f"Unknown chaos action {action} in {name}")
+        if event.get("target") is None or event.get("at") is None:
+            raise XbenchException(f"Chaos event {name} needs target and at")
+        steps.append(
+            ChaosStep(
+                event=name,
+                action=action,
+                target=event["target"],
+                at=float(event["at"]),
+                command=event.get("command"),
+                check_quorum=bool(event.get("check_quorum"))
+                and event.get("duration") is None,
+            )
+        )
+        if event.get("duration") is not None and action in RECOVERY_ACTIONS:
+            steps.append(
+                ChaosStep(
+                    event=name,
+                    action=RECOVERY_ACTIONS[action],
+                    target=event["target"],
+                    at=float(event["at"]) + float(event["duration"]),
+                    command=event.get("recover_command"),
+                    fault=False,
+                    check_quorum=bool(event.get("check_quorum")),
+                )
+            )
+    return sorted(steps, key=lambda s: s.at)
+
+
+class ChaosSchedule:
+    """Execute chaos events in a side thread while the workload is running"""
+
+    def __init__(
+        self,
+        cluster: Cluster,
+        backend,
+        events: List[Dict],
+        cloud_for_node: Callable[[Node], AbstractCloud],
+        bt: Optional[Dict] = None,
+        quorum_timeout: int = DEFAULT_QUORUM_TIMEOUT,
+    ):
+        """
+        Args:
+            cluster (Cluster): cluster the workload is running on
+            backend: backend of the workload, used to check quorum
+            events (List[Dict]): chaos events from workload.yaml
+            cloud_for_node (Callable): returns cloud of the node for instance actions
+            bt (Dict): extra bt params for component classes
+        """
+        self.logger = logging.getLogger(__name__)
+        self.cluster = cluster
+        self.backend = backend
+        self.cloud_for_node = cloud_for_node
+        self.bt = bt or {}
+        self.quorum_timeout = quorum_timeout
+        self.steps = chaos_steps(events)
+        self.started_at: Optional[float] = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="chaos", daemon=True)
+
+    def start(self):
+        self.started_at = time.time()
+        self.logger.info(f"Chaos schedule started with {len(self.steps)} step(s)")
+        self.thread.start()
+
+    def stop(self):
+        """Stop the schedule and run recovery steps of already injected faults"""
+        self.stopped.set()
+        self.thread.join()
+        injected = {s.event for s in self.steps if s.fault and s.start is not None}
+        for step in self.steps:
+            if step.status != "pending":
+                continue
+            if not step.fault and step.event in injected:
+                self.logger.info(f"Workload is over, recovering {step.event} now")
+                self.execute(step)
+            else:
+                step.status = "skipped"
+
+    def _run(self):
+        for step in self.steps:
+            delay = self.started_at + step.at - time.time()
+            if self.stopped.wait(max(0.0, delay)):
+                return
+            self.execute(step)
+
+    def execute(self, step: ChaosStep):
+        nodes = target_nodes(self.cluster.members, step.target)
+        step.nodes = [n.vm.name for n in nodes]
+        step.start = time.time()
+        self.logger.info(
+            f"Chaos {step.event}: {step.action} on {step.nodes or step.target}"
+        )
+        try:
+            if not nodes:
+                raise XbenchException(f"No nodes match chaos target {step.target}")
+            if step.action in SERVICE_ACTIONS:
+                self.service_action(step.action, nodes)
+            elif step.action in INSTANCE_ACTIONS:
+                self.instance_action(step.action, nodes)
+            elif step.command:
+                MultiNode(nodes).run_on_all_nodes(step.command, timeout=COMMAND_TIMEOUT)
+            if step.check_quorum:
+                self.wait_for_quorum()
+            step.status = "done"
+        except CHAOS_EXCEPTIONS as e:
+            self.logger.error(f"Chaos {step.event} failed: {e}")
+            step.status = "failed"
+        step.end = time.time()
+
+    def service_action(self, action: str, nodes: List[Node]):
+        """Call stop/start/restart of the component class of the nodes"""
+        klass = get_class_from_klass(nodes[0].vm.klass)
+        instances = (
+            [klass(nodes, bt=self.bt)]
+            if klass.clustered
+            else [klass(n, bt=self.bt) for n in nodes]
+        )
+        for instance in instances:
+            if action == "restart" and not hasattr(instance, "restart"):
+                instance.stop()
+                instance.start()
+            else:
+                getattr(instance, action)()
+
+    def instance_action(self, action: str, nodes: List[Node]):
+        for node in nodes:
+            cloud = self.cloud_for_node(node)
+            if action == "stop_instance":
+                cloud.stop_instance(node)
+            elif action == "start_instance":
+                cloud.start_instance(node)
+            else:
+                cloud.reboot_instance(node)
+
+    def wait_for_quorum(self):
+        if not hasattr(self.backend, "check_quorum"):
+            self.logger.warning("Backend has no quorum check, skipping")
+            return
+        deadline = time.time() + self.quorum_timeout
+        while True:
+            try:
+                self.backend.check_quorum()
+                return
+            except BackendException as e:
+                if time.time() > deadline:
+                    raise XbenchException(
+                        f"No quorum after {self.quorum_timeout} sec: {e}"
+                    )
+            traced_sleep(QUORUM_CHECK_INTERVAL, "quorum")
+
+    def faults(self) -> List[Dict]:
+        """Injected faults in the save_print_recovery format"""
+        return [
+            {
+                "event": s.event,
+                "action": s.action,
+                "target": s.target,
+                "injected_at": s.start,
+            }
+            for s in self.steps
+            if s.fault and s.start is not None
+        ]
+
+    def save(self, artifact_dir: str):
+        file_name = os.path.join(artifact_dir, EVENTS_FILE)
+        with open(file_name, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[x.name for x in fields(ChaosStep)])
+            writer.writeheader()
+            for step in self.steps:
+                writer.writerow(asdict(step) | {"nodes": ",".join(step.nodes)})
+        self.logger.info(f"Chaos events saved as {file_name}")
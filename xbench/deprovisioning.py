@@ -2,6 +2,7 @@ from typing import Optional
 
 from cloud.cli_factory import CliFactory
 from cloud.cloud_factory import CloudFactory
+from common.tracing import traced
 from compute import run_parallel
 from metrics.server import MetricsServer
 from xbench.common import klass_instance_clean
@@ -34,6 +35,7 @@ class DeProvisioning(Xbench):
         ms = MetricsServer()
         ms.deregister_cluster(self.cluster.cluster_name)
 
+    @traced("deprovision.clean")
     def clean(self):
         """Tear down the entire cluster"""
 
@@ -86,6 +88,7 @@ class DeProvisioning(Xbench):
         self.remove_cluster_yaml()
         self.logger.info(f"Deleted cluster file")
 
+    @traced("deprovision.nuke")
     def nuke(self):
         """Nuke the entire cluster by requesting resources from the cloud by tag"""
         cli = None
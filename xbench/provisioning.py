@@ -8,6 +8,7 @@ from cloud.cloud_factory import CloudFactory
 from cloud.ephemeral import EphemeralCloud
 from cloud.virtual_storage import VirtualStorage
 from common.common import save_dict_as_yaml, simple_dict_items
+from common.tracing import traced
 from compute import (
     Cluster,
     ClusterState,
@@ -163,6 +164,7 @@ class Provisioning(Xbench):
 
         raise XbenchException(f"Component {name} was not found")
 
+    @traced("provision.configure")
     def configure(self):
         """Helper to build the final tree which takes into account count from impl"""
 
@@ -233,6 +235,7 @@ class Provisioning(Xbench):
         """Configure node and it's storage after provisioning but before install"""
         n.configure(**self.xbench_config_instance.xbench_config)
 
+    @traced("provision.allocate")
     def allocate(self):
         """All real provision work happens here
 
@@ -337,6 +340,7 @@ class Provisioning(Xbench):
         except (CloudException, NodeException) as e:
             raise XbenchException(e)
 
+    @traced("provision.make")
     def make(self):
         """Basic preparation of the node
 
@@ -358,11 +362,13 @@ class Provisioning(Xbench):
                 ]
 
                 noop = lambda x: x
-                run_parallel(configure_args, noop, self.node_configure)
+                with MetricsServer().batch():
+                    run_parallel(configure_args, noop, self.node_configure)
 
         except (CloudException, NodeException) as e:
             raise XbenchException(e)
 
+    @traced("provision.self_test")
     def self_test(self):
         """Check than node is accessible
 
@@ -393,6 +399,7 @@ class Provisioning(Xbench):
             klass_instances.append((k[0])(k[1], **self.extra_impl_params))
         return klass_instances
 
+    @traced("provision.install")
     def install(self):
         """Install software to the node
 
@@ -422,7 +429,8 @@ class Provisioning(Xbench):
                 ]
 
                 noop = lambda x: x
-                run_parallel(configure_args, noop, klass_instance_configure)
+                with MetricsServer().batch():
+                    run_parallel(configure_args, noop, klass_instance_configure)
 
             # We install components across all environments (Multi-region Xpand)
             self.logger.info(f"Installing all components")
@@ -436,9 +444,10 @@ class Provisioning(Xbench):
                 for member in cluster.group_nodes_by_name().values()
             ]
 
-            completed_installs = run_parallel_returning(
-                install_args, klass_instance_install
-            )
+            with MetricsServer().batch():
+                completed_installs = run_parallel_returning(
+                    install_args, klass_instance_install
+                )
 
             for name, res in completed_installs:
                 if res is not None:
@@ -480,6 +489,7 @@ class Provisioning(Xbench):
         ) as e:
             raise XbenchException(e)
 
+    @traced("provision.clean")
     def clean(self):
         """Uninstall software on node
 
@@ -499,7 +509,8 @@ class Provisioning(Xbench):
                 ]
 
                 noop = lambda x: x
-                run_parallel(clean_args, noop, klass_instance_clean)
+                with MetricsServer().batch():
+                    run_parallel(clean_args, noop, klass_instance_clean)
 
                 cluster.bt = BackendTarget("", "", "", "", 0)
                 self.save_cluster(cluster)
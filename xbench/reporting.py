@@ -4,6 +4,9 @@
 import os
 from typing import Optional
 
+from benchmark.profiler import PROFILE_DIR, save_diff_flamegraphs
+from benchmark.scalability import save_print_scalability
+from common.tracing import traced
 from compute import ProcessExecutionException, RunSubprocess
 
 from .exceptions import XbenchException
@@ -22,7 +25,8 @@ class Reporting(Xbench):
         artifact_dir: str,
         yaml_config: Optional[str],
         notebook_name: Optional[str] = "results",
-        notebook_title: Optional[str] = "Test results"
+        notebook_title: Optional[str] = "Test results",
+        baseline_dir: Optional[str] = None,  # run to compare profiles with
     ):
         super(Reporting, self).__init__(cluster_name)
         self.cluster_name = cluster_name
@@ -32,12 +36,27 @@ class Reporting(Xbench):
         self.yaml_config = yaml_config
         self.notebook_name = notebook_name
         self.notebook_title = notebook_title
+        self.baseline_dir = baseline_dir
 
     # TODO
     #  jupyter nbconvert $XBENCH_HOME/notebooks/{self.notebook_name}.ipynb --execute --no-input --to html --output $bname.html
 
+    @traced("report.analyze")
+    def analyze(self):
+        """Fit scalability model for every run directory under the artifact directory
+
+        With baseline_dir profiles of every run are compared with the baseline run
+        """
+        for root, _, files in os.walk(self.artifact_dir):
+            if any(f.endswith("_summary.csv") for f in files):
+                save_print_scalability(root)
+            if self.baseline_dir and os.path.basename(root) == PROFILE_DIR:
+                save_diff_flamegraphs(self.baseline_dir, os.path.dirname(root))
+
+    @traced("report.run")
     def run(self):
         self.logger.info('Reporting has started')
+        self.analyze()
         report_notebook = f"notebooks/{NOTEBOOK}" # I am in XBENCH_HOME directory (xbench.sh does it for me)
         final_notebook_name = os.path.join(self.artifact_dir,f"{self.notebook_name}.ipynb")
         config_file_clause = f"-p yaml_config_file_name {self.yaml_config}" if self.yaml_config is not None else ""
@@ -3,22 +3,41 @@
 
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 from datetime import datetime, timezone
 from typing import Dict, List, Optional
 
+import pandas as pd
+
 from backend.abstract_backend import AbstractBackend
+from benchmark.clock_skew import DEFAULT_SAMPLES as DEFAULT_CLOCK_SAMPLES
+from benchmark.clock_skew import ClockSkew, correct_times
+from benchmark.driver_monitor import DEFAULT_THREADS_PER_CORE, drivers_needed
 from benchmark.exceptions import BenchmarkException
+from benchmark.host_resources import HOST_DIR, HostSampler, save_host_resources
+from benchmark.host_sampler import DEFAULT_INTERVAL
+from benchmark.recovery import DEFAULT_REPORT_INTERVAL, save_print_recovery
+from benchmark.scalability import save_print_scalability
+from benchmark.wait_monitor import DEFAULT_TOP_WAITS, attribute_waits
+from cloud.abstract_cloud import AbstractCloud
+from cloud.cloud_factory import CloudFactory
 from common import get_class_from_klass, save_dict_as_yaml
 from common.common import mkdir
+from common.tracing import traced, tracer
 from driver.abstract_driver import AbstractDriver
-from lib import Grafana, XbenchConfig
+from lib import Grafana, Prometheus, PrometheusException, XbenchConfig
+from lib.grafana import SNAPSHOT_WORKERS
+from lib.prometheus import to_epoch
 from lib.yaml_config import YamlConfig, YamlConfigException
 from proxy.abstract_proxy import AbstractProxy
 
+from .chaos import DEFAULT_QUORUM_TIMEOUT, ChaosSchedule
 from .exceptions import XbenchException
 from .xbench import Xbench
 
+PROMETHEUS_DIR = "prometheus"
+
 
 class WorkloadRunning(Xbench):
     """Main class to run workload"""
@@ -33,6 +52,8 @@ class WorkloadRunning(Xbench):
         tag: Optional[
             str
         ] = None,  # Useful when multiple workloads run for the same cluster
+        auto_drivers: bool = False,
+        resume_dir: Optional[str] = None,  # artifact directory of the run to resume
     ):
         super(WorkloadRunning, self).__init__(cluster_name)
         self.cluster = self.load_cluster()
@@ -41,6 +62,8 @@ class WorkloadRunning(Xbench):
         self.artifact_dir = artifact_dir
         self.extra_impl_params = extra_impl_params
         self.tag = tag
+        self.auto_drivers = auto_drivers
+        self.resume_dir = resume_dir
 
         workload_yaml = XbenchConfig().load_yaml("workload.yaml")
         # This hack is required because workload yaml is not standard file
@@ -65,9 +88,13 @@ class WorkloadRunning(Xbench):
             bt=self.extra_impl_params.get("bt", {}),
         )
         self.grafana_servers = []
+        self.prometheus_servers: Dict[str, Prometheus] = {}
         for env in self.cluster.envs:
             try:
                 grafana_host = self.load_cloud(env.cloud)[env.region]["metric_server"]
+                self.prometheus_servers[env.name] = Prometheus.from_metric_server(
+                    grafana_host
+                )
                 self.grafana_servers.append(
                     Grafana(grafana_host["sa_token"], grafana_host["hostname"])
                 )
@@ -86,6 +113,7 @@ class WorkloadRunning(Xbench):
             raise XbenchException(e)
 
     # Todo Exception handling
+    @traced("workload.self_test")
     def self_test(self):
         """Check that backend is working and the all drivers in the cluster can connect to database
 
@@ -105,6 +133,7 @@ class WorkloadRunning(Xbench):
                 instance.db_connect()
                 instance.self_test()
 
+    @traced("workload.prepare")
     def prepare(self):
         """Clean database and run prepare command for workload"""
         all_nodes = self.cluster.get_all_driver_nodes()
@@ -113,11 +142,13 @@ class WorkloadRunning(Xbench):
 
         workload_runner_class = get_class_from_klass(self.workload_conf.get("klass"))
         workload_runner_class(all_nodes, **self._get_all_params()).prepare()
-        workload_runner_class(all_nodes, **self._get_all_params()).data_check()
+        with tracer.span("workload.data_check"):
+            workload_runner_class(all_nodes, **self._get_all_params()).data_check()
         self.backend.db_connect()
         self.backend.print_db_size(self.cluster.bt.database)
 
     # Every workload has to take care about killing drivers before starting a new run
+    @traced("workload.run")
     def run(self) -> str:
         """
         Run the workload
@@ -129,36 +160,389 @@ class WorkloadRunning(Xbench):
         """
         try:
             all_nodes = self.cluster.get_all_driver_nodes()
-            # For each run we need to create unique run directory
-            now = datetime.now()
-            self.artifact_dir = f'{self.artifact_dir}/{self.cluster.cluster_name}/{now.strftime("%Y_%m_%d_%H_%M")}_{self.benchmark_name}'
-            if self.tag:
-                self.artifact_dir = f"{self.artifact_dir}_{self.tag}"
-            mkdir(self.artifact_dir)
+            if self.resume_dir:
+                # Continue the sweep in the same directory, runners skip finished steps
+                if not os.path.isdir(self.resume_dir):
+                    raise XbenchException(
+                        f"Artifact directory {self.resume_dir} to resume does not exist"
+                    )
+                self.artifact_dir = self.resume_dir
+                self.logger.info(f"Resuming workload in {self.artifact_dir}")
+            else:
+                # For each run we need to create unique run directory
+                now = datetime.now()
+                self.artifact_dir = f'{self.artifact_dir}/{self.cluster.cluster_name}/{now.strftime("%Y_%m_%d_%H_%M")}_{self.benchmark_name}'
+                if self.tag:
+                    self.artifact_dir = f"{self.artifact_dir}_{self.tag}"
+                mkdir(self.artifact_dir)
             workload_runner_class = get_class_from_klass(
                 self.workload_conf.get("klass")
             )
-            time_from = self.save_timestamp(os.path.join(self.artifact_dir, "start"))
+            if self.auto_drivers:
+                self.advise_drivers(all_nodes)
+            time_from = self.save_timestamp(
+                os.path.join(
+                    self.artifact_dir, "resume" if self.resume_dir else "start"
+                )
+            )
             self.save_tag(os.path.join(self.artifact_dir, "tag"))
             # Save workload config to the artifact directory
             save_dict_as_yaml(
                 os.path.join(self.artifact_dir, "workload.yaml"), self.workload_conf
             )
-            workload_runner_class(all_nodes, **self._get_all_params()).run()
-            time_to = self.save_timestamp(os.path.join(self.artifact_dir, "stop"))
-            for grafana in self.grafana_servers:
-                snapshot_urls = grafana.create_snapshot(
-                    self.cluster, time_from, time_to
+            clock = None
+            if self.workload_conf.get("clock_skew", True):
+                clock = ClockSkew(
+                    list(self.cluster.members.values()),
+                    self.workload_conf.get("clock_samples", DEFAULT_CLOCK_SAMPLES),
+                )
+                clock.measure("start")
+            host_sampler, host_samples = None, pd.DataFrame()
+            if self.workload_conf.get("host_sampling", True):
+                host_sampler = HostSampler(
+                    list(self.cluster.members.values()),
+                    self.workload_conf.get("host_sample_interval", DEFAULT_INTERVAL),
+                )
+                host_sampler.start()
+            chaos = self.chaos_schedule()
+            if chaos:
+                chaos.start()
+            failed = True
+            try:
+                workload_runner_class(all_nodes, **self._get_all_params()).run()
+                failed = False
+            finally:
+                # A failed run (e.g. a failover step) is analyzed too. Every cleanup
+                # step runs, the first error of a successful run is raised at the end
+                errors = []
+                if chaos:
+                    self.post_run(failed, chaos.stop, errors=errors)
+                    self.post_run(failed, chaos.save, self.artifact_dir, errors=errors)
+                if host_sampler:
+                    stopped = self.post_run(
+                        failed,
+                        host_sampler.stop,
+                        os.path.join(self.artifact_dir, HOST_DIR),
+                        errors=errors,
+                    )
+                    if stopped is not None:
+                        host_samples = stopped
+                if clock:
+                    self.post_run(failed, clock.measure, "end", errors=errors)
+                time_to = self.post_run(
+                    failed,
+                    self.save_timestamp,
+                    os.path.join(self.artifact_dir, "stop"),
+                    errors=errors,
                 )
-                self.save_snapshot_urls(
-                    snapshot_urls, (os.path.join(self.artifact_dir, "snapshot_url"))
+                self.post_run(
+                    failed,
+                    self.analyze_run,
+                    failed,
+                    time_from,
+                    time_to,
+                    chaos,
+                    clock,
+                    host_sampler,
+                    host_samples,
+                    errors=errors,
                 )
-                for url in snapshot_urls:
-                    self.logger.info(f"Snapshot URL: {url}")
+                if errors:
+                    raise errors[0]
             return self.artifact_dir
         except (OSError, BenchmarkException) as e:
             raise XbenchException(e)
 
+    def post_run(
+        self,
+        failed: bool,
+        fn,
+        *args,
+        optional: bool = False,
+        errors: Optional[list] = None,
+        **kwargs,
+    ):
+        """Call fn once the runner is done without hiding the outcome of the run
+
+        After a failed run any error is only logged, the error of the run is the one
+        raised. After a successful run errors of optional exports and analyses are
+        logged too, other errors are raised or, with errors, collected for later.
+        """
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if failed or optional:
+                run = "failed run" if failed else "run"
+                self.logger.warning(f"{fn.__name__} of the {run}: {e}")
+            elif errors is None:
+                raise
+            else:
+                self.logger.error(f"{fn.__name__} of the run: {e}")
+                errors.append(e)
+
+    def analyze_run(
+        self,
+        failed: bool,
+        time_from: str,
+        time_to: Optional[str],
+        chaos: Optional[ChaosSchedule],
+        clock: Optional[ClockSkew],
+        host_sampler: Optional[HostSampler],
+        host_samples: pd.DataFrame,
+    ):
+        """Everything collected and analyzed once the runner is done
+
+        Clock corrections and host resources belong to the results of the run, the
+        other analyses and exports are optional, see post_run for their errors
+        """
+        errors = []
+        report_interval = self.workload_conf.get(
+            "report_interval", DEFAULT_REPORT_INTERVAL
+        )
+        if clock:
+            # Member clocks must be closer than the finest sampling interval
+            intervals = [report_interval]
+            if host_sampler:
+                intervals.append(host_sampler.interval)
+            self.post_run(
+                failed, clock.save, self.artifact_dir, min(intervals), errors=errors
+            )
+            self.post_run(
+                failed, clock.correct_timeseries, self.artifact_dir, errors=errors
+            )
+            corrected = self.post_run(
+                failed,
+                correct_times,
+                host_samples,
+                clock.offsets(),
+                "node",
+                errors=errors,
+            )
+            if corrected is not None:
+                host_samples = corrected
+        self.post_run(
+            failed,
+            save_host_resources,
+            host_samples,
+            self.artifact_dir,
+            self.workload_name,
+            errors=errors,
+        )
+        self.post_run(
+            failed,
+            attribute_waits,
+            self.artifact_dir,
+            self.workload_name,
+            self.workload_conf.get("top_waits", DEFAULT_TOP_WAITS),
+            optional=True,
+        )
+        self.post_run(failed, save_print_scalability, self.artifact_dir, optional=True)
+        if chaos:
+            chaos_conf = self.workload_conf.get("chaos")
+            self.post_run(
+                failed,
+                save_print_recovery,
+                self.artifact_dir,
+                chaos.faults(),
+                report_interval,
+                optional=True,
+                **{
+                    k: chaos_conf[k]
+                    for k in ("baseline_window", "dip_threshold", "recovery_samples")
+                    if k in chaos_conf
+                },
+            )
+        if time_to is None:
+            # the stop time stamp could not be saved
+            time_to = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self.post_run(failed, self.create_snapshots, time_from, time_to, optional=True)
+        self.post_run(failed, self.export_metrics, time_from, time_to, optional=True)
+        if errors:
+            raise errors[0]
+
+    @traced("workload.snapshots")
+    def create_snapshots(self, time_from: str, time_to: str):
+        """Grafana snapshots of the run window, of every step with grafana_step_snapshots
+
+        Grafana servers are handled concurrently, each one creates its snapshots with
+        grafana_snapshot_workers concurrent requests. Step windows come from
+        {workload}_steps.csv, step snapshot URLs go to {workload}_step_snapshots.csv
+        """
+        if not self.grafana_servers:
+            return
+        workers = self.workload_conf.get("grafana_snapshot_workers", SNAPSHOT_WORKERS)
+        steps_file = os.path.join(self.artifact_dir, f"{self.workload_name}_steps.csv")
+        steps = []
+        if self.workload_conf.get("grafana_step_snapshots") and os.path.exists(
+            steps_file
+        ):
+            steps = (
+                pd.read_csv(steps_file)
+                .dropna()
+                .astype({"repeat": int, "concurrency": int, "rate": int})
+                .to_dict("records")
+            )
+
+        def snapshots(grafana: Grafana):
+            return (
+                grafana.create_snapshot(self.cluster, time_from, time_to, workers),
+                grafana.create_step_snapshots(self.cluster, steps, workers),
+            )
+
+        with ThreadPoolExecutor(len(self.grafana_servers)) as executor:
+            results = list(
+                executor.map(tracer.propagate(snapshots), self.grafana_servers)
+            )
+        for snapshot_urls, step_snapshots in results:
+            self.save_snapshot_urls(
+                snapshot_urls, (os.path.join(self.artifact_dir, "snapshot_url"))
+            )
+            for url in snapshot_urls:
+                self.logger.info(f"Snapshot URL: {url}")
+            if step_snapshots:
+                file_name = os.path.join(
+                    self.artifact_dir, f"{self.workload_name}_step_snapshots.csv"
+                )
+                pd.DataFrame(
+                    [
+                        {k: step[k] for k in ("repeat", "concurrency", "rate")}
+                        | {"url": url}
+                        for step, url in step_snapshots
+                    ]
+                ).to_csv(
+                    file_name,
+                    mode="a",
+                    header=not os.path.exists(file_name),
+                    index=False,
+                )
+                self.logger.info(
+                    f"{len(step_snapshots)} step snapshot(s) saved in {file_name}"
+                )
+
+    def export_metrics(self, time_from: str, time_to: str):
+        """Save Prometheus series of all cluster members for the run window
+
+        Series go to prometheus/<environment>/run.csv.gz at prometheus_step resolution
+        (report_interval by default). With prometheus_export_steps every step of
+        {workload}_steps.csv gets its own step_<repeat>_<concurrency>_<rate>.csv.gz.
+        Failures are logged only, results of the run are already saved.
+        """
+        if not self.workload_conf.get("prometheus_export", True):
+            return
+        step = self.workload_conf.get(
+            "prometheus_step",
+            self.workload_conf.get("report_interval", DEFAULT_REPORT_INTERVAL),
+        )
+        metrics = self.workload_conf.get("prometheus_metrics")
+        members = list(self.cluster.members)
+        start, end = to_epoch(time_from), to_epoch(time_to)
+        steps_file = os.path.join(self.artifact_dir, f"{self.workload_name}_steps.csv")
+        for env_name, prometheus in self.prometheus_servers.items():
+            directory = os.path.join(self.artifact_dir, PROMETHEUS_DIR, env_name)
+            mkdir(directory)
+            try:
+                prometheus.export_range(
+                    os.path.join(directory, "run.csv.gz"),
+                    self.cluster.cluster_name,
+                    members,
+                    start,
+                    end,
+                    step,
+                    metrics,
+                )
+                if self.workload_conf.get("prometheus_export_steps") and os.path.exists(
+                    steps_file
+                ):
+                    prometheus.export_steps(
+                        directory,
+                        pd.read_csv(steps_file).to_dict("records"),
+                        self.cluster.cluster_name,
+                        members,
+                        step,
+                        metrics,
+                    )
+                save_dict_as_yaml(
+                    os.path.join(directory, "export.yaml"),
+                    {
+                        "url": prometheus.url,
+                        "cluster_name": self.cluster.cluster_name,
+                        "members": members,
+                        "start": start,
+                        "end": end,
+                        "step": step,
+                        "metrics": metrics,
+                    },
+                )
+            except PrometheusException as e:
+                self.logger.warning(f"Unable to export metrics of {env_name}: {e}")
+
+    def chaos_schedule(self) -> Optional[ChaosSchedule]:
+        """Chaos schedule of the workload or None if there are no chaos events"""
+        events = (self.workload_conf.get("chaos") or {}).get("events")
+        if not events:
+            return None
+        return ChaosSchedule(
+            self.cluster,
+            self.backend,
+            events,
+            self._cloud_for_node,
+            bt=self.extra_impl_params.get("bt", {}),
+            quorum_timeout=self.workload_conf["chaos"].get(
+                "quorum_timeout", DEFAULT_QUORUM_TIMEOUT
+            ),
+        )
+
+    def _cloud_for_node(self, node) -> AbstractCloud:
+        for env in self.cluster.envs:
+            if env.name == node.vm.env:
+                return CloudFactory().create_cloud_from_str(
+                    env.cloud,
+                    self.cluster_name,
+                    **self.load_cloud(env.cloud)[env.region],
+                )
+        raise XbenchException(f"No environment {node.vm.env} for {node.vm.name}")
+
+    def max_concurrency(self) -> int:
+        """Maximum number of threads (terminals, virtual users) in the workload"""
+        concurrency = []
+        for key in (
+            "threads",
+            "terminals",
+            "terminals_tpcc",
+            "num_vu",
+            "users",
+            "clients",
+        ):
+            value = self.workload_conf.get(key)
+            if value:
+                concurrency.extend(value if isinstance(value, list) else [value])
+        return max(concurrency, default=0)
+
+    def advise_drivers(self, all_nodes: List) -> int:
+        """Log how many drivers like the head driver are needed for the workload
+
+        Returns:
+            int: recommended number of drivers
+        """
+        concurrency = self.max_concurrency()
+        nproc = all_nodes[0].nproc
+        threads_per_core = self.workload_conf.get(
+            "driver_threads_per_core", DEFAULT_THREADS_PER_CORE
+        )
+        needed = drivers_needed(concurrency, nproc, threads_per_core)
+        if needed > len(all_nodes):
+            self.logger.warning(
+                f"Maximum concurrency {concurrency} needs {needed} drivers with"
+                f" {nproc} cores ({threads_per_core} threads per core), cluster has"
+                f" {len(all_nodes)}. Drivers are likely to saturate"
+            )
+        else:
+            self.logger.info(
+                f"{len(all_nodes)} driver(s) are enough for maximum concurrency"
+                f" {concurrency}, {needed} required"
+            )
+        return needed
+
     def _get_all_params(self):
         return (
             self.workload_conf
@@ -166,6 +550,7 @@ class WorkloadRunning(Xbench):
             | {"artifact_dir": self.artifact_dir}
             | {"workload_name": self.workload_name}
             | {"backend": self.backend}
+            | {"resume": self.resume_dir is not None}
             | self.extra_impl_params
         )
 
@@ -180,6 +565,7 @@ class WorkloadRunning(Xbench):
         dest = f"{self.cluster.bt.get_backup_type()}/{self.benchmark_name}_{self.workload_conf.get('bench')}_{scale_string}{tag}"
         return dest
 
+    @traced("workload.backup")
     def backup(self, target: str):
         """Backup database to specified destination"""
 
@@ -196,6 +582,7 @@ class WorkloadRunning(Xbench):
         self.backend.backup(self.cluster.bt.database, backup_dest, cloud_args, target)
         self.logger.info("Backup complete")
 
+    @traced("workload.restore")
     def restore(self, target: str):
         """Restore from specified source"""
 
@@ -214,7 +601,8 @@ class WorkloadRunning(Xbench):
         workload_runner = workload_runner_class(
             self.cluster.get_all_driver_nodes(), **self._get_all_params()
         )
-        workload_runner.data_check()
+        with tracer.span("workload.data_check"):
+            workload_runner.data_check()
         workload_runner.setup()  # Need to setup benchbase on driver
 
     @staticmethod